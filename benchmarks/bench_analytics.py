@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /api/analytics/* tile latency across ~150 branches
+
+Seeds a throwaway branch_system.db with --branches branches spread over the
+four regions and --days days of sales, then times every dashboard tile
+(KPIs, trends, regional comparison) for every time range, cold (just after
+an invalidation) and warm, then the ranking index: rebuild, top-K and
+rank-of lookups and incremental sale updates.  The run fails if any cold
+tile takes longer than --budget ms, the rollups drift from sales_records
+or the index disagrees with a full sort after the updates.
+
+Usage:
+python benchmarks/bench_analytics.py [--branches 150] [--days 730] [--budget 50]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from branch_system import migrations, rollups  # noqa: E402
+from branch_system.analytics import REGIONS, TIME_RANGES, AnalyticsEngine  # noqa: E402
+from branch_system.database import ConnectionPool  # noqa: E402
+from branch_system.rankings import RankingIndex  # noqa: E402
+
+PRODUCTS = ["มะม่วงอบแห้ง", "สับปะรดอบแห้ง", "กล้วยอบแห้ง", "ลำไยอบแห้ง", "ผลไม้รวม"]
+TILES = [("kpis", "all"), ("trends", "all"), ("regions", "all"),
+         ("kpis", "region-north"), ("trends", "region-south")]
+
+
+def seed(pool, branches, days, sales_per_day):
+    regions = list(REGIONS)
+    today = date.today()
+    with pool.write() as conn:
+        migrations.migrate(conn)
+        conn.executemany(
+            "INSERT INTO branches (id, code, name, location, region) VALUES (?, ?, ?, ?, ?)",
+            [(f"branch-{i:03d}", f"B{i:03d}", f"สาขา {i}", "-", regions[i % len(regions)])
+             for i in range(branches)]
+        )
+        for day in range(days):
+            sale_date = today - timedelta(days=day)
+            rows = []
+            for i in range(branches):
+                for n in range(sales_per_day):
+                    qty = round(random.uniform(0.1, 2.0), 3)
+                    price = random.choice([240, 300, 360])
+                    rows.append((
+                        f"bench_{day}_{i}_{n}", "emp-004", f"branch-{i:03d}", f"สาขา {i}", None,
+                        random.choice(PRODUCTS), qty, "กิโลกรัม", price, qty * price,
+                        "walk-in", "cash", None, sale_date, sale_date.isoformat()
+                    ))
+            conn.executemany("""
+                INSERT INTO sales_records (
+                    id, user_id, branch_id, branch_name, session_id,
+                    product_name, quantity, unit, unit_price, total_amount,
+                    customer_type, payment_method, notes, sale_date, sale_time
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            rollups.add_sales(conn, ((r[2], r[13], r[5], r[6], r[9]) for r in rows))
+        migrations.analyze(conn, full=True)
+
+
+def bench_rank_index(conn, branches, updates=20000, lookups=20000):
+    index = RankingIndex()
+    started = time.perf_counter()
+    index.rebuild(conn)
+    print(f"rank index rebuild {(time.perf_counter() - started) * 1000:>10.2f} ms")
+
+    today = date.today()
+    started = time.perf_counter()
+    for _ in range(updates):
+        index.apply_sale(f"branch-{random.randrange(branches):03d}", today, random.uniform(50, 800))
+    per_update = (time.perf_counter() - started) / updates * 1e6
+    print(f"apply_sale         {per_update:>10.2f} us")
+
+    started = time.perf_counter()
+    for _ in range(lookups):
+        index.top("month", "all", "revenue", 10)
+    print(f"top 10             {(time.perf_counter() - started) / lookups * 1e6:>10.2f} us")
+
+    started = time.perf_counter()
+    for _ in range(lookups):
+        index.rank_of(f"branch-{random.randrange(branches):03d}", "month", "all", "growth")
+    print(f"rank_of            {(time.perf_counter() - started) / lookups * 1e6:>10.2f} us")
+
+    # The incrementally updated order must match a full sort of the same rows
+    ok = True
+    for metric in ("revenue", "growth"):
+        ranked = index.top("week", "region-north", metric, branches)
+        expected = sorted(ranked, key=lambda row: (
+            float("inf") if row[metric] is None else -row[metric], row["id"]))
+        ok &= [row["id"] for row in ranked] == [row["id"] for row in expected]
+    print(f"{'✅' if ok else '❌'} index order matches a full sort after {updates:,} updates")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--branches", type=int, default=150)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--sales-per-day", type=int, default=10, help="per branch")
+    parser.add_argument("--budget", type=float, default=50.0, help="cold tile budget in ms")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        pool = ConnectionPool(os.path.join(workdir, "branch_system.db"))
+        total = args.branches * args.days * args.sales_per_day
+        print(f"Seeding {total:,} sales for {args.branches} branches over {args.days} days...")
+        seed(pool, args.branches, args.days, args.sales_per_day)
+
+        with pool.read() as conn:
+            mismatches = rollups.check_consistency(conn)
+            ok = not mismatches
+            print(f"{'✅' if ok else '❌'} rollups consistent with sales_records "
+                  f"({len(mismatches)} mismatching rows)")
+
+            engine = AnalyticsEngine()
+            print(f"{'tile':<24}{'range':<10}{'cold ms':>10}{'warm ms':>10}")
+            for kind, group in TILES:
+                for time_range in TIME_RANGES:
+                    engine.invalidate()
+                    started = time.perf_counter()
+                    engine.compute(conn, kind, time_range, group)
+                    cold = (time.perf_counter() - started) * 1000
+
+                    started = time.perf_counter()
+                    assert engine.get(kind, time_range, group) is not None
+                    warm = (time.perf_counter() - started) * 1000
+
+                    ok &= cold <= args.budget
+                    flag = "" if cold <= args.budget else "  ❌ over budget"
+                    print(f"{kind + ' ' + group:<24}{time_range:<10}{cold:>10.2f}{warm:>10.3f}{flag}")
+
+            ok &= bench_rank_index(conn, args.branches)
+        pool.close()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /api/branch-auth/me latency while /api/sales/summary is busy
+
+Runs the app in-process against a throwaway branch_system.db seeded with a
+large sales history, then measures /me latency with heavy summary requests
+in flight, once with DB work inline on the event loop and once offloaded
+to the DB threads.
+
+Usage:
+python benchmarks/bench_async_db.py [--rows 300000] [--probes 200]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed_sales(main, rows):
+    from branch_system import rollups
+
+    branch_id = "branch-siam-paragon"
+    products = ["มะม่วงอบแห้ง", "สับปะรดอบแห้ง", "กล้วยอบแห้ง", "ลำไยอบแห้ง", "ผลไม้รวม"]
+    today = datetime.now()
+    batch = []
+    for i in range(rows):
+        when = today - timedelta(days=random.randint(0, 29), seconds=random.randint(0, 86399))
+        qty = round(random.uniform(0.1, 2.0), 3)
+        price = random.choice([240, 300, 360])
+        batch.append((
+            f"bench_{i}", "emp-004", branch_id, "Siam Paragon", None,
+            random.choice(products), qty, "กิโลกรัม", price, qty * price,
+            "walk-in", "cash", None, when.date(), when
+        ))
+    with main.db_pool.write() as conn:
+        conn.executemany("""
+            INSERT INTO sales_records (
+                id, user_id, branch_id, branch_name, session_id,
+                product_name, quantity, unit, unit_price, total_amount,
+                customer_type, payment_method, notes, sale_date, sale_time
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, batch)
+        rollups.rebuild(conn)
+        rollups.rebuild_branch_rollups(conn)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_scenario(client, headers, probes, heavy_workers):
+    stop = asyncio.Event()
+    heavy_done = 0
+
+    async def heavy():
+        nonlocal heavy_done
+        while not stop.is_set():
+            await client.get("/api/sales/summary", headers=headers)
+            heavy_done += 1
+
+    tasks = [asyncio.create_task(heavy()) for _ in range(heavy_workers)]
+    await asyncio.sleep(0.05)
+
+    latencies = []
+    for _ in range(probes):
+        started = time.perf_counter()
+        response = await client.get("/api/branch-auth/me", headers=headers)
+        latencies.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, response.text
+
+    stop.set()
+    await asyncio.gather(*tasks)
+    return latencies, heavy_done
+
+
+async def bench(args):
+    import httpx
+    import main
+    main.startup()
+
+    print(f"Seeding {args.rows:,} sales rows...")
+    seed_sales(main, args.rows)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        login = await client.post("/api/branch-auth/login",
+                                  json={"username": "manager001", "password": "123456"})
+        headers = {"Authorization": f"Bearer {login.json()['data']['token']}"}
+        await client.post("/api/branches/session/select",
+                          json={"branchId": "branch-siam-paragon"}, headers=headers)
+
+        print(f"{'mode':<10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'summaries':>12}")
+        for offload in (False, True):
+            main.async_db.offload = offload
+            latencies, heavy_done = await run_scenario(client, headers, args.probes, args.heavy)
+            mode = "offload" if offload else "inline"
+            print(f"{mode:<10}{statistics.median(latencies):>10.2f}"
+                  f"{percentile(latencies, 99):>10.2f}{max(latencies):>10.2f}{heavy_done:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=300000)
+    parser.add_argument("--probes", type=int, default=200)
+    parser.add_argument("--heavy", type=int, default=4, help="concurrent summary requests")
+    args = parser.parse_args()
+
+    # main.py opens branch_system.db relative to the working directory
+    sys.path.insert(0, ROOT)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
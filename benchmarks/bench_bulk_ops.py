@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /api/bulk-operations/execute across a few hundred branches
+
+Seeds a throwaway branch_system.db with --branches branches, then submits a
+price push to all of them whose per-branch action takes --work ms on the
+writer and fails transiently on --flaky percent of first attempts.  While it
+runs, a probe times small writes standing in for POS sales.
+
+Reports how long the submit call took, how long the operation took to
+finish and the probe's write latency, with --concurrency branches in
+flight and with every branch queued at once.  Fails unless every branch
+succeeded after retries and submit returned without waiting for them.
+
+Usage:
+python benchmarks/bench_bulk_ops.py [--branches 300] [--work 2] [--concurrency 8]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from branch_system import bulk_ops, migrations  # noqa: E402
+from branch_system.database import AsyncDatabase, ConnectionPool  # noqa: E402
+
+
+def flaky_push(work, flaky, rng):
+    """Price push that takes ``work`` seconds and sometimes hits a locked database"""
+    push = bulk_ops.ACTIONS["price-update"]
+    tried = set()
+
+    def action(conn, branch_id, data, operation_id):
+        time.sleep(work)
+        if branch_id not in tried:
+            tried.add(branch_id)
+            if rng.random() < flaky:
+                raise sqlite3.OperationalError("database is locked")
+        push(conn, branch_id, data, operation_id)
+    return action
+
+
+def _probe_write(conn):
+    conn.execute("SELECT 1")
+
+
+async def run(db, branch_ids, concurrency):
+    engine = bulk_ops.BulkOperationEngine(db, concurrency=concurrency, backoff=0.01, poll_interval=0.05)
+    started = time.perf_counter()
+    progress = await engine.submit("bench-push", branch_ids, {"productCategory": "all", "value": 5})
+    submit_ms = (time.perf_counter() - started) * 1000
+
+    latencies = []
+
+    async def probe():
+        while True:
+            probe_started = time.perf_counter()
+            await db.write(_probe_write)
+            latencies.append((time.perf_counter() - probe_started) * 1000)
+            await asyncio.sleep(0.005)
+
+    prober = asyncio.create_task(probe())
+    async for _ in engine.stream(progress["operationId"]):
+        pass
+    total_ms = (time.perf_counter() - started) * 1000
+    prober.cancel()
+    final = await engine.progress(progress["operationId"], False)
+    p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+    return submit_ms, total_ms, p95, final, engine.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--branches", type=int, default=300)
+    parser.add_argument("--work", type=float, default=2.0, help="per-branch action in ms")
+    parser.add_argument("--flaky", type=float, default=10.0, help="percent of first attempts that fail")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        pool = ConnectionPool(os.path.join(workdir, "branch_system.db"))
+        branch_ids = [f"branch-{i:03d}" for i in range(args.branches)]
+        with pool.write() as conn:
+            migrations.migrate(conn)
+            conn.executemany(
+                "INSERT INTO branches (id, code, name, location) VALUES (?, ?, ?, '-')",
+                [(branch_id, f"B{i:03d}", f"สาขา {i}") for i, branch_id in enumerate(branch_ids)],
+            )
+        db = AsyncDatabase(pool)
+
+        ok = True
+        print(f"{args.branches} branches, {args.work:.0f} ms per branch, "
+              f"{args.flaky:.0f}% transient failures on first attempt")
+        print(f"{'in flight':<12}{'submit ms':>10}{'total ms':>10}{'sale write p95 ms':>19}"
+              f"{'succeeded':>11}{'retries':>9}")
+        for concurrency in (args.concurrency, args.branches):
+            bulk_ops.ACTIONS["bench-push"] = flaky_push(args.work / 1000, args.flaky / 100, random.Random(7))
+            submit_ms, total_ms, p95, final, stats = asyncio.run(run(db, branch_ids, concurrency))
+            ok &= final["successful"] == args.branches and submit_ms < total_ms / 2
+            print(f"{concurrency:<12}{submit_ms:>10.1f}{total_ms:>10.1f}{p95:>19.1f}"
+                  f"{final['successful']:>11}{stats['retries']:>9}")
+        db.shutdown()
+        pool.close()
+    print(f"{'✅' if ok else '❌'} every branch succeeded and submit returned before the work")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /api/analytics/export for a multi-month, all-branch sales export
+
+Seeds a throwaway branch_system.db with --rows sales spread over --branches
+branches and --days days, then exports the whole range as CSV, gzipped CSV
+and XLSX, reporting rows/s and file size.  Each format is exported again for
+a quarter of the days under tracemalloc: peak Python memory must not grow
+with the row count (within --slack).  --batch shrinks the fetch batch so
+both runs read whole batches, since memory is bounded by the batch, not the
+rows.  Finally the XLSX is parsed back and a resumed download (Range from
+the middle of the file) is checked against the file's bytes.
+
+Usage:
+python benchmarks/bench_export.py [--rows 300000] [--branches 150] [--days 180]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from datetime import date, timedelta
+from xml.etree import ElementTree
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from branch_system import exports as export_module, migrations, rollups  # noqa: E402
+from branch_system.database import ConnectionPool  # noqa: E402
+from branch_system.exports import ReportExporter, file_response  # noqa: E402
+
+PRODUCTS = ["มะม่วงอบแห้ง", "สับปะรดอบแห้ง", "กล้วยอบแห้ง", "ลำไยอบแห้ง", "ผลไม้รวม"]
+FORMATS = [("csv", False), ("csv", True), ("xlsx", False)]
+
+
+def seed(pool, rows, branches, days):
+    today = date.today()
+    with pool.write() as conn:
+        migrations.migrate(conn)
+        conn.executemany(
+            "INSERT INTO branches (id, code, name, location) VALUES (?, ?, ?, '-')",
+            [(f"branch-{i:03d}", f"B{i:03d}", f"สาขา {i}") for i in range(branches)]
+        )
+        batch = []
+        for n in range(rows):
+            i = random.randrange(branches)
+            sale_date = today - timedelta(days=random.randrange(days))
+            qty = round(random.uniform(0.1, 2.0), 3)
+            price = random.choice([240, 300, 360])
+            batch.append((
+                f"bench_{n}", "emp-004", f"branch-{i:03d}", f"สาขา {i}", None,
+                random.choice(PRODUCTS), qty, "กิโลกรัม", price, qty * price,
+                "walk-in", "cash", None, sale_date, f"{sale_date}T{n % 24:02d}:00:00"
+            ))
+            if len(batch) == 10000 or n == rows - 1:
+                conn.executemany("""
+                    INSERT INTO sales_records (
+                        id, user_id, branch_id, branch_name, session_id,
+                        product_name, quantity, unit, unit_price, total_amount,
+                        customer_type, payment_method, notes, sale_date, sale_time
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, batch)
+                batch = []
+        rollups.rebuild(conn)
+        rollups.rebuild_branch_rollups(conn)
+    return today + timedelta(days=1)
+
+
+def peak_memory(exporter, conn, fmt, compress, start, end):
+    tracemalloc.start()
+    export = exporter.export(conn, fmt, start, end, "all", compress)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return export, peak
+
+
+def check_xlsx(path):
+    rows = 0
+    with zipfile.ZipFile(path) as workbook:
+        sheets = [name for name in workbook.namelist() if name.startswith("xl/worksheets/")]
+        for name in sheets:
+            with workbook.open(name) as sheet:
+                for _, element in ElementTree.iterparse(sheet):
+                    if element.tag.endswith("}row"):
+                        rows += 1
+                        element.clear()
+    return rows - len(sheets)
+
+
+async def read_response(response):
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    return response.status_code, response.headers, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=300000)
+    parser.add_argument("--branches", type=int, default=150)
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--batch", type=int, default=200, help="rows per fetch batch")
+    parser.add_argument("--slack", type=float, default=1.5, help="allowed peak memory ratio, full vs quarter")
+    args = parser.parse_args()
+
+    export_module.BATCH_ROWS = args.batch
+    ok = True
+    with tempfile.TemporaryDirectory() as workdir:
+        pool = ConnectionPool(os.path.join(workdir, "branch_system.db"))
+        end = seed(pool, args.rows, args.branches, args.days)
+        start = end - timedelta(days=args.days)
+        quarter = end - timedelta(days=args.days // 4)
+        exporter = ReportExporter(os.path.join(workdir, "exports"))
+
+        print(f"{args.rows} sales, {args.branches} branches, {args.days} days")
+        print(f"{'format':<9}{'rows/s':>10}{'MB':>8}{'peak KB (1/4)':>15}{'peak KB (all)':>15}")
+        with pool.read() as conn:
+            exports = {}
+            for fmt, compress in FORMATS:
+                started = time.perf_counter()
+                export = exporter.export(conn, fmt, start, end, "all", compress)
+                seconds = time.perf_counter() - started
+                exports[export["format"]] = export
+                ok &= export["rows"] == args.rows
+                _, small = peak_memory(exporter, conn, fmt, compress, quarter, end)
+                _, full = peak_memory(exporter, conn, fmt, compress, start, end)
+                ok &= full <= small * args.slack
+                print(f"{export['format']:<9}{export['rows'] / seconds:>10,.0f}{export['size'] / 2 ** 20:>8.1f}"
+                      f"{small / 1024:>15,.0f}{full / 1024:>15,.0f}")
+
+        xlsx_rows = check_xlsx(exporter.path(exports["xlsx"]["filename"], "system"))
+        ok &= xlsx_rows == args.rows
+        print(f"xlsx parsed back: {xlsx_rows} data rows")
+
+        path = exporter.path(exports["csv.gz"]["filename"], "system")
+        with open(path, "rb") as f:
+            content = f.read()
+        middle = len(content) // 2
+        status, headers, body = asyncio.run(read_response(file_response(path)))
+        etag = headers["etag"]
+        partial_status, partial_headers, tail = asyncio.run(
+            read_response(file_response(path, f"bytes={middle}-", etag)))
+        stale_status, _, _ = asyncio.run(read_response(file_response(path, f"bytes={middle}-", '"stale"')))
+        resumed = (status == 200 and partial_status == 206 and stale_status == 200
+                   and body[:middle] + tail == content
+                   and partial_headers["content-range"] == f"bytes {middle}-{len(content) - 1}/{len(content)}")
+        ok &= resumed
+        print(f"gzip ratio {exports['csv']['size'] / exports['csv.gz']['size']:.1f}x, "
+              f"resumed download from byte {middle:,}: {'ok' if resumed else 'MISMATCH'}")
+        pool.close()
+
+    print(f"{'✅' if ok else '❌'} every row exported in every format, memory flat in row count, resume intact")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
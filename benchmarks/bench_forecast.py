@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark: batch forecast fitting for /api/analytics/forecast
+
+Builds a year of synthetic daily revenue for --branches branches (trend,
+weekend peak, Thai-holiday lift and noise), then
+
+1. fits every branch plus the chain in one NumPy pass and, for comparison,
+   one series at a time as a per-branch loop would;
+2. holds out the last --holdout days, forecasts them and reports how often
+   the actual daily revenue falls inside the 95% interval.
+
+Usage:
+python benchmarks/bench_forecast.py [--branches 150] [--days 365] [--holdout 30]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from branch_system import forecast  # noqa: E402
+
+
+def synthetic(branches, days, start, rng):
+    t = np.arange(days)
+    dates = [start + timedelta(days=d) for d in range(days)]
+    weekend = np.array([d.weekday() >= 5 for d in dates])
+    holiday = np.array([forecast.is_holiday(d) for d in dates])
+    base = rng.uniform(3000, 12000, size=(branches, 1))
+    y = base * (1 + 0.0008 * t) * np.where(weekend, 1.35, 1.0) * np.where(holiday, 1.6, 1.0)
+    y += rng.normal(0, 0.05, size=y.shape) * base
+    y = np.maximum(y, 0)
+    keys = [f"branch-{i:03d}" for i in range(branches)] + [forecast.CHAIN]
+    return keys, np.vstack([y, y.sum(axis=0)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--branches", type=int, default=150)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--holdout", type=int, default=30)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    today = date.today()
+    start = today - timedelta(days=args.days)
+    keys, y = synthetic(args.branches, args.days, start, rng)
+    train_days = args.days - args.holdout
+    fit_today = start + timedelta(days=train_days)
+
+    started = time.perf_counter()
+    model = forecast._fit((keys, start, y[:, :train_days]), fit_today)
+    batch_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    for i, key in enumerate(keys):
+        forecast._fit(([key], start, y[i:i + 1, :train_days]), fit_today)
+    loop_ms = (time.perf_counter() - started) * 1000
+
+    print(f"{len(keys)} series x {train_days} days x "
+          f"{len(forecast.ALPHAS) * len(forecast.BETAS) * len(forecast.GAMMAS)} parameter sets")
+    print(f"batch fit {batch_ms:>9.1f} ms")
+    print(f"loop fit  {loop_ms:>9.1f} ms   ({loop_ms / batch_ms:.1f}x slower)")
+
+    days = [fit_today + timedelta(days=h) for h in range(args.holdout)]
+    inside = total = 0
+    errors = []
+    for i in range(len(keys)):
+        point, variance, _ = forecast._project(model, i, days)
+        actual = y[i, train_days:]
+        half = forecast.Z95 * np.sqrt(variance)
+        inside += int(np.sum((actual >= point - half) & (actual <= point + half)))
+        total += len(actual)
+        errors.append(np.mean(np.abs(actual - point) / actual) * 100)
+
+    coverage = inside / total * 100
+    print(f"holdout {args.holdout} days: MAPE {np.median(errors):.1f}% (median over series), "
+          f"95% interval coverage {coverage:.1f}%")
+    sys.exit(0 if coverage >= 85 else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cold import and startup of main.py
+
+Runs --runs fresh interpreters, each in an empty working directory, that
+time ``import main``, ``create_app()`` and ``startup()`` (migrate and seed an
+empty branch_system.db, open the sale log).  Importing must not create files
+or start threads; that all happens in startup, from the app's lifespan.
+Also lists the slowest top-level imports from one ``-X importtime`` run.
+
+Fails if the median import exceeds --budget ms or the median startup
+exceeds --startup-budget ms.
+
+Usage:
+python benchmarks/bench_import.py [--runs 5] [--budget 1000] [--startup-budget 500]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = f"""
+import json, os, sys, threading, time
+sys.path.insert(0, {ROOT!r})
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+files, threads = sorted(os.listdir(".")), threading.active_count()
+main.create_app()
+created = time.perf_counter()
+main.startup()
+ready = time.perf_counter()
+main.sale_log.close()
+print(json.dumps({{
+    "importMs": (imported - started) * 1000,
+    "createAppMs": (created - imported) * 1000,
+    "startupMs": (ready - created) * 1000,
+    "filesAfterImport": files,
+    "threadsAfterImport": threads,
+}}))
+"""
+
+
+def probe():
+    with tempfile.TemporaryDirectory() as workdir:
+        output = subprocess.run([sys.executable, "-c", PROBE], cwd=workdir, check=True,
+                                capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def slowest_imports(limit):
+    with tempfile.TemporaryDirectory() as workdir:
+        report = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import sys; sys.path.insert(0, {ROOT!r}); import main"],
+            cwd=workdir, check=True, capture_output=True, text=True,
+        ).stderr
+    top = []
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Only modules imported by main itself (one nesting level)
+        if name.startswith("   ") and not name.startswith("     "):
+            top.append((int(cumulative) / 1000, name.strip()))
+    return sorted(top, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=1000.0, help="median import ms")
+    parser.add_argument("--startup-budget", type=float, default=500.0, help="median startup ms")
+    args = parser.parse_args()
+
+    probe()  # compile .pyc files so every measured run imports from cache
+    runs = [probe() for _ in range(args.runs)]
+
+    print(f"{args.runs} cold interpreters, empty working directory")
+    print(f"{'step':<12}{'p50 ms':>10}{'max ms':>10}")
+    medians = {}
+    for key, label in (("importMs", "import"), ("createAppMs", "create_app"), ("startupMs", "startup")):
+        values = [run[key] for run in runs]
+        medians[key] = statistics.median(values)
+        print(f"{label:<12}{medians[key]:>10.1f}{max(values):>10.1f}")
+
+    print("slowest imports from main:")
+    for ms, name in slowest_imports(6):
+        print(f"  {name:<32}{ms:>8.1f} ms")
+
+    side_effects = [(run["filesAfterImport"], run["threadsAfterImport"]) for run in runs
+                    if run["filesAfterImport"] or run["threadsAfterImport"] != 1]
+    if side_effects:
+        print(f"import left files/threads behind: {side_effects[0]}")
+    ok = (not side_effects and medians["importMs"] <= args.budget
+          and medians["startupMs"] <= args.startup_budget)
+    print(f"{'✅' if ok else '❌'} import {medians['importMs']:.0f} ms (budget {args.budget:.0f}), "
+          f"startup {medians['startupMs']:.0f} ms (budget {args.startup_budget:.0f}), no import side effects")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Benchmark: live sales feed fan-out to many dashboard connections
+
+Opens N simultaneous /api/sales/live/stream (SSE) connections against the
+in-process app, records sales through POST /api/sales, and measures how long
+each event takes to reach every connection.  A few deliberately slow clients
+can be added to show they only lose their own events.
+
+Usage:
+python benchmarks/bench_live_feed.py [--clients 500] [--events 200] [--rate 50] [--slow 5]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class SSEClient:
+    """Drives the ASGI app directly as one long-lived SSE connection"""
+
+    def __init__(self, app, published, slow_delay=0.0):
+        self.app = app
+        self.published = published      # cursor -> perf_counter at publish
+        self.slow_delay = slow_delay
+        self.latencies = []
+        self.received = 0
+        self.gaps = 0
+        self.connected = asyncio.Event()
+        self._closed = asyncio.Event()
+        self._buffer = b""
+
+    async def run(self):
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": "GET", "scheme": "http", "path": "/api/sales/live/stream",
+            "raw_path": b"/api/sales/live/stream", "query_string": b"",
+            "root_path": "", "headers": [(b"host", b"bench")],
+            "client": ("127.0.0.1", 0), "server": ("bench", 80),
+        }
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await self._closed.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                self.connected.set()
+            elif message["type"] == "http.response.body":
+                self._parse(message.get("body", b""), time.perf_counter())
+                if self.slow_delay:
+                    await asyncio.sleep(self.slow_delay)
+
+        await self.app(scope, receive, send)
+
+    def close(self):
+        self._closed.set()
+
+    def _parse(self, chunk, arrived):
+        self._buffer += chunk
+        *frames, self._buffer = self._buffer.split(b"\n\n")
+        for frame in frames:
+            if frame.startswith(b"event: gap") or b"\nevent: gap" in frame:
+                self.gaps += 1
+            elif b"event: sale" in frame:
+                data = frame.split(b"data: ", 1)[1]
+                cursor = json.loads(data)["cursor"]
+                self.received += 1
+                self.latencies.append((arrived - self.published[cursor]) * 1000)
+
+
+async def bench(args):
+    import httpx
+    import main
+    main.startup()
+
+    published = {}
+    app = main.app
+    fast = [SSEClient(app, published) for _ in range(args.clients - args.slow)]
+    slow = [SSEClient(app, published, slow_delay=0.5) for _ in range(args.slow)]
+    clients = fast + slow
+    tasks = [asyncio.create_task(client.run()) for client in clients]
+    await asyncio.gather(*(client.connected.wait() for client in clients))
+    print(f"📡 {len(clients)} SSE connections open ({args.slow} slow), "
+          f"{main.live_feed.stats()['subscribers']} subscribers")
+
+    transport = httpx.ASGITransport(app=app)
+    interval = 1.0 / args.rate
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        for i in range(args.events):
+            published[main.live_feed.cursor + 1] = time.perf_counter()
+            response = await client.post("/api/sales", json={
+                "saleId": f"BENCH{i:06d}", "employeeName": "bench", "branchName": "สยาม พารากอน",
+                "items": [{"name": "มะม่วงอบแห้ง", "quantity": 250, "unit": "กรัม", "total": 62.5}],
+                "totalAmount": 62.5, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            })
+            assert response.json()["success"], response.text
+            await asyncio.sleep(max(0.0, started + (i + 1) * interval - time.perf_counter()))
+
+    # Let the fast clients drain, then disconnect everyone
+    deadline = time.perf_counter() + 10
+    while time.perf_counter() < deadline and any(c.received < args.events for c in fast):
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    for c in clients:
+        c.close()
+    await asyncio.gather(*tasks)
+
+    latencies = [ms for c in fast for ms in c.latencies]
+    delivered = sum(c.received for c in clients)
+    complete = sum(1 for c in fast if c.received == args.events)
+    print(f"{'deliveries':<22}{delivered:,} in {elapsed:.2f}s ({delivered / elapsed:,.0f}/s)")
+    print(f"{'fast clients complete':<22}{complete}/{len(fast)}")
+    print(f"{'latency p50 / p99':<22}{statistics.median(latencies):.2f} / "
+          f"{percentile(latencies, 99):.2f} ms (max {max(latencies):.2f})")
+    if slow:
+        print(f"{'slow clients':<22}received {sum(c.received for c in slow):,}, "
+              f"gap notices {sum(c.gaps for c in slow)}")
+    print(f"{'feed stats':<22}{main.live_feed.stats()}")
+    ok = complete == len(fast)
+    print("✅ every fast client got every event" if ok else "❌ fast clients missed events")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=50, help="sales per second")
+    parser.add_argument("--slow", type=int, default=5, help="clients that read slowly")
+    args = parser.parse_args()
+
+    # main.py opens branch_system.db relative to the working directory
+    sys.path.insert(0, ROOT)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        ok = asyncio.run(bench(args))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark: shift-start login storm against /api/branch-auth/login
+
+Fires many concurrent logins at the app in-process and reports throughput
+and event-loop lag for increasing password worker counts.  With bcrypt
+running on the worker pool, logins/s should grow with the number of
+workers up to the number of cores while the event loop stays responsive.
+
+Usage:
+python benchmarks/bench_login_storm.py [--logins 48] [--rounds 10]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ACCOUNTS = [
+    ("admin", "admin123"),
+    ("manager001", "123456"),
+    ("manager002", "123456"),
+    ("staff001", "123456"),
+    ("staff002", "123456"),
+    ("staff003", "123456"),
+]
+
+
+async def measure_loop_lag(stop, samples, interval=0.01):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - expected) * 1000)
+
+
+async def storm(client, logins):
+    async def login(i):
+        username, password = ACCOUNTS[i % len(ACCOUNTS)]
+        response = await client.post("/api/branch-auth/login",
+                                     json={"username": username, "password": password})
+        assert response.status_code == 200, response.text
+
+    await asyncio.gather(*(login(i) for i in range(logins)))
+
+
+async def bench(args):
+    import httpx
+    import main
+    from branch_system.passwords import PasswordHasher
+    main.startup()
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        cores = os.cpu_count() or 1
+        worker_counts = sorted({1, 2, max(1, cores // 2), cores})
+        print(f"{args.logins} concurrent logins, bcrypt cost {args.rounds}, {cores} cores")
+        print(f"{'workers':>8}{'seconds':>10}{'logins/s':>10}{'loop lag p99 ms':>18}{'avg wait ms':>14}")
+
+        for workers in worker_counts:
+            main.password_hasher = PasswordHasher(rounds=args.rounds, max_workers=workers)
+            # Warm-up login also rehashes the demo users to the benchmark cost
+            await storm(client, len(ACCOUNTS))
+            main.password_hasher = PasswordHasher(rounds=args.rounds, max_workers=workers)
+
+            stop, lag = asyncio.Event(), []
+            ticker = asyncio.create_task(measure_loop_lag(stop, lag))
+            started = time.perf_counter()
+            await storm(client, args.logins)
+            elapsed = time.perf_counter() - started
+            stop.set()
+            await ticker
+
+            lag.sort()
+            p99 = lag[int(0.99 * (len(lag) - 1))] if lag else 0.0
+            stats = main.password_hasher.stats()
+            print(f"{workers:>8}{elapsed:>10.2f}{args.logins / elapsed:>10.1f}"
+                  f"{p99:>18.2f}{stats['avgWaitMs']:>14.1f}")
+            main.password_hasher.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=48)
+    parser.add_argument("--rounds", type=int, default=10, help="bcrypt cost used for the run")
+    args = parser.parse_args()
+
+    # main.py opens branch_system.db relative to the working directory
+    sys.path.insert(0, ROOT)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
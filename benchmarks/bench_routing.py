@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark: delivery route optimization for /api/delivery/routes/optimize-all
+
+Scatters --zones zones of --routes routes with --stops stops each around
+Thailand, then
+
+1. checks the solver against brute force on small routes (how far above the
+   true shortest path the heuristic lands);
+2. reports the distance saved over a random stop order, and over nearest
+   neighbour alone;
+3. times optimize-all solving one zone per worker process against solving
+   every route in this process.
+
+Usage:
+python benchmarks/bench_routing.py [--zones 4] [--routes 6] [--stops 40]
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from branch_system import routing  # noqa: E402
+
+WAREHOUSE = {"id": "WH-BKK", "name": "warehouse", "lat": 13.7563, "lng": 100.5018}
+ZONE_CENTRES = [(13.9, 100.6), (18.5, 99.3), (8.0, 99.0), (16.5, 102.8), (12.8, 101.9), (15.2, 104.8)]
+
+
+def make_routes(zones, routes, stops, rng):
+    result = []
+    for z in range(zones):
+        lat, lng = ZONE_CENTRES[z % len(ZONE_CENTRES)]
+        for r in range(routes):
+            result.append({
+                "id": f"route-{z}-{r}",
+                "zone": f"ZONE_{z}",
+                "branches": [
+                    {"id": f"S-{z}-{r}-{s}", "name": "-",
+                     "lat": lat + rng.uniform(-1.0, 1.0), "lng": lng + rng.uniform(-1.0, 1.0)}
+                    for s in range(stops)
+                ],
+            })
+    return result
+
+
+def brute_force(dist):
+    stops = range(1, len(dist))
+    return min(routing.path_length(dist, [0] + list(order)) for order in itertools.permutations(stops))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--zones", type=int, default=4)
+    parser.add_argument("--routes", type=int, default=6)
+    parser.add_argument("--stops", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    rng = random.Random(7)
+    ok = True
+
+    # 1. Optimality gap on routes small enough to enumerate
+    gaps = []
+    for route in make_routes(1, 50, 7, rng):
+        coords = [(WAREHOUSE["lat"], WAREHOUSE["lng"])] + [(s["lat"], s["lng"]) for s in route["branches"]]
+        dist = (routing.haversine_km(coords) * routing.ROAD_FACTOR).tolist()
+        solved = routing.path_length(dist, [0] + routing.solve(dist))
+        gaps.append(solved / brute_force(dist) - 1)
+    mean_gap = sum(gaps) / len(gaps) * 100
+    ok &= mean_gap < 2.0
+    print(f"{'✅' if mean_gap < 2.0 else '❌'} 7-stop routes: {mean_gap:.2f}% above optimal on average, "
+          f"{sum(1 for g in gaps if g < 1e-9)}/{len(gaps)} optimal")
+
+    # 2. Savings over a random order and over nearest neighbour alone
+    routes = make_routes(args.zones, args.routes, args.stops, rng)
+    planner = routing.RoutePlanner(WAREHOUSE, routes, max_workers=args.workers)
+    before = sum(route["totalDistance"] for route in planner.routes())
+    nn = 0.0
+    for route in routes:
+        _, dist, _ = planner._job(planner._routes[route["id"]])
+        nn += routing.path_length(dist, routing.nearest_neighbour(dist))
+
+    # 3. Zones in parallel on the process pool vs everything in-process
+    jobs = [planner._job(planner._routes[route["id"]]) for route in routes]
+    started = time.perf_counter()
+    routing.solve_routes(jobs)
+    serial_ms = (time.perf_counter() - started) * 1000
+
+    asyncio.run(planner.optimize(["route-0-0"]))     # start the workers
+    started = time.perf_counter()
+    results = asyncio.run(planner.optimize())
+    pool_ms = (time.perf_counter() - started) * 1000
+    planner.shutdown()
+
+    after = sum(route["totalDistance"] for route in planner.routes())
+    print(f"{len(routes)} routes x {args.stops} stops: random order {before:,.0f} km, "
+          f"nearest neighbour {nn:,.0f} km, optimized {after:,.0f} km")
+    print(f"saved {100 * (1 - after / before):.1f}% vs random, {100 * (1 - after / nn):.1f}% vs nearest neighbour")
+    worse = [r["routeId"] for r in results if r["after"]["distance"] > r["before"]["distance"]]
+    ok &= not worse and after <= nn
+    print(f"{'✅' if not worse else '❌'} no route got longer")
+    print(f"in-process {serial_ms:>9.1f} ms")
+    print(f"pool       {pool_ms:>9.1f} ms   ({planner.max_workers} workers, {args.zones} zones)")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
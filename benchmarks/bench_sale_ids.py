@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Stress test: sale ID allocation and sales_records inserts
+
+1. Several processes and threads mint IDs concurrently; every ID must be
+   unique and each thread's sequence strictly increasing.
+2. Concurrent POS threads record single sales through the same write path
+   as /api/sales/record against a throwaway branch_system.db, and the run
+   fails if it cannot sustain the target insert rate or hits a
+   primary-key collision.
+
+Usage:
+python benchmarks/bench_sale_ids.py [--sales 20000] [--target 10000]
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from branch_system.ids import new_id  # noqa: E402
+
+
+def mint_ids(count, threads=4):
+    results = [[] for _ in range(threads)]
+
+    def worker(out):
+        for _ in range(count // threads):
+            out.append(new_id("sale_"))
+
+    pool = [threading.Thread(target=worker, args=(out,)) for out in results]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    for sequence in results:
+        assert sequence == sorted(sequence), "IDs not monotonic within a thread"
+    return [i for sequence in results for i in sequence]
+
+
+def check_allocator(processes, per_process):
+    with multiprocessing.Pool(processes) as pool:
+        batches = pool.map(mint_ids, [per_process] * processes)
+    ids = [i for batch in batches for i in batch]
+    assert len(ids) == len(set(ids)), "duplicate IDs across workers"
+    print(f"✅ {len(ids):,} IDs from {processes} processes x 4 threads, all unique")
+
+
+def check_inserts(sales, threads, target):
+    import main
+    main.startup()
+
+    with main.db_pool.write() as conn:
+        conn.execute("""
+            INSERT INTO daily_sessions (id, user_id, branch_id, branch_name, session_date, start_time, is_locked)
+            VALUES ('session_bench', 'emp-004', 'branch-siam-paragon', 'Siam Paragon', ?, ?, TRUE)
+        """, (main.datetime.now().date(), main.datetime.now()))
+
+    sale = main.SalesRecordRequest(productName="มะม่วงอบแห้ง", quantity=0.25, unitPrice=240)
+    errors = []
+
+    def pos_terminal():
+        try:
+            for _ in range(sales // threads):
+                with main.db_pool.write() as conn:
+                    main._insert_sale(conn, "emp-004", sale)
+        except Exception as e:  # surfaced below
+            errors.append(e)
+
+    pool = [threading.Thread(target=pos_terminal) for _ in range(threads)]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    assert not errors, f"insert failed: {errors[0]!r}"
+    with main.db_pool.read() as conn:
+        stored = conn.execute("SELECT COUNT(*) FROM sales_records").fetchone()[0]
+    rate = stored / elapsed
+    print(f"{'✅' if rate >= target else '❌'} {stored:,} sales in {elapsed:.2f}s "
+          f"= {rate:,.0f} inserts/s (target {target:,})")
+    return rate >= target
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sales", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--target", type=int, default=10000, help="required inserts per second")
+    args = parser.parse_args()
+
+    check_allocator(processes=4, per_process=50000)
+
+    # main.py opens branch_system.db relative to the working directory
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        ok = check_inserts(args.sales, args.threads, args.target)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
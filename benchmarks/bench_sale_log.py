@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark: durable sale log ingest behind POST /api/sales
+
+1. Appends --records sales one at a time with small segments and reports
+   the rate per window; it should stay flat as the log grows and rotates.
+2. Runs --concurrency async writers that each wait for their fsync, and
+   reports throughput and sales made durable per fsync (group commit).
+3. Several processes append to one log directory at once; every record must
+   read back exactly once, in offset order.
+
+Usage:
+python benchmarks/bench_sale_log.py [--records 200000] [--concurrency 64] [--processes 4]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from branch_system.sale_log import SaleLog  # noqa: E402
+
+
+def sale(i, worker=0):
+    return {
+        "id": f"SALE{worker:02d}{i:08d}", "employeeName": "นายสมชาย ใจดี",
+        "branchName": "สยาม พารากอน", "totalAmount": 62.5, "timestamp": "2025-01-17T14:30:00Z",
+        "items": [{"name": "มะม่วงอบแห้ง", "quantity": 250, "unit": "กรัม", "total": 62.5}],
+    }
+
+
+def check_flat_ingest(directory, records, windows=10):
+    log = SaleLog(directory, segment_bytes=4 * 1024 * 1024, fsync=False)
+    per_window = records // windows
+    rates = []
+    for window in range(windows):
+        started = time.perf_counter()
+        for i in range(per_window):
+            log.append(sale(window * per_window + i))
+        rates.append(per_window / (time.perf_counter() - started))
+    stats = log.stats()
+    log.close()
+    print("append rate per window (k/s): " + " ".join(f"{r / 1000:.0f}" for r in rates))
+    print(f"   {stats['appends']:,} records, {stats['segments']} segments, {stats['rotations']} rotations")
+    flat = min(rates[1:]) >= 0.7 * max(rates[1:])
+    print(f"{'✅' if flat else '❌'} ingest rate independent of log size")
+    return flat
+
+
+async def durable_writers(directory, records, concurrency):
+    log = SaleLog(directory)
+    per_writer = records // concurrency
+
+    async def writer(w):
+        for i in range(per_writer):
+            await log.append_durable(sale(i, w))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(writer(w) for w in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stats = log.stats()
+    log.close()
+    print(f"✅ {stats['appends']:,} fsynced appends in {elapsed:.2f}s = "
+          f"{stats['appends'] / elapsed:,.0f}/s, {stats['appendsPerFsync']} per fsync")
+
+
+def append_from_process(args):
+    directory, worker, count = args
+    log = SaleLog(directory, segment_bytes=256 * 1024, tail_size=0, fsync=False)
+    for i in range(count):
+        log.append(sale(i, worker))
+    log.close()
+
+
+def check_shared_directory(directory, processes, per_process):
+    with multiprocessing.Pool(processes) as pool:
+        pool.map(append_from_process, [(directory, w, per_process) for w in range(processes)])
+    log = SaleLog(directory, segment_bytes=256 * 1024, fsync=False)
+    seen, after = [], -1
+    while True:
+        batch = log.read(after=after, limit=5000)
+        if not batch:
+            break
+        seen.extend(record["id"] for _, record in batch)
+        after = batch[-1][0]
+    segments = log.stats()["segments"]
+    log.close()
+    ok = len(seen) == len(set(seen)) == processes * per_process
+    print(f"{'✅' if ok else '❌'} {len(seen):,} records from {processes} processes "
+          f"read back once each across {segments} segments")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--records", type=int, default=200000)
+    parser.add_argument("--durable", type=int, default=20000, help="records for the fsync test")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--processes", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        ok = check_flat_ingest(os.path.join(workdir, "flat"), args.records)
+        asyncio.run(durable_writers(os.path.join(workdir, "durable"), args.durable, args.concurrency))
+        ok &= check_shared_directory(os.path.join(workdir, "shared"), args.processes, 20000)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+"""
+Support modules for the branch login system served by main.py
+"""
@@ -0,0 +1,345 @@
+"""
+Sales analytics behind the /api/analytics/* endpoints
+
+Every figure is computed from the per-branch rollups maintained by
+``rollups``: whole months come from ``sales_branch_monthly`` and only the
+loose days at either end of a window from ``sales_branch_daily``.  A year
+across ~150 branches therefore sums a few thousand rows, not every sale.
+
+Time ranges are trailing windows ending today (``TIME_RANGES``); growth and
+trend compare a window with the equally long window just before it.  Groups
+are ``all``, ``region-<code>`` for a key of ``REGIONS`` or a single branch id.
+
+Results are cached per (kind, time_range, group).  Sale writers call
+``invalidate`` after they commit; a computation that overlapped an
+invalidation is returned but not cached.  Entries also expire after ``ttl``
+seconds, which bounds how long sales written through another worker stay
+invisible here.
+"""
+
+import threading
+import time
+from datetime import date, timedelta
+
+# Trailing window length in days for each time range
+TIME_RANGES = {
+    "today": 1,
+    "week": 7,
+    "month": 30,
+    "quarter": 90,
+    "year": 365,
+}
+
+# Trend chart buckets per time range: (bucket unit, number of buckets)
+TREND_BUCKETS = {
+    "today": ("day", 7),
+    "week": ("day", 7),
+    "month": ("day", 30),
+    "quarter": ("week", 13),
+    "year": ("month", 12),
+}
+
+# Region code -> display name, in chart order
+REGIONS = {
+    "central": "ภาคกลาง",
+    "north": "ภาคเหนือ",
+    "northeast": "ภาคอีสาน",
+    "south": "ภาคใต้",
+}
+
+MONTH_LABELS = ["ม.ค.", "ก.พ.", "มี.ค.", "เม.ย.", "พ.ค.", "มิ.ย.",
+                "ก.ค.", "ส.ค.", "ก.ย.", "ต.ค.", "พ.ย.", "ธ.ค."]
+
+# Growth beyond +/- this percentage marks a branch trend as up / down
+TREND_THRESHOLD = 5.0
+
+# Loose days before the first whole month, whole months, loose days after
+_RANGE_TOTALS = """
+    SELECT branch_id, SUM(total_amount) AS revenue,
+           SUM(transaction_count) AS transactions, SUM(total_quantity) AS quantity
+    FROM (
+        SELECT branch_id, total_amount, transaction_count, total_quantity
+        FROM sales_branch_daily WHERE sale_date >= ? AND sale_date < ?
+        UNION ALL
+        SELECT branch_id, total_amount, transaction_count, total_quantity
+        FROM sales_branch_monthly WHERE sale_month >= ? AND sale_month < ?
+        UNION ALL
+        SELECT branch_id, total_amount, transaction_count, total_quantity
+        FROM sales_branch_daily WHERE sale_date >= ? AND sale_date < ?
+    )
+    GROUP BY branch_id
+"""
+
+
+class AnalyticsEngine:
+    """Cached, query-backed KPIs, trends and regional totals"""
+
+    def __init__(self, ttl=10.0, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}          # (kind, time_range, group) -> (expires_at, value)
+        self._generation = 0        # bumped by every invalidation
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "invalidations": 0,
+            "discarded": 0,
+        }
+
+    # -- cache -----------------------------------------------------------
+
+    def get(self, kind, time_range, group):
+        """Cached result or None; safe to call on the event loop"""
+        key = (kind, time_range, group)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._counters["hits"] += 1
+                return entry[1]
+            self._entries.pop(key, None)
+            self._counters["misses"] += 1
+            return None
+
+    def compute(self, conn, kind, time_range, group, today=None):
+        """Run the query for ``kind`` and cache it unless sales landed meanwhile"""
+        with self._lock:
+            generation = self._generation
+        compute = {
+            "kpis": self._kpis,
+            "trends": self._trends,
+            "regions": self._regions,
+        }[kind]
+        value = compute(conn, check_range(time_range), group, today or date.today())
+
+        with self._lock:
+            if generation != self._generation:
+                self._counters["discarded"] += 1
+            else:
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+                self._entries[(kind, time_range, group)] = (time.monotonic() + self.ttl, value)
+        return value
+
+    def invalidate(self):
+        """Forget every cached result after sales were added or removed"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._counters["invalidations"] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries), ttl=self.ttl)
+
+    # -- queries ---------------------------------------------------------
+
+    def _kpis(self, conn, time_range, group, today):
+        rows = branch_rows(conn, time_range, group, today)
+        revenue = sum(row["revenue"] for row in rows)
+        previous = sum(row["previousRevenue"] for row in rows)
+        transactions = sum(row["transactions"] for row in rows)
+        return {
+            "score": round(sum(row["score"] for row in rows) / len(rows), 1) if rows else 0.0,
+            "revenue": revenue,
+            "revenuePerBranch": revenue / len(rows) if rows else 0,
+            "transactions": transactions,
+            "quantity": sum(row["quantity"] for row in rows),
+            "averageTicket": revenue / transactions if transactions else 0,
+            "growth": _growth(revenue, previous),
+            "branches": len(rows),
+            "activeBranches": sum(1 for row in rows if row["transactions"]),
+        }
+
+    def _trends(self, conn, time_range, group, today):
+        unit, count = TREND_BUCKETS[time_range]
+        if unit == "month":
+            first = _add_months(today.replace(day=1), -(count - 1))
+        else:
+            first = today - timedelta(days=(7 if unit == "week" else 1) * count - 1)
+
+        branch_ids = None if group == "all" else [
+            branch["id"] for branch in _select_branches(_load_branches(conn), group)
+        ]
+        # Month buckets are whole months, so they read the monthly rollup
+        table, period = ("sales_branch_monthly", "sale_month") if unit == "month" \
+            else ("sales_branch_daily", "sale_date")
+        sql = f"""
+            SELECT {period} AS period, SUM(total_amount) AS revenue, SUM(transaction_count) AS transactions
+            FROM {table}
+            WHERE {period} >= ? AND {period} <= ?{{}}
+            GROUP BY {period}
+        """
+        params = [_month_key(first), _month_key(today)] if unit == "month" else [first, today]
+        if branch_ids is None:
+            sql = sql.format("")
+        else:
+            sql = sql.format(" AND branch_id IN ({})".format(",".join("?" * len(branch_ids))))
+            params.extend(branch_ids)
+
+        revenue = [0] * count
+        transactions = [0] * count
+        for row in conn.execute(sql, params):
+            period = str(row["period"])
+            day = date.fromisoformat(period + "-01" if unit == "month" else period)
+            index = _bucket_index(unit, first, day)
+            revenue[index] += row["revenue"]
+            transactions[index] += row["transactions"]
+
+        return {
+            "labels": [_bucket_label(unit, first, index) for index in range(count)],
+            "datasets": [
+                {"label": "ยอดขาย", "data": revenue},
+                {"label": "จำนวนรายการ", "data": transactions},
+            ],
+        }
+
+    def _regions(self, conn, time_range, group, today):
+        rows = branch_rows(conn, time_range, "all", today)
+        by_region = {code: [] for code in REGIONS}
+        for row in rows:
+            by_region.setdefault(row["regionCode"], []).append(row)
+
+        codes = list(by_region)
+        return {
+            "labels": [REGIONS.get(code, code) for code in codes],
+            "regions": codes,
+            "datasets": [{
+                "label": "คะแนนเฉลี่ย",
+                "data": [
+                    round(sum(r["score"] for r in by_region[code]) / len(by_region[code]), 1)
+                    if by_region[code] else 0.0
+                    for code in codes
+                ],
+                "revenue": [sum(r["revenue"] for r in by_region[code]) for code in codes],
+                "transactions": [sum(r["transactions"] for r in by_region[code]) for code in codes],
+                "branches": [len(by_region[code]) for code in codes],
+            }],
+        }
+
+
+def branch_rows(conn, time_range, group, today):
+    """Per-branch totals for the window and the one before it, with scores"""
+    branches = _select_branches(_load_branches(conn), group)
+    start, end = window(time_range, today)
+    days = TIME_RANGES[time_range]
+    totals = _range_totals(conn, start, end)
+    previous_totals = _range_totals(conn, start - timedelta(days=days), start)
+
+    rows = []
+    for branch in branches:
+        total = totals.get(branch["id"])
+        previous_total = previous_totals.get(branch["id"])
+        rows.append(derive_row({
+            "id": branch["id"],
+            "code": branch["code"],
+            "name": branch["name"],
+            "regionCode": branch["region"],
+            "region": REGIONS.get(branch["region"], branch["region"]),
+            "revenue": total["revenue"] if total else 0,
+            "transactions": total["transactions"] if total else 0,
+            "quantity": total["quantity"] if total else 0,
+            "previousRevenue": previous_total["revenue"] if previous_total else 0,
+        }))
+
+    # Score: revenue relative to the best branch in the group (0-100)
+    best = max((row["revenue"] for row in rows), default=0)
+    for row in rows:
+        row["score"] = score(row["revenue"], best)
+    return rows
+
+
+def derive_row(row):
+    """Fill in average ticket, growth and trend from a row's running totals"""
+    revenue, transactions = row["revenue"], row["transactions"]
+    row["averageTicket"] = revenue / transactions if transactions else 0
+    row["growth"] = growth = _growth(revenue, row["previousRevenue"])
+    if growth is None:
+        row["trend"] = "up" if revenue else "stable"
+    elif growth > TREND_THRESHOLD:
+        row["trend"] = "up"
+    elif growth < -TREND_THRESHOLD:
+        row["trend"] = "down"
+    else:
+        row["trend"] = "stable"
+    return row
+
+
+def score(revenue, best):
+    return round(100 * revenue / best, 1) if best else 0.0
+
+
+def window(time_range, today):
+    """(start, end) dates of the trailing window, end exclusive"""
+    end = today + timedelta(days=1)
+    return end - timedelta(days=TIME_RANGES[time_range]), end
+
+
+def check_range(time_range):
+    if time_range not in TIME_RANGES:
+        raise ValueError(f"ช่วงเวลาไม่ถูกต้อง: {time_range} (ใช้ได้: {', '.join(TIME_RANGES)})")
+    return time_range
+
+
+def _load_branches(conn):
+    return conn.execute(
+        "SELECT id, code, name, region FROM branches WHERE is_active = TRUE ORDER BY code"
+    ).fetchall()
+
+
+def _select_branches(branches, group):
+    """Branches belonging to ``group`` (all, region-<code> or a branch id)"""
+    if group == "all":
+        return branches
+    if group.startswith("region-"):
+        region = group[len("region-"):]
+        if region not in REGIONS:
+            raise ValueError(f"ไม่รู้จักภูมิภาค: {region}")
+        return [branch for branch in branches if branch["region"] == region]
+    selected = [branch for branch in branches if branch["id"] == group]
+    if not selected:
+        raise ValueError(f"ไม่รู้จักกลุ่มสาขา: {group}")
+    return selected
+
+
+def _range_totals(conn, start, end):
+    """Branch id -> totals row for sales dated start <= sale_date < end"""
+    first_month = start if start.day == 1 else _add_months(start.replace(day=1), 1)
+    last_month = end.replace(day=1)
+    if first_month >= last_month:
+        # No whole month inside: every day comes from the daily rollup
+        params = (start, end, "", "", end, end)
+    else:
+        params = (start, first_month, _month_key(first_month), _month_key(last_month), last_month, end)
+    return {row["branch_id"]: row for row in conn.execute(_RANGE_TOTALS, params)}
+
+
+def _month_key(day):
+    return day.strftime("%Y-%m")
+
+
+def _growth(current, previous):
+    """Percentage change, or None when there is nothing to compare with"""
+    if not previous:
+        return None
+    return round(100 * (current - previous) / previous, 1)
+
+
+def _add_months(day, months):
+    month = day.year * 12 + day.month - 1 + months
+    return day.replace(year=month // 12, month=month % 12 + 1)
+
+
+def _bucket_index(unit, first, day):
+    if unit == "month":
+        return (day.year - first.year) * 12 + day.month - first.month
+    if unit == "week":
+        return (day - first).days // 7
+    return (day - first).days
+
+
+def _bucket_label(unit, first, index):
+    if unit == "month":
+        return MONTH_LABELS[_add_months(first, index).month - 1]
+    day = first + timedelta(days=index * (7 if unit == "week" else 1))
+    return day.strftime("%d/%m")
@@ -0,0 +1,409 @@
+"""
+Bulk branch operations behind /api/bulk-operations/*
+
+``BulkOperationEngine.submit`` records an operation with one pending row per
+branch in ``bulk_operations`` / ``bulk_operation_results`` and returns at
+once, so pushing prices to 300 branches does not hold a request open.  The
+branches are then worked through in the background by at most
+``concurrency`` worker tasks.
+
+The workers do not write in parallel: every branch step is a job on the
+AsyncDatabase writer thread, and SQLite admits one writer at a time, so
+branch steps run one after another.  ``concurrency`` caps how many of them
+wait in the writer's queue at once (other writes, such as POS sales, queue
+behind at most that many), and lets one branch's retry backoff overlap
+other branches' writes.
+
+Each branch's action runs in one write transaction together with the update
+that marks it succeeded, so a branch is never changed without its result
+being recorded or recorded without being changed.  A transient failure (a
+locked database, a timeout) is retried up to ``max_attempts`` times with
+exponential backoff and jitter; any other error fails that branch only.
+
+Progress is read from the database, so any worker can answer a poll.
+``stream`` yields Server-Sent Events as branches finish: immediately for
+operations running in this process, and every ``poll_interval`` seconds for
+those running elsewhere.
+
+An operation whose worker stopped (shutdown, crash) is left ``running``
+with branches pending.  ``recover`` resumes any that have recorded no
+progress for ``stale_after`` seconds, working through the pending branches
+only.  A branch's result is recorded only while it is still pending, so a
+branch reached by two runners is applied once.
+"""
+
+import asyncio
+import json
+import logging
+import random
+import sqlite3
+from datetime import date
+
+from branch_system import analytics
+from branch_system.ids import new_id
+
+logger = logging.getLogger(__name__)
+
+# Errors worth another attempt; anything else fails the branch at once
+TRANSIENT_ERRORS = (sqlite3.OperationalError, TimeoutError, ConnectionError)
+
+FINISHED = ("completed", "partial", "failed")
+
+# Branch size shown in the branch picker: the lowest analytics score (this
+# month's revenue as a percentage of the best branch's) for each size
+SIZE_TIERS = ((67.0, "large"), (34.0, "medium"), (0.0, "small"))
+
+
+class BranchNotFound(LookupError):
+    pass
+
+
+# -- per-branch actions: fn(conn, branch_id, data, operation_id) -----------
+
+def _require_branch(conn, branch_id):
+    if conn.execute("SELECT 1 FROM branches WHERE id = ?", (branch_id,)).fetchone() is None:
+        raise BranchNotFound(f"ไม่พบสาขา {branch_id}")
+
+
+def _put_setting(conn, branch_id, key, value, operation_id):
+    conn.execute("""
+        INSERT INTO branch_settings (branch_id, key, value, operation_id, updated_at)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT (branch_id, key) DO UPDATE SET
+            value = excluded.value,
+            operation_id = excluded.operation_id,
+            updated_at = excluded.updated_at
+    """, (branch_id, key, json.dumps(value, ensure_ascii=False), operation_id))
+
+
+def _set_active(active):
+    def action(conn, branch_id, data, operation_id):
+        updated = conn.execute(
+            "UPDATE branches SET is_active = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (active, branch_id),
+        ).rowcount
+        if not updated:
+            raise BranchNotFound(f"ไม่พบสาขา {branch_id}")
+    return action
+
+
+def _price_update(conn, branch_id, data, operation_id):
+    _require_branch(conn, branch_id)
+    _put_setting(conn, branch_id, f"price:{data.get('productCategory') or 'all'}", data, operation_id)
+
+
+def _promotion(conn, branch_id, data, operation_id):
+    _require_branch(conn, branch_id)
+    _put_setting(conn, branch_id, "promotion", data, operation_id)
+
+
+def _config_update(conn, branch_id, data, operation_id):
+    _require_branch(conn, branch_id)
+    for key, value in data.items():
+        _put_setting(conn, branch_id, f"config:{key}", value, operation_id)
+
+
+# operationType -> action
+ACTIONS = {
+    "price-update": _price_update,
+    "promotion": _promotion,
+    "config-update": _config_update,
+    "activate": _set_active(True),
+    "deactivate": _set_active(False),
+}
+
+
+# -- persistence: fn(conn, ...) run on the DB threads ----------------------
+
+def create(conn, operation_id, operation_type, branch_ids, data):
+    """Record a queued operation and its pending branches"""
+    conn.execute(
+        "INSERT INTO bulk_operations (id, operation_type, operation_data, total) VALUES (?, ?, ?, ?)",
+        (operation_id, operation_type, json.dumps(data, ensure_ascii=False), len(branch_ids)),
+    )
+    conn.executemany(
+        "INSERT INTO bulk_operation_results (operation_id, branch_id) VALUES (?, ?)",
+        [(operation_id, branch_id) for branch_id in branch_ids],
+    )
+
+
+def _start(conn, operation_id):
+    conn.execute(
+        "UPDATE bulk_operations SET status = 'running', started_at = CURRENT_TIMESTAMP WHERE id = ?",
+        (operation_id,),
+    )
+
+
+def _pending(conn, operation_id, branch_id):
+    return conn.execute(
+        "SELECT 1 FROM bulk_operation_results WHERE operation_id = ? AND branch_id = ? AND status = 'pending'",
+        (operation_id, branch_id),
+    ).fetchone() is not None
+
+
+def _record(conn, operation_id, branch_id, status, attempts, message):
+    """Record a pending branch's result; False if it was already recorded"""
+    recorded = conn.execute("""
+        UPDATE bulk_operation_results
+        SET status = ?, attempts = ?, message = ?, updated_at = CURRENT_TIMESTAMP
+        WHERE operation_id = ? AND branch_id = ? AND status = 'pending'
+    """, (status, attempts, message, operation_id, branch_id)).rowcount
+    if recorded:
+        column = "succeeded" if status == "succeeded" else "failed"
+        conn.execute(f"UPDATE bulk_operations SET {column} = {column} + 1 WHERE id = ?", (operation_id,))
+    return bool(recorded)
+
+
+def _apply(conn, operation_id, operation_type, branch_id, data, attempt):
+    if not _pending(conn, operation_id, branch_id):
+        return False  # done by another runner of a resumed operation
+    ACTIONS[operation_type](conn, branch_id, data, operation_id)
+    return _record(conn, operation_id, branch_id, "succeeded", attempt, "สำเร็จ")
+
+
+def _finish(conn, operation_id):
+    """Settle the final status once no branch is pending"""
+    conn.execute("""
+        UPDATE bulk_operations
+        SET status = CASE WHEN failed = 0 THEN 'completed'
+                          WHEN succeeded = 0 THEN 'failed'
+                          ELSE 'partial' END,
+            finished_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND NOT EXISTS (
+            SELECT 1 FROM bulk_operation_results WHERE operation_id = ? AND status = 'pending'
+        )
+    """, (operation_id, operation_id))
+
+
+def _claim_stale(conn, stale_after):
+    """Take over running operations with no progress for ``stale_after`` seconds
+
+    Restarting the clock on each one keeps other workers from claiming it
+    too.  Returns ``start`` arguments with only the pending branches.
+    """
+    stale = conn.execute("""
+        SELECT * FROM bulk_operations o
+        WHERE o.status = 'running'
+          AND COALESCE((SELECT MAX(r.updated_at) FROM bulk_operation_results r
+                        WHERE r.operation_id = o.id), o.started_at) < datetime('now', ?)
+    """, (f"-{stale_after} seconds",)).fetchall()
+    claimed = []
+    for row in stale:
+        conn.execute(
+            "UPDATE bulk_operations SET started_at = CURRENT_TIMESTAMP WHERE id = ?", (row["id"],)
+        )
+        branch_ids = [r["branch_id"] for r in conn.execute(
+            "SELECT branch_id FROM bulk_operation_results WHERE operation_id = ? AND status = 'pending'",
+            (row["id"],),
+        )]
+        claimed.append((row["id"], row["operation_type"], branch_ids, json.loads(row["operation_data"])))
+    return claimed
+
+
+def load(conn, operation_id, results=True):
+    """Operation progress, optionally with every branch's result; None if unknown"""
+    row = conn.execute("SELECT * FROM bulk_operations WHERE id = ?", (operation_id,)).fetchone()
+    if row is None:
+        return None
+    done = row["succeeded"] + row["failed"]
+    progress = {
+        "operationId": row["id"],
+        "operationType": row["operation_type"],
+        "status": row["status"],
+        "totalBranches": row["total"],
+        "successful": row["succeeded"],
+        "failed": row["failed"],
+        "pending": row["total"] - done,
+        "progress": round(100 * done / row["total"], 1) if row["total"] else 100.0,
+        "createdAt": row["created_at"],
+        "startedAt": row["started_at"],
+        "finishedAt": row["finished_at"],
+    }
+    if results:
+        progress["results"] = [
+            {"branchId": r["branch_id"], "status": r["status"], "success": r["status"] == "succeeded",
+             "attempts": r["attempts"], "message": r["message"], "updatedAt": r["updated_at"]}
+            for r in conn.execute(
+                "SELECT * FROM bulk_operation_results WHERE operation_id = ? ORDER BY branch_id",
+                (operation_id,),
+            )
+        ]
+    return progress
+
+
+def list_branches(conn, today=None):
+    """Every branch an operation can target, active or not, with this month's figures"""
+    figures = {row["id"]: row for row in analytics.branch_rows(conn, "month", "all", today or date.today())}
+    branches = []
+    for branch in conn.execute("SELECT id, name, region, is_active FROM branches ORDER BY code"):
+        row = figures.get(branch["id"])
+        performance = row["score"] if row else 0.0
+        branches.append({
+            "id": branch["id"],
+            "name": branch["name"],
+            "region": branch["region"],
+            "size": next(size for floor, size in SIZE_TIERS if performance >= floor),
+            "status": "active" if branch["is_active"] else "inactive",
+            "revenue": row["revenue"] if row else 0,
+            "performance": performance,
+        })
+    return branches
+
+
+def check_request(operation_type, branch_ids, data):
+    if operation_type not in ACTIONS:
+        raise ValueError(f"ไม่รู้จักการดำเนินการ: {operation_type} (ใช้ได้: {', '.join(ACTIONS)})")
+    if not isinstance(branch_ids, list) or not branch_ids or not all(isinstance(b, str) for b in branch_ids):
+        raise ValueError("กรุณาเลือกสาขาอย่างน้อยหนึ่งสาขา")
+    if not isinstance(data, dict):
+        raise ValueError("operationData ต้องเป็นออบเจ็กต์")
+    # Duplicates would run the action twice against one result row
+    return list(dict.fromkeys(branch_ids))
+
+
+class BulkOperationEngine:
+    """Background execution and progress tracking of bulk branch operations
+
+    ``concurrency`` is the number of branches in flight, not parallel
+    writers: their write transactions are serialized on the DB writer.
+    """
+
+    def __init__(self, db, concurrency=8, max_attempts=3, backoff=0.5, poll_interval=1.0):
+        self.db = db
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.poll_interval = poll_interval
+        self._tasks = {}        # operation id -> asyncio.Task running it here
+        self._changed = {}      # operation id -> Event set on the next progress change
+        self._counters = {
+            "submitted": 0,
+            "branchesSucceeded": 0,
+            "branchesFailed": 0,
+            "retries": 0,
+            "resumed": 0,
+            "errors": 0,
+        }
+
+    async def submit(self, operation_type, branch_ids, data):
+        """Record the operation, start it in the background and return its progress"""
+        branch_ids = check_request(operation_type, branch_ids, data)
+        operation_id = new_id("OP-")
+        await self.db.write(create, operation_id, operation_type, branch_ids, data)
+        self.start(operation_id, operation_type, branch_ids, data)
+        return await self.db.read(load, operation_id, False)
+
+    def start(self, operation_id, operation_type, branch_ids, data):
+        """Run an operation already recorded with ``create`` in the background"""
+        self._counters["submitted"] += 1
+        task = asyncio.create_task(self._run(operation_id, operation_type, branch_ids, data))
+        self._tasks[operation_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(operation_id, None))
+
+    async def recover(self, stale_after=60.0):
+        """Resume operations whose runner stopped; returns their ids"""
+        resumed = []
+        for operation in await self.db.write(_claim_stale, stale_after):
+            if operation[0] in self._tasks:
+                continue
+            self._counters["resumed"] += 1
+            self.start(*operation)
+            resumed.append(operation[0])
+        return resumed
+
+    async def progress(self, operation_id, results=True):
+        return await self.db.read(load, operation_id, results)
+
+    async def stream(self, operation_id, is_disconnected=None):
+        """SSE body: a ``progress`` event per change, then ``done`` with the results"""
+        yield b"retry: 3000\n\n"
+        last = None
+        while True:
+            changed = self._changed.setdefault(operation_id, asyncio.Event())
+            progress = await self.db.read(load, operation_id, False)
+            if progress is None:
+                yield _sse("error", {"message": f"ไม่พบการดำเนินการ {operation_id}"})
+                return
+            if progress["status"] in FINISHED:
+                self._changed.pop(operation_id, None)
+                yield _sse("done", await self.db.read(load, operation_id, True))
+                return
+            if progress != last:
+                yield _sse("progress", progress)
+                last = progress
+            try:
+                await asyncio.wait_for(changed.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                if is_disconnected is not None and await is_disconnected():
+                    return
+
+    async def shutdown(self):
+        """Cancel operations still running here; ``recover`` resumes their pending branches"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Events are bound to this event loop; streams on the next one make new ones
+        self._changed.clear()
+
+    def stats(self):
+        return dict(self._counters, running=len(self._tasks), concurrency=self.concurrency,
+                    writesSerialized=True, maxAttempts=self.max_attempts)
+
+    async def _run(self, operation_id, operation_type, branch_ids, data):
+        queue = asyncio.Queue()
+        for branch_id in branch_ids:
+            queue.put_nowait(branch_id)
+
+        async def worker():
+            while not queue.empty():
+                branch_id = queue.get_nowait()
+                try:
+                    await self._run_branch(operation_id, operation_type, branch_id, data)
+                except Exception:
+                    # Its result could not be recorded; it stays pending for recover
+                    self._counters["errors"] += 1
+                    logger.exception("Bulk operation %s: branch %s not recorded", operation_id, branch_id)
+
+        try:
+            await self.db.write(_start, operation_id)
+            self._notify(operation_id)
+            await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(branch_ids)))))
+        finally:
+            # A no-op while branches are pending (cancelled, or unrecorded failures)
+            try:
+                await self.db.write(_finish, operation_id)
+            except Exception:
+                self._counters["errors"] += 1
+                logger.exception("Bulk operation %s: final status not recorded", operation_id)
+            self._notify(operation_id)
+
+    async def _run_branch(self, operation_id, operation_type, branch_id, data):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                if await self.db.write(_apply, operation_id, operation_type, branch_id, data, attempt):
+                    self._counters["branchesSucceeded"] += 1
+                break
+            except TRANSIENT_ERRORS as e:
+                if attempt == self.max_attempts:
+                    await self._fail(operation_id, branch_id, attempt, f"ล้มเหลวหลังลอง {attempt} ครั้ง: {e}")
+                    break
+                self._counters["retries"] += 1
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            except Exception as e:
+                await self._fail(operation_id, branch_id, attempt, f"ล้มเหลว: {e}")
+                break
+        self._notify(operation_id)
+
+    async def _fail(self, operation_id, branch_id, attempts, message):
+        if await self.db.write(_record, operation_id, branch_id, "failed", attempts, message):
+            self._counters["branchesFailed"] += 1
+
+    def _notify(self, operation_id):
+        changed = self._changed.pop(operation_id, None)
+        if changed is not None:
+            changed.set()
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n".encode("utf-8")
@@ -0,0 +1,283 @@
+"""
+SQLite connection pool for branch_system.db
+
+All connections run in WAL mode so POS readers never block on the writer.
+SQLite only allows one writer at a time, so writes go through a single
+dedicated connection guarded by a lock while reads are spread over a small
+pool of reader connections.  Each connection keeps its own prepared
+statement cache (sqlite3 ``cached_statements``).
+
+AsyncDatabase wraps a pool for ``async def`` handlers: queries run on
+dedicated DB threads so a slow aggregate never stalls the event loop.
+"""
+
+import asyncio
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# Pragmas applied to every connection when it is opened
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",   # durable enough with WAL, avoids fsync per commit
+    "cache_size": -16000,      # negative = KiB, ~16 MB page cache per connection
+    "mmap_size": 268435456,    # 256 MB memory-mapped I/O
+    "busy_timeout": 5000,      # ms to wait on a locked database
+    "temp_store": "MEMORY",
+}
+
+
+class PoolTimeout(Exception):
+    """Raised when no reader connection becomes available in time"""
+
+
+class ConnectionPool:
+    """Reader/writer split connection pool for a single SQLite file"""
+
+    def __init__(self, db_path, max_readers=8, acquire_timeout=5.0,
+                 statement_cache_size=256, pragmas=None):
+        self.db_path = db_path
+        self.max_readers = max_readers
+        self.acquire_timeout = acquire_timeout
+        self.statement_cache_size = statement_cache_size
+        self.pragmas = dict(DEFAULT_PRAGMAS, **(pragmas or {}))
+
+        self._readers = queue.LifoQueue()
+        self._reader_count = 0
+        self._reader_lock = threading.Lock()
+        self._writer = None
+        self._writer_lock = threading.RLock()
+        self._closed = False
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "connectionsOpened": 0,
+            "readCheckouts": 0,
+            "readWaits": 0,
+            "readWaitMs": 0.0,
+            "writeCheckouts": 0,
+            "writeWaitMs": 0.0,
+            "commits": 0,
+            "rollbacks": 0,
+        }
+
+    # -----------------------------------------
+    # Connection setup
+    # -----------------------------------------
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.pragmas["busy_timeout"] / 1000,
+            isolation_level=None,  # transactions are managed explicitly
+            check_same_thread=False,
+            cached_statements=self.statement_cache_size,
+        )
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        self._bump("connectionsOpened")
+        return conn
+
+    def _bump(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _ensure_open(self):
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+
+    # -----------------------------------------
+    # Checkout
+    # -----------------------------------------
+
+    def _acquire_reader(self):
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._reader_lock:
+            if self._reader_count < self.max_readers:
+                self._reader_count += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._reader_count -= 1
+                    raise
+
+        # Pool exhausted, wait for a connection to be returned
+        self._bump("readWaits")
+        started = time.perf_counter()
+        try:
+            conn = self._readers.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise PoolTimeout(f"No reader connection available after {self.acquire_timeout}s")
+        self._bump("readWaitMs", (time.perf_counter() - started) * 1000)
+        return conn
+
+    @contextmanager
+    def read(self):
+        """Borrow a reader connection (autocommit, one snapshot per statement)"""
+        self._ensure_open()
+        conn = self._acquire_reader()
+        self._bump("readCheckouts")
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            if self._closed:
+                self._discard_reader(conn)
+            else:
+                self._readers.put(conn)
+
+    @contextmanager
+    def write(self):
+        """Run a block inside a single IMMEDIATE transaction on the writer connection"""
+        self._ensure_open()
+        started = time.perf_counter()
+        with self._writer_lock:
+            self._bump("writeWaitMs", (time.perf_counter() - started) * 1000)
+            self._bump("writeCheckouts")
+            if self._writer is None:
+                self._writer = self._connect()
+            conn = self._writer
+
+            # Nested write() calls join the outer transaction
+            if conn.in_transaction:
+                yield conn
+                return
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                self._bump("rollbacks")
+                raise
+            else:
+                conn.commit()
+                self._bump("commits")
+
+    # -----------------------------------------
+    # Introspection / shutdown
+    # -----------------------------------------
+
+    def stats(self):
+        """Snapshot of pool counters"""
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        idle = self._readers.qsize()
+        snapshot.update({
+            "dbPath": self.db_path,
+            "maxReaders": self.max_readers,
+            "readersOpen": self._reader_count,
+            "readersIdle": idle,
+            "readersInUse": self._reader_count - idle,
+            "writerOpen": self._writer is not None,
+            "statementCacheSize": self.statement_cache_size,
+            "readWaitMs": round(snapshot["readWaitMs"], 3),
+            "writeWaitMs": round(snapshot["writeWaitMs"], 3),
+        })
+        return snapshot
+
+    def _discard_reader(self, conn):
+        conn.close()
+        with self._reader_lock:
+            self._reader_count -= 1
+
+    def open(self):
+        """Accept checkouts again after ``close``; connections open lazily"""
+        self._closed = False
+
+    def close(self):
+        """Close every idle connection; checked-out readers close on return"""
+        self._closed = True
+        while True:
+            try:
+                self._discard_reader(self._readers.get_nowait())
+            except queue.Empty:
+                break
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+
+class AsyncDatabase:
+    """Runs blocking pool work on dedicated DB threads for async handlers
+
+    Reads execute on a thread pool sized to the reader pool, writes on a
+    single thread (SQLite serialises writers anyway), so concurrency is
+    bounded by the number of connections rather than by the event loop.
+    """
+
+    def __init__(self, pool, offload=True):
+        self.pool = pool
+        self.offload = offload
+        self._read_executor = None
+        self._write_executor = None
+        self._pending = {"read": 0, "write": 0}
+        self.start()
+
+    def start(self):
+        """Start the DB threads; after ``shutdown`` this starts new ones"""
+        if self._read_executor is None:
+            self._read_executor = ThreadPoolExecutor(
+                max_workers=self.pool.max_readers, thread_name_prefix="branch-db-read"
+            )
+            self._write_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="branch-db-write"
+            )
+
+    def _read_job(self, fn, args):
+        with self.pool.read() as conn:
+            return fn(conn, *args)
+
+    def _write_job(self, fn, args):
+        with self.pool.write() as conn:
+            return fn(conn, *args)
+
+    async def _submit(self, kind, executor, job, *args):
+        if not self.offload:
+            # Inline execution on the event loop (the pre-pool behaviour)
+            return job(*args)
+        if executor is None:
+            raise RuntimeError("AsyncDatabase is shut down")
+        self._pending[kind] += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, job, *args)
+        finally:
+            self._pending[kind] -= 1
+
+    async def read(self, fn, *args):
+        """Run ``fn(conn, *args)`` on a reader connection"""
+        return await self._submit("read", self._read_executor, self._read_job, fn, args)
+
+    async def write(self, fn, *args):
+        """Run ``fn(conn, *args)`` inside a write transaction"""
+        return await self._submit("write", self._write_executor, self._write_job, fn, args)
+
+    async def call(self, fn, *args):
+        """Run a blocking helper that manages its own connections"""
+        return await self._submit("read", self._read_executor, fn, *args)
+
+    def stats(self):
+        """Queue depth of in-flight DB jobs"""
+        return {
+            "offload": self.offload,
+            "pendingReads": self._pending["read"],
+            "pendingWrites": self._pending["write"],
+        }
+
+    def shutdown(self):
+        """Wait for queued jobs and stop the DB threads"""
+        executors = self._read_executor, self._write_executor
+        self._read_executor = self._write_executor = None
+        for executor in executors:
+            if executor is not None:
+                executor.shutdown(wait=True)
@@ -0,0 +1,378 @@
+"""
+Sales exports for /api/analytics/export
+
+``ReportExporter.export`` streams ``sales_records`` for a date range and a
+branch group into a CSV (optionally gzipped as it is written) or XLSX file
+under ``directory``, one ``fetchmany`` batch at a time, so memory stays flat
+however many months and branches are exported.  Rows are read branch by
+branch through ``idx_sales_records_branch_date_time``, which returns them
+already ordered by date and time: no sort, no temporary B-tree.
+
+XLSX is written without a spreadsheet library: the worksheet XML is
+streamed into its zip entry with inline strings, and a new sheet is started
+when one reaches Excel's row limit.  Files are written under a temporary
+name and renamed when complete, so a download never sees half an export.
+
+``file_response`` serves a finished file with ``Accept-Ranges``, answering
+a single ``Range`` (guarded by ``If-Range``) with 206, so an interrupted
+download of a large export resumes instead of starting over.  Exports are
+deleted ``ttl`` seconds after they were written.  An export only covers the
+branches its user may see, and its filename carries that user's id so no
+one else can download it.
+"""
+
+import csv
+import gzip
+import io
+import os
+import re
+import threading
+import time
+import zipfile
+from datetime import date, timedelta
+from xml.sax.saxutils import escape
+
+from fastapi.responses import Response, StreamingResponse
+
+from branch_system.analytics import REGIONS, check_range, window
+from branch_system.ids import new_id
+
+# (column, header) in file order
+COLUMNS = [
+    ("sale_date", "วันที่"),
+    ("sale_time", "เวลา"),
+    ("id", "รหัสรายการ"),
+    ("branch_id", "รหัสสาขา"),
+    ("branch_name", "สาขา"),
+    ("user_id", "พนักงาน"),
+    ("product_name", "สินค้า"),
+    ("quantity", "จำนวน"),
+    ("unit", "หน่วย"),
+    ("unit_price", "ราคาต่อหน่วย"),
+    ("total_amount", "ยอดขาย"),
+    ("customer_type", "ประเภทลูกค้า"),
+    ("payment_method", "การชำระเงิน"),
+]
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "csv.gz": "application/gzip",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Longest export a request may ask for
+MAX_EXPORT_DAYS = 3 * 366
+
+# Rows per fetchmany batch, and per write to the output file
+BATCH_ROWS = 2000
+
+# Excel's limit, header row included
+XLSX_MAX_ROWS = 1048576
+
+# Bytes per chunk when serving a file
+CHUNK_BYTES = 256 * 1024
+
+# sales_<first day>_<last day>_<group>_<owner>_<id>.<format>
+_FILENAME = re.compile(r"^sales_\d{8}_\d{8}_[0-9A-Za-z-]+_(?P<owner>[0-9A-Za-z-]+)_[0-9A-Za-z]+\.(csv|csv\.gz|xlsx)$")
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+# Characters XML 1.0 does not allow, even escaped
+_XML_ILLEGAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_SELECT = "SELECT {} FROM sales_records WHERE branch_id = ? AND sale_date >= ? AND sale_date < ? " \
+          "ORDER BY sale_date, sale_time".format(", ".join(column for column, _ in COLUMNS))
+
+
+def export_window(time_range=None, start_date=None, end_date=None, today=None):
+    """(start, end exclusive) from a time range or inclusive start/end dates"""
+    if start_date or end_date:
+        try:
+            start = date.fromisoformat(str(start_date))
+            end = date.fromisoformat(str(end_date)) + timedelta(days=1)
+        except ValueError:
+            raise ValueError("กรุณาระบุ startDate และ endDate ในรูปแบบ YYYY-MM-DD")
+        if end <= start:
+            raise ValueError("endDate ต้องไม่ก่อน startDate")
+    else:
+        start, end = window(check_range(time_range or "month"), today or date.today())
+    if (end - start).days > MAX_EXPORT_DAYS:
+        raise ValueError(f"ส่งออกได้ไม่เกิน {MAX_EXPORT_DAYS} วันต่อครั้ง")
+    return start, end
+
+
+def iter_batches(conn, start, end, group="all", allowed=None):
+    """Lists of sale rows in (branch, date, time) order, BATCH_ROWS at a time
+
+    ``allowed``, when given, limits the export to those branch ids.
+    """
+    for branch_id in _branch_ids(conn, start, end, group, allowed):
+        cursor = conn.execute(_SELECT, (branch_id, start, end))
+        while True:
+            batch = cursor.fetchmany(BATCH_ROWS)
+            if not batch:
+                break
+            yield batch
+
+
+def _branch_ids(conn, start, end, group, allowed=None):
+    if group != "all" and not group.startswith("region-"):
+        if conn.execute("SELECT 1 FROM branches WHERE id = ?", (group,)).fetchone() is None:
+            raise ValueError(f"ไม่รู้จักกลุ่มสาขา: {group}")
+        if allowed is not None and group not in allowed:
+            raise PermissionError(f"ไม่มีสิทธิ์ส่งออกข้อมูลสาขา: {group}")
+        return [group]
+    # Branches with sales in the window, from the (sale_date, branch_id) rollup key
+    rows = conn.execute(
+        "SELECT DISTINCT branch_id FROM sales_branch_daily WHERE sale_date >= ? AND sale_date < ?",
+        (start, end),
+    ).fetchall()
+    branch_ids = sorted(row[0] for row in rows if allowed is None or row[0] in allowed)
+    if group == "all":
+        return branch_ids
+    region = group[len("region-"):]
+    if region not in REGIONS:
+        raise ValueError(f"ไม่รู้จักภูมิภาค: {region}")
+    in_region = {row[0] for row in conn.execute("SELECT id FROM branches WHERE region = ?", (region,))}
+    return [branch_id for branch_id in branch_ids if branch_id in in_region]
+
+
+def write_csv(batches, fileobj):
+    """CSV with a UTF-8 BOM (so Excel reads Thai); returns data rows written"""
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="", write_through=False)
+    writer = csv.writer(text)
+    writer.writerow([header for _, header in COLUMNS])
+    rows = 0
+    for batch in batches:
+        writer.writerows(batch)
+        rows += len(batch)
+    text.flush()
+    text.detach()
+    return rows
+
+
+def write_xlsx(batches, fileobj):
+    """Streamed XLSX workbook; returns data rows written"""
+    header = _xlsx_row([header for _, header in COLUMNS])
+    rows = sheet_rows = 0
+    sheets = 0
+    sheet = None
+    with zipfile.ZipFile(fileobj, "w", zipfile.ZIP_DEFLATED) as workbook:
+        try:
+            for batch in batches:
+                position = 0
+                while position < len(batch):
+                    if sheet is None or sheet_rows == XLSX_MAX_ROWS - 1:
+                        if sheet is not None:
+                            _close_sheet(sheet)
+                        sheets += 1
+                        sheet = workbook.open(f"xl/worksheets/sheet{sheets}.xml", "w", force_zip64=True)
+                        sheet.write(_SHEET_HEAD + header)
+                        sheet_rows = 0
+                    take = batch[position:position + XLSX_MAX_ROWS - 1 - sheet_rows]
+                    sheet.write(b"".join(_xlsx_row(row) for row in take))
+                    sheet_rows += len(take)
+                    rows += len(take)
+                    position += len(take)
+            if sheet is None:
+                sheets = 1
+                sheet = workbook.open("xl/worksheets/sheet1.xml", "w")
+                sheet.write(_SHEET_HEAD + header)
+            _close_sheet(sheet)
+            sheet = None
+        finally:
+            if sheet is not None:
+                sheet.close()
+        _write_xlsx_parts(workbook, sheets)
+    return rows
+
+
+_SHEET_HEAD = (b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+               b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+               b'<sheetData>')
+
+
+def _close_sheet(sheet):
+    sheet.write(b"</sheetData></worksheet>")
+    sheet.close()
+
+
+def _xlsx_row(values):
+    cells = []
+    for value in values:
+        if value is None:
+            cells.append("<c/>")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f"<c><v>{value}</v></c>")
+        else:
+            text = escape(_XML_ILLEGAL.sub("", str(value)))
+            cells.append(f'<c t="inlineStr"><is><t>{text}</t></is></c>')
+    return ("<row>" + "".join(cells) + "</row>").encode("utf-8")
+
+
+def _write_xlsx_parts(workbook, sheets):
+    main = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+    workbook.writestr("[Content_Types].xml", (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        + "".join(
+            f'<Override PartName="/xl/worksheets/sheet{n}.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for n in range(1, sheets + 1))
+        + "</Types>"
+    ))
+    workbook.writestr("_rels/.rels", (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        f'<Relationship Id="rId1" Type="{main}/officeDocument" Target="xl/workbook.xml"/>'
+        "</Relationships>"
+    ))
+    workbook.writestr("xl/workbook.xml", (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        f'xmlns:r="{main}"><sheets>'
+        + "".join(f'<sheet name="ยอดขาย {n}" sheetId="{n}" r:id="rId{n}"/>' for n in range(1, sheets + 1))
+        + "</sheets></workbook>"
+    ))
+    workbook.writestr("xl/_rels/workbook.xml.rels", (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        + "".join(
+            f'<Relationship Id="rId{n}" Type="{main}/worksheet" Target="worksheets/sheet{n}.xml"/>'
+            for n in range(1, sheets + 1))
+        + "</Relationships>"
+    ))
+
+
+class ReportExporter:
+    """Writes sales exports to ``directory`` and forgets them after ``ttl``"""
+
+    def __init__(self, directory, ttl=24 * 3600):
+        self.directory = directory
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._counters = {"exports": 0, "rows": 0, "bytes": 0, "pruned": 0}
+
+    def export(self, conn, fmt, start, end, group="all", compress=False, allowed=None, owner="system"):
+        """Write one export (blocking; run on a reader connection)
+
+        Only branches in ``allowed`` (all when None) are exported, and only
+        ``owner`` may fetch the file through ``path``.
+        """
+        if fmt not in ("csv", "xlsx"):
+            raise ValueError(f"ไม่รองรับรูปแบบ {fmt} (ใช้ได้: csv, xlsx)")
+        # XLSX is a zip already; gzip only applies to CSV
+        extension = "csv.gz" if fmt == "csv" and compress else fmt
+        self.prune()
+        os.makedirs(self.directory, exist_ok=True)
+        filename = (f"sales_{start:%Y%m%d}_{end - timedelta(days=1):%Y%m%d}_{_slug(group)}_{_slug(owner)}_"
+                    f"{new_id()}.{extension}")
+        path = os.path.join(self.directory, filename)
+        partial = path + ".part"
+        batches = iter_batches(conn, start, end, group, allowed)
+        try:
+            with open(partial, "wb") as raw:
+                if extension == "csv.gz":
+                    with gzip.GzipFile(filename=filename[:-3], mode="wb", fileobj=raw, compresslevel=6) as out:
+                        rows = write_csv(batches, out)
+                elif extension == "csv":
+                    rows = write_csv(batches, raw)
+                else:
+                    rows = write_xlsx(batches, raw)
+            os.replace(partial, path)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+
+        size = os.path.getsize(path)
+        with self._lock:
+            self._counters["exports"] += 1
+            self._counters["rows"] += rows
+            self._counters["bytes"] += size
+        return {"filename": filename, "format": extension, "rows": rows, "size": size}
+
+    def path(self, filename, owner):
+        """Absolute path of a finished export made by ``owner``, or None"""
+        match = _FILENAME.match(filename)
+        if not match or match.group("owner") != _slug(owner):
+            return None
+        path = os.path.join(self.directory, filename)
+        return path if os.path.isfile(path) else None
+
+    def prune(self, now=None):
+        """Delete exports (and abandoned partial files) older than ``ttl``"""
+        now = now or time.time()
+        removed = 0
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return 0
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                if name.startswith("sales_") and now - os.path.getmtime(path) > self.ttl:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._counters["pruned"] += removed
+        return removed
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, directory=self.directory, ttl=self.ttl)
+
+
+def _slug(text):
+    return re.sub(r"[^0-9A-Za-z-]+", "-", text)[:40] or "all"
+
+
+def file_response(path, range_header=None, if_range=None):
+    """Serve an export with byte-range support (single range)"""
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = f'"{size:x}-{stat.st_mtime_ns:x}"'
+    filename = os.path.basename(path)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    }
+    media_type = FORMATS[filename.split(".", 1)[1]]
+
+    start, end = 0, size - 1
+    partial = False
+    # A stale If-Range (file changed since the first part) gets the whole file
+    if range_header and (not if_range or if_range == etag):
+        match = _RANGE.match(range_header.strip())
+        if match and (match.group(1) or match.group(2)):
+            first, last = match.groups()
+            if first:
+                start, end = int(first), min(int(last), size - 1) if last else size - 1
+            else:
+                start = max(size - int(last), 0)
+            if start >= size or start > end:
+                return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+            partial = True
+
+    headers["Content-Length"] = str(end - start + 1)
+    if partial:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return StreamingResponse(_read_file(path, start, end), status_code=206 if partial else 200,
+                             media_type=media_type, headers=headers)
+
+
+def _read_file(path, start, end):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
@@ -0,0 +1,327 @@
+"""
+Revenue forecasting behind /api/analytics/forecast
+
+One additive Holt-Winters model (damped trend, weekly seasonality) is fitted
+per branch and one for the whole chain, on daily revenue from
+``sales_branch_daily`` (the per-branch daily rollup of ``sales_records``).
+Today is left out because it is still being sold.
+
+Thai public holidays do not update the smoothing states; the one-step error
+on those days is averaged into a per-series holiday effect that is added
+back on future holidays.  Lunar holidays move every year, so extend
+``LUNAR_HOLIDAYS`` when the cabinet publishes the next year's calendar; a
+forecast reaching a year that is not listed logs a warning (once per year)
+and treats only its fixed-date holidays as holidays.
+
+Fitting is a grid search over the smoothing parameters, run with NumPy on a
+(series x parameter set) array so every branch and every candidate advance
+together one day at a time; each series keeps the set with the lowest
+one-step squared error.  The fitted states are cached until the date
+changes (the first request after midnight refits) or ``fit`` is called.
+
+Prediction intervals use the ETS(A,Ad,A) forecast-error variance; monthly
+totals sum the daily errors through their shared shocks, not as if each day
+were independent.
+"""
+
+import itertools
+import logging
+import threading
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SEASON = 7                  # weekly seasonality, in days
+HISTORY_DAYS = 365          # longest history used for fitting
+MIN_HISTORY_DAYS = 4 * SEASON
+WARMUP_DAYS = 2 * SEASON    # used for initial states, not scored
+DAMPING = 0.98
+BLOCK_DAYS = 30             # one "month" in the response
+
+ALPHAS = (0.05, 0.1, 0.2, 0.3, 0.5)
+BETAS = (0.0, 0.01, 0.05, 0.1)
+GAMMAS = (0.05, 0.1, 0.2, 0.3)
+
+Z80, Z95 = 1.2816, 1.96
+
+# Thai public holidays on a fixed date: (month, day)
+FIXED_HOLIDAYS = [
+    (1, 1),                 # วันขึ้นปีใหม่
+    (4, 6),                 # วันจักรี
+    (4, 13), (4, 14), (4, 15),  # สงกรานต์
+    (5, 1),                 # วันแรงงาน
+    (5, 4),                 # วันฉัตรมงคล
+    (6, 3),                 # วันเฉลิมพระชนมพรรษาพระราชินี
+    (7, 28),                # วันเฉลิมพระชนมพรรษา ร.10
+    (8, 12),                # วันแม่
+    (10, 13),               # วันนวมินทรมหาราช
+    (10, 23),               # วันปิยมหาราช
+    (12, 5),                # วันพ่อ
+    (12, 10),               # วันรัฐธรรมนูญ
+    (12, 31),               # วันสิ้นปี
+]
+
+# Lunar holidays: ตรุษจีน, มาฆบูชา, วิสาขบูชา, อาสาฬหบูชา, เข้าพรรษา
+LUNAR_HOLIDAYS = {
+    2024: [date(2024, 2, 10), date(2024, 2, 24), date(2024, 5, 22), date(2024, 7, 20), date(2024, 7, 21)],
+    2025: [date(2025, 1, 29), date(2025, 2, 12), date(2025, 5, 11), date(2025, 7, 10), date(2025, 7, 11)],
+    2026: [date(2026, 2, 17), date(2026, 3, 3), date(2026, 5, 31), date(2026, 7, 29), date(2026, 7, 30)],
+    2027: [date(2027, 2, 6), date(2027, 2, 20), date(2027, 5, 20), date(2027, 7, 18), date(2027, 7, 19)],
+}
+
+CHAIN = "all"
+
+
+def is_holiday(day):
+    return (day.month, day.day) in FIXED_HOLIDAYS or day in LUNAR_HOLIDAYS.get(day.year, ())
+
+
+class ForecastEngine:
+    """Per-branch and chain-wide revenue models, fitted together"""
+
+    def __init__(self, history_days=HISTORY_DAYS):
+        self.history_days = history_days
+        self._model = None
+        self._lock = threading.Lock()
+        self._counters = {"fits": 0, "forecasts": 0}
+        self._unlisted_years = set()   # years already warned about
+
+    def fit(self, conn, today=None):
+        """Refit every series now; returns the fit summary"""
+        today = today or date.today()
+        with self._lock:
+            self._model = _fit(_load_series(conn, today, self.history_days), today)
+            self._counters["fits"] += 1
+            return self._summary(self._model)
+
+    def forecast(self, conn, months=3, branch=None, today=None):
+        """Historical and forecast revenue for the chain or one branch"""
+        today = today or date.today()
+        months = max(1, min(int(months), 12))
+        with self._lock:
+            if self._model is None or self._model["today"] != today:
+                self._model = _fit(_load_series(conn, today, self.history_days), today)
+                self._counters["fits"] += 1
+            model = self._model
+            self._counters["forecasts"] += 1
+
+        key = branch or CHAIN
+        if key not in model["index"]:
+            raise ValueError(f"ไม่มีข้อมูลยอดขายของสาขา {key}")
+        i = model["index"][key]
+
+        horizon = months * BLOCK_DAYS
+        days = [today + timedelta(days=h) for h in range(horizon)]
+        self._check_holiday_calendar(days)
+        point, daily_var, c = _project(model, i, days)
+        sigma2 = model["sigma"][i] ** 2
+
+        # Monthly totals: variance through the shared one-step shocks
+        revenue, lower80, upper80, lower95, upper95 = [], [], [], [], []
+        csum = np.concatenate(([0.0], np.cumsum(c)))
+        for block in range(months):
+            a, b = block * BLOCK_DAYS, (block + 1) * BLOCK_DAYS - 1
+            k = np.arange(b + 1)
+            # Shock k (0-based) reaches days h in [max(k, a), b] with weight c[h - k]
+            weights = csum[b - k + 1] - csum[np.maximum(k, a) - k]
+            total = float(point[a:b + 1].sum())
+            sd = float(np.sqrt(sigma2 * np.sum(weights ** 2)))
+            revenue.append(round(total, 2))
+            lower80.append(round(max(total - Z80 * sd, 0.0), 2))
+            upper80.append(round(total + Z80 * sd, 2))
+            lower95.append(round(max(total - Z95 * sd, 0.0), 2))
+            upper95.append(round(total + Z95 * sd, 2))
+
+        history = model["series"][i]
+        blocks = [float(history[max(len(history) - (n + 1) * BLOCK_DAYS, 0):len(history) - n * BLOCK_DAYS].sum())
+                  for n in range(3, -1, -1)]
+        growth = (revenue[0] - blocks[-1]) / blocks[-1] * 100 if blocks[-1] else None
+        spread = (upper95[0] - lower95[0]) / 2 / revenue[0] if revenue[0] else None
+        risk = "high" if spread is None or spread > 0.3 else "medium" if spread > 0.15 else "low"
+
+        return {
+            "series": key,
+            "historical": {
+                "labels": ["3 เดือนก่อน", "2 เดือนก่อน", "เดือนก่อน", "ปัจจุบัน"],
+                "revenue": [round(value, 2) for value in blocks],
+            },
+            "forecast": {
+                "labels": [f"เดือน {n + 1}" for n in range(months)],
+                "revenue": revenue,
+                "lower80": lower80,
+                "upper80": upper80,
+                "lower95": lower95,
+                "upper95": upper95,
+                "daily": {
+                    "dates": [day.isoformat() for day in days],
+                    "revenue": np.round(point, 2).tolist(),
+                    "lower95": np.round(np.maximum(point - Z95 * np.sqrt(daily_var), 0), 2).tolist(),
+                    "upper95": np.round(point + Z95 * np.sqrt(daily_var), 2).tolist(),
+                },
+            },
+            "insights": {
+                "growth_rate": round(growth, 1) if growth is not None else None,
+                "risk_level": risk,
+            },
+            "diagnostics": self._diagnostics(model, i),
+        }
+
+    def stats(self):
+        with self._lock:
+            model = self._model
+            return dict(
+                self._counters,
+                fittedAt=model["fittedAt"] if model else None,
+                series=len(model["keys"]) if model else 0,
+            )
+
+    def _check_holiday_calendar(self, days):
+        with self._lock:
+            unlisted = {day.year for day in days} - LUNAR_HOLIDAYS.keys() - self._unlisted_years
+            self._unlisted_years |= unlisted
+        for year in sorted(unlisted):
+            logger.warning("No lunar holidays listed for %s; add them to forecast.LUNAR_HOLIDAYS", year)
+
+    def _summary(self, model):
+        return {
+            "fittedAt": model["fittedAt"],
+            "series": len(model["keys"]),
+            "days": int(model["series"].shape[1]),
+            "fitMs": model["fitMs"],
+            "chain": self._diagnostics(model, model["index"][CHAIN]),
+        }
+
+    @staticmethod
+    def _diagnostics(model, i):
+        alpha, beta, gamma = model["params"][i]
+        return {
+            "alpha": alpha,
+            "beta": beta,
+            "gamma": gamma,
+            "phi": DAMPING,
+            "holidayEffect": round(float(model["holiday"][i]), 2),
+            "rmse": round(float(model["sigma"][i]), 2),
+            "mape": round(float(model["mape"][i]), 2) if np.isfinite(model["mape"][i]) else None,
+            "observations": int(model["scored"][i]),
+            "historyStart": model["start"].isoformat(),
+            "historyEnd": (model["today"] - timedelta(days=1)).isoformat(),
+            "fittedAt": model["fittedAt"],
+        }
+
+
+def _load_series(conn, today, history_days):
+    """(keys, first day, revenue matrix) - one row per branch, chain last"""
+    end = today - timedelta(days=1)
+    first = conn.execute(
+        "SELECT MIN(sale_date) FROM sales_branch_daily WHERE sale_date >= ? AND sale_date <= ?",
+        (today - timedelta(days=history_days), end)
+    ).fetchone()[0]
+    if first is None:
+        raise ValueError("ยังไม่มีข้อมูลยอดขายสำหรับการพยากรณ์")
+    start = date.fromisoformat(str(first))
+    length = (end - start).days + 1
+    if length < MIN_HISTORY_DAYS:
+        raise ValueError(f"ต้องมีข้อมูลยอดขายอย่างน้อย {MIN_HISTORY_DAYS} วันสำหรับการพยากรณ์")
+
+    rows = conn.execute("""
+        SELECT sale_date, branch_id, total_amount FROM sales_branch_daily
+        WHERE sale_date >= ? AND sale_date <= ?
+    """, (start, end)).fetchall()
+    keys = sorted({row["branch_id"] for row in rows})
+    index = {key: i for i, key in enumerate(keys)}
+    day_index = {(start + timedelta(days=t)).isoformat(): t for t in range(length)}
+    series = np.zeros((len(keys) + 1, length))
+    if rows:
+        series[
+            [index[row["branch_id"]] for row in rows],
+            [day_index[str(row["sale_date"])] for row in rows],
+        ] = [row["total_amount"] for row in rows]
+    series[-1] = series[:-1].sum(axis=0)
+    return keys + [CHAIN], start, series
+
+
+def _fit(loaded, today):
+    """Grid-search every series at once and keep each one's best parameters"""
+    started = datetime.now()
+    keys, start, y = loaded
+    n_series, length = y.shape
+    grid = np.array(list(itertools.product(ALPHAS, BETAS, GAMMAS)))
+    alpha, beta, gamma = (grid[:, j][None, :] for j in range(3))
+    holidays = np.array([is_holiday(start + timedelta(days=t)) for t in range(length)])
+
+    # Initial states from the first two weeks, identical for every grid point
+    first = y[:, :WARMUP_DAYS]
+    level0 = first.mean(axis=1)
+    trend0 = (y[:, SEASON:WARMUP_DAYS].mean(axis=1) - y[:, :SEASON].mean(axis=1)) / SEASON
+    season0 = first.reshape(n_series, 2, SEASON).mean(axis=1) - level0[:, None]
+
+    shape = (n_series, len(grid))
+    level = np.broadcast_to(level0[:, None], shape).copy()
+    trend = np.broadcast_to(trend0[:, None], shape).copy()
+    season = np.broadcast_to(season0[:, None, :], shape + (SEASON,)).copy()
+    sse = np.zeros(shape)
+    ape = np.zeros(shape)
+    holiday_error = np.zeros(shape)
+    scored = 0
+    positive = np.zeros(n_series)
+
+    for t in range(length):
+        s = t % SEASON
+        expected = level + DAMPING * trend + season[:, :, s]
+        error = y[:, t:t + 1] - expected
+        if holidays[t]:
+            # Holidays are measured, not learned into the weekly pattern
+            holiday_error += error
+            level += DAMPING * trend
+            trend *= DAMPING
+            continue
+        if t >= WARMUP_DAYS:
+            sse += error * error
+            observed = y[:, t] > 0
+            ape += np.where(observed[:, None], np.abs(error) / np.where(observed, y[:, t], 1)[:, None], 0)
+            positive += observed
+            scored += 1
+        level += DAMPING * trend + alpha * error
+        trend = DAMPING * trend + alpha * beta * error
+        season[:, :, s] += gamma * error
+
+    best = sse.argmin(axis=1)
+    rows = np.arange(n_series)
+    holiday_days = int(holidays.sum())
+    return {
+        "keys": keys,
+        "index": {key: i for i, key in enumerate(keys)},
+        "start": start,
+        "today": today,
+        "series": y,
+        "length": length,
+        "params": [tuple(float(v) for v in grid[g]) for g in best],
+        "level": level[rows, best],
+        "trend": trend[rows, best],
+        "season": season[rows, best],
+        "sigma": np.sqrt(sse[rows, best] / max(scored, 1)),
+        "mape": np.where(positive > 0, ape[rows, best] / np.maximum(positive, 1) * 100, np.nan),
+        "holiday": holiday_error[rows, best] / holiday_days if holiday_days else np.zeros(n_series),
+        "scored": np.full(n_series, scored),
+        "fittedAt": datetime.now().isoformat(timespec="seconds"),
+        "fitMs": round((datetime.now() - started).total_seconds() * 1000, 1),
+    }
+
+
+def _project(model, i, days):
+    """Daily point forecasts, their variances and the error weights c_j"""
+    alpha, beta, gamma = model["params"][i]
+    horizon = len(days)
+    h = np.arange(1, horizon + 1)
+    phi_h = np.cumsum(DAMPING ** h)             # phi + phi^2 + ... + phi^h
+    seasonal = model["season"][i][(model["length"] + h - 1) % SEASON]
+    lift = np.array([model["holiday"][i] if is_holiday(day) else 0.0 for day in days])
+    point = np.maximum(model["level"][i] + phi_h * model["trend"][i] + seasonal + lift, 0.0)
+
+    # c_0 = 1, c_j = alpha * (1 + beta * phi_j) + gamma * [j is a whole season]
+    j = np.arange(1, horizon)
+    c = np.concatenate(([1.0], alpha * (1 + beta * phi_h[:-1]) + gamma * (j % SEASON == 0)))
+    variance = model["sigma"][i] ** 2 * np.cumsum(c ** 2)
+    return point, variance, c
@@ -0,0 +1,83 @@
+"""
+Time-ordered, collision-free identifiers
+
+IDs are ULIDs: a 48-bit millisecond timestamp followed by 80 random bits,
+written as 26 Crockford base32 characters.  They sort by creation time, so
+new rows land at the right-hand edge of a TEXT primary-key B-tree instead of
+splitting pages all over it.
+
+Within one process the allocator is strictly monotonic: a second ID in the
+same millisecond increments the random part instead of drawing a new one,
+so a busy kiosk can mint thousands per second without a collision.  Across
+uvicorn workers the 80 random bits make a clash practically impossible, and
+the state is reseeded after ``fork`` so child processes never replay the
+parent's sequence.
+"""
+
+import os
+import secrets
+import threading
+import time
+
+CROCKFORD_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+_RANDOM_BITS = 80
+_RANDOM_MAX = (1 << _RANDOM_BITS) - 1
+
+
+def encode_ulid(value):
+    """128-bit integer -> 26-character Crockford base32 string"""
+    chars = []
+    for _ in range(26):
+        chars.append(CROCKFORD_ALPHABET[value & 0x1F])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def ulid_timestamp(ulid):
+    """Millisecond Unix timestamp embedded in a ULID"""
+    value = 0
+    for char in ulid[:10]:
+        value = (value << 5) | CROCKFORD_ALPHABET.index(char)
+    return value
+
+
+class IdAllocator:
+    """Thread-safe monotonic ULID generator"""
+
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._reset()
+
+    def _reset(self):
+        # Also used after fork, where the parent's lock may have been held
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._last_random = 0
+
+    def ulid(self):
+        """Next ULID; always greater than the previous one from this allocator"""
+        with self._lock:
+            now_ms = int(self._clock() * 1000)
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._last_random = secrets.randbits(_RANDOM_BITS)
+            elif self._last_random < _RANDOM_MAX:
+                # Same millisecond (or the clock stepped back): keep counting
+                self._last_random += 1
+            else:
+                self._last_ms += 1
+                self._last_random = secrets.randbits(_RANDOM_BITS)
+            return encode_ulid((self._last_ms << _RANDOM_BITS) | self._last_random)
+
+    def new_id(self, prefix=""):
+        """ULID with a fixed type prefix, e.g. ``new_id("sale_")``"""
+        return f"{prefix}{self.ulid()}"
+
+
+# Process-wide allocator shared by every ID-minting path
+allocator = IdAllocator()
+new_id = allocator.new_id
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=allocator._reset)
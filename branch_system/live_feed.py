@@ -0,0 +1,210 @@
+"""
+In-process push feed of recorded sales
+
+Sale endpoints ``publish`` each committed sale; the live-feed page receives
+it over Server-Sent Events or a WebSocket instead of polling a canned list.
+
+Every event gets an increasing ``cursor``.  The feed keeps the last
+``history_size`` events so a reconnecting client (SSE ``Last-Event-ID``) or
+a polling client (``/api/sales/live?cursor=``) can resume where it stopped.
+Each subscriber has a bounded queue: when a client falls behind, its oldest
+pending events are dropped and the next delivery carries a ``dropped`` count
+so the client knows to resync from the cursor endpoint.  A slow tablet
+therefore never holds up publishing or the other subscribers.
+
+Events are serialized once at publish time and the same bytes are fanned
+out to every connection.  Publish and subscribe run on the event loop.
+"""
+
+import asyncio
+import json
+from collections import deque
+
+from fastapi.responses import StreamingResponse
+
+
+class FeedEvent:
+    """One published sale and its pre-encoded wire forms"""
+
+    __slots__ = ("cursor", "branch_keys", "data", "json", "sse")
+
+    def __init__(self, cursor, data):
+        self.cursor = cursor
+        self.data = dict(data, cursor=cursor)
+        self.branch_keys = frozenset(
+            key for key in (data.get("branchId"), data.get("branchName")) if key
+        )
+        self.json = json.dumps(self.data, ensure_ascii=False, default=str)
+        self.sse = f"id: {cursor}\nevent: sale\ndata: {self.json}\n\n".encode("utf-8")
+
+
+class Subscription:
+    """A connected client's filter and bounded send queue"""
+
+    def __init__(self, branches=None, queue_size=256):
+        self.branches = frozenset(branches) if branches else None
+        self._queue = deque(maxlen=queue_size)
+        self._ready = asyncio.Event()
+        self._dropped = 0
+        self.delivered = 0
+        self.total_dropped = 0
+
+    def matches(self, event):
+        return self.branches is None or not self.branches.isdisjoint(event.branch_keys)
+
+    def offer(self, event):
+        if len(self._queue) == self._queue.maxlen:
+            self._dropped += 1
+            self.total_dropped += 1
+        self._queue.append(event)
+        self._ready.set()
+
+    async def next_batch(self, timeout=None):
+        """Wait for pending events; returns ``(events, dropped)``
+
+        ``([], 0)`` means the timeout passed with nothing to send.
+        """
+        if not self._queue:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return [], 0
+        events = list(self._queue)
+        self._queue.clear()
+        dropped, self._dropped = self._dropped, 0
+        self.delivered += len(events)
+        return events, dropped
+
+
+class LiveFeed:
+    """Cursor-numbered sale events with replay history and fan-out"""
+
+    def __init__(self, history_size=1000, queue_size=256):
+        self.queue_size = queue_size
+        self._history = deque(maxlen=history_size)
+        self._cursor = 0
+        self._subscribers = set()
+        self._counters = {"published": 0, "connections": 0, "peakSubscribers": 0}
+
+    @property
+    def cursor(self):
+        """Cursor of the newest event (0 before the first)"""
+        return self._cursor
+
+    def publish(self, sale):
+        """Number, encode and fan out one sale; returns the FeedEvent"""
+        self._cursor += 1
+        event = FeedEvent(self._cursor, sale)
+        self._history.append(event)
+        self._counters["published"] += 1
+        for subscription in self._subscribers:
+            if subscription.matches(event):
+                subscription.offer(event)
+        return event
+
+    def subscribe(self, branches=None, cursor=None):
+        """Register a client; events after ``cursor`` are queued first"""
+        subscription = Subscription(branches, self.queue_size)
+        if cursor is not None:
+            events, _ = self._after(cursor)
+            for event in events:
+                if subscription.matches(event):
+                    subscription.offer(event)
+        self._subscribers.add(subscription)
+        self._counters["connections"] += 1
+        self._counters["peakSubscribers"] = max(
+            self._counters["peakSubscribers"], len(self._subscribers)
+        )
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self._subscribers.discard(subscription)
+
+    def since(self, cursor=None, branches=None, limit=50):
+        """Events for polling clients, and the cursor to poll from next
+
+        Returns ``(events, next_cursor, reset)``.  Without a cursor, or when
+        the cursor is unknown (too old, or from before a restart; ``reset``
+        is True), ``events`` is the latest ``limit`` events, newest first.
+        With a known cursor it is the events after it, oldest first, up to
+        ``limit``; ``next_cursor`` is then the last one returned, so events
+        beyond the limit come with the next poll instead of being skipped.
+        ``next_cursor < self.cursor`` means more are waiting.
+        """
+        events, reset = self._after(cursor)
+        if branches:
+            branches = frozenset(branches)
+            events = [e for e in events if not branches.isdisjoint(e.branch_keys)]
+        if cursor is None or reset:
+            return events[::-1][:limit], self._cursor, reset
+        if len(events) > limit:
+            events = events[:limit]
+            return events, events[-1].cursor, False
+        return events, self._cursor, False
+
+    def stats(self):
+        """Publish and fan-out counters"""
+        subscribers = list(self._subscribers)
+        return {
+            **self._counters,
+            "cursor": self._cursor,
+            "historySize": len(self._history),
+            "subscribers": len(subscribers),
+            "queuedEvents": sum(len(s._queue) for s in subscribers),
+            "droppedEvents": sum(s.total_dropped for s in subscribers),
+        }
+
+    def _after(self, cursor):
+        history = self._history
+        if cursor is None:
+            return list(history), False
+        if cursor > self._cursor or (history and cursor < history[0].cursor - 1):
+            return list(history), True
+        if not history or cursor >= history[-1].cursor:
+            return [], False
+        # Cursors are consecutive, so the position in history is arithmetic
+        start = cursor - history[0].cursor + 1
+        return [history[i] for i in range(max(start, 0), len(history))], False
+
+
+async def sse_stream(subscription, is_disconnected=None, heartbeat=15.0):
+    """Server-Sent Events body for one subscription
+
+    Yields pre-encoded ``sale`` frames, a ``gap`` event when events were
+    dropped for this client, and a comment line as heartbeat.
+    """
+    yield b"retry: 3000\n\n"
+    while True:
+        events, dropped = await subscription.next_batch(timeout=heartbeat)
+        if not events:
+            if is_disconnected is not None and await is_disconnected():
+                return
+            yield b": ping\n\n"
+            continue
+        if dropped:
+            yield f"event: gap\ndata: {json.dumps({'dropped': dropped})}\n\n".encode("utf-8")
+        yield b"".join(event.sse for event in events)
+
+
+class SSEResponse(StreamingResponse):
+    """text/event-stream response that unsubscribes when the client goes away
+
+    The unsubscribe happens when the response ends for any reason, rather
+    than whenever the abandoned body generator happens to be collected.
+    """
+
+    def __init__(self, feed, subscription, is_disconnected=None, heartbeat=15.0):
+        super().__init__(
+            sse_stream(subscription, is_disconnected, heartbeat),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+        self.feed = feed
+        self.subscription = subscription
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.feed.unsubscribe(self.subscription)
@@ -0,0 +1,401 @@
+"""
+Versioned schema migrations for branch_system.db
+
+Every schema change is appended to MIGRATIONS with the next version number;
+``migrate`` applies whatever the database has not seen yet and records it
+in ``schema_migrations``.  Never edit a migration that has shipped - add a
+new one instead.  Migrations are plain SQL kept here, DDL and backfills
+alike: they never reference a feature module, whose tables and code keep
+changing after the migration has run.
+
+``check_query_plans`` runs EXPLAIN QUERY PLAN over the hot POS queries at
+startup so a missing or unused index shows up in the log rather than as a
+slow dashboard.
+"""
+
+import logging
+from collections import namedtuple
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+Migration = namedtuple("Migration", ["version", "description", "statements"])
+
+MIGRATIONS = [
+    Migration(1, "baseline branch login schema", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            first_name TEXT NOT NULL,
+            last_name TEXT NOT NULL,
+            employee_id TEXT UNIQUE NOT NULL,
+            email TEXT,
+            phone TEXT,
+            role TEXT NOT NULL,
+            allowed_branches TEXT NOT NULL,
+            is_active BOOLEAN DEFAULT TRUE,
+            avatar TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS branches (
+            id TEXT PRIMARY KEY,
+            code TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            location TEXT NOT NULL,
+            is_active BOOLEAN DEFAULT TRUE,
+            manager_id TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS daily_sessions (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            branch_id TEXT NOT NULL,
+            branch_name TEXT NOT NULL,
+            session_date DATE NOT NULL,
+            start_time TIMESTAMP NOT NULL,
+            end_time TIMESTAMP,
+            is_locked BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (branch_id) REFERENCES branches (id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS sales_records (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            branch_id TEXT NOT NULL,
+            branch_name TEXT NOT NULL,
+            session_id TEXT,
+            product_name TEXT NOT NULL,
+            quantity DECIMAL(10,3) NOT NULL,
+            unit TEXT NOT NULL DEFAULT 'กิโลกรัม',
+            unit_price DECIMAL(10,2) NOT NULL,
+            total_amount DECIMAL(10,2) NOT NULL,
+            customer_type TEXT DEFAULT 'walk-in',
+            payment_method TEXT DEFAULT 'cash',
+            notes TEXT,
+            sale_date DATE NOT NULL,
+            sale_time TIMESTAMP NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (branch_id) REFERENCES branches (id),
+            FOREIGN KEY (session_id) REFERENCES daily_sessions (id)
+        )
+        """,
+    ]),
+    Migration(2, "covering indexes for session lookups and branch sales", [
+        # Active-session lookup done by every POS action
+        """
+        CREATE INDEX IF NOT EXISTS idx_daily_sessions_user_date_locked
+        ON daily_sessions (user_id, session_date, is_locked)
+        """,
+        # Today's sales list, ordered by time within the day
+        """
+        CREATE INDEX IF NOT EXISTS idx_sales_records_branch_date_time
+        ON sales_records (branch_id, sale_date, sale_time)
+        """,
+        # Summary totals and top products answered from the index alone
+        """
+        CREATE INDEX IF NOT EXISTS idx_sales_records_branch_date_product
+        ON sales_records (branch_id, sale_date, product_name, quantity, total_amount)
+        """,
+    ]),
+    Migration(3, "idempotency keys for batched sale ingestion", [
+        # Kept apart from sales_records so a deleted sale is not re-created by a replay
+        """
+        CREATE TABLE IF NOT EXISTS sales_idempotency_keys (
+            idempotency_key TEXT PRIMARY KEY,
+            sale_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL
+        )
+        """,
+    ]),
+    Migration(4, "daily sales rollup by branch, date and product", [
+        """
+        CREATE TABLE IF NOT EXISTS sales_daily_rollup (
+            branch_id TEXT NOT NULL,
+            sale_date DATE NOT NULL,
+            product_name TEXT NOT NULL,
+            total_quantity REAL NOT NULL DEFAULT 0,
+            total_amount REAL NOT NULL DEFAULT 0,
+            transaction_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (branch_id, sale_date, product_name)
+        ) WITHOUT ROWID
+        """,
+        # Backfill from the sales recorded so far
+        "DELETE FROM sales_daily_rollup",
+        """
+        INSERT INTO sales_daily_rollup
+            (branch_id, sale_date, product_name, total_quantity, total_amount, transaction_count)
+        SELECT branch_id, sale_date, product_name, SUM(quantity), SUM(total_amount), COUNT(*)
+        FROM sales_records
+        GROUP BY branch_id, sale_date, product_name
+        """,
+    ]),
+    Migration(5, "session change log for cross-worker session cache invalidation", [
+        """
+        CREATE TABLE IF NOT EXISTS session_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    Migration(6, "branch regions and per-branch daily/monthly sales for analytics", [
+        # One of analytics.REGIONS; the demo branches are all in Bangkok
+        "ALTER TABLE branches ADD COLUMN region TEXT NOT NULL DEFAULT 'central'",
+        """
+        CREATE TABLE IF NOT EXISTS sales_branch_daily (
+            sale_date DATE NOT NULL,
+            branch_id TEXT NOT NULL,
+            total_quantity REAL NOT NULL DEFAULT 0,
+            total_amount REAL NOT NULL DEFAULT 0,
+            transaction_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (sale_date, branch_id)
+        ) WITHOUT ROWID
+        """,
+        # sale_month is 'YYYY-MM'
+        """
+        CREATE TABLE IF NOT EXISTS sales_branch_monthly (
+            sale_month TEXT NOT NULL,
+            branch_id TEXT NOT NULL,
+            total_quantity REAL NOT NULL DEFAULT 0,
+            total_amount REAL NOT NULL DEFAULT 0,
+            transaction_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (sale_month, branch_id)
+        ) WITHOUT ROWID
+        """,
+        # Backfill from the product-level rollup
+        "DELETE FROM sales_branch_daily",
+        """
+        INSERT INTO sales_branch_daily
+            (sale_date, branch_id, total_quantity, total_amount, transaction_count)
+        SELECT sale_date, branch_id, SUM(total_quantity), SUM(total_amount), SUM(transaction_count)
+        FROM sales_daily_rollup
+        GROUP BY sale_date, branch_id
+        """,
+        "DELETE FROM sales_branch_monthly",
+        """
+        INSERT INTO sales_branch_monthly
+            (sale_month, branch_id, total_quantity, total_amount, transaction_count)
+        SELECT substr(sale_date, 1, 7), branch_id, SUM(total_quantity), SUM(total_amount),
+               SUM(transaction_count)
+        FROM sales_daily_rollup
+        GROUP BY substr(sale_date, 1, 7), branch_id
+        """,
+    ]),
+    Migration(7, "daily branch rank snapshots", [
+        """
+        CREATE TABLE IF NOT EXISTS branch_rank_snapshots (
+            branch_id TEXT NOT NULL,
+            time_range TEXT NOT NULL,
+            group_key TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            snapshot_date DATE NOT NULL,
+            rank INTEGER NOT NULL,
+            value REAL,
+            PRIMARY KEY (branch_id, time_range, group_key, metric, snapshot_date)
+        ) WITHOUT ROWID
+        """,
+    ]),
+    Migration(8, "bulk branch operations, per-branch results and pushed settings", [
+        """
+        CREATE TABLE IF NOT EXISTS bulk_operations (
+            id TEXT PRIMARY KEY,
+            operation_type TEXT NOT NULL,
+            operation_data TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            total INTEGER NOT NULL,
+            succeeded INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS bulk_operation_results (
+            operation_id TEXT NOT NULL,
+            branch_id TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            message TEXT,
+            updated_at TIMESTAMP,
+            PRIMARY KEY (operation_id, branch_id)
+        ) WITHOUT ROWID
+        """,
+        # Settings pushed to branches (prices, promotions, config), read by the POS
+        """
+        CREATE TABLE IF NOT EXISTS branch_settings (
+            branch_id TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            operation_id TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (branch_id, key)
+        ) WITHOUT ROWID
+        """,
+    ]),
+    Migration(9, "scheduled bulk operations and the scheduler lease", [
+        """
+        CREATE TABLE IF NOT EXISTS scheduled_jobs (
+            id TEXT PRIMARY KEY,
+            operation_type TEXT NOT NULL,
+            branch_ids TEXT NOT NULL,
+            operation_data TEXT NOT NULL,
+            cadence TEXT,
+            anchor_at TIMESTAMP NOT NULL,
+            run_at TIMESTAMP NOT NULL,
+            occurrence INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL DEFAULT 'active',
+            runs INTEGER NOT NULL DEFAULT 0,
+            missed INTEGER NOT NULL DEFAULT 0,
+            last_run_at TIMESTAMP,
+            last_operation_id TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_due ON scheduled_jobs (status, run_at)",
+        """
+        CREATE TABLE IF NOT EXISTS scheduler_leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        """,
+    ]),
+]
+
+# Below this many rows a table scan is expected and not worth a warning
+PLAN_CHECK_MIN_ROWS = 1000
+
+# Hot queries: table, SQL, sample parameters and the index each should use
+HOT_QUERIES = {
+    "active_session": (
+        "daily_sessions",
+        """SELECT * FROM daily_sessions
+           WHERE user_id = ? AND session_date = ? AND is_locked = TRUE""",
+        ("emp-000", date(2000, 1, 1)),
+        "idx_daily_sessions_user_date_locked",
+    ),
+    "today_sales": (
+        "sales_records",
+        """SELECT * FROM sales_records
+           WHERE branch_id = ? AND sale_date = ? ORDER BY sale_time DESC""",
+        ("branch-000", date(2000, 1, 1)),
+        "idx_sales_records_branch_date_time",
+    ),
+    "period_total": (
+        "sales_daily_rollup",
+        """SELECT COALESCE(SUM(total_amount), 0) FROM sales_daily_rollup
+           WHERE branch_id = ? AND sale_date >= ?""",
+        ("branch-000", date(2000, 1, 1)),
+        "PRIMARY KEY",
+    ),
+    "top_products": (
+        "sales_daily_rollup",
+        """SELECT product_name, SUM(total_quantity), SUM(total_amount), SUM(transaction_count)
+           FROM sales_daily_rollup WHERE branch_id = ? AND sale_date >= ?
+           GROUP BY product_name ORDER BY 3 DESC LIMIT 5""",
+        ("branch-000", date(2000, 1, 1)),
+        "PRIMARY KEY",
+    ),
+    "analytics_loose_days": (
+        "sales_branch_daily",
+        """SELECT branch_id, SUM(total_amount), SUM(transaction_count)
+           FROM sales_branch_daily WHERE sale_date >= ? AND sale_date < ?
+           GROUP BY branch_id""",
+        (date(2000, 1, 1), date(2000, 2, 1)),
+        "PRIMARY KEY",
+    ),
+    "analytics_whole_months": (
+        "sales_branch_monthly",
+        """SELECT branch_id, SUM(total_amount), SUM(transaction_count)
+           FROM sales_branch_monthly WHERE sale_month >= ? AND sale_month < ?
+           GROUP BY branch_id""",
+        ("2000-01", "2001-01"),
+        "PRIMARY KEY",
+    ),
+}
+
+
+def current_version(conn):
+    """Highest applied migration version (0 for a fresh database)"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    row = conn.execute("SELECT MAX(version) FROM schema_migrations").fetchone()
+    return row[0] or 0
+
+
+def migrate(conn, migrations=MIGRATIONS):
+    """Apply pending migrations inside the caller's transaction
+
+    Returns the list of versions applied.
+    """
+    version = current_version(conn)
+    applied = []
+    for migration in sorted(migrations, key=lambda m: m.version):
+        if migration.version <= version:
+            continue
+        for statement in migration.statements:
+            conn.execute(statement)
+        conn.execute(
+            "INSERT INTO schema_migrations (version, description) VALUES (?, ?)",
+            (migration.version, migration.description),
+        )
+        applied.append(migration.version)
+        logger.info("Applied migration %s: %s", migration.version, migration.description)
+    return applied
+
+
+def analyze(conn, full=False):
+    """Refresh planner statistics
+
+    A full (bounded) ANALYZE runs after new indexes or when no statistics
+    exist yet; otherwise ``PRAGMA optimize`` only re-analyzes what changed.
+    """
+    has_stats = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+    ).fetchone()
+    if full or not has_stats:
+        conn.execute("PRAGMA analysis_limit = 1000")
+        conn.execute("ANALYZE")
+    else:
+        conn.execute("PRAGMA optimize")
+
+
+def check_query_plans(conn, queries=HOT_QUERIES, min_rows=PLAN_CHECK_MIN_ROWS):
+    """EXPLAIN each hot query and report whether it uses its index
+
+    Returns ``{name: {"index": ..., "ok": bool, "plan": [...]}}`` and logs a
+    warning for any query that falls back to a table scan.  Tables smaller
+    than ``min_rows`` are only reported, since the planner rightly prefers
+    a scan there.
+    """
+    report = {}
+    for name, (table, sql, params, expected_index) in queries.items():
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        ok = any(expected_index in step for step in plan)
+        report[name] = {"index": expected_index, "ok": ok, "plan": plan}
+        if not ok:
+            rows = conn.execute(
+                f"SELECT COUNT(*) FROM (SELECT 1 FROM {table} LIMIT ?)", (min_rows,)
+            ).fetchone()[0]
+            if rows >= min_rows:
+                logger.warning("Query %r is not using %s: %s", name, expected_index, plan)
+    return report
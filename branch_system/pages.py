@@ -0,0 +1,158 @@
+"""
+In-memory, precompressed cache for the HTML page routes
+
+Pages under ``web/`` used to be read from disk on every request and the
+inline pages re-encoded every time.  PageCache loads each page once, keeps
+the encoded body plus gzip (and brotli, if the ``brotli`` package is
+installed) variants, and answers with a strong ETag so a tablet that already
+has the page gets a bodiless ``304 Not Modified``.
+
+In dev mode every request stats the source file and reloads it when it has
+changed, so edits under ``web/`` show up without restarting the server.
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+HTML = "text/html; charset=utf-8"
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 512
+
+
+class PageAsset:
+    """One page in every encoding we serve, with its validators"""
+
+    __slots__ = ("media_type", "variants", "etags", "source_stamp")
+
+    def __init__(self, body, media_type, source_stamp=None):
+        self.media_type = media_type
+        self.source_stamp = source_stamp
+        digest = hashlib.sha256(body).hexdigest()[:32]
+
+        # encoding -> (body, etag); "identity" is always present
+        self.variants = {"identity": (body, f'"{digest}"')}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            self.variants["gzip"] = (gzip.compress(body, compresslevel=9, mtime=0), f'"{digest}-gz"')
+            if brotli is not None:
+                self.variants["br"] = (brotli.compress(body, quality=11), f'"{digest}-br"')
+        self.etags = frozenset(etag for _, etag in self.variants.values())
+
+    def pick(self, accept_encoding):
+        """Best encoding the client accepts (brotli, then gzip, then none)"""
+        accepted = set()
+        for part in accept_encoding.lower().split(","):
+            name, _, params = part.partition(";")
+            quality = params.replace(" ", "")
+            if quality.startswith("q=") and quality[2:] in ("0", "0.0", "0.00", "0.000"):
+                continue
+            accepted.add(name.strip())
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and encoding in accepted:
+                return encoding
+        return "identity"
+
+
+class PageCache:
+    """Page assets by name, served with ETag/304 and content negotiation"""
+
+    def __init__(self, root="web", dev_mode=False):
+        self.root = root
+        self.dev_mode = dev_mode
+        self._assets = {}
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "loads": 0, "reloads": 0, "notModified": 0}
+
+    # -----------------------------------------
+    # Route helpers
+    # -----------------------------------------
+
+    def file(self, request, filename, fallback=None, media_type=HTML):
+        """Serve ``root/filename``, or ``fallback`` text if the file is missing"""
+        path = os.path.join(self.root, filename)
+        asset = self._assets.get(path)
+        if asset is None or self.dev_mode:
+            asset = self._load_file(path, asset, fallback, media_type)
+        else:
+            self._count("hits")
+        return self.respond(request, asset)
+
+    def respond(self, request, asset):
+        """304 if the client's copy is current, otherwise the best variant"""
+        encoding = asset.pick(request.headers.get("accept-encoding", ""))
+        body, etag = asset.variants[encoding]
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            tags = {tag.strip() for tag in if_none_match.split(",")}
+            if "*" in tags or tags & asset.etags:
+                self._count("notModified")
+                return Response(status_code=304, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type=asset.media_type, headers=headers)
+
+    def clear(self):
+        """Drop every cached page"""
+        with self._lock:
+            self._assets.clear()
+
+    def stats(self):
+        """Counters plus the cached pages and their sizes per encoding"""
+        with self._lock:
+            counters = dict(self._counters)
+            assets = dict(self._assets)
+        counters.update({
+            "devMode": self.dev_mode,
+            "brotli": brotli is not None,
+            "pages": {
+                name: {encoding: len(body) for encoding, (body, _) in asset.variants.items()}
+                for name, asset in assets.items()
+            },
+        })
+        return counters
+
+    # -----------------------------------------
+    # Internals
+    # -----------------------------------------
+
+    def _load_file(self, path, current, fallback, media_type):
+        try:
+            stat = os.stat(path)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            stamp = None
+
+        if current is not None and current.source_stamp == stamp:
+            self._count("hits")
+            return current
+
+        if stamp is None:
+            if fallback is None:
+                fallback = f"{os.path.basename(path)} not found"
+            asset = PageAsset(fallback.encode("utf-8"), media_type)
+        else:
+            with open(path, "rb") as f:
+                asset = PageAsset(f.read(), media_type, source_stamp=stamp)
+        self._count("reloads" if current is not None else "loads")
+        return self._store(path, asset)
+
+    def _store(self, key, asset):
+        with self._lock:
+            self._assets[key] = asset
+        return asset
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
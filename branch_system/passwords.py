@@ -0,0 +1,163 @@
+"""
+bcrypt hashing on a bounded worker pool
+
+A bcrypt check costs a few hundred milliseconds of CPU by design.  Running
+it inside an ``async def`` handler blocks the event loop, so at shift start
+every login queues behind every other one.  PasswordHasher runs hashing on
+its own thread pool (bcrypt releases the GIL while hashing, so checks run in
+parallel up to the number of workers), caps how many checks may wait, and
+records queueing metrics.
+
+``verify_and_upgrade`` also re-hashes a password whose stored hash uses a
+different cost or bcrypt variant than the current configuration, so cost
+can be tuned without forcing password resets.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+
+class PasswordQueueFull(Exception):
+    """Raised when too many password checks are already waiting"""
+
+
+class PasswordHasher:
+    """bcrypt hash/verify with a concurrency cap and queue metrics"""
+
+    PREFIX = b"2b"
+
+    def __init__(self, rounds=12, max_workers=None, max_queue=256):
+        self.rounds = rounds
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self._executor = None
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._stats = {
+            "completed": 0,
+            "rejected": 0,
+            "rehashed": 0,
+            "waitMsTotal": 0.0,
+            "waitMsMax": 0.0,
+            "runMsTotal": 0.0,
+        }
+        self.start()
+
+    def start(self):
+        """Start the worker threads; after ``shutdown`` this starts new ones"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="bcrypt"
+            )
+
+    # -----------------------------------------
+    # Blocking primitives
+    # -----------------------------------------
+
+    def hash(self, password):
+        """Hash with the configured cost (blocking)"""
+        salt = bcrypt.gensalt(rounds=self.rounds, prefix=self.PREFIX)
+        return bcrypt.hashpw(password.encode("utf-8"), salt).decode("utf-8")
+
+    def verify(self, password, hashed):
+        """Check a password against a stored hash (blocking)"""
+        return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+
+    def needs_rehash(self, hashed):
+        """True if ``hashed`` was made with another cost or variant"""
+        try:
+            _, variant, cost, _ = hashed.split("$", 3)
+            return variant.encode() != self.PREFIX or int(cost) != self.rounds
+        except ValueError:
+            return True
+
+    def _check_and_upgrade(self, password, hashed, submitted_at):
+        started = time.perf_counter()
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        ok, new_hash = False, None
+        try:
+            ok = self.verify(password, hashed)
+            new_hash = self.hash(password) if ok and self.needs_rehash(hashed) else None
+            return ok, new_hash
+        finally:
+            finished = time.perf_counter()
+            wait_ms = (started - submitted_at) * 1000
+            with self._lock:
+                self._running -= 1
+                self._stats["completed"] += 1
+                self._stats["waitMsTotal"] += wait_ms
+                self._stats["waitMsMax"] = max(self._stats["waitMsMax"], wait_ms)
+                self._stats["runMsTotal"] += (finished - started) * 1000
+                if ok and new_hash:
+                    self._stats["rehashed"] += 1
+
+    # -----------------------------------------
+    # Async API
+    # -----------------------------------------
+
+    async def verify_and_upgrade(self, password, hashed):
+        """Verify off the event loop
+
+        Returns ``(ok, new_hash)`` where ``new_hash`` is a fresh hash to
+        store when the old one is outdated, otherwise None.
+        """
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self._stats["rejected"] += 1
+                raise PasswordQueueFull(f"{self._queued} password checks already queued")
+            self._queued += 1
+        # _check_and_upgrade frees the slot once it starts; a check that never
+        # starts (cancelled while queued, or refused after shutdown) frees it here
+        try:
+            if self._executor is None:
+                raise RuntimeError("PasswordHasher is shut down")
+            future = self._executor.submit(
+                self._check_and_upgrade, password, hashed, time.perf_counter()
+            )
+        except RuntimeError:
+            self._release_slot()
+            raise
+        future.add_done_callback(self._release_if_cancelled)
+        return await asyncio.wrap_future(future)
+
+    def _release_slot(self):
+        with self._lock:
+            self._queued -= 1
+
+    def _release_if_cancelled(self, future):
+        if future.cancelled():
+            self._release_slot()
+
+    def stats(self):
+        """Queue depth, throughput and latency counters"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            queued, running = self._queued, self._running
+        completed = snapshot["completed"]
+        return {
+            "rounds": self.rounds,
+            "maxWorkers": self.max_workers,
+            "maxQueue": self.max_queue,
+            "queued": queued,
+            "running": running,
+            "completed": completed,
+            "rejected": snapshot["rejected"],
+            "rehashed": snapshot["rehashed"],
+            "avgWaitMs": round(snapshot["waitMsTotal"] / completed, 3) if completed else 0.0,
+            "maxWaitMs": round(snapshot["waitMsMax"], 3),
+            "avgRunMs": round(snapshot["runMsTotal"] / completed, 3) if completed else 0.0,
+        }
+
+    def shutdown(self):
+        """Stop the worker threads"""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
@@ -0,0 +1,135 @@
+"""
+In-process cache of authenticated principals
+
+``get_current_user`` used to decode the JWT and load the user row on every
+request.  PrincipalCache keeps the result per bearer token: the decoded
+claims, the user record and the allowed branches pre-parsed into a
+tuple (original order) and a frozenset.  Entries expire after ``ttl`` seconds (or when the token itself
+expires, whichever is first) and the least recently used entry is evicted
+once ``max_entries`` is reached.
+
+The cache is per worker process, so the TTL also bounds how long another
+worker can serve a stale principal after a user is changed.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class PrincipalCache:
+    """TTL + LRU cache of principals keyed by bearer token"""
+
+    def __init__(self, ttl=30.0, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # token -> (expires_at, principal)
+        self._tokens_by_user = {}       # user id -> set of tokens
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "expirations": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    @staticmethod
+    def build_principal(claims, user):
+        """User row plus decoded claims and the parsed allowed branch set"""
+        principal = dict(user)
+        principal["claims"] = claims
+        principal["allowed_branch_ids"] = tuple(json.loads(user["allowed_branches"]))
+        principal["allowed_branch_set"] = frozenset(principal["allowed_branch_ids"])
+        return principal
+
+    def get(self, token):
+        """Cached principal for ``token`` or None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            expires_at, principal = entry
+            if expires_at <= now:
+                self._drop(token, principal["id"])
+                self._counters["expirations"] += 1
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(token)
+            self._counters["hits"] += 1
+            return principal
+
+    def put(self, token, claims, user):
+        """Build and cache the principal for a freshly verified token"""
+        principal = self.build_principal(claims, user)
+        lifetime = self.ttl
+        if "exp" in claims:
+            lifetime = min(lifetime, claims["exp"] - time.time())
+        if lifetime <= 0:
+            return principal
+
+        with self._lock:
+            previous = self._entries.pop(token, None)
+            if previous is not None:
+                self._unindex(token, previous[1]["id"])
+            self._entries[token] = (time.monotonic() + lifetime, principal)
+            self._tokens_by_user.setdefault(principal["id"], set()).add(token)
+            while len(self._entries) > self.max_entries:
+                old_token, (_, old_principal) = self._entries.popitem(last=False)
+                self._unindex(old_token, old_principal["id"])
+                self._counters["evictions"] += 1
+        return principal
+
+    def invalidate_user(self, user_id):
+        """Drop every cached token of a user (call after changing or deactivating it)"""
+        with self._lock:
+            tokens = self._tokens_by_user.pop(user_id, set())
+            for token in tokens:
+                self._entries.pop(token, None)
+            self._counters["invalidations"] += len(tokens)
+            return len(tokens)
+
+    def invalidate_token(self, token):
+        """Drop a single token, e.g. on logout"""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return False
+            self._drop(token, entry[1]["id"])
+            self._counters["invalidations"] += 1
+            return True
+
+    def clear(self):
+        """Drop every cached principal"""
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._entries)
+        lookups = counters["hits"] + counters["misses"]
+        counters.update({
+            "size": size,
+            "maxEntries": self.max_entries,
+            "ttlSeconds": self.ttl,
+            "hitRatio": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+        })
+        return counters
+
+    # Callers hold self._lock
+    def _drop(self, token, user_id):
+        self._entries.pop(token, None)
+        self._unindex(token, user_id)
+
+    def _unindex(self, token, user_id):
+        tokens = self._tokens_by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[user_id]
@@ -0,0 +1,324 @@
+"""
+Incrementally maintained branch rankings for /api/analytics/branch-rankings
+
+For every time range, group (``all`` and each region) and metric the index
+keeps an order-statistic treap of ``(-value, branch id)`` keys, so the top K
+branches and the rank of any one branch come out in O(log n + K) without
+sorting.  ``score`` is revenue relative to the group's best branch, so it
+shares the revenue order; only revenue and growth have their own trees.
+
+``rebuild`` loads every branch's totals from the rollups (on a DB thread).
+After that, sales recorded through this worker are applied with
+``apply_sale`` as they commit: it updates the branch's totals for each time
+range and marks it dirty in its two groups' trees, which move it to its new
+position on their next lookup.  The index is rebuilt when the date changes, which also moves the
+trailing windows, and every ``refresh_interval`` seconds to pick up sales
+written through other workers.
+
+At the first rebuild of a day each worker offers the previous day's final
+ranks to ``branch_rank_snapshots`` (``snapshot``, first writer wins), so
+rank movement over time is a lookup rather than a recomputation.
+"""
+
+import random
+import threading
+import time
+from datetime import date, timedelta
+
+from branch_system.analytics import REGIONS, TIME_RANGES, branch_rows, check_range, derive_row, score, window
+
+METRICS = ("revenue", "growth", "score")
+
+# Metric -> tree it is ranked by
+_ORDER = {"revenue": "revenue", "growth": "growth", "score": "revenue"}
+
+
+class _Node:
+    __slots__ = ("key", "priority", "left", "right", "size")
+
+    def __init__(self, key):
+        self.key = key
+        self.priority = random.random()
+        self.left = None
+        self.right = None
+        self.size = 1
+
+
+def _size(node):
+    return node.size if node else 0
+
+
+def _split(node, key):
+    """(keys < key, keys >= key)"""
+    if node is None:
+        return None, None
+    if node.key < key:
+        left, right = _split(node.right, key)
+        node.right = left
+        node.size = 1 + _size(node.left) + _size(node.right)
+        return node, right
+    left, right = _split(node.left, key)
+    node.left = right
+    node.size = 1 + _size(node.left) + _size(node.right)
+    return left, node
+
+
+def _drop_first(node):
+    """(smallest key, tree without it)"""
+    if node.left is None:
+        return node.key, node.right
+    key, node.left = _drop_first(node.left)
+    node.size -= 1
+    return key, node
+
+
+def _merge(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        left.size = 1 + _size(left.left) + _size(left.right)
+        return left
+    right.left = _merge(left, right.left)
+    right.size = 1 + _size(right.left) + _size(right.right)
+    return right
+
+
+class OrderStatisticTree:
+    """Treap of unique, comparable keys with subtree sizes"""
+
+    def __init__(self):
+        self._root = None
+
+    def __len__(self):
+        return _size(self._root)
+
+    def insert(self, key):
+        left, right = _split(self._root, key)
+        self._root = _merge(_merge(left, _Node(key)), right)
+
+    def remove(self, key):
+        left, rest = _split(self._root, key)
+        if rest is None:
+            self._root = left
+            raise KeyError(key)
+        first, right = _drop_first(rest)
+        if first != key:
+            self._root = _merge(left, rest)
+            raise KeyError(key)
+        self._root = _merge(left, right)
+
+    def rank(self, key):
+        """Number of keys smaller than ``key``"""
+        node, smaller = self._root, 0
+        while node is not None:
+            if node.key < key:
+                smaller += _size(node.left) + 1
+                node = node.right
+            else:
+                node = node.left
+        return smaller
+
+    def first(self, count):
+        """The ``count`` smallest keys in order"""
+        keys, stack, node = [], [], self._root
+        while (stack or node is not None) and len(keys) < count:
+            if node is not None:
+                stack.append(node)
+                node = node.left
+            else:
+                node = stack.pop()
+                keys.append(node.key)
+                node = node.right
+        return keys
+
+
+def _sort_key(row, metric):
+    """Ascending key for descending ``metric``; branches without growth go last"""
+    value = row[metric]
+    return (float("inf") if value is None else -value, row["id"])
+
+
+class _Ranking:
+    """One ordering: tree plus each branch's current key and pending moves"""
+
+    __slots__ = ("metric", "tree", "keys", "dirty")
+
+    def __init__(self, metric):
+        self.metric = metric
+        self.tree = OrderStatisticTree()
+        self.keys = {}          # branch id -> key currently in the tree
+        self.dirty = set()      # branches whose totals changed since the last flush
+
+    def add(self, row):
+        key = self.keys[row["id"]] = _sort_key(row, self.metric)
+        self.tree.insert(key)
+
+    def flush(self, rows):
+        """Move changed branches to their new position: O(changed x log n)"""
+        for branch_id in self.dirty:
+            key = _sort_key(rows[branch_id], self.metric)
+            if key != self.keys[branch_id]:
+                self.tree.remove(self.keys[branch_id])
+                self.tree.insert(key)
+                self.keys[branch_id] = key
+        self.dirty.clear()
+        return self.tree
+
+
+class RankingIndex:
+    """Per (time range, group, metric) ranking trees over live branch totals"""
+
+    def __init__(self, refresh_interval=30.0):
+        self.refresh_interval = refresh_interval
+        self._date = None
+        self._built_at = 0.0
+        self._rows = {}     # time range -> branch id -> row
+        self._rankings = {}  # (time range, group, metric) -> _Ranking
+        self._lock = threading.Lock()
+        self._counters = {"rebuilds": 0, "updates": 0, "lookups": 0}
+
+    def stale(self, today=None):
+        today = today or date.today()
+        return self._date != today or time.monotonic() - self._built_at > self.refresh_interval
+
+    def rebuild(self, conn, today=None):
+        """Reload totals from the rollups; True on the first build for ``today``"""
+        today = today or date.today()
+        rows = {tr: {row["id"]: row for row in branch_rows(conn, tr, "all", today)} for tr in TIME_RANGES}
+        rankings = {}
+        for time_range, by_branch in rows.items():
+            for row in by_branch.values():
+                for group in ("all", "region-" + row["regionCode"]):
+                    for metric in ("revenue", "growth"):
+                        rankings.setdefault((time_range, group, metric), _Ranking(metric)).add(row)
+
+        with self._lock:
+            new_day = self._date != today
+            self._date, self._rows, self._rankings = today, rows, rankings
+            self._built_at = time.monotonic()
+            self._counters["rebuilds"] += 1
+        return new_day
+
+    def apply_sale(self, branch_id, sale_date, amount, transactions=1, quantity=0):
+        """Fold a committed sale (negative values for a deletion) into every window
+
+        Only the totals change here; the trees reposition the branch on
+        their next lookup.
+        """
+        with self._lock:
+            if self._date is None:
+                return
+            sale_date = date.fromisoformat(str(sale_date))
+            for time_range, by_branch in self._rows.items():
+                row = by_branch.get(branch_id)
+                if row is None:
+                    continue        # new branch: picked up by the next rebuild
+                start, end = window(time_range, self._date)
+                if start <= sale_date < end:
+                    fields = (("revenue", amount), ("transactions", transactions), ("quantity", quantity))
+                elif start - timedelta(days=TIME_RANGES[time_range]) <= sale_date < start:
+                    fields = (("previousRevenue", amount),)
+                else:
+                    continue
+                for field, delta in fields:
+                    row[field] += delta
+                derive_row(row)
+                for group in ("all", "region-" + row["regionCode"]):
+                    for metric in ("revenue", "growth"):
+                        self._rankings[(time_range, group, metric)].dirty.add(branch_id)
+            self._counters["updates"] += 1
+
+    def top(self, time_range="month", group="all", metric="revenue", limit=10):
+        """Best ``limit`` branches with rank and score"""
+        _validate(time_range, group, metric)
+        with self._lock:
+            tree, by_branch = self._lookup(time_range, group, metric)
+            keys = tree.first(max(limit, 0))
+            best = self._best_revenue(time_range, group)
+            return [self._entry(by_branch[key[1]], rank, best)
+                    for rank, key in enumerate(keys, 1)]
+
+    def rank_of(self, branch_id, time_range="month", group="all", metric="revenue"):
+        """One branch's rank in its group, or None if it is not in the group"""
+        _validate(time_range, group, metric)
+        with self._lock:
+            tree, by_branch = self._lookup(time_range, group, metric)
+            row = by_branch.get(branch_id)
+            if row is None or (group != "all" and group != "region-" + row["regionCode"]):
+                return None
+            entry = self._entry(row, tree.rank(_sort_key(row, _ORDER[metric])) + 1,
+                                self._best_revenue(time_range, group))
+            entry["of"] = len(tree)
+            return entry
+
+    def snapshot(self, conn, day):
+        """Record the final ranks of ``day`` unless already recorded; returns rows added"""
+        rows = []
+        for time_range in TIME_RANGES:
+            branches = branch_rows(conn, time_range, "all", day)
+            for group in ["all"] + ["region-" + code for code in REGIONS]:
+                members = [row for row in branches
+                           if group == "all" or group == "region-" + row["regionCode"]]
+                for metric in ("revenue", "growth"):
+                    members.sort(key=lambda row: _sort_key(row, metric))
+                    rows.extend(
+                        (row["id"], time_range, group, metric, day, rank, row[metric])
+                        for rank, row in enumerate(members, 1)
+                    )
+        return conn.executemany("""
+            INSERT OR IGNORE INTO branch_rank_snapshots
+                (branch_id, time_range, group_key, metric, snapshot_date, rank, value)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, rows).rowcount
+
+    @staticmethod
+    def history(conn, branch_id, time_range="month", group="all", metric="revenue", days=30, today=None):
+        """Daily ranks of one branch over the last ``days`` snapshots"""
+        _validate(time_range, group, metric)
+        today = today or date.today()
+        rows = conn.execute("""
+            SELECT snapshot_date, rank, value FROM branch_rank_snapshots
+            WHERE branch_id = ? AND time_range = ? AND group_key = ? AND metric = ?
+              AND snapshot_date >= ?
+            ORDER BY snapshot_date
+        """, (branch_id, time_range, group, _ORDER[metric], today - timedelta(days=days))).fetchall()
+        return [{"date": str(row["snapshot_date"]), "rank": row["rank"], "value": row["value"]}
+                for row in rows]
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self._counters,
+                date=self._date.isoformat() if self._date else None,
+                trees=len(self._rankings),
+                refreshInterval=self.refresh_interval,
+            )
+
+    def _lookup(self, time_range, group, metric):
+        """(tree, rows by branch id); call with the lock held"""
+        self._counters["lookups"] += 1
+        return self._tree(time_range, group, _ORDER[metric]), self._rows.get(time_range, {})
+
+    def _tree(self, time_range, group, metric):
+        ranking = self._rankings.get((time_range, group, metric))
+        # A region without branches has no ranking
+        return ranking.flush(self._rows[time_range]) if ranking else OrderStatisticTree()
+
+    def _best_revenue(self, time_range, group):
+        leader = self._tree(time_range, group, "revenue").first(1)
+        return self._rows[time_range][leader[0][1]]["revenue"] if leader else 0
+
+    @staticmethod
+    def _entry(row, rank, best):
+        return dict(row, rank=rank, score=score(row["revenue"], best))
+
+
+def _validate(time_range, group, metric):
+    check_range(time_range)
+    if metric not in METRICS:
+        raise ValueError(f"ไม่รู้จักตัวชี้วัด: {metric} (ใช้ได้: {', '.join(METRICS)})")
+    if group != "all" and not (group.startswith("region-") and group[len("region-"):] in REGIONS):
+        raise ValueError(f"จัดอันดับได้เฉพาะทุกสาขาหรือรายภูมิภาค: {group}")
@@ -0,0 +1,276 @@
+"""
+Daily sales rollups for branch_system.db
+
+``sales_daily_rollup`` holds one row per (branch, day, product) with the
+running quantity, amount and transaction count.  Every write path that adds
+or removes a sale updates it in the same transaction, so dashboard queries
+read O(days x products) rows instead of scanning every sale.
+
+``sales_branch_daily`` and ``sales_branch_monthly`` hold the same totals per
+(day, branch) and per (month, branch), keyed period first, so the analytics
+endpoints aggregate a date range across every branch from whole months plus
+a few loose days instead of per-product rows.
+
+Rebuild or verify the tables from the command line:
+
+    python -m branch_system.rollups rebuild [--db branch_system.db]
+    python -m branch_system.rollups check   [--db branch_system.db]
+"""
+
+import argparse
+import sqlite3
+import sys
+from datetime import timedelta
+
+from branch_system import migrations
+
+# Amount drift tolerated by the consistency check (REAL arithmetic)
+AMOUNT_TOLERANCE = 0.005
+
+_UPSERT = """
+    INSERT INTO sales_daily_rollup
+        (branch_id, sale_date, product_name, total_quantity, total_amount, transaction_count)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (branch_id, sale_date, product_name) DO UPDATE SET
+        total_quantity = total_quantity + excluded.total_quantity,
+        total_amount = total_amount + excluded.total_amount,
+        transaction_count = transaction_count + excluded.transaction_count
+"""
+
+# Branch-level rollups: (table, period column, period of a sale date)
+BRANCH_ROLLUPS = [
+    ("sales_branch_daily", "sale_date", lambda sale_date: sale_date),
+    ("sales_branch_monthly", "sale_month", lambda sale_date: str(sale_date)[:7]),
+]
+
+_UPSERT_BRANCH = """
+    INSERT INTO {table}
+        ({period}, branch_id, total_quantity, total_amount, transaction_count)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT ({period}, branch_id) DO UPDATE SET
+        total_quantity = total_quantity + excluded.total_quantity,
+        total_amount = total_amount + excluded.total_amount,
+        transaction_count = transaction_count + excluded.transaction_count
+"""
+
+
+def add_sales(conn, sales):
+    """Fold new sales into every rollup
+
+    ``sales`` is an iterable of (branch_id, sale_date, product_name,
+    quantity, total_amount) tuples.
+    """
+    rows = [(b, d, p, q, a, 1) for b, d, p, q, a in sales]
+    conn.executemany(_UPSERT, rows)
+    for table, period, period_of in BRANCH_ROLLUPS:
+        totals = {}
+        for branch_id, sale_date, _, quantity, amount, _ in rows:
+            total = totals.setdefault((period_of(sale_date), branch_id), [0, 0, 0])
+            total[0] += quantity
+            total[1] += amount
+            total[2] += 1
+        conn.executemany(
+            _UPSERT_BRANCH.format(table=table, period=period),
+            ((key, branch_id, q, a, n) for (key, branch_id), (q, a, n) in totals.items())
+        )
+
+
+def remove_sale(conn, branch_id, sale_date, product_name, quantity, total_amount):
+    """Take a deleted sale back out of every rollup"""
+    conn.execute(_UPSERT, (branch_id, sale_date, product_name, -quantity, -total_amount, -1))
+    conn.execute("""
+        DELETE FROM sales_daily_rollup
+        WHERE branch_id = ? AND sale_date = ? AND product_name = ? AND transaction_count <= 0
+    """, (branch_id, sale_date, product_name))
+    for table, period, period_of in BRANCH_ROLLUPS:
+        key = period_of(sale_date)
+        conn.execute(
+            _UPSERT_BRANCH.format(table=table, period=period),
+            (key, branch_id, -quantity, -total_amount, -1)
+        )
+        conn.execute(f"""
+            DELETE FROM {table}
+            WHERE {period} = ? AND branch_id = ? AND transaction_count <= 0
+        """, (key, branch_id))
+
+
+def rebuild(conn, branch_id=None):
+    """Recompute rollup rows from sales_records (all branches or one)"""
+    where, params = ("WHERE branch_id = ?", (branch_id,)) if branch_id else ("", ())
+    conn.execute(f"DELETE FROM sales_daily_rollup {where}", params)
+    conn.execute(f"""
+        INSERT INTO sales_daily_rollup
+            (branch_id, sale_date, product_name, total_quantity, total_amount, transaction_count)
+        SELECT branch_id, sale_date, product_name, SUM(quantity), SUM(total_amount), COUNT(*)
+        FROM sales_records {where}
+        GROUP BY branch_id, sale_date, product_name
+    """, params)
+    return conn.execute("SELECT COUNT(*) FROM sales_daily_rollup").fetchone()[0]
+
+
+def rebuild_branch_rollups(conn):
+    """Recompute the per-branch daily and monthly rollups from sales_daily_rollup"""
+    for table, period, _ in BRANCH_ROLLUPS:
+        key = "substr(sale_date, 1, 7)" if period == "sale_month" else "sale_date"
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute(f"""
+            INSERT INTO {table}
+                ({period}, branch_id, total_quantity, total_amount, transaction_count)
+            SELECT {key}, branch_id, SUM(total_quantity), SUM(total_amount), SUM(transaction_count)
+            FROM sales_daily_rollup
+            GROUP BY {key}, branch_id
+        """)
+    return conn.execute("SELECT COUNT(*) FROM sales_branch_daily").fetchone()[0]
+
+
+def check_consistency(conn):
+    """Compare the rollups with a fresh aggregate of their source
+
+    sales_daily_rollup is checked against sales_records and the branch
+    rollups against sales_daily_rollup.  Returns a list of mismatching rows
+    with both sides' values; an empty list means the rollups are consistent.
+    """
+    rows = conn.execute("""
+        WITH actual AS (
+            SELECT branch_id, sale_date, product_name,
+                   SUM(quantity) AS qty, SUM(total_amount) AS amount, COUNT(*) AS cnt
+            FROM sales_records
+            GROUP BY branch_id, sale_date, product_name
+        ),
+        keys AS (
+            SELECT branch_id, sale_date, product_name FROM actual
+            UNION
+            SELECT branch_id, sale_date, product_name FROM sales_daily_rollup
+        )
+        SELECT k.branch_id, k.sale_date, k.product_name,
+               a.qty, a.amount, a.cnt,
+               r.total_quantity, r.total_amount, r.transaction_count
+        FROM keys k
+        LEFT JOIN actual a USING (branch_id, sale_date, product_name)
+        LEFT JOIN sales_daily_rollup r USING (branch_id, sale_date, product_name)
+    """).fetchall()
+
+    mismatches = []
+    for row in rows:
+        branch_id, sale_date, product, qty, amount, cnt, r_qty, r_amount, r_cnt = tuple(row)
+        if (cnt or 0) != (r_cnt or 0) \
+                or abs((amount or 0) - (r_amount or 0)) > AMOUNT_TOLERANCE \
+                or abs((qty or 0) - (r_qty or 0)) > AMOUNT_TOLERANCE:
+            mismatches.append({
+                "branchId": branch_id,
+                "saleDate": sale_date,
+                "productName": product,
+                "actual": {"quantity": qty, "amount": amount, "transactions": cnt},
+                "rollup": {"quantity": r_qty, "amount": r_amount, "transactions": r_cnt},
+            })
+
+    # Branch rollups must equal sales_daily_rollup summed over products
+    for table, period, _ in BRANCH_ROLLUPS:
+        key = "substr(sale_date, 1, 7)" if period == "sale_month" else "sale_date"
+        rows = conn.execute(f"""
+            WITH actual AS (
+                SELECT {key} AS {period}, branch_id,
+                       SUM(total_amount) AS amount, SUM(transaction_count) AS cnt
+                FROM sales_daily_rollup
+                GROUP BY {key}, branch_id
+            ),
+            keys AS (
+                SELECT {period}, branch_id FROM actual
+                UNION
+                SELECT {period}, branch_id FROM {table}
+            )
+            SELECT k.branch_id, k.{period}, a.amount, a.cnt, t.total_amount, t.transaction_count
+            FROM keys k
+            LEFT JOIN actual a USING ({period}, branch_id)
+            LEFT JOIN {table} t USING ({period}, branch_id)
+        """).fetchall()
+        for row in rows:
+            branch_id, sale_period, amount, cnt, t_amount, t_cnt = tuple(row)
+            if (cnt or 0) != (t_cnt or 0) or abs((amount or 0) - (t_amount or 0)) > AMOUNT_TOLERANCE:
+                mismatches.append({
+                    "table": table,
+                    "branchId": branch_id,
+                    "saleDate": sale_period,
+                    "productName": None,
+                    "actual": {"amount": amount, "transactions": cnt},
+                    "rollup": {"amount": t_amount, "transactions": t_cnt},
+                })
+    return mismatches
+
+
+def day_totals(conn, branch_id, sale_date):
+    """(total_amount, transaction_count) for one branch and day"""
+    row = conn.execute("""
+        SELECT COALESCE(SUM(total_amount), 0), COALESCE(SUM(transaction_count), 0)
+        FROM sales_daily_rollup
+        WHERE branch_id = ? AND sale_date = ?
+    """, (branch_id, sale_date)).fetchone()
+    return row[0], row[1]
+
+
+def branch_summary(conn, branch_id, today):
+    """Today / 7-day / 30-day totals and the week's top 5 products"""
+    week_ago = today - timedelta(days=7)
+    month_ago = today - timedelta(days=30)
+    totals = conn.execute("""
+        SELECT COALESCE(SUM(CASE WHEN sale_date = ? THEN total_amount END), 0) AS today,
+               COALESCE(SUM(CASE WHEN sale_date >= ? THEN total_amount END), 0) AS week,
+               COALESCE(SUM(total_amount), 0) AS month
+        FROM sales_daily_rollup
+        WHERE branch_id = ? AND sale_date >= ?
+    """, (today, week_ago, branch_id, month_ago)).fetchone()
+
+    top_products = conn.execute("""
+        SELECT product_name,
+               SUM(total_quantity) as total_quantity,
+               SUM(total_amount) as total_amount,
+               SUM(transaction_count) as transaction_count
+        FROM sales_daily_rollup
+        WHERE branch_id = ? AND sale_date >= ?
+        GROUP BY product_name
+        ORDER BY total_amount DESC
+        LIMIT 5
+    """, (branch_id, week_ago)).fetchall()
+
+    return {
+        "todaySales": totals["today"],
+        "weekSales": totals["week"],
+        "monthSales": totals["month"],
+        "topProducts": [dict(row) for row in top_products],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the sales rollup tables")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    parser.add_argument("--db", default="branch_system.db")
+    parser.add_argument("--branch", help="rebuild a single branch only")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA busy_timeout = 5000")
+    try:
+        if args.command == "rebuild":
+            conn.execute("BEGIN IMMEDIATE")
+            migrations.migrate(conn)
+            rows = rebuild(conn, args.branch)
+            branch_rows = rebuild_branch_rollups(conn)
+            conn.execute("COMMIT")
+            print(f"✅ sales_daily_rollup rebuilt: {rows} rows ({branch_rows} branch-day rows)")
+            return 0
+
+        mismatches = check_consistency(conn)
+        if not mismatches:
+            print("✅ sales rollups are consistent with sales_records")
+            return 0
+        print(f"❌ {len(mismatches)} rollup rows differ from their source:")
+        for mismatch in mismatches[:20]:
+            print(f"   {mismatch}")
+        return 1
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
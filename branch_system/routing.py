@@ -0,0 +1,337 @@
+"""
+Delivery route planning behind /api/delivery/routes
+
+Distances are great-circle (haversine) kilometres times ``ROAD_FACTOR``, the
+usual ratio of Thai highway distance to straight-line distance, and driving
+time is that distance at ``AVERAGE_SPEED_KMH`` plus ``SERVICE_HOURS`` per
+stop.  ``DistanceMatrix`` holds one matrix over the warehouse and every
+known stop and only recomputes it when a location is added or moves.
+
+A route leaves the warehouse and ends at its last stop (the truck stays in
+the region), so it is an open path with a fixed start.  ``solve`` builds one
+by nearest neighbour, then improves it with 2-opt (reverse a run of stops)
+and Or-opt (move a run of up to ``OR_OPT_SEGMENT`` stops elsewhere, either
+way round) until neither shortens it.  The current order is improved the
+same way and the shorter result kept, so optimizing never makes a route
+longer.
+
+The solver is a plain function over a list-of-lists matrix, so it runs in
+worker processes: ``RoutePlanner.optimize`` sends each zone's routes to a
+process pool and keeps the resulting stop orders.
+"""
+
+import asyncio
+import copy
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Road distance / straight-line distance on Thai highways
+ROAD_FACTOR = 1.2
+
+# Truck cruising speed between stops and time spent unloading at each one
+AVERAGE_SPEED_KMH = 70.0
+SERVICE_HOURS = 0.5
+
+# Delivery truck fuel economy, for the fuel saved by a shorter route
+FUEL_KM_PER_LITRE = 6.0
+
+# Longest run of stops Or-opt moves at once
+OR_OPT_SEGMENT = 3
+
+# Improvements smaller than this (km) are rounding noise
+_EPSILON = 1e-9
+
+
+def haversine_km(coords):
+    """Pairwise great-circle distances for an (n, 2) array of (lat, lng)"""
+    lat, lng = np.radians(np.asarray(coords, dtype=float)).T
+    dlat = lat[:, None] - lat[None, :]
+    dlng = lng[:, None] - lng[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class DistanceMatrix:
+    """Road-distance estimates between named locations, rebuilt only on change"""
+
+    def __init__(self, road_factor=ROAD_FACTOR):
+        self.road_factor = road_factor
+        self._locations = {}    # location id -> (lat, lng)
+        self._index = {}        # location id -> row in _km
+        self._km = np.zeros((0, 0))
+        self._lock = threading.Lock()
+        self._counters = {"builds": 0, "hits": 0}
+
+    def update(self, locations):
+        """Register ``{id: (lat, lng)}``; rebuilds only if one is new or moved"""
+        with self._lock:
+            changed = {key: (float(lat), float(lng)) for key, (lat, lng) in locations.items()
+                       if self._locations.get(key) != (float(lat), float(lng))}
+            if not changed:
+                self._counters["hits"] += 1
+                return False
+            self._locations.update(changed)
+            ids = list(self._locations)
+            self._km = haversine_km([self._locations[key] for key in ids]) * self.road_factor
+            self._index = {key: row for row, key in enumerate(ids)}
+            self._counters["builds"] += 1
+            return True
+
+    def submatrix(self, ids):
+        """Distances among ``ids``, in that order, as nested lists"""
+        with self._lock:
+            rows = [self._index[key] for key in ids]
+            return self._km[np.ix_(rows, rows)].tolist()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, locations=len(self._locations))
+
+
+# -- solver ---------------------------------------------------------------
+# Index 0 of every matrix is the warehouse; a path is [0, stop, stop, ...].
+
+def _leg(dist, a, b):
+    """Distance a -> b, where b None is the open end of the path"""
+    return 0.0 if b is None else dist[a][b]
+
+
+def path_length(dist, path):
+    return sum(dist[a][b] for a, b in zip(path, path[1:]))
+
+
+def nearest_neighbour(dist):
+    """Path that always drives to the closest stop not yet visited"""
+    path, left = [0], set(range(1, len(dist)))
+    while left:
+        here = dist[path[-1]]
+        nearest = min(left, key=lambda stop: (here[stop], stop))
+        path.append(nearest)
+        left.remove(nearest)
+    return path
+
+
+def two_opt(dist, path):
+    """Reverse runs of stops while that shortens the path; True if it changed"""
+    changed, improved = False, True
+    while improved:
+        improved = False
+        n = len(path)
+        for i in range(1, n - 1):
+            for j in range(i + 1, n):
+                a, b = path[i - 1], path[j + 1] if j + 1 < n else None
+                delta = (dist[a][path[j]] + _leg(dist, path[i], b)
+                         - dist[a][path[i]] - _leg(dist, path[j], b))
+                if delta < -_EPSILON:
+                    path[i:j + 1] = path[j:i - 1:-1]
+                    changed = improved = True
+    return changed
+
+
+def or_opt(dist, path):
+    """Move runs of 1..OR_OPT_SEGMENT stops while that shortens the path"""
+    changed, improved = False, True
+    while improved:
+        improved = False
+        n = len(path)
+        for length in range(1, min(OR_OPT_SEGMENT, n - 2) + 1):
+            i = 1
+            while i + length <= n:
+                segment = path[i:i + length]
+                a, b = path[i - 1], path[i + length] if i + length < n else None
+                removed = dist[a][segment[0]] + _leg(dist, segment[-1], b) - _leg(dist, a, b)
+                rest = path[:i] + path[i + length:]
+                move = _best_insertion(dist, rest, segment, removed, i - 1)
+                if move is not None:
+                    after, run = move
+                    path[:] = rest[:after + 1] + run + rest[after + 1:]
+                    changed = improved = True
+                i += 1
+    return changed
+
+
+def _best_insertion(dist, rest, segment, removed, origin):
+    """(position in ``rest`` to insert after, run) that beats ``removed``, or None"""
+    best, best_delta = None, -_EPSILON
+    for after in range(len(rest)):
+        c, d = rest[after], rest[after + 1] if after + 1 < len(rest) else None
+        for run in (segment, segment[::-1]):
+            if after == origin and run is segment:
+                continue    # where it came from
+            delta = dist[c][run[0]] + _leg(dist, run[-1], d) - _leg(dist, c, d) - removed
+            if delta < best_delta:
+                best, best_delta = (after, run), delta
+    return best
+
+
+def improve(dist, path):
+    """Alternate 2-opt and Or-opt until neither finds a shorter path"""
+    path = list(path)
+    two_opt(dist, path)
+    while or_opt(dist, path) and two_opt(dist, path):
+        pass
+    return path
+
+
+def solve(dist, current=None):
+    """Shortest stop order found from nearest neighbour and from ``current``
+
+    Returns the stops (matrix indices, warehouse excluded) in driving order.
+    """
+    candidates = [improve(dist, nearest_neighbour(dist))]
+    if current is not None:
+        candidates.append(improve(dist, [0] + list(current)))
+    return min(candidates, key=lambda path: path_length(dist, path))[1:]
+
+
+def solve_routes(jobs):
+    """Process-pool entry point: [(route id, dist, current)] -> [(route id, order)]"""
+    return [(route_id, solve(dist, current)) for route_id, dist, current in jobs]
+
+
+# -- planner --------------------------------------------------------------
+
+def driving_hours(distance_km, stops):
+    return distance_km / AVERAGE_SPEED_KMH + SERVICE_HOURS * stops
+
+
+class RoutePlanner:
+    """Delivery routes with measured distances, optimized on a process pool"""
+
+    def __init__(self, warehouse, routes, branches=(), max_workers=None):
+        self.warehouse = warehouse
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.matrix = DistanceMatrix()
+        self._routes = {route["id"]: copy.deepcopy(route) for route in routes}
+        self._pool = None
+        self._lock = threading.Lock()
+        self._counters = {
+            "optimizations": 0,
+            "batches": 0,
+            "kmSaved": 0.0,
+            "solveMsTotal": 0.0,
+        }
+
+        # Branch records and route stops both carry coordinates; a route's own
+        # copy wins if they disagree
+        locations = {warehouse["id"]: (warehouse["lat"], warehouse["lng"])}
+        for branch in branches:
+            if branch.get("lat") is not None and branch.get("lng") is not None:
+                locations[branch["id"]] = (branch["lat"], branch["lng"])
+        for route in self._routes.values():
+            for stop in route["branches"]:
+                locations[stop["id"]] = (stop["lat"], stop["lng"])
+        self.matrix.update(locations)
+
+        for route in self._routes.values():
+            self._measure(route)
+
+    def routes(self):
+        with self._lock:
+            return copy.deepcopy(list(self._routes.values()))
+
+    async def optimize(self, route_ids=None):
+        """Re-solve the given routes (default: all), one pool task per zone"""
+        with self._lock:
+            if route_ids is None:
+                route_ids = list(self._routes)
+            for route_id in route_ids:
+                if route_id not in self._routes:
+                    raise ValueError(f"ไม่พบเส้นทาง {route_id}")
+            zones = {}
+            for route_id in route_ids:
+                route = self._routes[route_id]
+                zones.setdefault(route["zone"], []).append(self._job(route))
+
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        pool = self._executor()
+        batches = await asyncio.gather(*(
+            loop.run_in_executor(pool, solve_routes, jobs) for jobs in zones.values()
+        ))
+        solve_ms = (time.perf_counter() - started) * 1000
+
+        with self._lock:
+            results = [self._apply(self._routes[route_id], order)
+                       for batch in batches for route_id, order in batch]
+            self._counters["optimizations"] += len(results)
+            self._counters["batches"] += 1
+            self._counters["kmSaved"] += sum(result["distanceSaved"] for result in results)
+            self._counters["solveMsTotal"] += solve_ms
+        return results
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self._counters,
+                kmSaved=round(self._counters["kmSaved"], 1),
+                routes=len(self._routes),
+                workers=self.max_workers,
+                poolStarted=self._pool is not None,
+                matrix=self.matrix.stats(),
+            )
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                # Spawned, not forked: forking a process that runs DB and
+                # hashing threads can deadlock the child, and Windows has no
+                # fork.  Workers only import this module to run solve_routes.
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    # -- call with the lock held -----------------------------------------
+
+    def _job(self, route):
+        ids = [self.warehouse["id"]] + [stop["id"] for stop in route["branches"]]
+        return route["id"], self.matrix.submatrix(ids), list(range(1, len(ids)))
+
+    def _measure(self, route):
+        """Set leg, total distance and time from the matrix; returns (km, hours)"""
+        ids = [self.warehouse["id"]] + [stop["id"] for stop in route["branches"]]
+        dist = self.matrix.submatrix(ids)
+        for position, stop in enumerate(route["branches"], 1):
+            stop["order"] = position
+            stop["distance"] = round(dist[position - 1][position], 1)
+        total = path_length(dist, list(range(len(ids))))
+        hours = driving_hours(total, len(route["branches"]))
+        route["totalDistance"] = round(total, 1)
+        route["estimatedTime"] = round(hours, 1)
+        return total, hours
+
+    def _apply(self, route, order):
+        before_km, before_hours = self._measure(route)
+        stops = route["branches"]
+        route["branches"] = [stops[index - 1] for index in order]
+        after_km, after_hours = self._measure(route)
+        route["optimizationScore"] = 100
+        route["lastOptimized"] = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+        saved = before_km - after_km
+        return {
+            "routeId": route["id"],
+            "zone": route["zone"],
+            "order": [stop["id"] for stop in route["branches"]],
+            "before": {"distance": round(before_km, 1), "time": round(before_hours, 2)},
+            "after": {"distance": round(after_km, 1), "time": round(after_hours, 2)},
+            "distanceSaved": round(saved, 1),
+            "timeSaved": round(before_hours - after_hours, 2),
+            "fuelSaved": round(saved / FUEL_KM_PER_LITRE, 1),
+            "optimizationScore": route["optimizationScore"],
+        }
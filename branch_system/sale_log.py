@@ -0,0 +1,345 @@
+"""
+Durable, append-only, segmented log for the POST /api/sales recorder
+
+Each sale is one record: ``<length><crc32><json>``.  Records are appended
+to the newest segment file (``<base offset>.seg``) until it reaches
+``segment_bytes``, then a new segment starts.  A record's *offset* is its
+position in the whole log (segment base + position in the segment), so
+offsets increase across segments and workers and double as cursors.
+
+Appends hold an exclusive ``flock`` on ``LOCK`` just long enough to write
+the record, so several uvicorn workers can share one log directory.  A
+background thread fsyncs whatever has been written since the last fsync
+and then wakes every writer that was waiting for it (group commit): under
+load one fsync makes many sales durable, and the cost of an append does not
+depend on how much was logged before.
+
+Reads map segments with ``mmap``: full segments stay mapped until
+``close``, the growing one is mapped per read and unmapped afterwards.
+``append_durable`` runs the append (flock, write) on a worker thread;
+async callers should do the same with ``read``.  The newest ``tail_size``
+records are also kept in memory for the live feed.  On open, a torn record left at the
+end of the newest segment by a crash is cut off.
+"""
+
+import asyncio
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process locking only
+    fcntl = None
+
+HEADER = struct.Struct("<II")   # payload length, crc32(payload)
+SEGMENT_SUFFIX = ".seg"
+
+
+class SaleLogError(Exception):
+    """Raised for an unreadable log or a closed SaleLog"""
+
+
+def _segment_name(base):
+    return f"{base:020d}{SEGMENT_SUFFIX}"
+
+
+def _scan(buffer, start=0, end=None):
+    """Yield ``(position, payload bytes)`` for each intact record in ``buffer``"""
+    end = len(buffer) if end is None else end
+    position = start
+    while position + HEADER.size <= end:
+        length, crc = HEADER.unpack_from(buffer, position)
+        payload_end = position + HEADER.size + length
+        if payload_end > end:
+            return
+        payload = bytes(buffer[position + HEADER.size:payload_end])
+        if zlib.crc32(payload) != crc:
+            return
+        yield position, payload
+        position = payload_end
+
+
+class SaleLog:
+    """Segmented append-only log with group-commit fsync"""
+
+    def __init__(self, directory, segment_bytes=16 * 1024 * 1024, tail_size=1000, fsync=True):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self._tail = deque(maxlen=tail_size)
+
+        self._lock = threading.Lock()           # appends within this process
+        self._synced = threading.Condition(self._lock)
+        self._written_end = 0                   # log offset after our last write
+        self._synced_end = 0                    # log offset known to be on disk
+        self._waiters = []                      # (end offset, loop, future)
+        self._sealed = {}                       # base -> mmap of a full segment
+        self._closed = False
+        self._stats = {"appends": 0, "fsyncs": 0, "rotations": 0, "bytes": 0, "recovered": 0}
+
+        os.makedirs(directory, exist_ok=True)
+        self._lock_fd = os.open(os.path.join(directory, "LOCK"), os.O_RDWR | os.O_CREAT, 0o644)
+        with self._file_lock():
+            segments = self._segments()
+            self._open_segment(segments[-1] if segments else 0, recover=True)
+        self._load_tail()
+
+        self._flusher = threading.Thread(target=self._flush_loop, name="sale-log-fsync", daemon=True)
+        self._flusher.start()
+
+    # -----------------------------------------
+    # Appending
+    # -----------------------------------------
+
+    def append(self, record, wait=False):
+        """Append one record and return its offset
+
+        With ``wait=True`` block until the record has been fsynced.
+        """
+        payload = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        frame = HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._lock:
+            if self._closed:
+                raise SaleLogError("sale log is closed")
+            with self._file_lock():
+                position = os.lseek(self._fd, 0, os.SEEK_END)
+                if position >= self.segment_bytes:
+                    self._rotate(self._base + position)
+                    position = os.lseek(self._fd, 0, os.SEEK_END)
+                os.write(self._fd, frame)
+            offset = self._base + position
+            self._written_end = offset + len(frame)
+            self._tail.append((offset, record))
+            self._stats["appends"] += 1
+            self._stats["bytes"] += len(frame)
+            self._synced.notify_all()
+            if wait:
+                while self._synced_end < offset + len(frame) and not self._closed:
+                    self._synced.wait()
+        return offset
+
+    async def append_durable(self, record):
+        """Append from async code; resolves with the offset once fsynced"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        # The append may wait on another worker's flock: not on the event loop
+        offset, synced = await asyncio.to_thread(self._append_waiting, record, loop, future)
+        if not synced:
+            await future
+        return offset
+
+    def _append_waiting(self, record, loop, future):
+        """Append, then register ``future`` to be resolved by the next fsync"""
+        offset = self.append(record)
+        with self._lock:
+            end = self._written_end
+            if self._synced_end >= end:
+                return offset, True
+            self._waiters.append((end, loop, future))
+            self._synced.notify_all()
+        return offset, False
+
+    # -----------------------------------------
+    # Reading
+    # -----------------------------------------
+
+    def tail(self, limit=None):
+        """Newest records as ``(offset, record)`` pairs, oldest first"""
+        with self._lock:
+            records = list(self._tail)
+        return records if limit is None else records[-limit:]
+
+    def read(self, after=-1, limit=100):
+        """Up to ``limit`` ``(offset, record)`` pairs with offset > ``after``
+
+        Covers every worker's appends, straight from the mapped segments.
+        """
+        if self._closed:
+            raise SaleLogError("sale log is closed")
+        results = []
+        segments = self._segments()
+        for index, base in enumerate(segments):
+            next_base = segments[index + 1] if index + 1 < len(segments) else None
+            if next_base is not None and next_base <= after + 1:
+                continue
+            with self._mapped(base, sealed=next_base is not None) as (buffer, size):
+                if buffer is None:
+                    continue
+                start = 0
+                if after >= base:
+                    # Skip to the record after ``after`` without decoding payloads
+                    position = 0
+                    while position + HEADER.size <= size and base + position <= after:
+                        length, _ = HEADER.unpack_from(buffer, position)
+                        position += HEADER.size + length
+                    start = position
+                for position, payload in _scan(buffer, start, size):
+                    results.append((base + position, json.loads(payload)))
+                    if len(results) >= limit:
+                        return results
+        return results
+
+    def stats(self):
+        """Append/fsync counters and on-disk layout"""
+        segments = self._segments()
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "segments": len(segments),
+                "segmentBytes": self.segment_bytes,
+                "writtenOffset": self._written_end,
+                "syncedOffset": self._synced_end,
+                "pendingWaiters": len(self._waiters),
+                "tailSize": len(self._tail),
+                "fsync": self.fsync,
+            })
+        stats["appendsPerFsync"] = round(stats["appends"] / stats["fsyncs"], 2) if stats["fsyncs"] else 0.0
+        return stats
+
+    def close(self):
+        """Flush, fsync and release files"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._synced.notify_all()
+        self._flusher.join()
+        with self._lock:
+            for buffer in self._sealed.values():
+                buffer.close()
+            self._sealed.clear()
+            os.close(self._fd)
+            os.close(self._lock_fd)
+
+    # -----------------------------------------
+    # Internals
+    # -----------------------------------------
+
+    def _file_lock(self):
+        return _FileLock(self._lock_fd)
+
+    def _segments(self):
+        return sorted(
+            int(name[:-len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def _open_segment(self, base, recover=False):
+        # Caller holds the file lock
+        path = os.path.join(self.directory, _segment_name(base))
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        self._base = base
+        size = os.fstat(self._fd).st_size
+        if recover and size:
+            with mmap.mmap(self._fd, size, access=mmap.ACCESS_READ) as buffer:
+                end = 0
+                for position, payload in _scan(buffer):
+                    end = position + HEADER.size + len(payload)
+            if end < size:
+                os.ftruncate(self._fd, end)
+                self._stats["recovered"] += 1
+            size = end
+        self._written_end = self._synced_end = base + size
+
+    def _rotate(self, new_base):
+        # Caller holds both locks; another worker may have rotated already
+        os.fsync(self._fd)
+        os.close(self._fd)
+        self._synced_end = max(self._synced_end, self._written_end)
+        latest = self._segments()[-1]
+        self._open_segment(max(latest, new_base))
+        self._stats["rotations"] += 1
+
+    @contextmanager
+    def _mapped(self, base, sealed):
+        """``(buffer, size)`` of a segment, ``(None, 0)`` if it is empty
+
+        A sealed (full) segment is mapped once and kept for ``close``; the
+        active one is still growing, so it is unmapped on exit.
+        """
+        if sealed and base in self._sealed:
+            buffer = self._sealed[base]
+            yield buffer, len(buffer)
+            return
+        path = os.path.join(self.directory, _segment_name(base))
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            buffer = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) if size else None
+        if buffer is None:
+            yield None, 0
+        elif sealed:
+            # Another reader thread may have mapped it first; keep one mapping
+            with self._lock:
+                kept = self._sealed.setdefault(base, buffer)
+            if kept is not buffer:
+                buffer.close()
+            yield kept, len(kept)
+        else:
+            with buffer:
+                yield buffer, size
+
+    def _load_tail(self):
+        # Newest segment(s) only, so startup cost is bounded by segment size
+        needed = self._tail.maxlen
+        if not needed:
+            return
+        records = []
+        for base in reversed(self._segments()):
+            with self._mapped(base, sealed=base != self._base) as (buffer, size):
+                if buffer is None:
+                    continue
+                chunk = [(base + position, json.loads(payload)) for position, payload in _scan(buffer, 0, size)]
+            records[:0] = chunk
+            if len(records) >= needed:
+                break
+        self._tail.extend(records[-needed:])
+
+    def _flush_loop(self):
+        while True:
+            with self._lock:
+                while self._written_end <= self._synced_end and not self._closed:
+                    self._synced.wait()
+                if self._written_end <= self._synced_end and self._closed:
+                    return
+                target = self._written_end
+                fd = os.dup(self._fd)
+            try:
+                if self.fsync:
+                    os.fsync(fd)
+            finally:
+                os.close(fd)
+            with self._lock:
+                self._synced_end = max(self._synced_end, target)
+                self._stats["fsyncs"] += 1
+                ready = [w for w in self._waiters if w[0] <= self._synced_end]
+                self._waiters = [w for w in self._waiters if w[0] > self._synced_end]
+                self._synced.notify_all()
+            for end, loop, future in ready:
+                loop.call_soon_threadsafe(_resolve, future, end)
+
+
+def _resolve(future, value):
+    if not future.done():
+        future.set_result(value)
+
+
+class _FileLock:
+    """Exclusive flock on the log's LOCK file (no-op without fcntl)"""
+
+    def __init__(self, fd):
+        self.fd = fd
+
+    def __enter__(self):
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
@@ -0,0 +1,320 @@
+"""
+Deferred and recurring bulk operations
+
+``scheduled_jobs`` is the queue: each active job carries the time of its
+next run, and the ``(status, run_at)`` index makes "what is due" and "when
+is the next one" single index lookups, so no worker keeps a copy of the
+queue that could drift from what other workers scheduled.
+
+Every uvicorn worker runs the loop, but only the holder of the
+``scheduler_leases`` row fires jobs.  The lease is taken or renewed in the
+same write transaction that claims the due jobs and records their bulk
+operations, and it expires ``lease_ttl`` seconds after its holder stops
+renewing it, so a job is never fired twice and a dead leader is replaced
+within one lease period.
+
+Recurring runs are computed from the first run time (``anchor_at``), so they
+do not drift and a monthly job anchored on the 31st runs on the last day of
+shorter months.  After downtime a job that missed one or more runs fires
+once, immediately, and then continues from its next future occurrence; the
+skipped runs are counted as ``missed``.  An operation claimed by a leader
+that died before starting it is started by the next leader, and the leader
+resumes bulk operations left running by a stopped worker
+(``BulkOperationEngine.recover``) on every pass.
+"""
+
+import asyncio
+import calendar
+import json
+import logging
+import os
+import secrets
+import socket
+import time
+from datetime import datetime, timedelta
+
+from branch_system import bulk_ops
+from branch_system.ids import new_id
+
+logger = logging.getLogger(__name__)
+
+# recurringFreq -> (unit, step)
+CADENCES = {
+    "daily": ("days", 1),
+    "weekly": ("days", 7),
+    "monthly": ("months", 1),
+    "quarterly": ("months", 3),
+}
+
+# Local wall-clock time, like sale_time; sorts correctly as text
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def parse_time(value):
+    """ISO date-time (datetime-local input or with an offset) -> local naive datetime"""
+    try:
+        parsed = value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError(f"รูปแบบวันเวลาไม่ถูกต้อง: {value}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed.replace(microsecond=0)
+
+
+def occurrence(anchor, cadence, index):
+    """Time of run number ``index`` (0 = the anchor) of a recurring job"""
+    unit, step = CADENCES[cadence]
+    if unit == "days":
+        return anchor + timedelta(days=step * index)
+    year, month = divmod(anchor.year * 12 + anchor.month - 1 + step * index, 12)
+    day = min(anchor.day, calendar.monthrange(year, month + 1)[1])
+    return anchor.replace(year=year, month=month + 1, day=day)
+
+
+def next_occurrence(anchor, cadence, index, now):
+    """(index, time) of the first run after ``now`` following run ``index``"""
+    index += 1
+    run_at = occurrence(anchor, cadence, index)
+    while run_at <= now:
+        index += 1
+        run_at = occurrence(anchor, cadence, index)
+    return index, run_at
+
+
+# -- fn(conn, ...) run on the DB threads -----------------------------------
+
+def _insert(conn, job_id, operation_type, branch_ids, data, run_at, cadence):
+    conn.execute("""
+        INSERT INTO scheduled_jobs
+            (id, operation_type, branch_ids, operation_data, cadence, anchor_at, run_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (job_id, operation_type, json.dumps(branch_ids), json.dumps(data, ensure_ascii=False),
+          cadence, run_at.strftime(TIME_FORMAT), run_at.strftime(TIME_FORMAT)))
+
+
+def _cancel(conn, job_id):
+    return conn.execute(
+        "UPDATE scheduled_jobs SET status = 'cancelled' WHERE id = ? AND status = 'active'", (job_id,)
+    ).rowcount > 0
+
+
+def _hold_lease(conn, name, holder, ttl):
+    """Take or renew the lease unless another live holder has it"""
+    now = time.time()
+    conn.execute("""
+        INSERT INTO scheduler_leases (name, holder, expires_at) VALUES (?, ?, ?)
+        ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+        WHERE scheduler_leases.holder = excluded.holder OR scheduler_leases.expires_at < ?
+    """, (name, holder, now + ttl, now))
+    row = conn.execute("SELECT holder FROM scheduler_leases WHERE name = ?", (name,)).fetchone()
+    return row["holder"] == holder
+
+
+def _release_lease(conn, name, holder):
+    conn.execute("DELETE FROM scheduler_leases WHERE name = ? AND holder = ?", (name, holder))
+
+
+def _claim_due(conn, name, holder, ttl, now, orphans):
+    """Under the lease: record an operation for every due job and advance it
+
+    Returns ``(leader, fired, orphaned)``; ``orphaned`` are operations an
+    earlier leader claimed but never started, returned when ``orphans``.
+    """
+    if not _hold_lease(conn, name, holder, ttl):
+        return False, [], []
+
+    orphaned = []
+    if orphans:
+        orphaned = [
+            _operation(row, row["last_operation_id"]) for row in conn.execute("""
+                SELECT j.* FROM scheduled_jobs j
+                JOIN bulk_operations o ON o.id = j.last_operation_id
+                WHERE o.status = 'queued'
+            """)
+        ]
+
+    fired = []
+    due = conn.execute(
+        "SELECT * FROM scheduled_jobs WHERE status = 'active' AND run_at <= ? ORDER BY run_at",
+        (now.strftime(TIME_FORMAT),),
+    ).fetchall()
+    for job in due:
+        operation_id = new_id("OP-")
+        operation = _operation(job, operation_id)
+        bulk_ops.create(conn, *operation)
+
+        run_at = datetime.strptime(job["run_at"], TIME_FORMAT)
+        if job["cadence"]:
+            anchor = datetime.strptime(job["anchor_at"], TIME_FORMAT)
+            index, next_run = next_occurrence(anchor, job["cadence"], job["occurrence"], now)
+            missed = index - job["occurrence"] - 1
+            status = "active"
+        else:
+            index, next_run, missed, status = job["occurrence"], run_at, 0, "done"
+        conn.execute("""
+            UPDATE scheduled_jobs
+            SET run_at = ?, occurrence = ?, status = ?, runs = runs + 1, missed = missed + ?,
+                last_run_at = ?, last_operation_id = ?
+            WHERE id = ?
+        """, (next_run.strftime(TIME_FORMAT), index, status, missed,
+              now.strftime(TIME_FORMAT), operation_id, job["id"]))
+        fired.append((operation, (now - run_at).total_seconds(), missed))
+    return True, fired, orphaned
+
+
+def _operation(job, operation_id):
+    """bulk_ops.create / engine.start arguments for one run of ``job``"""
+    return (operation_id, job["operation_type"], json.loads(job["branch_ids"]),
+            json.loads(job["operation_data"]))
+
+
+def _queue_state(conn, now):
+    row = conn.execute("""
+        SELECT COUNT(*) AS depth, MIN(run_at) AS next_run, SUM(run_at <= ?) AS due
+        FROM scheduled_jobs WHERE status = 'active'
+    """, (now.strftime(TIME_FORMAT),)).fetchone()
+    return row["depth"], row["next_run"], row["due"] or 0
+
+
+def list_jobs(conn, include_finished=False):
+    sql = "SELECT * FROM scheduled_jobs"
+    if not include_finished:
+        sql += " WHERE status = 'active'"
+    return [_job_dict(row) for row in conn.execute(sql + " ORDER BY run_at")]
+
+
+def _job_dict(row):
+    return {
+        "jobId": row["id"],
+        "operationType": row["operation_type"],
+        "branchIds": json.loads(row["branch_ids"]),
+        "scheduleType": "recurring" if row["cadence"] else "scheduled",
+        "recurringFreq": row["cadence"],
+        "nextRunAt": row["run_at"] if row["status"] == "active" else None,
+        "status": row["status"],
+        "runs": row["runs"],
+        "missedRuns": row["missed"],
+        "lastRunAt": row["last_run_at"],
+        "lastOperationId": row["last_operation_id"],
+    }
+
+
+class BulkOperationScheduler:
+    """Lease-guarded loop that starts scheduled bulk operations when due"""
+
+    NAME = "bulk-operations"
+
+    def __init__(self, db, engine, tick=5.0, lease_ttl=30.0, stale_after=60.0):
+        self.db = db
+        self.engine = engine
+        self.tick = tick
+        self.lease_ttl = lease_ttl
+        self.stale_after = stale_after
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+        self.leader = False
+        self._task = None
+        self._wake = asyncio.Event()
+        self._queue = {"depth": 0, "due": 0, "nextRunAt": None}
+        self._lateness = {"last": 0.0, "max": 0.0, "total": 0.0}
+        self._counters = {"fired": 0, "missed": 0, "resumed": 0, "ticks": 0, "errors": 0}
+
+    async def schedule(self, operation_type, branch_ids, data, run_at, cadence=None):
+        """Queue an operation to run at ``run_at``, then every ``cadence`` if given"""
+        branch_ids = bulk_ops.check_request(operation_type, branch_ids, data)
+        if cadence is not None and cadence not in CADENCES:
+            raise ValueError(f"ไม่รู้จักความถี่: {cadence} (ใช้ได้: {', '.join(CADENCES)})")
+        if run_at in (None, ""):
+            raise ValueError("กรุณาระบุวันและเวลาที่ต้องการดำเนินการ")
+        job_id = new_id("JOB-")
+        await self.db.write(_insert, job_id, operation_type, branch_ids, data, parse_time(run_at), cadence)
+        self._wake.set()
+        return next(job for job in await self.jobs() if job["jobId"] == job_id)
+
+    async def cancel(self, job_id):
+        return await self.db.write(_cancel, job_id)
+
+    async def jobs(self, include_finished=False):
+        return await self.db.read(list_jobs, include_finished)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.leader:
+            await self.db.write(_release_lease, self.NAME, self.holder)
+            self.leader = False
+        # Bound to this event loop; the next start may run on another
+        self._wake = asyncio.Event()
+
+    async def run_pending(self, now=None):
+        """One scheduler pass; returns the operation ids started here"""
+        now = now or datetime.now().replace(microsecond=0)
+        was_leader = self.leader
+        self.leader, fired, orphaned = await self.db.write(
+            _claim_due, self.NAME, self.holder, self.lease_ttl, now, not was_leader
+        )
+        started = []
+        for operation in orphaned:
+            self.engine.start(*operation)
+            started.append(operation[0])
+            self._counters["resumed"] += 1
+        if self.leader:
+            resumed = await self.engine.recover(self.stale_after)
+            started += resumed
+            self._counters["resumed"] += len(resumed)
+        for operation, lateness, missed in fired:
+            self.engine.start(*operation)
+            started.append(operation[0])
+            self._counters["fired"] += 1
+            self._counters["missed"] += missed
+            self._lateness["last"] = lateness
+            self._lateness["max"] = max(self._lateness["max"], lateness)
+            self._lateness["total"] += lateness
+
+        depth, next_run, due = await self.db.read(_queue_state, now)
+        self._queue = {"depth": depth, "due": due, "nextRunAt": next_run}
+        self._counters["ticks"] += 1
+        return started
+
+    def stats(self):
+        fired = self._counters["fired"]
+        return dict(
+            self._counters,
+            leader=self.leader,
+            holder=self.holder,
+            queueDepth=self._queue["depth"],
+            dueNow=self._queue["due"],
+            nextRunAt=self._queue["nextRunAt"],
+            latenessSeconds={
+                "last": round(self._lateness["last"], 1),
+                "max": round(self._lateness["max"], 1),
+                "avg": round(self._lateness["total"] / fired, 1) if fired else 0.0,
+            },
+            tick=self.tick,
+            leaseTtl=self.lease_ttl,
+        )
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_pending()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._counters["errors"] += 1
+                logger.exception("Scheduler pass failed")
+            # Sleep until the next job is due, but renew the lease every tick
+            delay = self.tick
+            if self.leader and self._queue["nextRunAt"]:
+                next_run = datetime.strptime(self._queue["nextRunAt"], TIME_FORMAT)
+                delay = min(delay, max((next_run - datetime.now()).total_seconds(), 0.0))
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,151 @@
+"""
+In-process registry of today's active daily sessions
+
+Every POS action needs the caller's locked session for today.  The registry
+keeps it in memory after ``select_daily_branch`` (or the first database
+lookup) so sale recording and the dashboards skip that query.  Entries are
+keyed by session date, so the whole registry empties itself at day rollover.
+
+Ending a session is recorded in ``session_changes``.  Each worker polls that
+table at most once per ``sync_interval`` and drops the users listed there,
+so a session ended through one uvicorn worker stops being served by the
+others within that interval.  Writers additionally guard their inserts with
+``is_locked = TRUE``, so a stale entry can never record a sale.
+"""
+
+import threading
+import time
+
+_LOOKUP = """
+    SELECT * FROM daily_sessions
+    WHERE user_id = ? AND session_date = ? AND is_locked = TRUE
+"""
+
+
+class ActiveSessionCache:
+    """Active sessions by user for the current day, shared by all handlers"""
+
+    def __init__(self, sync_interval=1.0, change_log_size=10000):
+        self.sync_interval = sync_interval
+        self.change_log_size = change_log_size
+        self._sessions = {}         # user id -> session dict
+        self._date = None           # session date the entries belong to
+        self._last_seq = None       # newest session_changes row seen
+        self._next_sync = 0.0
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "invalidations": 0,
+            "rollovers": 0,
+            "syncs": 0,
+        }
+
+    def lookup(self, conn, user_id, session_date, refresh=False):
+        """Active session for ``user_id`` on ``session_date`` or None
+
+        Served from memory when possible; ``refresh`` forces a database read.
+        """
+        self._sync(conn)
+        with self._lock:
+            self._roll_over(session_date)
+            session = None
+            if not refresh and str(session_date) == self._date:
+                session = self._sessions.get(user_id)
+            if session is not None:
+                self._counters["hits"] += 1
+                return session
+            self._counters["misses"] += 1
+
+        row = conn.execute(_LOOKUP, (user_id, session_date)).fetchone()
+        if row is None:
+            self.discard(user_id)
+            return None
+        return self.remember(row)
+
+    def remember(self, row):
+        """Cache a freshly selected or loaded session row"""
+        session = dict(row)
+        with self._lock:
+            self._roll_over(session["session_date"])
+            if session["session_date"] == self._date:
+                self._sessions[session["user_id"]] = session
+        return session
+
+    def discard(self, user_id):
+        """Drop a user's entry in this worker only"""
+        with self._lock:
+            if self._sessions.pop(user_id, None) is not None:
+                self._counters["invalidations"] += 1
+
+    def invalidate(self, conn, user_id):
+        """Drop a user's entry here and tell the other workers (inside a write)"""
+        self.discard(user_id)
+        cursor = conn.execute("INSERT INTO session_changes (user_id) VALUES (?)", (user_id,))
+        if cursor.lastrowid % 1000 == 0:
+            conn.execute(
+                "DELETE FROM session_changes WHERE seq <= ?",
+                (cursor.lastrowid - self.change_log_size,),
+            )
+
+    def clear(self):
+        """Forget every cached session"""
+        with self._lock:
+            self._sessions.clear()
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            counters = dict(self._counters)
+            counters.update({
+                "size": len(self._sessions),
+                "sessionDate": str(self._date) if self._date else None,
+                "syncIntervalSeconds": self.sync_interval,
+            })
+        lookups = counters["hits"] + counters["misses"]
+        counters["hitRatio"] = round(counters["hits"] / lookups, 4) if lookups else 0.0
+        return counters
+
+    # -----------------------------------------
+    # Internals
+    # -----------------------------------------
+
+    def _sync(self, conn):
+        now = time.monotonic()
+        if now < self._next_sync:
+            return
+        self._next_sync = now + self.sync_interval
+
+        if self._last_seq is None:
+            row = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM session_changes").fetchone()
+            with self._lock:
+                self._last_seq = row[0]
+            return
+
+        rows = conn.execute(
+            "SELECT seq, user_id FROM session_changes WHERE seq > ? ORDER BY seq",
+            (self._last_seq,),
+        ).fetchall()
+        with self._lock:
+            self._counters["syncs"] += 1
+            if not rows:
+                return
+            if rows[0][0] != self._last_seq + 1:
+                # Log was pruned past our position: start over
+                self._sessions.clear()
+            for _, user_id in rows:
+                if self._sessions.pop(user_id, None) is not None:
+                    self._counters["invalidations"] += 1
+            self._last_seq = rows[-1][0]
+
+    # Caller holds self._lock
+    def _roll_over(self, session_date):
+        session_date = str(session_date)
+        if session_date == self._date:
+            return
+        if self._date is not None and session_date < self._date:
+            return
+        if self._sessions:
+            self._counters["rollovers"] += 1
+        self._sessions.clear()
+        self._date = session_date
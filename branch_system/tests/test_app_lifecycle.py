@@ -0,0 +1,61 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # branch_system.db, the sale log and exports are opened relative to the cwd
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def wait_finished(client, operation_id):
+    for _ in range(200):
+        progress = client.get(f"/api/bulk-operations/{operation_id}").json()["data"]
+        if progress["status"] in ("completed", "partial", "failed"):
+            return progress
+        time.sleep(0.01)
+    raise AssertionError(f"{operation_id} did not finish: {progress}")
+
+
+def lifecycle(client):
+    login = client.post("/api/branch-auth/login", json={"username": "staff001", "password": "123456"})
+    assert login.status_code == 200 and login.json()["success"]
+
+    scheduler = client.get("/api/system/scheduler").json()
+    assert scheduler["success"], scheduler
+
+    recorded = client.post("/api/sales", json={
+        "saleId": "S-1", "employeeName": "สมใจ", "branchName": "ลาดพร้าว",
+        "items": [], "totalAmount": 100, "timestamp": 0,
+    }).json()
+    assert recorded["success"], recorded
+    logged = client.get("/api/sales/log", params={"after": recorded["data"]["logOffset"] - 1}).json()
+    assert [sale["saleId"] for sale in logged["data"]] == ["S-1"]
+    assert client.get("/api/system/sale-log").json()["success"]
+
+    branches = [b["id"] for b in client.get("/api/bulk-operations/branches").json()["data"]]
+    submitted = client.post("/api/bulk-operations/execute", json={
+        "operationType": "promotion", "branchIds": branches, "operationData": {"discount": 5},
+    }).json()
+    assert submitted["success"], submitted
+    return wait_finished(client, submitted["data"]["operationId"])
+
+
+def test_app_runs_two_lifecycles_in_one_process(workdir):
+    for _ in range(2):
+        with TestClient(main.create_app()) as client:
+            progress = lifecycle(client)
+            assert progress["status"] == "completed"
+        assert main.sale_log is None
+        assert main.schema_status == {}
+
+
+def test_sale_log_endpoints_answer_503_before_startup(workdir):
+    client = TestClient(main.create_app())  # no lifespan: the sale log is not open
+    assert client.get("/api/sales/log").status_code == 503
+    assert client.get("/api/system/sale-log").status_code == 503
@@ -0,0 +1,172 @@
+import asyncio
+import sqlite3
+
+from branch_system import bulk_ops, migrations
+from branch_system.bulk_ops import BulkOperationEngine
+from branch_system.database import AsyncDatabase, ConnectionPool
+
+BRANCHES = ["branch-a", "branch-b", "branch-c"]
+
+
+def open_db(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "branch_system.db"))
+    with pool.write() as conn:
+        migrations.migrate(conn)
+        conn.executemany(
+            "INSERT INTO branches (id, code, name, location) VALUES (?, ?, ?, ?)",
+            [(branch_id, branch_id[-1].upper(), branch_id, "-") for branch_id in BRANCHES],
+        )
+    return AsyncDatabase(pool)
+
+
+def run(db, scenario):
+    try:
+        return asyncio.run(scenario())
+    finally:
+        db.shutdown()
+        db.pool.close()
+
+
+async def wait_finished(engine, operation_id):
+    for _ in range(200):
+        progress = await engine.progress(operation_id)
+        if progress["status"] in bulk_ops.FINISHED:
+            return progress
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"{operation_id} did not finish: {progress}")
+
+
+def test_operation_finishes_with_per_branch_results(tmp_path):
+    db = open_db(tmp_path)
+    engine = BulkOperationEngine(db, concurrency=2)
+
+    async def scenario():
+        submitted = await engine.submit("promotion", BRANCHES + ["branch-x"], {"discount": 10})
+        return await wait_finished(engine, submitted["operationId"])
+
+    progress = run(db, scenario)
+    assert progress["status"] == "partial"
+    assert (progress["successful"], progress["failed"], progress["pending"]) == (3, 1, 0)
+    failed = [r for r in progress["results"] if not r["success"]]
+    assert [r["branchId"] for r in failed] == ["branch-x"]
+    assert failed[0]["attempts"] == 1  # not transient: no retry
+
+
+def test_transient_failure_is_retried(tmp_path, monkeypatch):
+    db = open_db(tmp_path)
+    engine = BulkOperationEngine(db, backoff=0.001)
+    calls = []
+
+    def flaky(conn, branch_id, data, operation_id):
+        calls.append(branch_id)
+        if len(calls) < 3:
+            raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setitem(bulk_ops.ACTIONS, "promotion", flaky)
+
+    async def scenario():
+        submitted = await engine.submit("promotion", ["branch-a"], {})
+        return await wait_finished(engine, submitted["operationId"])
+
+    progress = run(db, scenario)
+    assert progress["status"] == "completed"
+    assert progress["results"][0]["attempts"] == 3
+    assert engine.stats()["retries"] == 2
+
+
+def test_transient_failure_gives_up_after_max_attempts(tmp_path, monkeypatch):
+    db = open_db(tmp_path)
+    engine = BulkOperationEngine(db, max_attempts=2, backoff=0.001)
+
+    def locked(conn, branch_id, data, operation_id):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setitem(bulk_ops.ACTIONS, "promotion", locked)
+
+    async def scenario():
+        submitted = await engine.submit("promotion", ["branch-a", "branch-b"], {})
+        return await wait_finished(engine, submitted["operationId"])
+
+    progress = run(db, scenario)
+    assert progress["status"] == "failed"
+    assert [r["attempts"] for r in progress["results"]] == [2, 2]
+
+
+def test_unrecorded_failure_still_finishes_the_rest(tmp_path, monkeypatch):
+    db = open_db(tmp_path)
+    engine = BulkOperationEngine(db, concurrency=1)
+    record = bulk_ops._record
+
+    def record_fails_for_b(conn, operation_id, branch_id, *args):
+        if branch_id == "branch-b":
+            raise sqlite3.DatabaseError("disk I/O error")
+        return record(conn, operation_id, branch_id, *args)
+
+    monkeypatch.setitem(bulk_ops.ACTIONS, "promotion", lambda conn, branch_id, *_: None)
+    monkeypatch.setattr(bulk_ops, "_record", record_fails_for_b)
+
+    async def scenario():
+        submitted = await engine.submit("promotion", BRANCHES, {})
+        await asyncio.gather(*engine._tasks.values())
+        return await engine.progress(submitted["operationId"])
+
+    progress = run(db, scenario)
+    # branch-c was still worked through; branch-b stays pending for recover
+    assert [r["status"] for r in progress["results"]] == ["succeeded", "pending", "succeeded"]
+    assert progress["status"] == "running"
+    assert engine.stats()["errors"] == 1
+
+
+def test_recover_resumes_pending_branches_of_a_stopped_operation(tmp_path):
+    db = open_db(tmp_path)
+    engine = BulkOperationEngine(db)
+
+    def stopped_midway(conn):
+        bulk_ops.create(conn, "OP-1", "promotion", BRANCHES, {"discount": 5})
+        bulk_ops._start(conn, "OP-1")
+        bulk_ops._apply(conn, "OP-1", "promotion", "branch-a", {"discount": 5}, 1)
+        conn.execute("UPDATE bulk_operations SET started_at = datetime('now', '-5 minutes')")
+        conn.execute("UPDATE bulk_operation_results SET updated_at = datetime('now', '-5 minutes')")
+
+    async def scenario():
+        await db.write(stopped_midway)
+        assert await engine.recover(stale_after=600) == []  # not stale yet
+        resumed = await engine.recover(stale_after=60)
+        assert await engine.recover(stale_after=60) == []  # claimed once
+        return resumed, await wait_finished(engine, "OP-1")
+
+    resumed, progress = run(db, scenario)
+    assert resumed == ["OP-1"]
+    assert progress["status"] == "completed"
+    assert progress["successful"] == 3
+    assert engine.stats()["resumed"] == 1
+
+
+def test_branch_recorded_by_another_runner_is_not_applied_again(tmp_path):
+    db = open_db(tmp_path)
+
+    def scenario(conn):
+        bulk_ops.create(conn, "OP-1", "promotion", ["branch-a"], {})
+        first = bulk_ops._apply(conn, "OP-1", "promotion", "branch-a", {}, 1)
+        second = bulk_ops._apply(conn, "OP-1", "promotion", "branch-a", {}, 1)
+        return first, second, bulk_ops.load(conn, "OP-1")
+
+    with db.pool.write() as conn:
+        first, second, progress = scenario(conn)
+    db.shutdown()
+    db.pool.close()
+    assert (first, second) == (True, False)
+    assert progress["successful"] == 1
+
+
+def test_list_branches_serves_branch_table_ids(tmp_path):
+    db = open_db(tmp_path)
+    with db.pool.write() as conn:
+        conn.execute("UPDATE branches SET is_active = FALSE WHERE id = 'branch-c'")
+    with db.pool.read() as conn:
+        branches = bulk_ops.list_branches(conn)
+    db.shutdown()
+    db.pool.close()
+    assert [b["id"] for b in branches] == BRANCHES
+    assert [b["status"] for b in branches] == ["active", "active", "inactive"]
+    assert all(b["size"] == "small" and b["revenue"] == 0 for b in branches)
@@ -0,0 +1,111 @@
+import asyncio
+from datetime import date
+
+import pytest
+
+from branch_system import migrations, rollups
+from branch_system.database import ConnectionPool
+from branch_system.exports import ReportExporter, file_response
+
+CONTENT = bytes(range(256)) * 40  # 10240 bytes
+
+
+@pytest.fixture
+def export_path(tmp_path):
+    path = tmp_path / "sales_20260101_20260131_all_x.csv"
+    path.write_bytes(CONTENT)
+    return str(path)
+
+
+def read(response):
+    async def body():
+        return b"".join([chunk async for chunk in response.body_iterator])
+
+    return asyncio.run(body())
+
+
+def test_whole_file_without_range(export_path):
+    response = file_response(export_path)
+    assert response.status_code == 200
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert response.headers["Content-Length"] == str(len(CONTENT))
+    assert "Content-Range" not in response.headers
+    assert read(response) == CONTENT
+
+
+@pytest.mark.parametrize("header, start, end", [
+    ("bytes=0-99", 0, 99),
+    ("bytes=10000-", 10000, 10239),
+    ("bytes=10000-99999", 10000, 10239),  # end clamped to the file
+    ("bytes=-240", 10000, 10239),  # suffix: the last 240 bytes
+    ("bytes=-99999", 0, 10239),  # suffix longer than the file
+])
+def test_single_range(export_path, header, start, end):
+    response = file_response(export_path, header)
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == f"bytes {start}-{end}/{len(CONTENT)}"
+    assert response.headers["Content-Length"] == str(end - start + 1)
+    assert read(response) == CONTENT[start:end + 1]
+
+
+@pytest.mark.parametrize("header", ["bytes=10240-", "bytes=20000-30000", "bytes=500-100", "bytes=-0"])
+def test_unsatisfiable_range(export_path, header):
+    response = file_response(export_path, header)
+    assert response.status_code == 416
+    assert response.headers["Content-Range"] == f"bytes */{len(CONTENT)}"
+
+
+@pytest.mark.parametrize("header", ["bytes=-", "bytes=0-10,20-30", "items=0-10"])
+def test_unsupported_range_serves_whole_file(export_path, header):
+    response = file_response(export_path, header)
+    assert response.status_code == 200
+    assert read(response) == CONTENT
+
+
+def test_if_range_matching_etag_resumes(export_path):
+    etag = file_response(export_path).headers["ETag"]
+    response = file_response(export_path, "bytes=5000-", etag)
+    assert response.status_code == 206
+    assert read(response) == CONTENT[5000:]
+
+
+def test_stale_if_range_serves_whole_file(export_path):
+    response = file_response(export_path, "bytes=5000-", '"0-0"')
+    assert response.status_code == 200
+    assert response.headers["Content-Length"] == str(len(CONTENT))
+    assert read(response) == CONTENT
+
+
+def sales_db(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "branch_system.db"))
+    with pool.write() as conn:
+        migrations.migrate(conn)
+        for branch_id in ("branch-a", "branch-b"):
+            conn.execute("INSERT INTO branches (id, code, name, location) VALUES (?, ?, ?, '-')",
+                         (branch_id, branch_id, branch_id))
+            conn.execute(
+                "INSERT INTO sales_records (id, user_id, branch_id, branch_name, product_name, quantity, "
+                "unit_price, total_amount, sale_date, sale_time) "
+                "VALUES (?, 'emp-001', ?, ?, 'มะม่วงอบแห้ง', 1, 100, 100, '2026-01-15', '2026-01-15 10:00:00')",
+                (f"sale-{branch_id}", branch_id, branch_id),
+            )
+            rollups.add_sales(conn, [(branch_id, "2026-01-15", "มะม่วงอบแห้ง", 1, 100)])
+    return pool
+
+
+def test_export_covers_only_allowed_branches_and_only_its_owner_downloads(tmp_path):
+    pool = sales_db(tmp_path)
+    exporter = ReportExporter(str(tmp_path / "exports"))
+    start, end = date(2026, 1, 1), date(2026, 2, 1)
+    try:
+        with pool.read() as conn:
+            everything = exporter.export(conn, "csv", start, end)
+            mine = exporter.export(conn, "csv", start, end, allowed={"branch-a"}, owner="emp-001")
+            with pytest.raises(PermissionError):
+                exporter.export(conn, "csv", start, end, "branch-b", allowed={"branch-a"}, owner="emp-001")
+    finally:
+        pool.close()
+    assert (everything["rows"], mine["rows"]) == (2, 1)
+    assert exporter.path(mine["filename"], "emp-001") is not None
+    assert exporter.path(mine["filename"], "emp-002") is None
+    assert exporter.path(everything["filename"], "emp-001") is None
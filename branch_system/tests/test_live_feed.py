@@ -0,0 +1,81 @@
+import asyncio
+
+from branch_system.live_feed import LiveFeed
+
+
+def publish(feed, count, branch="BR-001"):
+    for n in range(count):
+        feed.publish({"id": f"sale_{feed.cursor + 1}", "branchId": branch, "totalAmount": n})
+
+
+def test_latest_view_is_newest_first():
+    feed = LiveFeed(history_size=100)
+    publish(feed, 10)
+    events, cursor, reset = feed.since(limit=3)
+    assert [e.cursor for e in events] == [10, 9, 8]
+    assert cursor == 10 and not reset
+
+
+def test_cursor_poll_pages_oldest_first_without_skipping():
+    feed = LiveFeed(history_size=1000)
+    publish(feed, 5)
+    _, cursor, _ = feed.since()
+    publish(feed, 450)
+
+    delivered = []
+    while True:
+        events, cursor, reset = feed.since(cursor, limit=200)
+        assert not reset
+        delivered += [e.cursor for e in events]
+        if cursor >= feed.cursor:
+            break
+    assert delivered == list(range(6, 456))
+
+
+def test_cursor_poll_with_nothing_new():
+    feed = LiveFeed()
+    publish(feed, 3)
+    assert feed.since(3) == ([], 3, False)
+
+
+def test_branch_filter_advances_cursor_past_other_branches():
+    feed = LiveFeed()
+    publish(feed, 2, branch="BR-001")
+    publish(feed, 3, branch="BR-002")
+    events, cursor, _ = feed.since(0, branches=["BR-001"])
+    assert [e.cursor for e in events] == [1, 2]
+    assert cursor == 5
+
+
+def test_unknown_cursor_resets_to_latest():
+    feed = LiveFeed(history_size=10)
+    publish(feed, 30)
+    events, cursor, reset = feed.since(2, limit=5)
+    assert reset
+    assert [e.cursor for e in events] == [30, 29, 28, 27, 26]
+    assert cursor == 30
+    assert feed.since(99)[2]  # from before a restart
+
+
+def test_subscribe_replays_after_cursor():
+    async def scenario():
+        feed = LiveFeed()
+        publish(feed, 4)
+        subscription = feed.subscribe(cursor=2)
+        publish(feed, 1)
+        events, dropped = await subscription.next_batch(timeout=0.1)
+        return [e.cursor for e in events], dropped
+
+    assert asyncio.run(scenario()) == ([3, 4, 5], 0)
+
+
+def test_slow_subscriber_drops_oldest_and_reports_it():
+    async def scenario():
+        feed = LiveFeed(queue_size=3)
+        subscription = feed.subscribe()
+        publish(feed, 5)
+        return await subscription.next_batch(timeout=0.1)
+
+    events, dropped = asyncio.run(scenario())
+    assert [e.cursor for e in events] == [3, 4, 5]
+    assert dropped == 2
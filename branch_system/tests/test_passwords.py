@@ -0,0 +1,55 @@
+import asyncio
+import threading
+
+import pytest
+
+from branch_system.passwords import PasswordHasher, PasswordQueueFull
+
+
+def test_verify_and_upgrade_rehashes_outdated_cost():
+    hasher = PasswordHasher(rounds=5, max_workers=1)
+    old_hash = PasswordHasher(rounds=4).hash("123456")
+    try:
+        ok, new_hash = asyncio.run(hasher.verify_and_upgrade("123456", old_hash))
+    finally:
+        hasher.shutdown()
+    assert ok and new_hash.startswith("$2b$05$")
+    assert hasher.stats()["rehashed"] == 1
+
+
+def test_cancelled_queued_checks_free_their_slots():
+    hasher = PasswordHasher(rounds=4, max_workers=1, max_queue=3)
+    hashed = hasher.hash("123456")
+    release = threading.Event()
+
+    async def scenario():
+        # Occupy the only worker so every check below stays queued
+        blocker = hasher._executor.submit(release.wait)
+        checks = [asyncio.create_task(hasher.verify_and_upgrade("123456", hashed)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        with pytest.raises(PasswordQueueFull):
+            await hasher.verify_and_upgrade("123456", hashed)
+        for check in checks:
+            check.cancel()
+        await asyncio.gather(*checks, return_exceptions=True)
+        release.set()
+        await asyncio.wrap_future(blocker)
+        # The slots are free again: a new check is accepted and completes
+        return await hasher.verify_and_upgrade("123456", hashed)
+
+    try:
+        assert asyncio.run(scenario()) == (True, None)
+    finally:
+        release.set()
+        hasher.shutdown()
+    stats = hasher.stats()
+    assert (stats["queued"], stats["running"], stats["completed"]) == (0, 0, 1)
+
+
+def test_check_after_shutdown_frees_its_slot():
+    hasher = PasswordHasher(rounds=4, max_workers=1)
+    hashed = hasher.hash("123456")
+    hasher.shutdown()
+    with pytest.raises(RuntimeError):
+        asyncio.run(hasher.verify_and_upgrade("123456", hashed))
+    assert hasher.stats()["queued"] == 0
@@ -0,0 +1,50 @@
+import asyncio
+import os
+
+import pytest
+
+from branch_system.sale_log import SaleLog, SaleLogError
+
+
+def segment_mappings(directory):
+    """Mappings of the log's segment files in this process (Linux)"""
+    with open("/proc/self/maps") as maps:
+        return sum(1 for line in maps if line.rstrip().endswith(".seg") and str(directory) in line)
+
+
+def test_append_durable_and_read_across_segments(tmp_path):
+    log = SaleLog(str(tmp_path), segment_bytes=256, tail_size=5)
+
+    async def scenario():
+        return await asyncio.gather(*(log.append_durable({"saleId": f"S{i}"}) for i in range(20)))
+
+    try:
+        offsets = asyncio.run(scenario())
+        records = log.read(limit=100)
+        after = log.read(after=offsets[9], limit=3)
+        stats = log.stats()
+    finally:
+        log.close()
+    assert sorted(offsets) == [offset for offset, _ in records]
+    assert sorted(record["saleId"] for _, record in records) == sorted(f"S{i}" for i in range(20))
+    assert [offset for offset, _ in after] == [o for o in sorted(offsets) if o > offsets[9]][:3]
+    assert stats["segments"] > 1 and stats["syncedOffset"] == stats["writtenOffset"]
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/maps"), reason="needs /proc/self/maps")
+def test_reads_do_not_keep_the_active_segment_mapped(tmp_path):
+    log = SaleLog(str(tmp_path), segment_bytes=256)
+    try:
+        for i in range(20):
+            log.append({"saleId": f"S{i}"}, wait=True)
+        log.read(limit=100)
+        sealed = segment_mappings(tmp_path)
+        for _ in range(10):
+            log.read(limit=100)
+        # Only the full segments stay mapped, however often the log is read
+        assert segment_mappings(tmp_path) == sealed == log.stats()["segments"] - 1
+    finally:
+        log.close()
+    assert segment_mappings(tmp_path) == 0
+    with pytest.raises(SaleLogError):
+        log.read()
@@ -0,0 +1,135 @@
+import asyncio
+from datetime import datetime
+
+from branch_system import migrations, scheduler
+from branch_system.database import AsyncDatabase, ConnectionPool
+from branch_system.scheduler import BulkOperationScheduler, next_occurrence, occurrence
+
+
+class RecordingEngine:
+    """Stands in for BulkOperationEngine: records what the scheduler starts"""
+
+    def __init__(self):
+        self.started = []
+
+    def start(self, operation_id, operation_type, branch_ids, data):
+        self.started.append(operation_id)
+
+    async def recover(self, stale_after):
+        return []
+
+
+def open_db(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "branch_system.db"))
+    with pool.write() as conn:
+        migrations.migrate(conn)
+    return AsyncDatabase(pool)
+
+
+def run(db, scenario):
+    try:
+        return asyncio.run(scenario())
+    finally:
+        db.shutdown()
+        db.pool.close()
+
+
+def test_daily_and_weekly_occurrences():
+    anchor = datetime(2026, 3, 1, 9, 30)
+    assert occurrence(anchor, "daily", 0) == anchor
+    assert occurrence(anchor, "daily", 31) == datetime(2026, 4, 1, 9, 30)
+    assert occurrence(anchor, "weekly", 2) == datetime(2026, 3, 15, 9, 30)
+
+
+def test_monthly_anchor_on_the_31st_runs_on_month_end():
+    anchor = datetime(2026, 1, 31, 23, 0)
+    runs = [occurrence(anchor, "monthly", index) for index in range(5)]
+    # Anchored, not chained: March is back on the 31st after February's 28th
+    assert [run.date().isoformat() for run in runs] == [
+        "2026-01-31", "2026-02-28", "2026-03-31", "2026-04-30", "2026-05-31",
+    ]
+    assert occurrence(datetime(2027, 11, 30), "quarterly", 1) == datetime(2028, 2, 29)
+
+
+def test_next_occurrence_skips_past_runs():
+    anchor = datetime(2026, 5, 1, 8, 0)
+    assert next_occurrence(anchor, "daily", 0, datetime(2026, 5, 1, 8, 0)) == (1, datetime(2026, 5, 2, 8, 0))
+    # Down from the 2nd to the 5th at noon: runs 2, 3 and 4 are behind us
+    assert next_occurrence(anchor, "daily", 1, datetime(2026, 5, 5, 12, 0)) == (5, datetime(2026, 5, 6, 8, 0))
+
+
+def test_catch_up_fires_once_and_counts_missed_runs(tmp_path):
+    db = open_db(tmp_path)
+    engine = RecordingEngine()
+    bulk_scheduler = BulkOperationScheduler(db, engine)
+
+    async def scenario():
+        job = await bulk_scheduler.schedule("promotion", ["branch-a"], {}, "2026-05-01T08:00", "daily")
+        started = await bulk_scheduler.run_pending(datetime(2026, 5, 4, 9, 0))
+        return job, started, await bulk_scheduler.jobs()
+
+    job, started, jobs = run(db, scenario)
+    assert job["nextRunAt"] == "2026-05-01 08:00:00"
+    assert len(started) == 1 and engine.started == started
+    # Runs at the 1st (fired late), 2nd, 3rd and 4th were due; one fires, three are missed
+    assert jobs[0]["missedRuns"] == 3
+    assert jobs[0]["nextRunAt"] == "2026-05-05 08:00:00"
+    assert jobs[0]["lastOperationId"] == started[0]
+    assert bulk_scheduler.stats()["missed"] == 3
+
+
+def test_one_off_job_fires_once_then_is_done(tmp_path):
+    db = open_db(tmp_path)
+    engine = RecordingEngine()
+    bulk_scheduler = BulkOperationScheduler(db, engine)
+
+    async def scenario():
+        await bulk_scheduler.schedule("promotion", ["branch-a"], {}, "2026-05-01T08:00")
+        assert await bulk_scheduler.run_pending(datetime(2026, 5, 1, 7, 59)) == []
+        first = await bulk_scheduler.run_pending(datetime(2026, 5, 1, 8, 0))
+        second = await bulk_scheduler.run_pending(datetime(2026, 5, 1, 8, 5))
+        return first, second, await bulk_scheduler.jobs(include_finished=True)
+
+    first, second, jobs = run(db, scenario)
+    assert len(first) == 1 and second == []
+    assert jobs[0]["status"] == "done" and jobs[0]["runs"] == 1
+
+
+def test_only_the_lease_holder_claims_due_jobs(tmp_path):
+    db = open_db(tmp_path)
+    engines = RecordingEngine(), RecordingEngine()
+    leader, follower = (BulkOperationScheduler(db, engine, lease_ttl=30) for engine in engines)
+    now = datetime(2026, 5, 1, 8, 0)
+
+    async def scenario():
+        await leader.schedule("promotion", ["branch-a"], {}, "2026-05-01T08:00", "daily")
+        await leader.run_pending(now)
+        await follower.run_pending(now)
+        return leader.leader, follower.leader
+
+    assert run(db, scenario) == (True, False)
+    assert len(engines[0].started) == 1 and engines[1].started == []
+
+
+def test_expired_lease_passes_over_and_orphans_are_started(tmp_path):
+    db = open_db(tmp_path)
+    engines = RecordingEngine(), RecordingEngine()
+    first, second = (BulkOperationScheduler(db, engine, lease_ttl=30) for engine in engines)
+    now = datetime(2026, 5, 1, 8, 0)
+
+    def expire_lease(conn):
+        conn.execute("UPDATE scheduler_leases SET expires_at = 0")
+
+    async def scenario():
+        await first.schedule("promotion", ["branch-a"], {}, "2026-05-01T08:00")
+        # The first leader claims the job but dies before starting its operation
+        fired = await db.write(scheduler._claim_due, first.NAME, first.holder, 30, now, False)
+        assert fired[0] and len(fired[1]) == 1
+        assert await second.run_pending(now) == []  # lease still live
+        await db.write(expire_lease)
+        return fired[1][0][0][0], await second.run_pending(now)
+
+    operation_id, started = run(db, scenario)
+    assert second.leader
+    assert started == [operation_id]
+    assert second.stats()["resumed"] == 1
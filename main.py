@@ -1,34 +1,44 @@
-from fastapi import FastAPI, Request, HTTPException, Depends, status
+from fastapi import APIRouter, FastAPI, Request, HTTPException, Depends, status, WebSocket, WebSocketDisconnect
 import time
-from fastapi.responses import HTMLResponse, FileResponse, Response, JSONResponse
+from fastapi.responses import HTMLResponse, FileResponse, Response, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
-import uvicorn
+import asyncio
 import os
 import jwt
-import bcrypt
-import sqlite3
 import json
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from typing import Optional, List
 from pathlib import Path
 
-app = FastAPI(title="ระบบจัดการสต๊อคผลไม้อบแห้ง", version="1.0.0")
-
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Mount static files
-if os.path.exists("web"):
-    app.mount("/static", StaticFiles(directory="web"), name="static")
+from branch_system import migrations, rollups
+from branch_system.analytics import AnalyticsEngine
+from branch_system.bulk_ops import BulkOperationEngine, list_branches
+from branch_system.database import AsyncDatabase, ConnectionPool
+from branch_system.exports import ReportExporter, export_window, file_response
+from branch_system.forecast import ForecastEngine
+from branch_system.ids import new_id
+from branch_system.live_feed import LiveFeed, SSEResponse
+from branch_system.pages import PageCache
+from branch_system.passwords import PasswordHasher, PasswordQueueFull
+from branch_system.principal_cache import PrincipalCache
+from branch_system.rankings import RankingIndex
+from branch_system.routing import RoutePlanner
+from branch_system.sale_log import SaleLog
+from branch_system.scheduler import BulkOperationScheduler
+from branch_system.sessions import ActiveSessionCache
+
+# Every endpoint is registered on this router; create_app() builds the
+# FastAPI application around it and importing this module opens nothing
+router = APIRouter()
+
+# HTML pages are served from memory with ETag/304 and gzip/brotli variants;
+# BRANCH_SYSTEM_DEV=1 reloads edited files under web/ on the next request
+PAGE_CACHE_DEV_MODE = os.environ.get("BRANCH_SYSTEM_DEV") == "1"
+page_cache = PageCache("web", dev_mode=PAGE_CACHE_DEV_MODE)
 
 # =========================================
 # BRANCH LOGIN SYSTEM
@@ -42,91 +52,62 @@ JWT_EXPIRATION_DELTA = timedelta(days=7)
 # Security
 security = HTTPBearer()
 
+# Authenticated principals by bearer token (claims + parsed user record)
+PRINCIPAL_CACHE_TTL = 30  # seconds
+principal_cache = PrincipalCache(ttl=PRINCIPAL_CACHE_TTL, max_entries=10000)
+
+# Password hashing runs on its own worker pool; raising BCRYPT_ROUNDS
+# upgrades stored hashes transparently on each user's next login
+BCRYPT_ROUNDS = 12
+PASSWORD_WORKERS = os.cpu_count() or 1
+PASSWORD_MAX_QUEUE = 256
+password_hasher = PasswordHasher(
+    rounds=BCRYPT_ROUNDS, max_workers=PASSWORD_WORKERS, max_queue=PASSWORD_MAX_QUEUE
+)
+
 # Database initialization
 DB_PATH = "branch_system.db"
+DB_MAX_READERS = 8
+
+# Shared WAL-mode connection pool for branch_system.db
+db_pool = ConnectionPool(DB_PATH, max_readers=DB_MAX_READERS)
+
+# Async handlers run their queries on dedicated DB threads through this
+async_db = AsyncDatabase(db_pool)
+
+# Today's locked session per user; other workers' session ends are picked
+# up from the session_changes table at most once per sync interval
+SESSION_SYNC_INTERVAL = 1.0  # seconds
+session_cache = ActiveSessionCache(sync_interval=SESSION_SYNC_INTERVAL)
+
+# Schema version and hot-query plan check from the last startup
+schema_status = {}
 
 def init_database():
     """Initialize SQLite database for branch login system"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # Users table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id TEXT PRIMARY KEY,
-            username TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            first_name TEXT NOT NULL,
-            last_name TEXT NOT NULL,
-            employee_id TEXT UNIQUE NOT NULL,
-            email TEXT,
-            phone TEXT,
-            role TEXT NOT NULL,
-            allowed_branches TEXT NOT NULL,
-            is_active BOOLEAN DEFAULT TRUE,
-            avatar TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Branches table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS branches (
-            id TEXT PRIMARY KEY,
-            code TEXT UNIQUE NOT NULL,
-            name TEXT NOT NULL,
-            location TEXT NOT NULL,
-            is_active BOOLEAN DEFAULT TRUE,
-            manager_id TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Daily sessions table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS daily_sessions (
-            id TEXT PRIMARY KEY,
-            user_id TEXT NOT NULL,
-            branch_id TEXT NOT NULL,
-            branch_name TEXT NOT NULL,
-            session_date DATE NOT NULL,
-            start_time TIMESTAMP NOT NULL,
-            end_time TIMESTAMP,
-            is_locked BOOLEAN DEFAULT TRUE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id),
-            FOREIGN KEY (branch_id) REFERENCES branches (id)
-        )
-    ''')
-    
-    # Sales records table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sales_records (
-            id TEXT PRIMARY KEY,
-            user_id TEXT NOT NULL,
-            branch_id TEXT NOT NULL,
-            branch_name TEXT NOT NULL,
-            session_id TEXT,
-            product_name TEXT NOT NULL,
-            quantity DECIMAL(10,3) NOT NULL,
-            unit TEXT NOT NULL DEFAULT 'กิโลกรัม',
-            unit_price DECIMAL(10,2) NOT NULL,
-            total_amount DECIMAL(10,2) NOT NULL,
-            customer_type TEXT DEFAULT 'walk-in',
-            payment_method TEXT DEFAULT 'cash',
-            notes TEXT,
-            sale_date DATE NOT NULL,
-            sale_time TIMESTAMP NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id),
-            FOREIGN KEY (branch_id) REFERENCES branches (id),
-            FOREIGN KEY (session_id) REFERENCES daily_sessions (id)
-        )
-    ''')
+    with db_pool.write() as conn:
+        applied = migrations.migrate(conn)
+        _seed_demo_data(conn.cursor())
+        migrations.analyze(conn, full=bool(applied))
+        schema_status["version"] = migrations.current_version(conn)
     
-    # Insert demo data if not exists
+    with db_pool.read() as conn:
+        schema_status["queryPlans"] = migrations.check_query_plans(conn)
+
+# bcrypt (cost 12) of the demo passwords, 123456 for emp-001..005 and admin123
+# for emp-006, so seeding an empty database costs no hashing; a different
+# BCRYPT_ROUNDS re-hashes them on first login like any other stored hash
+DEMO_PASSWORD_HASHES = [
+    "$2b$12$GfiE.njnCvGq4Gu1o9FZBeZ9RUCLp1geaSUMlGJc9pXYv8zetLNBa",
+    "$2b$12$LTlETYz/dtzkReiUySBgneKc6d2VDVmMwFBW3xYivy4ZcA7JBgbVu",
+    "$2b$12$eR0NJ1FEzAiIfXbhDduWP.K7CL7YYLl4iu6pS63husYrwoJ.aMG6q",
+    "$2b$12$KLPkExM52J.Tt82ZwcZmVu1mfUQ3Ow1H/.xR8VT3pG6s2kB.adjrK",
+    "$2b$12$oS5sDfyC3./98dBMEXhWxOVYUaIPxFqOaQ/YMvOchdtX7yI7ikQje",
+    "$2b$12$XtB/LNyTIK27qt79.jp.SOCfasWWDr/T825aSJ3VZTFnGgaZqLFpW",
+]
+
+def _seed_demo_data(cursor):
+    """Insert demo branches and users into an empty database"""
     cursor.execute("SELECT COUNT(*) FROM branches")
     if cursor.fetchone()[0] == 0:
         demo_branches = [
@@ -141,27 +122,23 @@ def init_database():
     
     cursor.execute("SELECT COUNT(*) FROM users")
     if cursor.fetchone()[0] == 0:
-        # Hash passwords
-        def hash_password(password: str) -> str:
-            return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-        
         demo_users = [
-            ('emp-001', 'staff001', hash_password('123456'), 'สมใจ', 'ใจดี', 'EMP001', 
+            ('emp-001', 'staff001', DEMO_PASSWORD_HASHES[0], 'สมใจ', 'ใจดี', 'EMP001', 
              'somjai@example.com', '081-234-5678', 'STAFF', 
              '["branch-central-ladprao", "branch-siam-paragon"]', True, '👩'),
-            ('emp-002', 'staff002', hash_password('123456'), 'มานะ', 'ขยัน', 'EMP002',
+            ('emp-002', 'staff002', DEMO_PASSWORD_HASHES[1], 'มานะ', 'ขยัน', 'EMP002',
              'mana@example.com', '082-345-6789', 'STAFF',
              '["branch-siam-paragon", "branch-emquartier"]', True, '👨'),
-            ('emp-003', 'staff003', hash_password('123456'), 'สุภา', 'รักงาน', 'EMP003',
+            ('emp-003', 'staff003', DEMO_PASSWORD_HASHES[2], 'สุภา', 'รักงาน', 'EMP003',
              'supa@example.com', '083-456-7890', 'STAFF',
              '["branch-emquartier"]', True, '👩'),
-            ('emp-004', 'manager001', hash_password('123456'), 'วิชัย', 'จัดการดี', 'MGR001',
+            ('emp-004', 'manager001', DEMO_PASSWORD_HASHES[3], 'วิชัย', 'จัดการดี', 'MGR001',
              'wichai@example.com', '084-567-8901', 'MANAGER',
              '["branch-central-ladprao", "branch-siam-paragon", "branch-emquartier"]', True, '👨‍💼'),
-            ('emp-005', 'manager002', hash_password('123456'), 'ปราณี', 'ผู้นำทีม', 'MGR002',
+            ('emp-005', 'manager002', DEMO_PASSWORD_HASHES[4], 'ปราณี', 'ผู้นำทีม', 'MGR002',
              'pranee@example.com', '085-678-9012', 'MANAGER',
              '["branch-siam-paragon", "branch-emquartier"]', True, '👩‍💼'),
-            ('emp-006', 'admin', hash_password('admin123'), 'ธนา', 'ผู้ดูแล', 'ADM001',
+            ('emp-006', 'admin', DEMO_PASSWORD_HASHES[5], 'ธนา', 'ผู้ดูแล', 'ADM001',
              'admin@example.com', '086-789-0123', 'ADMIN',
              '["branch-central-ladprao", "branch-siam-paragon", "branch-emquartier"]', True, '👤'),
         ]
@@ -171,9 +148,6 @@ def init_database():
                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
             demo_users
         )
-    
-    conn.commit()
-    conn.close()
 
 # Pydantic models
 class LoginRequest(BaseModel):
@@ -202,6 +176,13 @@ class SalesRecordRequest(BaseModel):
     paymentMethod: str = "cash"
     notes: Optional[str] = None
 
+class BatchSaleItem(SalesRecordRequest):
+    # Client-generated key (e.g. UUID per sale) so replays are not recorded twice
+    idempotencyKey: Optional[str] = None
+
+class BatchSalesRecordRequest(BaseModel):
+    records: List[BatchSaleItem]
+
 class SalesRecord(BaseModel):
     id: str
     userId: str
@@ -253,44 +234,39 @@ def create_access_token(data: dict) -> str:
     encoded_jwt = jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
     return encoded_jwt
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
-
 def get_user_by_username(username: str) -> Optional[dict]:
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
-    user = cursor.fetchone()
-    conn.close()
+    with db_pool.read() as conn:
+        user = conn.execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
     return dict(user) if user else None
 
 def get_user_branches(user_id: str) -> List[dict]:
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    # Get user's allowed branches
-    cursor.execute("SELECT allowed_branches FROM users WHERE id = ?", (user_id,))
-    user_result = cursor.fetchone()
-    if not user_result:
-        conn.close()
-        return []
-    
-    allowed_branch_ids = json.loads(user_result['allowed_branches'])
-    
-    # Get branch details
-    placeholders = ','.join('?' * len(allowed_branch_ids))
-    cursor.execute(f"SELECT * FROM branches WHERE id IN ({placeholders}) AND is_active = TRUE", 
-                   allowed_branch_ids)
-    branches = cursor.fetchall()
-    conn.close()
+    with db_pool.read() as conn:
+        cursor = conn.cursor()
+        
+        # Get user's allowed branches
+        cursor.execute("SELECT allowed_branches FROM users WHERE id = ?", (user_id,))
+        user_result = cursor.fetchone()
+        if not user_result:
+            return []
+        
+        allowed_branch_ids = json.loads(user_result['allowed_branches'])
+        
+        # Get branch details
+        placeholders = ','.join('?' * len(allowed_branch_ids))
+        cursor.execute(f"SELECT * FROM branches WHERE id IN ({placeholders}) AND is_active = TRUE", 
+                       allowed_branch_ids)
+        branches = cursor.fetchall()
     
     return [dict(branch) for branch in branches]
 
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    token = credentials.credentials
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+    
     try:
-        payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
@@ -299,30 +275,344 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
         if user is None:
             raise HTTPException(status_code=401, detail="User not found")
         
-        return user
+        if not user['is_active']:
+            raise HTTPException(status_code=403, detail="บัญชีผู้ใช้ถูกระงับ")
+        
+        return principal_cache.put(token, payload, user)
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
 
-# Initialize database
-init_database()
+def invalidate_user_cache(user_id: str):
+    """Forget cached principals after a user record changes"""
+    principal_cache.invalidate_user(user_id)
+
+# Query functions for the session and sales endpoints. Each takes a pooled
+# connection as its first argument and runs on a DB thread via async_db.
+def _update_password_hash(conn, user_id: str, password_hash: str):
+    conn.execute(
+        "UPDATE users SET password_hash = ?, updated_at = ? WHERE id = ?",
+        (password_hash, datetime.now(), user_id)
+    )
+
+def _find_active_session(conn, user_id: str, session_date, refresh: bool = False):
+    # Served from session_cache; refresh=True goes to daily_sessions
+    return session_cache.lookup(conn, user_id, session_date, refresh=refresh)
+
+def _require_active_session(conn, user_id: str, session_date, refresh: bool = False):
+    session = _find_active_session(conn, user_id, session_date, refresh)
+    if not session:
+        raise HTTPException(status_code=400, detail="ไม่พบข้อมูลการทำงานสำหรับวันนี้ กรุณาเลือกสาขาก่อน")
+    return session
+
+# Sale insert that only succeeds while the session is still locked, so a
+# cached session ended by another worker can never receive a sale
+INSERT_SALE_SQL = """
+    INSERT INTO sales_records (
+        id, user_id, branch_id, branch_name, session_id,
+        product_name, quantity, unit, unit_price, total_amount,
+        customer_type, payment_method, notes,
+        sale_date, sale_time
+    )
+    SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+    FROM daily_sessions WHERE id = ? AND is_locked = TRUE
+"""
+
+def _open_daily_session(conn, user_id: str, branch_id: str):
+    cursor = conn.cursor()
+    
+    # Get branch info
+    cursor.execute("SELECT * FROM branches WHERE id = ?", (branch_id,))
+    branch = cursor.fetchone()
+    if not branch:
+        raise HTTPException(status_code=404, detail="ไม่พบสาขาที่เลือก")
+    
+    # Check if user already has session today
+    today = datetime.now().date()
+    if _find_active_session(conn, user_id, today, refresh=True):
+        raise HTTPException(status_code=400, detail="คุณได้เลือกสาขาสำหรับวันนี้แล้ว")
+    
+    # Create new session
+    session_id = new_id("session_")
+    now = datetime.now()
+    
+    cursor.execute("""
+        INSERT INTO daily_sessions (id, user_id, branch_id, branch_name, session_date, start_time, is_locked)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (session_id, user_id, branch_id, branch['name'], today, now, True))
+    session_cache.remember(
+        cursor.execute("SELECT * FROM daily_sessions WHERE id = ?", (session_id,)).fetchone()
+    )
+    
+    return session_id, branch['name'], today, now
+
+def _close_daily_session(conn, user_id: str):
+    today = datetime.now().date()
+    now = datetime.now()
+    
+    cursor = conn.execute("""
+        UPDATE daily_sessions 
+        SET end_time = ?, is_locked = FALSE 
+        WHERE user_id = ? AND session_date = ? AND is_locked = TRUE
+    """, (now, user_id, today))
+    
+    if cursor.rowcount == 0:
+        raise HTTPException(status_code=404, detail="ไม่พบข้อมูลการทำงานสำหรับวันนี้")
+    
+    session_cache.invalidate(conn, user_id)
+
+def _insert_sale(conn, user_id: str, sale_data: SalesRecordRequest):
+    today = datetime.now().date()
+    
+    # Calculate total amount
+    total_amount = sale_data.quantity * sale_data.unitPrice
+    
+    # Generate sale record ID (time-ordered, unique even within the same second)
+    now = datetime.now()
+    sale_id = new_id("sale_")
+    
+    # Current session from the cache; re-read it once if the cached one has ended
+    for refresh in (False, True):
+        session = _require_active_session(conn, user_id, today, refresh)
+        cursor = conn.execute(INSERT_SALE_SQL, (
+            sale_id, session['user_id'], session['branch_id'], session['branch_name'], session['id'],
+            sale_data.productName, sale_data.quantity, sale_data.unit, 
+            sale_data.unitPrice, total_amount, sale_data.customerType,
+            sale_data.paymentMethod, sale_data.notes, today, now, session['id']
+        ))
+        if cursor.rowcount:
+            break
+        session_cache.discard(user_id)
+    else:
+        raise HTTPException(status_code=400, detail="ไม่พบข้อมูลการทำงานสำหรับวันนี้ กรุณาเลือกสาขาก่อน")
+    rollups.add_sales(conn, [(session['branch_id'], today, sale_data.productName, sale_data.quantity, total_amount)])
+    
+    return sale_id, total_amount, session['branch_id'], session['branch_name'], now
+
+def _insert_sales_batch(conn, user_id: str, records: List[BatchSaleItem]):
+    # Resolve the session once for the whole batch, straight from daily_sessions
+    today = datetime.now().date()
+    session = _require_active_session(conn, user_id, today, refresh=True)
+    
+    session_id, branch_id, branch_name = session['id'], session['branch_id'], session['branch_name']
+    
+    # Keys already recorded by an earlier (possibly partial) replay
+    keys = [r.idempotencyKey for r in records if r.idempotencyKey]
+    known = {}
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        rows = conn.execute(
+            "SELECT idempotency_key, sale_id FROM sales_idempotency_keys WHERE idempotency_key IN ({})"
+            .format(','.join('?' * len(chunk))), chunk
+        ).fetchall()
+        known.update((row['idempotency_key'], row['sale_id']) for row in rows)
+    
+    now = datetime.now()
+    sale_rows, key_rows, results = [], [], []
+    for index, record in enumerate(records):
+        key = record.idempotencyKey
+        if key and key in known:
+            results.append({"index": index, "status": "duplicate", "id": known[key], "idempotencyKey": key})
+            continue
+        
+        sale_id = new_id("sale_")
+        total_amount = record.quantity * record.unitPrice
+        sale_rows.append((
+            sale_id, session['user_id'], branch_id, branch_name, session_id,
+            record.productName, record.quantity, record.unit,
+            record.unitPrice, total_amount, record.customerType,
+            record.paymentMethod, record.notes, today, now
+        ))
+        if key:
+            known[key] = sale_id
+            key_rows.append((key, sale_id, user_id, now))
+        results.append({
+            "index": index, "status": "created", "id": sale_id,
+            "idempotencyKey": key, "totalAmount": total_amount
+        })
+    
+    conn.executemany("""
+        INSERT INTO sales_records (
+            id, user_id, branch_id, branch_name, session_id,
+            product_name, quantity, unit, unit_price, total_amount,
+            customer_type, payment_method, notes,
+            sale_date, sale_time
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, sale_rows)
+    conn.executemany("""
+        INSERT INTO sales_idempotency_keys (idempotency_key, sale_id, user_id, created_at)
+        VALUES (?, ?, ?, ?)
+    """, key_rows)
+    rollups.add_sales(conn, ((row[2], row[13], row[5], row[6], row[9]) for row in sale_rows))
+    
+    return results, branch_id, branch_name, now
+
+def _load_today_sales(conn, user_id: str):
+    # Get current session
+    today = datetime.now().date()
+    session = _find_active_session(conn, user_id, today)
+    if not session:
+        return [], 0, 0
+    
+    # Get today's sales for this branch
+    rows = conn.execute("""
+        SELECT * FROM sales_records 
+        WHERE branch_id = ? AND sale_date = ?
+        ORDER BY sale_time DESC
+    """, (session['branch_id'], today)).fetchall()
+    
+    # Day totals come from the rollup rather than re-summing the list
+    total_amount, total_transactions = rollups.day_totals(conn, session['branch_id'], today)
+    return [dict(row) for row in rows], total_amount, total_transactions
+
+def _load_sales_summary(conn, user_id: str) -> dict:
+    # Get current session
+    today = datetime.now().date()
+    session = _find_active_session(conn, user_id, today)
+    
+    if not session:
+        return {
+            "todaySales": 0,
+            "weekSales": 0,
+            "monthSales": 0,
+            "topProducts": []
+        }
+    
+    # Totals and top products are read from sales_daily_rollup (one row
+    # per branch, day and product) instead of scanning every sale
+    return rollups.branch_summary(conn, session['branch_id'], today)
+
+def _delete_sale(conn, sale_id: str, allowed_branches: List[str]):
+    cursor = conn.cursor()
+    
+    # Check if sale exists and belongs to user's accessible branches
+    cursor.execute("""
+        SELECT * FROM sales_records 
+        WHERE id = ? AND branch_id IN ({})
+    """.format(','.join('?' * len(allowed_branches))), [sale_id] + allowed_branches)
+    
+    sale = cursor.fetchone()
+    if not sale:
+        raise HTTPException(status_code=404, detail="ไม่พบรายการขายที่ต้องการลบ")
+    
+    # Delete the sale
+    cursor.execute("DELETE FROM sales_records WHERE id = ?", (sale_id,))
+    
+    if cursor.rowcount == 0:
+        raise HTTPException(status_code=404, detail="ไม่พบรายการขายที่ต้องการลบ")
+    
+    rollups.remove_sale(
+        conn, sale['branch_id'], sale['sale_date'], sale['product_name'],
+        sale['quantity'], sale['total_amount']
+    )
+    return dict(sale)
+
+# Largest batch accepted by /api/sales/record/batch
+MAX_SALES_BATCH = 5000
+
+# Committed sales pushed to /api/sales/live/stream and /api/sales/live/ws;
+# each client may fall LIVE_FEED_QUEUE events behind before events are dropped
+LIVE_FEED_HISTORY = 1000
+LIVE_FEED_QUEUE = 256
+LIVE_FEED_HEARTBEAT = 15.0  # seconds
+live_feed = LiveFeed(history_size=LIVE_FEED_HISTORY, queue_size=LIVE_FEED_QUEUE)
+
+# Durable append-only log behind the legacy POST /api/sales recorder, shared
+# by every worker; its newest records seed the live feed after a restart
+SALE_LOG_DIR = "sale_log"
+SALE_LOG_SEGMENT_BYTES = 16 * 1024 * 1024
+sale_log: Optional[SaleLog] = None  # opened by startup()
+
+def open_sale_log():
+    """Open the sale log and replay its newest records into an empty live feed"""
+    global sale_log
+    if sale_log is None:
+        sale_log = SaleLog(SALE_LOG_DIR, segment_bytes=SALE_LOG_SEGMENT_BYTES, tail_size=LIVE_FEED_HISTORY)
+        # A restarted app in the same process already has them
+        if live_feed.cursor == 0:
+            for log_offset, logged_sale in sale_log.tail():
+                live_feed.publish(dict(logged_sale, logOffset=log_offset))
+
+def require_sale_log() -> SaleLog:
+    """The open sale log; 503 outside startup()/shutdown()"""
+    if sale_log is None:
+        raise HTTPException(status_code=503, detail="บันทึกการขายยังไม่พร้อมใช้งาน")
+    return sale_log
+
+def close_sale_log():
+    """Fsync the last batch and release the sale log files"""
+    global sale_log
+    if sale_log is not None:
+        sale_log.close()
+        sale_log = None
+
+def _publish_sale(user: dict, sale_id: str, branch_id: str, branch_name: str,
+                  product_name: str, quantity: float, unit: str, total_amount: float, sale_time):
+    """Push a committed /api/sales/record sale to live-feed subscribers"""
+    live_feed.publish({
+        "saleId": sale_id,
+        "employeeName": f"{user['first_name']} {user['last_name']}",
+        "branchId": branch_id,
+        "branchName": branch_name,
+        "items": [{"name": product_name, "quantity": quantity, "unit": unit, "total": total_amount}],
+        "totalAmount": total_amount,
+        "timestamp": sale_time.isoformat()
+    })
+
+# Dashboard analytics cached per (time range, group); sale writers
+# invalidate it, other workers' sales show up within the TTL
+ANALYTICS_CACHE_TTL = 10.0  # seconds
+analytics = AnalyticsEngine(ttl=ANALYTICS_CACHE_TTL)
+
+# Per-branch and chain revenue models behind /api/analytics/forecast
+forecaster = ForecastEngine()
+
+# Branch rankings kept sorted as sales commit; rebuilt from the rollups at
+# day change and every RANK_INDEX_REFRESH seconds for other workers' sales
+RANK_INDEX_REFRESH = 30.0  # seconds
+rank_index = RankingIndex(refresh_interval=RANK_INDEX_REFRESH)
+
+# Sales exports are written to EXPORT_DIR and deleted after EXPORT_TTL
+EXPORT_DIR = "exports"
+EXPORT_TTL = 24 * 3600  # seconds
+exporter = ReportExporter(EXPORT_DIR, ttl=EXPORT_TTL)
+
+def _sales_changed(branch_id: str, sale_date, amount: float, transactions: int, quantity: float):
+    """Update analytics after sales for one branch and day were committed or deleted"""
+    analytics.invalidate()
+    rank_index.apply_sale(branch_id, sale_date, amount, transactions, quantity)
 
 # Branch Login API Endpoints
-@app.post("/api/branch-auth/login")
+@router.post("/api/branch-auth/login")
 async def branch_login(login_data: LoginRequest):
     """Branch login endpoint"""
     try:
-        user = get_user_by_username(login_data.username)
-        if not user or not verify_password(login_data.password, user['password_hash']):
+        user = await async_db.call(get_user_by_username, login_data.username)
+        if not user:
+            raise HTTPException(status_code=401, detail="ชื่อผู้ใช้หรือรหัสผ่านไม่ถูกต้อง")
+        
+        try:
+            password_ok, new_hash = await password_hasher.verify_and_upgrade(
+                login_data.password, user['password_hash']
+            )
+        except PasswordQueueFull:
+            raise HTTPException(status_code=503, detail="ระบบกำลังมีผู้เข้าสู่ระบบจำนวนมาก กรุณาลองใหม่อีกครั้ง")
+        
+        if not password_ok:
             raise HTTPException(status_code=401, detail="ชื่อผู้ใช้หรือรหัสผ่านไม่ถูกต้อง")
         
         if not user['is_active']:
             raise HTTPException(status_code=403, detail="บัญชีผู้ใช้ถูกระงับ")
         
+        # Stored hash uses an outdated cost; replace it now that we know the password
+        if new_hash:
+            await async_db.write(_update_password_hash, user['id'], new_hash)
+            invalidate_user_cache(user['id'])
+        
         # Create access token
         access_token = create_access_token(data={"sub": user['username']})
         
         # Get user branches
-        user_branches = get_user_branches(user['id'])
+        user_branches = await async_db.call(get_user_branches, user['id'])
         
         # Prepare user data
         user_data = {
@@ -354,10 +644,10 @@ async def branch_login(login_data: LoginRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"เกิดข้อผิดพลาดในระบบ: {str(e)}")
 
-@app.get("/api/branch-auth/me")
+@router.get("/api/branch-auth/me")
 async def get_current_user_info(current_user: dict = Depends(get_current_user)):
     """Get current user information"""
-    user_branches = get_user_branches(current_user['id'])
+    user_branches = await async_db.call(get_user_branches, current_user['id'])
     user_data = {
         "id": current_user['id'],
         "username": current_user['username'],
@@ -367,7 +657,7 @@ async def get_current_user_info(current_user: dict = Depends(get_current_user)):
         "email": current_user['email'],
         "phone": current_user['phone'],
         "role": current_user['role'],
-        "allowedBranches": json.loads(current_user['allowed_branches']),
+        "allowedBranches": list(current_user['allowed_branch_ids']),
         "isActive": current_user['is_active'],
         "avatar": current_user['avatar'],
         "createdAt": current_user['created_at'],
@@ -379,55 +669,26 @@ async def get_current_user_info(current_user: dict = Depends(get_current_user)):
         "data": user_data
     }
 
-@app.get("/api/branches/available")
+@router.get("/api/branches/available")
 async def get_available_branches(current_user: dict = Depends(get_current_user)):
     """Get user's available branches"""
-    branches = get_user_branches(current_user['id'])
+    branches = await async_db.call(get_user_branches, current_user['id'])
     return {
         "success": True,
         "data": branches
     }
 
-@app.post("/api/branches/session/select")
+@router.post("/api/branches/session/select")
 async def select_daily_branch(branch_data: BranchSelectionRequest, current_user: dict = Depends(get_current_user)):
     """Select daily branch for work session"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
         # Check if user has access to this branch
-        allowed_branches = json.loads(current_user['allowed_branches'])
-        if branch_data.branchId not in allowed_branches:
+        if branch_data.branchId not in current_user['allowed_branch_set']:
             raise HTTPException(status_code=403, detail="คุณไม่มีสิทธิ์เข้าถึงสาขานี้")
         
-        # Get branch info
-        cursor.execute("SELECT * FROM branches WHERE id = ?", (branch_data.branchId,))
-        branch = cursor.fetchone()
-        if not branch:
-            raise HTTPException(status_code=404, detail="ไม่พบสาขาที่เลือก")
-        
-        # Check if user already has session today
-        today = datetime.now().date()
-        cursor.execute("""
-            SELECT * FROM daily_sessions 
-            WHERE user_id = ? AND session_date = ? AND is_locked = TRUE
-        """, (current_user['id'], today))
-        existing_session = cursor.fetchone()
-        
-        if existing_session:
-            raise HTTPException(status_code=400, detail="คุณได้เลือกสาขาสำหรับวันนี้แล้ว")
-        
-        # Create new session
-        session_id = f"session_{current_user['id']}_{int(datetime.now().timestamp())}"
-        now = datetime.now()
-        
-        cursor.execute("""
-            INSERT INTO daily_sessions (id, user_id, branch_id, branch_name, session_date, start_time, is_locked)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (session_id, current_user['id'], branch_data.branchId, branch[2], today, now, True))
-        
-        conn.commit()
-        conn.close()
+        session_id, branch_name, today, now = await async_db.write(
+            _open_daily_session, current_user['id'], branch_data.branchId
+        )
         
         return {
             "success": True,
@@ -435,70 +696,42 @@ async def select_daily_branch(branch_data: BranchSelectionRequest, current_user:
                 "id": session_id,
                 "userId": current_user['id'],
                 "branchId": branch_data.branchId,
-                "branchName": branch[2],
+                "branchName": branch_name,
                 "sessionDate": today.isoformat(),
                 "startTime": now.isoformat(),
                 "isLocked": True
             },
-            "message": f"เริ่มงานที่ {branch[2]} เรียบร้อยแล้ว"
+            "message": f"เริ่มงานที่ {branch_name} เรียบร้อยแล้ว"
         }
     except HTTPException:
         raise
     except Exception as e:
-        if conn:
-            conn.close()
         raise HTTPException(status_code=500, detail=f"เกิดข้อผิดพลาดในระบบ: {str(e)}")
 
-@app.get("/api/branches/session")
+@router.get("/api/branches/session")
 async def get_current_session(current_user: dict = Depends(get_current_user)):
     """Get current daily session"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
         today = datetime.now().date()
-        cursor.execute("""
-            SELECT * FROM daily_sessions 
-            WHERE user_id = ? AND session_date = ? AND is_locked = TRUE
-        """, (current_user['id'], today))
-        
-        session = cursor.fetchone()
-        conn.close()
+        session = await async_db.read(_find_active_session, current_user['id'], today)
         
         if not session:
             raise HTTPException(status_code=404, detail="ไม่พบข้อมูลการทำงานสำหรับวันนี้")
         
         return {
             "success": True,
-            "data": dict(session)
+            "data": session
         }
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"เกิดข้อผิดพลาดในระบบ: {str(e)}")
 
-@app.post("/api/branches/session/end")
+@router.post("/api/branches/session/end")
 async def end_daily_session(current_user: dict = Depends(get_current_user)):
     """End daily work session"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        today = datetime.now().date()
-        now = datetime.now()
-        
-        cursor.execute("""
-            UPDATE daily_sessions 
-            SET end_time = ?, is_locked = FALSE 
-            WHERE user_id = ? AND session_date = ? AND is_locked = TRUE
-        """, (now, current_user['id'], today))
-        
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail="ไม่พบข้อมูลการทำงานสำหรับวันนี้")
-        
-        conn.commit()
-        conn.close()
+        await async_db.write(_close_daily_session, current_user['id'])
         
         return {
             "success": True,
@@ -507,58 +740,24 @@ async def end_daily_session(current_user: dict = Depends(get_current_user)):
     except HTTPException:
         raise
     except Exception as e:
-        if conn:
-            conn.close()
         raise HTTPException(status_code=500, detail=f"เกิดข้อผิดพลาดในระบบ: {str(e)}")
 
 # =========================================
 # SALES RECORDING API ENDPOINTS
 # =========================================
 
-@app.post("/api/sales/record")
+@router.post("/api/sales/record")
 async def record_sale(sale_data: SalesRecordRequest, current_user: dict = Depends(get_current_user)):
     """Record a new sale"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Get current session
-        today = datetime.now().date()
-        cursor.execute("""
-            SELECT * FROM daily_sessions 
-            WHERE user_id = ? AND session_date = ? AND is_locked = TRUE
-        """, (current_user['id'], today))
-        session = cursor.fetchone()
-        
-        if not session:
-            raise HTTPException(status_code=400, detail="ไม่พบข้อมูลการทำงานสำหรับวันนี้ กรุณาเลือกสาขาก่อน")
-        
-        session_id, user_id, branch_id, branch_name = session[0], session[1], session[2], session[3]
-        
-        # Calculate total amount
-        total_amount = sale_data.quantity * sale_data.unitPrice
-        
-        # Generate sale record ID
-        now = datetime.now()
-        sale_id = f"sale_{branch_id}_{int(now.timestamp())}"
-        
-        # Insert sale record
-        cursor.execute("""
-            INSERT INTO sales_records (
-                id, user_id, branch_id, branch_name, session_id,
-                product_name, quantity, unit, unit_price, total_amount,
-                customer_type, payment_method, notes,
-                sale_date, sale_time
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            sale_id, user_id, branch_id, branch_name, session_id,
-            sale_data.productName, sale_data.quantity, sale_data.unit, 
-            sale_data.unitPrice, total_amount, sale_data.customerType,
-            sale_data.paymentMethod, sale_data.notes, today, now
-        ))
-        
-        conn.commit()
-        conn.close()
+        sale_id, total_amount, branch_id, branch_name, now = await async_db.write(
+            _insert_sale, current_user['id'], sale_data
+        )
+        _sales_changed(branch_id, now.date(), total_amount, 1, sale_data.quantity)
+        _publish_sale(
+            current_user, sale_id, branch_id, branch_name, sale_data.productName,
+            sale_data.quantity, sale_data.unit, total_amount, now
+        )
         
         return {
             "success": True,
@@ -573,57 +772,61 @@ async def record_sale(sale_data: SalesRecordRequest, current_user: dict = Depend
     except HTTPException:
         raise
     except Exception as e:
-        if conn:
-            conn.close()
         raise HTTPException(status_code=500, detail=f"เกิดข้อผิดพลาดในการบันทึกการขาย: {str(e)}")
 
-@app.get("/api/sales/today")
-async def get_today_sales(current_user: dict = Depends(get_current_user)):
-    """Get today's sales for current user's branch"""
+@router.post("/api/sales/record/batch")
+async def record_sales_batch(batch: BatchSalesRecordRequest, current_user: dict = Depends(get_current_user)):
+    """Record many sales in one transaction (offline POS replay)"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        if len(batch.records) > MAX_SALES_BATCH:
+            raise HTTPException(status_code=413, detail=f"ส่งรายการขายได้สูงสุด {MAX_SALES_BATCH} รายการต่อครั้ง")
         
-        # Get current session
-        today = datetime.now().date()
-        cursor.execute("""
-            SELECT * FROM daily_sessions 
-            WHERE user_id = ? AND session_date = ? AND is_locked = TRUE
-        """, (current_user['id'], today))
-        session = cursor.fetchone()
-        
-        if not session:
-            return {
-                "success": True,
-                "data": {
-                    "sales": [],
-                    "summary": {
-                        "totalAmount": 0,
-                        "totalTransactions": 0,
-                        "averageTransaction": 0
-                    }
-                }
-            }
-        
-        branch_id = session['branch_id']
-        
-        # Get today's sales for this branch
-        cursor.execute("""
-            SELECT * FROM sales_records 
-            WHERE branch_id = ? AND sale_date = ?
-            ORDER BY sale_time DESC
-        """, (branch_id, today))
+        results, branch_id, branch_name, now = await async_db.write(
+            _insert_sales_batch, current_user['id'], batch.records
+        )
+        created, created_amount, created_quantity = 0, 0, 0
+        for result in results:
+            if result["status"] == "created":
+                created += 1
+                record = batch.records[result["index"]]
+                created_amount += result["totalAmount"]
+                created_quantity += record.quantity
+                _publish_sale(
+                    current_user, result["id"], branch_id, branch_name, record.productName,
+                    record.quantity, record.unit, result["totalAmount"], now
+                )
+        
+        if created:
+            _sales_changed(branch_id, now.date(), created_amount, created, created_quantity)
         
-        sales = [dict(row) for row in cursor.fetchall()]
+        return {
+            "success": True,
+            "data": {
+                "branchName": branch_name,
+                "received": len(results),
+                "created": created,
+                "duplicates": len(results) - created,
+                "results": results,
+                "recordedAt": now.isoformat()
+            },
+            "message": f"บันทึกการขาย {created} รายการเรียบร้อยแล้ว"
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"เกิดข้อผิดพลาดในการบันทึกการขาย: {str(e)}")
+
+@router.get("/api/sales/today")
+async def get_today_sales(current_user: dict = Depends(get_current_user)):
+    """Get today's sales for current user's branch"""
+    try:
+        sales, total_amount, total_transactions = await async_db.read(
+            _load_today_sales, current_user['id']
+        )
         
         # Calculate summary
-        total_amount = sum(sale['total_amount'] for sale in sales)
-        total_transactions = len(sales)
         average_transaction = total_amount / total_transactions if total_transactions > 0 else 0
         
-        conn.close()
-        
         return {
             "success": True,
             "data": {
@@ -636,96 +839,22 @@ async def get_today_sales(current_user: dict = Depends(get_current_user)):
             }
         }
     except Exception as e:
-        if conn:
-            conn.close()
         raise HTTPException(status_code=500, detail=f"เกิดข้อผิดพลาดในการดึงข้อมูลการขาย: {str(e)}")
 
-@app.get("/api/sales/summary")
+@router.get("/api/sales/summary")
 async def get_sales_summary(current_user: dict = Depends(get_current_user)):
     """Get sales summary for current user's branch"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        # Get current session
-        today = datetime.now().date()
-        cursor.execute("""
-            SELECT * FROM daily_sessions 
-            WHERE user_id = ? AND session_date = ? AND is_locked = TRUE
-        """, (current_user['id'], today))
-        session = cursor.fetchone()
-        
-        if not session:
-            return {
-                "success": True,
-                "data": {
-                    "todaySales": 0,
-                    "weekSales": 0,
-                    "monthSales": 0,
-                    "topProducts": []
-                }
-            }
-        
-        branch_id = session['branch_id']
-        
-        # Today's sales
-        cursor.execute("""
-            SELECT COALESCE(SUM(total_amount), 0) as total
-            FROM sales_records 
-            WHERE branch_id = ? AND sale_date = ?
-        """, (branch_id, today))
-        today_sales = cursor.fetchone()['total']
-        
-        # This week's sales (last 7 days)
-        week_ago = today - timedelta(days=7)
-        cursor.execute("""
-            SELECT COALESCE(SUM(total_amount), 0) as total
-            FROM sales_records 
-            WHERE branch_id = ? AND sale_date >= ?
-        """, (branch_id, week_ago))
-        week_sales = cursor.fetchone()['total']
-        
-        # This month's sales (last 30 days)
-        month_ago = today - timedelta(days=30)
-        cursor.execute("""
-            SELECT COALESCE(SUM(total_amount), 0) as total
-            FROM sales_records 
-            WHERE branch_id = ? AND sale_date >= ?
-        """, (branch_id, month_ago))
-        month_sales = cursor.fetchone()['total']
-        
-        # Top products this week
-        cursor.execute("""
-            SELECT product_name, 
-                   SUM(quantity) as total_quantity,
-                   SUM(total_amount) as total_amount,
-                   COUNT(*) as transaction_count
-            FROM sales_records 
-            WHERE branch_id = ? AND sale_date >= ?
-            GROUP BY product_name
-            ORDER BY total_amount DESC
-            LIMIT 5
-        """, (branch_id, week_ago))
-        top_products = [dict(row) for row in cursor.fetchall()]
-        
-        conn.close()
+        summary = await async_db.read(_load_sales_summary, current_user['id'])
         
         return {
             "success": True,
-            "data": {
-                "todaySales": today_sales,
-                "weekSales": week_sales,
-                "monthSales": month_sales,
-                "topProducts": top_products
-            }
+            "data": summary
         }
     except Exception as e:
-        if conn:
-            conn.close()
         raise HTTPException(status_code=500, detail=f"เกิดข้อผิดพลาดในการดึงข้อมูลสรุปการขาย: {str(e)}")
 
-@app.delete("/api/sales/{sale_id}")
+@router.delete("/api/sales/{sale_id}")
 async def delete_sale(sale_id: str, current_user: dict = Depends(get_current_user)):
     """Delete a sale record (admin/manager only)"""
     try:
@@ -733,28 +862,9 @@ async def delete_sale(sale_id: str, current_user: dict = Depends(get_current_use
         if current_user['role'] not in ['ADMIN', 'MANAGER']:
             raise HTTPException(status_code=403, detail="ไม่มีสิทธิ์ลบรายการขาย")
         
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Check if sale exists and belongs to user's accessible branches
-        allowed_branches = json.loads(current_user['allowed_branches'])
-        cursor.execute("""
-            SELECT * FROM sales_records 
-            WHERE id = ? AND branch_id IN ({})
-        """.format(','.join('?' * len(allowed_branches))), [sale_id] + allowed_branches)
-        
-        sale = cursor.fetchone()
-        if not sale:
-            raise HTTPException(status_code=404, detail="ไม่พบรายการขายที่ต้องการลบ")
-        
-        # Delete the sale
-        cursor.execute("DELETE FROM sales_records WHERE id = ?", (sale_id,))
-        
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail="ไม่พบรายการขายที่ต้องการลบ")
-        
-        conn.commit()
-        conn.close()
+        allowed_branches = list(current_user['allowed_branch_ids'])
+        sale = await async_db.write(_delete_sale, sale_id, allowed_branches)
+        _sales_changed(sale['branch_id'], sale['sale_date'], -sale['total_amount'], -1, -sale['quantity'])
         
         return {
             "success": True,
@@ -763,468 +873,27 @@ async def delete_sale(sale_id: str, current_user: dict = Depends(get_current_use
     except HTTPException:
         raise
     except Exception as e:
-        if conn:
-            conn.close()
         raise HTTPException(status_code=500, detail=f"เกิดข้อผิดพลาดในการลบรายการขาย: {str(e)}")
 
 # Branch Login Frontend Routes
-@app.get("/branch-login", response_class=HTMLResponse)
-async def branch_login_page():
+@router.get("/branch-login", response_class=HTMLResponse)
+async def branch_login_page(request: Request):
     """Branch login page"""
-    return HTMLResponse(content="""
-    <!DOCTYPE html>
-    <html lang="th">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Branch Login - ระบบจัดการสต๊อคผลไม้อบแห้ง</title>
-        <script src="https://cdn.tailwindcss.com"></script>
-        <style>
-            @import url('https://fonts.googleapis.com/css2?family=Kanit:wght@300;400;500;600;700&display=swap');
-            body { font-family: 'Kanit', sans-serif; }
-        </style>
-    </head>
-    <body class="bg-gradient-to-br from-blue-50 to-indigo-100 min-h-screen">
-        <div class="container mx-auto px-4 py-8">
-            <div class="max-w-md mx-auto bg-white rounded-xl shadow-lg p-8">
-                <div class="text-center mb-8">
-                    <div class="w-16 h-16 bg-blue-600 rounded-xl flex items-center justify-center mx-auto mb-4">
-                        <span class="text-2xl text-white">🏢</span>
-                    </div>
-                    <h1 class="text-2xl font-bold text-gray-900 mb-2">Branch Login</h1>
-                    <p class="text-gray-600">ระบบจัดการสต๊อคผลไม้อบแห้ง</p>
-                </div>
-                
-                <div id="error-alert" class="hidden mb-4 p-4 bg-red-50 border border-red-200 rounded-lg">
-                    <p class="text-red-700 text-sm" id="error-message"></p>
-                </div>
-                
-                <form id="login-form" class="space-y-6">
-                    <div>
-                        <label for="username" class="block text-sm font-medium text-gray-700 mb-2">ชื่อผู้ใช้</label>
-                        <input type="text" id="username" name="username" required
-                               class="w-full px-3 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500"
-                               placeholder="กรอกชื่อผู้ใช้">
-                    </div>
-                    
-                    <div>
-                        <label for="password" class="block text-sm font-medium text-gray-700 mb-2">รหัสผ่าน</label>
-                        <input type="password" id="password" name="password" required
-                               class="w-full px-3 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500"
-                               placeholder="กรอกรหัสผ่าน">
-                    </div>
-                    
-                    <button type="submit" id="login-btn"
-                            class="w-full bg-blue-600 text-white py-2 px-4 rounded-lg hover:bg-blue-700 focus:outline-none focus:ring-2 focus:ring-blue-500 transition duration-200">
-                        เข้าสู่ระบบ
-                    </button>
-                </form>
-                
-                <div class="mt-8 pt-6 border-t border-gray-200">
-                    <h3 class="text-sm font-medium text-gray-700 mb-3">Demo Accounts:</h3>
-                    <div class="space-y-2 text-xs text-gray-600">
-                        <div class="bg-gray-50 p-2 rounded">
-                            <strong>Admin:</strong> admin / admin123
-                        </div>
-                        <div class="bg-gray-50 p-2 rounded">
-                            <strong>Manager:</strong> manager001 / 123456
-                        </div>
-                        <div class="bg-gray-50 p-2 rounded">
-                            <strong>Staff:</strong> staff001 / 123456
-                        </div>
-                    </div>
-                </div>
-            </div>
-        </div>
-        
-        <script>
-            // Clear any existing session on page load
-            localStorage.removeItem('branch_token');
-            localStorage.removeItem('branch_user');
-            localStorage.removeItem('branch_session');
-            
-            document.getElementById('login-form').addEventListener('submit', async (e) => {
-                e.preventDefault();
-                
-                const username = document.getElementById('username').value;
-                const password = document.getElementById('password').value;
-                const errorAlert = document.getElementById('error-alert');
-                const errorMessage = document.getElementById('error-message');
-                const loginBtn = document.getElementById('login-btn');
-                
-                // Hide error alert
-                errorAlert.classList.add('hidden');
-                
-                // Show loading
-                loginBtn.textContent = 'กำลังเข้าสู่ระบบ...';
-                loginBtn.disabled = true;
-                
-                try {
-                    const response = await fetch('/api/branch-auth/login', {
-                        method: 'POST',
-                        headers: {
-                            'Content-Type': 'application/json',
-                        },
-                        body: JSON.stringify({ username, password })
-                    });
-                    
-                    const data = await response.json();
-                    
-                    if (data.success) {
-                        // Store token
-                        localStorage.setItem('branch_token', data.data.token);
-                        localStorage.setItem('branch_user', JSON.stringify(data.data.user));
-                        
-                        // Redirect to branch selection or dashboard
-                        if (data.data.needsBranchSelection) {
-                            window.location.href = '/branch-selection';
-                        } else {
-                            window.location.href = '/dashboard';
-                        }
-                    } else {
-                        throw new Error(data.detail || 'เกิดข้อผิดพลาดในการเข้าสู่ระบบ');
-                    }
-                } catch (error) {
-                    errorMessage.textContent = error.message;
-                    errorAlert.classList.remove('hidden');
-                } finally {
-                    loginBtn.textContent = 'เข้าสู่ระบบ';
-                    loginBtn.disabled = false;
-                }
-            });
-        </script>
-    </body>
-    </html>
-    """)
-
-@app.get("/branch-selection", response_class=HTMLResponse)
-async def branch_selection_page():
+    return page_cache.file(request, "branch-login.html", fallback="<h1>Branch Login - กำลังพัฒนา</h1>")
+
+@router.get("/branch-selection", response_class=HTMLResponse)
+async def branch_selection_page(request: Request):
     """Branch selection page"""
-    return HTMLResponse(content="""
-    <!DOCTYPE html>
-    <html lang="th">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>เลือกสาขา - ระบบจัดการสต๊อคผลไม้อบแห้ง</title>
-        <script src="https://cdn.tailwindcss.com"></script>
-        <style>
-            @import url('https://fonts.googleapis.com/css2?family=Kanit:wght@300;400;500;600;700&display=swap');
-            body { font-family: 'Kanit', sans-serif; }
-        </style>
-    </head>
-    <body class="bg-gradient-to-br from-blue-50 to-indigo-100 min-h-screen">
-        <div class="container mx-auto px-4 py-8">
-            <div class="max-w-2xl mx-auto bg-white rounded-xl shadow-lg p-8">
-                <div class="text-center mb-8">
-                    <div class="w-16 h-16 bg-blue-600 rounded-xl flex items-center justify-center mx-auto mb-4">
-                        <span class="text-2xl text-white">🏢</span>
-                    </div>
-                    <h1 class="text-2xl font-bold text-gray-900 mb-2">เลือกสาขาประจำวัน</h1>
-                    <p class="text-gray-600">เลือกสาขาที่ต้องการทำงานในวันนี้</p>
-                </div>
-                
-                <div id="user-info" class="mb-6 p-4 bg-blue-50 rounded-lg">
-                    <div class="flex items-center space-x-3">
-                        <div class="w-12 h-12 bg-blue-100 rounded-full flex items-center justify-center text-lg" id="user-avatar">👤</div>
-                        <div>
-                            <h3 class="font-semibold text-gray-900" id="user-name">กำลังโหลด...</h3>
-                            <p class="text-sm text-gray-600" id="user-role">กำลังโหลด...</p>
-                        </div>
-                    </div>
-                </div>
-                
-                <div id="error-alert" class="hidden mb-4 p-4 bg-red-50 border border-red-200 rounded-lg">
-                    <p class="text-red-700 text-sm" id="error-message"></p>
-                </div>
-                
-                <div id="loading" class="text-center py-8">
-                    <div class="animate-spin rounded-full h-8 w-8 border-b-2 border-blue-600 mx-auto"></div>
-                    <p class="mt-2 text-gray-600">กำลังโหลดข้อมูลสาขา...</p>
-                </div>
-                
-                <div id="branches-container" class="hidden space-y-4">
-                    <div id="branches-list"></div>
-                    
-                    <button id="confirm-btn" disabled
-                            class="w-full bg-blue-600 text-white py-3 px-4 rounded-lg hover:bg-blue-700 focus:outline-none focus:ring-2 focus:ring-blue-500 transition duration-200 disabled:bg-gray-400 disabled:cursor-not-allowed">
-                        เริ่มงานที่สาขานี้
-                    </button>
-                </div>
-                
-                <div class="text-center mt-6 space-y-2">
-                    <button id="clear-session-btn" class="w-full text-orange-600 hover:text-orange-800 text-sm border border-orange-300 rounded-lg py-2 px-4 hover:bg-orange-50 transition duration-200">
-                        ล้างข้อมูลการทำงานวันนี้ (เลือกสาขาใหม่)
-                    </button>
-                    <button id="logout-btn" class="text-gray-600 hover:text-gray-800 text-sm">
-                        ออกจากระบบ
-                    </button>
-                </div>
-            </div>
-        </div>
-        
-        <script>
-            let selectedBranchId = null;
-            let currentUser = null;
-            
-            // Check authentication
-            const token = localStorage.getItem('branch_token');
-            const userStr = localStorage.getItem('branch_user');
-            
-            if (!token || !userStr) {
-                window.location.href = '/branch-login';
-            }
-            
-            currentUser = JSON.parse(userStr);
-            
-            // Update user info
-            document.getElementById('user-avatar').textContent = currentUser.avatar || '👤';
-            document.getElementById('user-name').textContent = `${currentUser.firstName} ${currentUser.lastName}`;
-            document.getElementById('user-role').textContent = getRoleDisplay(currentUser.role);
-            
-            function getRoleDisplay(role) {
-                switch(role) {
-                    case 'ADMIN': return 'ผู้ดูแลระบบ';
-                    case 'MANAGER': return 'ผู้จัดการ';
-                    case 'STAFF': return 'พนักงาน';
-                    default: return role;
-                }
-            }
-            
-            // Load branches
-            async function loadBranches() {
-                try {
-                    const response = await fetch('/api/branches/available', {
-                        headers: {
-                            'Authorization': `Bearer ${token}`
-                        }
-                    });
-                    
-                    const data = await response.json();
-                    
-                    if (data.success) {
-                        displayBranches(data.data);
-                    } else {
-                        throw new Error('ไม่สามารถโหลดข้อมูลสาขาได้');
-                    }
-                } catch (error) {
-                    showError(error.message);
-                }
-            }
-            
-            function displayBranches(branches) {
-                const container = document.getElementById('branches-list');
-                const loading = document.getElementById('loading');
-                const branchesContainer = document.getElementById('branches-container');
-                
-                container.innerHTML = '';
-                
-                branches.forEach(branch => {
-                    const branchCard = document.createElement('div');
-                    branchCard.className = 'border-2 border-gray-200 rounded-lg p-4 cursor-pointer hover:border-blue-500 transition-colors duration-200';
-                    branchCard.innerHTML = `
-                        <div class="flex items-center justify-between">
-                            <div>
-                                <h3 class="font-semibold text-gray-900">${branch.name}</h3>
-                                <p class="text-sm text-gray-600">${branch.location}</p>
-                                <p class="text-xs text-blue-600 font-medium">รหัส: ${branch.code}</p>
-                            </div>
-                            <div class="w-6 h-6 border-2 border-gray-300 rounded-full"></div>
-                        </div>
-                    `;
-                    
-                    branchCard.addEventListener('click', () => selectBranch(branch.id, branchCard));
-                    container.appendChild(branchCard);
-                });
-                
-                loading.classList.add('hidden');
-                branchesContainer.classList.remove('hidden');
-            }
-            
-            function selectBranch(branchId, cardElement) {
-                // Clear previous selection
-                document.querySelectorAll('#branches-list > div').forEach(card => {
-                    card.classList.remove('border-blue-500', 'bg-blue-50');
-                    card.classList.add('border-gray-200');
-                    const radio = card.querySelector('.w-6.h-6');
-                    radio.classList.remove('bg-blue-600', 'border-blue-600');
-                    radio.classList.add('border-gray-300');
-                    radio.innerHTML = '';
-                });
-                
-                // Select new branch
-                selectedBranchId = branchId;
-                cardElement.classList.remove('border-gray-200');
-                cardElement.classList.add('border-blue-500', 'bg-blue-50');
-                const radio = cardElement.querySelector('.w-6.h-6');
-                radio.classList.remove('border-gray-300');
-                radio.classList.add('bg-blue-600', 'border-blue-600');
-                radio.innerHTML = '<div class="w-2 h-2 bg-white rounded-full m-auto mt-1"></div>';
-                
-                document.getElementById('confirm-btn').disabled = false;
-            }
-            
-            function showError(message) {
-                const errorAlert = document.getElementById('error-alert');
-                const errorMessage = document.getElementById('error-message');
-                
-                errorMessage.textContent = message;
-                errorAlert.classList.remove('hidden');
-            }
-            
-            // Confirm branch selection
-            document.getElementById('confirm-btn').addEventListener('click', async () => {
-                if (!selectedBranchId) return;
-                
-                const confirmBtn = document.getElementById('confirm-btn');
-                confirmBtn.textContent = 'กำลังดำเนินการ...';
-                confirmBtn.disabled = true;
-                
-                try {
-                    const response = await fetch('/api/branches/session/select', {
-                        method: 'POST',
-                        headers: {
-                            'Content-Type': 'application/json',
-                            'Authorization': `Bearer ${token}`
-                        },
-                        body: JSON.stringify({ branchId: selectedBranchId })
-                    });
-                    
-                    const data = await response.json();
-                    
-                    if (data.success) {
-                        localStorage.setItem('branch_session', JSON.stringify(data.data));
-                        alert(data.message);
-                        window.location.href = '/dashboard';
-                    } else {
-                        throw new Error(data.detail || 'เกิดข้อผิดพลาดในการเลือกสาขา');
-                    }
-                } catch (error) {
-                    showError(error.message);
-                    confirmBtn.textContent = 'เริ่มงานที่สาขานี้';
-                    confirmBtn.disabled = false;
-                }
-            });
-            
-            // Clear daily session (allows reselecting branch)
-            document.getElementById('clear-session-btn').addEventListener('click', async () => {
-                if (!confirm('คุณต้องการล้างข้อมูลการทำงานวันนี้และเลือกสาขาใหม่หรือไม่?')) {
-                    return;
-                }
-                
-                try {
-                    // Call API to end current session
-                    const response = await fetch('/api/branches/session/end', {
-                        method: 'POST',
-                        headers: {
-                            'Authorization': `Bearer ${token}`
-                        }
-                    });
-                    
-                    // Clear local session data
-                    localStorage.removeItem('branch_session');
-                    
-                    // Reload page to allow branch reselection
-                    window.location.reload();
-                } catch (error) {
-                    console.error('Error clearing session:', error);
-                    // Even if API fails, clear local data and reload
-                    localStorage.removeItem('branch_session');
-                    window.location.reload();
-                }
-            });
-            
-            // Logout
-            document.getElementById('logout-btn').addEventListener('click', () => {
-                if (confirm('คุณต้องการออกจากระบบหรือไม่?')) {
-                    localStorage.removeItem('branch_token');
-                    localStorage.removeItem('branch_user');
-                    localStorage.removeItem('branch_session');
-                    window.location.href = '/branch-login';
-                }
-            });
-            
-            // Check if user already has a session today
-            async function checkExistingSession() {
-                try {
-                    const response = await fetch('/api/branches/session', {
-                        headers: {
-                            'Authorization': `Bearer ${token}`
-                        }
-                    });
-                    
-                    if (response.status === 200) {
-                        const data = await response.json();
-                        if (data.success) {
-                            // User already has a session
-                            const session = data.data;
-                            showExistingSession(session);
-                            return true;
-                        }
-                    }
-                    return false;
-                } catch (error) {
-                    console.log('No existing session found');
-                    return false;
-                }
-            }
-            
-            function showExistingSession(session) {
-                const loading = document.getElementById('loading');
-                const branchesContainer = document.getElementById('branches-container');
-                const branchesList = document.getElementById('branches-list');
-                const confirmBtn = document.getElementById('confirm-btn');
-                
-                loading.classList.add('hidden');
-                branchesContainer.classList.remove('hidden');
-                
-                branchesList.innerHTML = `
-                    <div class="border-2 border-green-500 bg-green-50 rounded-lg p-6 text-center">
-                        <div class="text-green-600 mb-4">
-                            <svg class="w-12 h-12 mx-auto" fill="none" stroke="currentColor" viewBox="0 0 24 24">
-                                <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M9 12l2 2 4-4m6 2a9 9 0 11-18 0 9 9 0 0118 0z"></path>
-                            </svg>
-                        </div>
-                        <h3 class="text-lg font-semibold text-green-800 mb-2">✅ คุณได้เลือกสาขาแล้ว</h3>
-                        <p class="text-green-700 mb-1"><strong>สาขา:</strong> ${session.branch_name}</p>
-                        <p class="text-green-700 mb-1"><strong>เริ่มงานเมื่อ:</strong> ${new Date(session.start_time).toLocaleTimeString('th-TH')}</p>
-                        <p class="text-green-700 mb-4"><strong>สถานะ:</strong> ${session.is_locked ? 'กำลังทำงาน' : 'สิ้นสุดแล้ว'}</p>
-                        <button onclick="window.location.href='/dashboard'" class="bg-blue-600 text-white px-6 py-2 rounded-lg hover:bg-blue-700 transition duration-200">
-                            ไปยังแดชบอร์ด
-                        </button>
-                    </div>
-                `;
-                
-                confirmBtn.style.display = 'none';
-            }
-            
-            // Load branches or show existing session
-            async function initializePage() {
-                const hasSession = await checkExistingSession();
-                if (!hasSession) {
-                    loadBranches();
-                }
-            }
-            
-            // Initialize page
-            initializePage();
-        </script>
-    </body>
-    </html>
-    """)
+    return page_cache.file(request, "branch-selection.html", fallback="<h1>Branch Selection - กำลังพัฒนา</h1>")
 
 # =========================================
 # END BRANCH LOGIN SYSTEM
 # =========================================
 
 # Routes
-@app.get("/", response_class=HTMLResponse)
-async def home():
-    try:
-        with open("web/index.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
-        return HTMLResponse(content="""
+@router.get("/", response_class=HTMLResponse)
+async def home(request: Request):
+    return page_cache.file(request, "index.html", fallback="""
         <html>
             <head><title>ระบบจัดการสต๊อคผลไม้อบแห้ง</title></head>
             <body style="font-family: Arial, sans-serif; text-align: center; padding: 50px;">
@@ -1235,199 +904,46 @@ async def home():
         </html>
         """)
 
-@app.get("/dashboard", response_class=HTMLResponse)
-async def dashboard():
-    try:
-        with open("web/dashboard.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
-        return HTMLResponse(content="<h1>Dashboard - กำลังพัฒนา</h1>")
+@router.get("/dashboard", response_class=HTMLResponse)
+async def dashboard(request: Request):
+    return page_cache.file(request, "dashboard.html", fallback="<h1>Dashboard - กำลังพัฒนา</h1>")
 
-@app.get("/inventory", response_class=HTMLResponse)
-async def inventory():
-    try:
-        with open("web/inventory.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
-        return HTMLResponse(content="<h1>Inventory - กำลังพัฒนา</h1>")
-
-@app.get("/sales", response_class=HTMLResponse)
-async def sales():
-    return HTMLResponse(content="""
-    <!DOCTYPE html>
-    <html lang="th">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>ระบบขาย (POS)</title>
-        <link href="https://cdn.jsdelivr.net/npm/tailwindcss@2.2.19/dist/tailwind.min.css" rel="stylesheet">
-        <link href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css" rel="stylesheet">
-        <style>
-            .gradient-bg { background: linear-gradient(135deg, #FFD700 0%, #FFA500 50%, #FF8C00 100%); }
-        </style>
-    </head>
-    <body class="bg-gradient-to-br from-yellow-50 to-orange-50 min-h-screen">
-        <nav class="gradient-bg shadow-lg">
-            <div class="container mx-auto px-4">
-                <div class="flex items-center justify-between h-16">
-                    <div class="flex items-center space-x-4">
-                        <a href="/" class="text-white hover:text-yellow-200"><i class="fas fa-home text-xl"></i></a>
-                        <h1 class="text-white text-xl font-bold">ระบบขาย (POS)</h1>
-                    </div>
-                </div>
-            </div>
-        </nav>
-        <div class="container mx-auto px-4 py-8">
-            <div class="bg-white rounded-xl shadow-lg p-8 text-center">
-                <i class="fas fa-cash-register text-6xl text-orange-500 mb-4"></i>
-                <h2 class="text-3xl font-bold text-gray-800 mb-4">ระบบขาย (POS)</h2>
-                <p class="text-gray-600 mb-6">ระบบขายสำหรับบันทึกการขายผลไม้อบแห้ง</p>
-                <div class="text-orange-500 text-lg">🚧 กำลังพัฒนา...</div>
-            </div>
-        </div>
-    </body>
-    </html>
-    """)
-
-@app.get("/delivery", response_class=HTMLResponse)
-async def delivery():
-    return HTMLResponse(content="""
-    <!DOCTYPE html>
-    <html lang="th">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>ติดตามการจัดส่ง</title>
-        <link href="https://cdn.jsdelivr.net/npm/tailwindcss@2.2.19/dist/tailwind.min.css" rel="stylesheet">
-        <link href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css" rel="stylesheet">
-        <style>
-            .gradient-bg { background: linear-gradient(135deg, #FFD700 0%, #FFA500 50%, #FF8C00 100%); }
-        </style>
-    </head>
-    <body class="bg-gradient-to-br from-yellow-50 to-orange-50 min-h-screen">
-        <nav class="gradient-bg shadow-lg">
-            <div class="container mx-auto px-4">
-                <div class="flex items-center justify-between h-16">
-                    <div class="flex items-center space-x-4">
-                        <a href="/" class="text-white hover:text-yellow-200"><i class="fas fa-home text-xl"></i></a>
-                        <h1 class="text-white text-xl font-bold">ติดตามการจัดส่ง</h1>
-                    </div>
-                </div>
-            </div>
-        </nav>
-        <div class="container mx-auto px-4 py-8">
-            <div class="bg-white rounded-xl shadow-lg p-8 text-center">
-                <i class="fas fa-truck text-6xl text-orange-500 mb-4"></i>
-                <h2 class="text-3xl font-bold text-gray-800 mb-4">ติดตามการจัดส่ง</h2>
-                <p class="text-gray-600 mb-6">ระบบติดตามการจัดส่งสินค้าไปยังสาขาต่างๆ</p>
-                <div class="text-orange-500 text-lg">🚧 กำลังพัฒนา...</div>
-            </div>
-        </div>
-    </body>
-    </html>
-    """)
-
-@app.get("/reports", response_class=HTMLResponse)
-async def reports():
-    return HTMLResponse(content="""
-    <!DOCTYPE html>
-    <html lang="th">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>รายงานและวิเคราะห์</title>
-        <link href="https://cdn.jsdelivr.net/npm/tailwindcss@2.2.19/dist/tailwind.min.css" rel="stylesheet">
-        <link href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css" rel="stylesheet">
-        <style>
-            .gradient-bg { background: linear-gradient(135deg, #FFD700 0%, #FFA500 50%, #FF8C00 100%); }
-        </style>
-    </head>
-    <body class="bg-gradient-to-br from-yellow-50 to-orange-50 min-h-screen">
-        <nav class="gradient-bg shadow-lg">
-            <div class="container mx-auto px-4">
-                <div class="flex items-center justify-between h-16">
-                    <div class="flex items-center space-x-4">
-                        <a href="/" class="text-white hover:text-yellow-200"><i class="fas fa-home text-xl"></i></a>
-                        <h1 class="text-white text-xl font-bold">รายงานและวิเคราะห์</h1>
-                    </div>
-                </div>
-            </div>
-        </nav>
-        <div class="container mx-auto px-4 py-8">
-            <div class="bg-white rounded-xl shadow-lg p-8 text-center">
-                <i class="fas fa-chart-pie text-6xl text-orange-500 mb-4"></i>
-                <h2 class="text-3xl font-bold text-gray-800 mb-4">รายงานและวิเคราะห์</h2>
-                <p class="text-gray-600 mb-6">ระบบรายงานและวิเคราะห์ข้อมูลธุรกิจ</p>
-                <div class="text-orange-500 text-lg">🚧 กำลังพัฒนา...</div>
-            </div>
-        </div>
-    </body>
-    </html>
-    """)
-
-@app.get("/barcode", response_class=HTMLResponse)
-async def barcode():
-    return HTMLResponse(content="""
-    <!DOCTYPE html>
-    <html lang="th">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>ระบบบาร์โค้ด</title>
-        <link href="https://cdn.jsdelivr.net/npm/tailwindcss@2.2.19/dist/tailwind.min.css" rel="stylesheet">
-        <link href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css" rel="stylesheet">
-        <style>
-            .gradient-bg { background: linear-gradient(135deg, #FFD700 0%, #FFA500 50%, #FF8C00 100%); }
-        </style>
-    </head>
-    <body class="bg-gradient-to-br from-yellow-50 to-orange-50 min-h-screen">
-        <nav class="gradient-bg shadow-lg">
-            <div class="container mx-auto px-4">
-                <div class="flex items-center justify-between h-16">
-                    <div class="flex items-center space-x-4">
-                        <a href="/" class="text-white hover:text-yellow-200"><i class="fas fa-home text-xl"></i></a>
-                        <h1 class="text-white text-xl font-bold">ระบบบาร์โค้ด</h1>
-                    </div>
-                </div>
-            </div>
-        </nav>
-        <div class="container mx-auto px-4 py-8">
-            <div class="bg-white rounded-xl shadow-lg p-8 text-center">
-                <i class="fas fa-qrcode text-6xl text-orange-500 mb-4"></i>
-                <h2 class="text-3xl font-bold text-gray-800 mb-4">ระบบบาร์โค้ด</h2>
-                <p class="text-gray-600 mb-6">ระบบสแกนและสร้างบาร์โค้ดสินค้า</p>
-                <div class="text-orange-500 text-lg">🚧 กำลังพัฒนา...</div>
-            </div>
-        </div>
-    </body>
-    </html>
-    """)
-
-@app.get("/purchase", response_class=HTMLResponse)
-async def purchase():
-    try:
-        with open("web/purchase-form.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
-        return HTMLResponse(content="<h1>Purchase System - กำลังพัฒนา</h1>")
+@router.get("/inventory", response_class=HTMLResponse)
+async def inventory(request: Request):
+    return page_cache.file(request, "inventory.html", fallback="<h1>Inventory - กำลังพัฒนา</h1>")
 
-@app.get("/goods-receipt", response_class=HTMLResponse)
-async def goods_receipt():
-    try:
-        with open("web/goods-receipt-form.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
-        return HTMLResponse(content="<h1>Goods Receipt - กำลังพัฒนา</h1>")
+@router.get("/sales", response_class=HTMLResponse)
+async def sales(request: Request):
+    return page_cache.file(request, "sales.html", fallback="<h1>Sales - กำลังพัฒนา</h1>")
 
-@app.get("/print-functions.js")
-async def print_functions_js():
-    try:
-        with open("web/print-functions.js", "r", encoding="utf-8") as f:
-            return Response(content=f.read(), media_type="application/javascript")
-    except FileNotFoundError:
-        return Response(content="// print-functions.js not found", media_type="application/javascript")
+@router.get("/delivery", response_class=HTMLResponse)
+async def delivery(request: Request):
+    return page_cache.file(request, "delivery.html", fallback="<h1>Delivery - กำลังพัฒนา</h1>")
+
+@router.get("/reports", response_class=HTMLResponse)
+async def reports(request: Request):
+    return page_cache.file(request, "reports.html", fallback="<h1>Reports - กำลังพัฒนา</h1>")
+
+@router.get("/barcode", response_class=HTMLResponse)
+async def barcode(request: Request):
+    return page_cache.file(request, "barcode.html", fallback="<h1>Barcode - กำลังพัฒนา</h1>")
+
+@router.get("/purchase", response_class=HTMLResponse)
+async def purchase(request: Request):
+    return page_cache.file(request, "purchase-form.html", fallback="<h1>Purchase System - กำลังพัฒนา</h1>")
+
+@router.get("/goods-receipt", response_class=HTMLResponse)
+async def goods_receipt(request: Request):
+    return page_cache.file(request, "goods-receipt-form.html", fallback="<h1>Goods Receipt - กำลังพัฒนา</h1>")
 
-@app.get("/favicon.ico")
+@router.get("/print-functions.js")
+async def print_functions_js(request: Request):
+    return page_cache.file(
+        request, "print-functions.js",
+        fallback="// print-functions.js not found", media_type="application/javascript"
+    )
+
+@router.get("/favicon.ico")
 async def favicon():
     favicon_svg = """<svg xmlns="http://www.w3.org/2000/svg" width="16" height="16" viewBox="0 0 16 16">
         <text x="2" y="12" font-size="12">🥭</text>
@@ -1435,110 +951,64 @@ async def favicon():
     return Response(content=favicon_svg, media_type="image/svg+xml")
 
 # Branch Management
-@app.get("/branch-management", response_class=HTMLResponse)
-async def branch_management():
-    try:
-        with open("web/branch-management.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
-        return HTMLResponse(content="<h1>Branch Management - กำลังพัฒนา</h1>")
+@router.get("/branch-management", response_class=HTMLResponse)
+async def branch_management(request: Request):
+    return page_cache.file(request, "branch-management.html", fallback="<h1>Branch Management - กำลังพัฒนา</h1>")
 
-@app.get("/add-branch", response_class=HTMLResponse)
-async def add_branch():
-    try:
-        with open("web/add-branch.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
-        return HTMLResponse(content="<h1>Add Branch - กำลังพัฒนา</h1>")
+@router.get("/add-branch", response_class=HTMLResponse)
+async def add_branch(request: Request):
+    return page_cache.file(request, "add-branch.html", fallback="<h1>Add Branch - กำลังพัฒนา</h1>")
 
-@app.get("/branch-details", response_class=HTMLResponse)
-async def branch_details():
-    try:
-        with open("web/branch-details.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
-        return HTMLResponse(content="<h1>Branch Details - กำลังพัฒนา</h1>")
+@router.get("/branch-details", response_class=HTMLResponse)
+async def branch_details(request: Request):
+    return page_cache.file(request, "branch-details.html", fallback="<h1>Branch Details - กำลังพัฒนา</h1>")
 
-@app.get("/auto-branch-setup", response_class=HTMLResponse)
-async def auto_branch_setup():
-    try:
-        with open("web/auto-branch-setup.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
-        return HTMLResponse(content="<h1>Auto Branch Setup - กำลังพัฒนา</h1>")
+@router.get("/auto-branch-setup", response_class=HTMLResponse)
+async def auto_branch_setup(request: Request):
+    return page_cache.file(request, "auto-branch-setup.html", fallback="<h1>Auto Branch Setup - กำลังพัฒนา</h1>")
 
-@app.get("/branch-approval", response_class=HTMLResponse)
-async def branch_approval():
-    try:
-        with open("web/branch-approval.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
-        return HTMLResponse(content="<h1>Branch Approval - กำลังพัฒนา</h1>")
+@router.get("/branch-approval", response_class=HTMLResponse)
+async def branch_approval(request: Request):
+    return page_cache.file(request, "branch-approval.html", fallback="<h1>Branch Approval - กำลังพัฒนา</h1>")
 
-@app.get("/branch-delivery-routes", response_class=HTMLResponse)
-async def branch_delivery_routes():
-    try:
-        with open("web/branch-delivery-routes.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
-        return HTMLResponse(content="<h1>Branch Delivery Routes - กำลังพัฒนา</h1>")
+@router.get("/branch-delivery-routes", response_class=HTMLResponse)
+async def branch_delivery_routes(request: Request):
+    return page_cache.file(request, "branch-delivery-routes.html", fallback="<h1>Branch Delivery Routes - กำลังพัฒนา</h1>")
 
-@app.get("/branch-inventory", response_class=HTMLResponse)
-async def branch_inventory():
-    try:
-        with open("web/branch-inventory.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
-        return HTMLResponse(content="<h1>Branch Inventory - กำลังพัฒนา</h1>")
+@router.get("/branch-inventory", response_class=HTMLResponse)
+async def branch_inventory(request: Request):
+    return page_cache.file(request, "branch-inventory.html", fallback="<h1>Branch Inventory - กำลังพัฒนา</h1>")
 
-@app.get("/branch-analytics", response_class=HTMLResponse)
-async def branch_analytics():
-    try:
-        with open("web/branch-analytics.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
-        return HTMLResponse(content="<h1>Branch Analytics - กำลังพัฒนา</h1>")
+@router.get("/branch-analytics", response_class=HTMLResponse)
+async def branch_analytics(request: Request):
+    return page_cache.file(request, "branch-analytics.html", fallback="<h1>Branch Analytics - กำลังพัฒนา</h1>")
 
-@app.get("/bulk-branch-operations", response_class=HTMLResponse)
-async def bulk_branch_operations():
-    try:
-        with open("web/bulk-branch-operations.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
-        return HTMLResponse(content="<h1>Bulk Branch Operations - กำลังพัฒนา</h1>")
+@router.get("/bulk-branch-operations", response_class=HTMLResponse)
+async def bulk_branch_operations(request: Request):
+    return page_cache.file(request, "bulk-branch-operations.html", fallback="<h1>Bulk Branch Operations - กำลังพัฒนา</h1>")
 
-@app.get("/sales-pos", response_class=HTMLResponse)
-async def sales_pos():
-    try:
-        with open("web/sales-pos.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
-        return HTMLResponse(content="<h1>Sales POS - กำลังพัฒนา</h1>")
+@router.get("/sales-pos", response_class=HTMLResponse)
+async def sales_pos(request: Request):
+    return page_cache.file(request, "sales-pos.html", fallback="<h1>Sales POS - กำลังพัฒนา</h1>")
 
-@app.get("/sales-live-feed", response_class=HTMLResponse)
-async def sales_live_feed():
-    try:
-        with open("web/sales-live-feed.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
-        return HTMLResponse(content="<h1>Sales Live Feed - กำลังพัฒนา</h1>")
+@router.get("/sales-live-feed", response_class=HTMLResponse)
+async def sales_live_feed(request: Request):
+    return page_cache.file(request, "sales-live-feed.html", fallback="<h1>Sales Live Feed - กำลังพัฒนา</h1>")
 
 # API Routes for Branch Analytics
-@app.get("/api/analytics/kpis")
+async def _analytics(kind: str, time_range: str, group: str):
+    """Cached analytics result, computed on a DB thread on a miss"""
+    result = analytics.get(kind, time_range, group)
+    if result is None:
+        result = await async_db.read(analytics.compute, kind, time_range, group)
+    return result
+
+@router.get("/api/analytics/kpis")
 async def get_analytics_kpis(time_range: str = "month", group: str = "all"):
     try:
-        # Sample KPI data based on time range
-        kpis_data = {
-            "today": { "score": 89.2, "revenue": 2.6, "profit": 19.5, "satisfaction": 4.4, "efficiency": 94.1, "stockout": 2.8 },
-            "week": { "score": 88.7, "revenue": 2.5, "profit": 19.1, "satisfaction": 4.3, "efficiency": 93.5, "stockout": 3.1 },
-            "month": { "score": 87.5, "revenue": 2.4, "profit": 18.2, "satisfaction": 4.3, "efficiency": 92.8, "stockout": 3.2 },
-            "quarter": { "score": 86.8, "revenue": 2.3, "profit": 17.8, "satisfaction": 4.2, "efficiency": 91.9, "stockout": 3.5 },
-            "year": { "score": 85.9, "revenue": 2.2, "profit": 17.1, "satisfaction": 4.1, "efficiency": 90.8, "stockout": 3.8 }
-        }
-        
         return {
             "success": True,
-            "data": kpis_data.get(time_range, kpis_data["month"]),
+            "data": await _analytics("kpis", time_range, group),
             "timeRange": time_range,
             "group": group
         }
@@ -1548,27 +1018,12 @@ async def get_analytics_kpis(time_range: str = "month", group: str = "all"):
             "message": f"เกิดข้อผิดพลาด: {str(e)}"
         }
 
-@app.get("/api/analytics/performance-trends")
+@router.get("/api/analytics/performance-trends")
 async def get_performance_trends(time_range: str = "month", group: str = "all"):
     try:
-        # Sample performance trend data
-        trend_data = {
-            "labels": ["ม.ค.", "ก.พ.", "มี.ค.", "เม.ย.", "พ.ค.", "มิ.ย.", "ก.ค.", "ส.ค.", "ก.ย.", "ต.ค.", "พ.ย.", "ธ.ค."],
-            "datasets": [
-                {
-                    "label": "คะแนนประสิทธิภาพเฉลี่ย",
-                    "data": [82.1, 83.5, 85.2, 84.8, 86.1, 87.3, 88.5, 87.9, 89.2, 88.7, 90.1, 87.5]
-                },
-                {
-                    "label": "เป้าหมาย",
-                    "data": [85, 85, 85, 85, 85, 85, 85, 85, 85, 85, 85, 85]
-                }
-            ]
-        }
-        
         return {
             "success": True,
-            "data": trend_data
+            "data": await _analytics("trends", time_range, group)
         }
     except Exception as e:
         return {
@@ -1576,42 +1031,23 @@ async def get_performance_trends(time_range: str = "month", group: str = "all"):
             "message": f"เกิดข้อผิดพลาด: {str(e)}"
         }
 
-@app.get("/api/analytics/branch-rankings")
-async def get_branch_rankings(group: str = "all", limit: int = 10):
+async def _ranking_index() -> RankingIndex:
+    """Rank index, rebuilt on a DB thread when the day changes or a refresh is due"""
+    if rank_index.stale():
+        if await async_db.read(rank_index.rebuild):
+            # First build of the day: keep yesterday's final ranks
+            await async_db.write(rank_index.snapshot, datetime.now().date() - timedelta(days=1))
+    return rank_index
+
+@router.get("/api/analytics/branch-rankings")
+async def get_branch_rankings(group: str = "all", limit: int = 10, time_range: str = "month",
+                              metric: str = "revenue"):
     try:
-        # Sample branch ranking data
-        branches = [
-            { "id": "BR001", "name": "สาขาเซ็นทรัลเวิลด์", "region": "ภาคกลาง", "score": 95.2, "revenue": 3200000, "profit": 22.5, "satisfaction": 4.8, "efficiency": 97.2, "trend": "up" },
-            { "id": "BR002", "name": "สาขาเชียงใหม่นิมมาน", "region": "ภาคเหนือ", "score": 92.8, "revenue": 2800000, "profit": 24.1, "satisfaction": 4.7, "efficiency": 94.5, "trend": "up" },
-            { "id": "BR003", "name": "สาขาภูเก็ตบิ๊กซี", "region": "ภาคใต้", "score": 90.1, "revenue": 2900000, "profit": 21.8, "satisfaction": 4.6, "efficiency": 93.2, "trend": "stable" },
-            { "id": "BR004", "name": "สาขาขอนแก่นเซ็นทรัล", "region": "ภาคอีสาน", "score": 88.7, "revenue": 2400000, "profit": 20.3, "satisfaction": 4.5, "efficiency": 91.8, "trend": "up" },
-            { "id": "BR005", "name": "สาขาหาดใหญ่ลี การ์เดน", "region": "ภาคใต้", "score": 86.3, "revenue": 2200000, "profit": 19.7, "satisfaction": 4.4, "efficiency": 89.5, "trend": "down" },
-            { "id": "BR006", "name": "สาขาอุดรธานีซีคอน", "region": "ภาคอีสาน", "score": 84.9, "revenue": 2100000, "profit": 18.9, "satisfaction": 4.3, "efficiency": 87.2, "trend": "stable" },
-            { "id": "BR007", "name": "สาขาสมุทรปราการเมกา", "region": "ภาคกลาง", "score": 83.5, "revenue": 2000000, "profit": 18.2, "satisfaction": 4.2, "efficiency": 85.8, "trend": "up" },
-            { "id": "BR008", "name": "สาขานครราชสีมาเดอะมอลล์", "region": "ภาคอีสาน", "score": 82.1, "revenue": 1900000, "profit": 17.5, "satisfaction": 4.1, "efficiency": 84.3, "trend": "down" },
-            { "id": "BR009", "name": "สาขาสุราษฎร์ธานีเซ็นทรัล", "region": "ภาคใต้", "score": 80.7, "revenue": 1800000, "profit": 16.8, "satisfaction": 4.0, "efficiency": 82.9, "trend": "stable" },
-            { "id": "BR010", "name": "สาขาลพบุรีโรบินสัน", "region": "ภาคกลาง", "score": 79.3, "revenue": 1700000, "profit": 16.1, "satisfaction": 3.9, "efficiency": 81.5, "trend": "down" }
-        ]
-        
-        # Apply group filter
-        if group != "all":
-            if group.startswith("region-"):
-                region_map = {
-                    "region-north": "ภาคเหนือ",
-                    "region-central": "ภาคกลาง",
-                    "region-northeast": "ภาคอีสาน",
-                    "region-south": "ภาคใต้"
-                }
-                if group in region_map:
-                    branches = [b for b in branches if b["region"] == region_map[group]]
-        
-        # Sort by score and limit results
-        branches.sort(key=lambda x: x["score"], reverse=True)
-        branches = branches[:limit]
+        index = await _ranking_index()
         
         return {
             "success": True,
-            "data": branches
+            "data": index.top(time_range, group, metric, limit)
         }
     except Exception as e:
         return {
@@ -1619,22 +1055,26 @@ async def get_branch_rankings(group: str = "all", limit: int = 10):
             "message": f"เกิดข้อผิดพลาด: {str(e)}"
         }
 
-@app.get("/api/analytics/regional-comparison")
-async def get_regional_comparison():
+@router.get("/api/analytics/branch-rankings/{branch_id}")
+async def get_branch_rank(branch_id: str, group: str = "all", time_range: str = "month",
+                          metric: str = "revenue", days: int = 30):
+    """One branch's current rank and its daily rank history"""
     try:
-        regional_data = {
-            "labels": ["ภาคกลาง", "ภาคเหนือ", "ภาคอีสาน", "ภาคใต้"],
-            "datasets": [{
-                "label": "คะแนนเฉลี่ย",
-                "data": [88.5, 86.3, 84.2, 87.1],
-                "revenue": [285000000, 240000000, 210000000, 260000000],
-                "branches": [45, 32, 38, 35]
-            }]
-        }
+        index = await _ranking_index()
+        rank = index.rank_of(branch_id, time_range, group, metric)
+        if rank is None:
+            return {
+                "success": False,
+                "message": f"ไม่พบสาขา {branch_id} ในกลุ่ม {group}"
+            }
+        history = await async_db.read(index.history, branch_id, time_range, group, metric, days)
         
         return {
             "success": True,
-            "data": regional_data
+            "data": {
+                "current": rank,
+                "history": history
+            }
         }
     except Exception as e:
         return {
@@ -1642,28 +1082,24 @@ async def get_regional_comparison():
             "message": f"เกิดข้อผิดพลาด: {str(e)}"
         }
 
-@app.get("/api/analytics/forecast")
-async def get_forecast_data(months: int = 3):
+@router.get("/api/analytics/regional-comparison")
+async def get_regional_comparison(time_range: str = "month"):
     try:
-        forecast_data = {
-            "historical": {
-                "labels": ["3 เดือนก่อน", "2 เดือนก่อน", "เดือนก่อน", "ปัจจุบัน"],
-                "revenue": [220, 230, 235, 240],
-                "performance": [84.2, 85.8, 86.5, 87.5]
-            },
-            "forecast": {
-                "labels": ["เดือน 1", "เดือน 2", "เดือน 3"],
-                "revenue": [252, 265, 278],
-                "performance": [88.2, 89.1, 90.3],
-                "confidence": [95.2, 92.1, 87.8]
-            },
-            "insights": {
-                "growth_rate": 12.3,
-                "risk_level": "medium",
-                "confidence": 94.2,
-                "key_factors": ["ขยายสาขาใหม่ 5 แห่ง", "เพิ่มผลิตภัณฑ์ใหม่", "ปรับปรุงกระบวนการจัดส่ง"]
-            }
+        return {
+            "success": True,
+            "data": await _analytics("regions", time_range, "all")
         }
+    except Exception as e:
+        return {
+            "success": False,
+            "message": f"เกิดข้อผิดพลาด: {str(e)}"
+        }
+
+@router.get("/api/analytics/forecast")
+async def get_forecast_data(months: int = 3, branch: Optional[str] = None):
+    try:
+        # Models are fitted once a day (first request after midnight)
+        forecast_data = await async_db.read(forecaster.forecast, months, branch)
         
         return {
             "success": True,
@@ -1675,40 +1111,188 @@ async def get_forecast_data(months: int = 3):
             "message": f"เกิดข้อผิดพลาด: {str(e)}"
         }
 
-@app.post("/api/analytics/export")
-async def export_analytics_report(request: Request):
+@router.post("/api/analytics/forecast/refit")
+async def refit_forecast_models():
+    """Refit every branch and chain forecast model now"""
+    try:
+        return {
+            "success": True,
+            "data": await async_db.read(forecaster.fit)
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "message": f"เกิดข้อผิดพลาด: {str(e)}"
+        }
+
+@router.post("/api/analytics/export")
+async def export_analytics_report(request: Request, current_user: dict = Depends(get_current_user)):
     try:
         data = await request.json()
-        format_type = data.get("format", "pdf")
-        time_range = data.get("timeRange", "month")
+        format_type = data.get("format", "csv")
         group = data.get("group", "all")
-        
-        # Simulate export process
-        filename = f"branch_analytics_{time_range}_{group}_{int(time.time())}"
-        
+        start, end = export_window(data.get("timeRange", "month"), data.get("startDate"), data.get("endDate"))
+
+        # Streamed to disk batch by batch on a reader connection
+        export = await async_db.read(exporter.export, format_type, start, end, group, bool(data.get("compress")),
+                                     current_user['allowed_branch_set'], current_user['id'])
+        size_mb = export["size"] / (1024 * 1024)
+
         return {
             "success": True,
             "data": {
-                "filename": f"{filename}.{format_type}",
-                "downloadUrl": f"/downloads/{filename}.{format_type}",
-                "size": "2.4 MB",
+                **export,
+                "downloadUrl": f"/api/analytics/exports/{export['filename']}",
+                "sizeLabel": f"{size_mb:.1f} MB",
                 "generatedAt": int(time.time())
             },
-            "message": f"รายงานถูกส่งออกเรียบร้อยแล้วในรูปแบบ {format_type.upper()}"
+            "message": f"รายงานถูกส่งออกเรียบร้อยแล้วในรูปแบบ {export['format'].upper()} ({export['rows']:,} รายการ)"
         }
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
     except Exception as e:
         return {
             "success": False,
             "message": f"เกิดข้อผิดพลาด: {str(e)}"
         }
 
+@router.get("/api/analytics/exports/{filename}")
+async def download_analytics_export(filename: str, request: Request,
+                                    current_user: dict = Depends(get_current_user)):
+    """Download a finished export of the current user; supports Range for resumed downloads"""
+    path = exporter.path(filename, current_user['id'])
+    if path is None:
+        raise HTTPException(status_code=404, detail="ไม่พบไฟล์ส่งออก หรือไฟล์หมดอายุแล้ว")
+    return file_response(path, request.headers.get("range"), request.headers.get("if-range"))
+
 # Health check
-@app.get("/health")
+@router.get("/health")
 async def health_check():
     return {"status": "healthy", "message": "ระบบจัดการสต๊อคผลไม้อบแห้งทำงานปกติ"}
 
+@router.get("/api/system/db-pool")
+async def db_pool_stats():
+    """Connection pool statistics for branch_system.db"""
+    return {
+        "success": True,
+        "data": {**db_pool.stats(), "executor": async_db.stats()}
+    }
+
+@router.get("/api/system/auth-cache")
+async def auth_cache_stats():
+    """Principal cache hit/miss counters"""
+    return {
+        "success": True,
+        "data": principal_cache.stats()
+    }
+
+@router.get("/api/system/password-hasher")
+async def password_hasher_stats():
+    """Login password-check queue metrics"""
+    return {
+        "success": True,
+        "data": password_hasher.stats()
+    }
+
+@router.get("/api/system/session-cache")
+async def session_cache_stats():
+    """Active-session cache hit/miss counters"""
+    return {
+        "success": True,
+        "data": session_cache.stats()
+    }
+
+@router.get("/api/system/page-cache")
+async def page_cache_stats():
+    """Cached HTML pages and their encoded sizes"""
+    return {
+        "success": True,
+        "data": page_cache.stats()
+    }
+
+@router.get("/api/system/live-feed")
+async def live_feed_stats():
+    """Live sales feed subscribers and fan-out counters"""
+    return {
+        "success": True,
+        "data": live_feed.stats()
+    }
+
+@router.get("/api/system/sale-log")
+async def sale_log_stats():
+    """Legacy sale log segments and group-commit counters"""
+    log = require_sale_log()
+    return {
+        "success": True,
+        "data": await asyncio.to_thread(log.stats)
+    }
+
+@router.get("/api/system/analytics-cache")
+async def analytics_cache_stats():
+    """Analytics result cache counters"""
+    return {
+        "success": True,
+        "data": analytics.stats()
+    }
+
+@router.get("/api/system/forecast")
+async def forecast_stats():
+    """Forecast model fit counters and last fit time"""
+    return {
+        "success": True,
+        "data": forecaster.stats()
+    }
+
+@router.get("/api/system/rank-index")
+async def rank_index_stats():
+    """Branch ranking index rebuild and update counters"""
+    return {
+        "success": True,
+        "data": rank_index.stats()
+    }
+
+@router.get("/api/system/routing")
+async def routing_stats():
+    """Route optimizer runs, distance saved and matrix rebuilds"""
+    return {
+        "success": True,
+        "data": route_planner.stats()
+    }
+
+@router.get("/api/system/exports")
+async def exports_stats():
+    """Sales exports written, rows, bytes and expired files removed"""
+    return {
+        "success": True,
+        "data": exporter.stats()
+    }
+
+@router.get("/api/system/bulk-operations")
+async def bulk_operations_stats():
+    """Bulk operation branch outcomes, retries and running operations"""
+    return {
+        "success": True,
+        "data": bulk_operations.stats()
+    }
+
+@router.get("/api/system/scheduler")
+async def scheduler_stats():
+    """Scheduled job queue depth, lateness and lease state"""
+    return {
+        "success": True,
+        "data": bulk_scheduler.stats()
+    }
+
+@router.get("/api/system/schema")
+async def db_schema_status():
+    """Schema migration version and hot-query index usage"""
+    return {
+        "success": True,
+        "data": schema_status
+    }
+
 # API endpoints (mock data for now)
-@app.get("/api/dashboard/stats")
+@router.get("/api/dashboard/stats")
 async def dashboard_stats():
     return {
         "todaySales": 125450,
@@ -1717,7 +1301,7 @@ async def dashboard_stats():
         "activeBranches": "147/150"
     }
 
-@app.get("/api/inventory/products")
+@router.get("/api/inventory/products")
 async def get_products():
     return {
         "success": True,
@@ -1750,7 +1334,7 @@ async def get_products():
     }
 
 # Purchase Order API endpoints
-@app.get("/api/suppliers")
+@router.get("/api/suppliers")
 async def get_suppliers():
     return {
         "success": True,
@@ -1788,7 +1372,7 @@ async def get_suppliers():
         ]
     }
 
-@app.get("/api/suppliers/{supplier_id}/products")
+@router.get("/api/suppliers/{supplier_id}/products")
 async def get_supplier_products(supplier_id: str):
     supplier_products = {
         "supplier1": [
@@ -1816,20 +1400,21 @@ async def get_supplier_products(supplier_id: str):
         "data": supplier_products.get(supplier_id, [])
     }
 
-@app.post("/api/purchase-orders")
+@router.post("/api/purchase-orders")
 async def create_purchase_order(request: Request):
     try:
         data = await request.json()
         
-        # Generate PO ID
-        po_id = f"PO{data['poNumber']}"
+        # Generate PO ID; the form's PO number is minute-granular, so mint one if absent
+        po_id = new_id("PO-")
+        po_number = data.get("poNumber") or po_id
         
         # Mock response - in real implementation, save to database
         response_data = {
             "success": True,
             "data": {
                 "id": po_id,
-                "poNumber": data["poNumber"],
+                "poNumber": po_number,
                 "status": "PENDING_APPROVAL",
                 "supplier": data["supplier"],
                 "orderDate": data["orderDate"],
@@ -1852,7 +1437,7 @@ async def create_purchase_order(request: Request):
             "message": f"เกิดข้อผิดพลาด: {str(e)}"
         }
 
-@app.get("/api/purchase-orders")
+@router.get("/api/purchase-orders")
 async def get_purchase_orders():
     return {
         "success": True,
@@ -1886,14 +1471,14 @@ async def get_purchase_orders():
         ]
     }
 
-@app.put("/api/purchase-orders/{po_id}/approve")
+@router.put("/api/purchase-orders/{po_id}/approve")
 async def approve_purchase_order(po_id: str):
     return {
         "success": True,
         "message": f"อนุมัติใบสั่งซื้อ {po_id} เรียบร้อยแล้ว"
     }
 
-@app.put("/api/purchase-orders/{po_id}/reject")
+@router.put("/api/purchase-orders/{po_id}/reject")
 async def reject_purchase_order(po_id: str, request: Request):
     data = await request.json()
     return {
@@ -1902,7 +1487,7 @@ async def reject_purchase_order(po_id: str, request: Request):
     }
 
 # Goods Receipt API endpoints
-@app.get("/api/purchase-orders/pending-receipt")
+@router.get("/api/purchase-orders/pending-receipt")
 async def get_pending_receipt_pos():
     return {
         "success": True,
@@ -1928,7 +1513,7 @@ async def get_pending_receipt_pos():
         ]
     }
 
-@app.get("/api/purchase-orders/{po_number}/details")
+@router.get("/api/purchase-orders/{po_number}/details")
 async def get_po_details(po_number: str):
     po_details = {
         "PO202407180001": {
@@ -1963,13 +1548,14 @@ async def get_po_details(po_number: str):
         "data": po_details.get(po_number, {})
     }
 
-@app.post("/api/goods-receipts")
+@router.post("/api/goods-receipts")
 async def create_goods_receipt(request: Request):
     try:
         data = await request.json()
         
-        # Generate GR ID
-        gr_id = f"GR{data['grNumber']}"
+        # Generate GR ID; the form's GR number is minute-granular, so mint one if absent
+        gr_id = new_id("GR-")
+        gr_number = data.get("grNumber") or gr_id
         
         # Calculate totals
         total_ordered = len(data['items'])
@@ -1981,7 +1567,7 @@ async def create_goods_receipt(request: Request):
             "success": True,
             "data": {
                 "id": gr_id,
-                "grNumber": data["grNumber"],
+                "grNumber": gr_number,
                 "poNumber": data["poNumber"],
                 "supplier": data["supplier"],
                 "receiptDate": data["receiptDate"],
@@ -2008,7 +1594,7 @@ async def create_goods_receipt(request: Request):
             "message": f"เกิดข้อผิดพลาด: {str(e)}"
         }
 
-@app.get("/api/goods-receipts")
+@router.get("/api/goods-receipts")
 async def get_goods_receipts():
     return {
         "success": True,
@@ -2038,7 +1624,7 @@ async def get_goods_receipts():
         ]
     }
 
-@app.get("/api/goods-receipts/{gr_id}")
+@router.get("/api/goods-receipts/{gr_id}")
 async def get_goods_receipt_details(gr_id: str):
     return {
         "success": True,
@@ -2079,182 +1665,183 @@ async def get_goods_receipt_details(gr_id: str):
     }
 
 # Branch Management API endpoints
-@app.get("/api/branches")
+BRANCHES = [
+    {
+        "id": "BR-001",
+        "name": "สาขาเซ็นทรัลปิ่นเกล้า",
+        "type": "FLAGSHIP",
+        "status": "ACTIVE",
+        "address": "เซ็นทรัลปิ่นเกล้า ชั้น 2 เลขที่ 7/222 ถนนบรมราชชนนี แขวงบางบำหรุ เขตบางพลัด กรุงเทพมหานคร 10700",
+        "province": "กรุงเทพมหานคร",
+        "postcode": "10700",
+        "phone": "02-884-8888",
+        "email": "pinklao@driedfruits.co.th",
+        "lat": 13.7878,
+        "lng": 100.4832,
+        "manager": "นางสาวกรรณิกา สมใส",
+        "managerPhone": "081-234-5678",
+        "managerEmail": "kannika@driedfruits.co.th",
+        "deliveryZone": "ZONE_CENTRAL",
+        "performanceScore": 95,
+        "monthlyRevenue": 850000,
+        "totalOrders": 2450,
+        "createdAt": "2024-01-15T09:00:00Z",
+        "openingDate": "2024-02-01"
+    },
+    {
+        "id": "BR-002",
+        "name": "สาขาเซียร์รังสิต",
+        "type": "STANDARD",
+        "status": "ACTIVE",
+        "address": "ห้างสรรพสินค้าเซียร์รังสิต ชั้น 1 เลขที่ 99/19 ถนนพหลโยธิน ตำบลประชาธิปัตย์ อำเภอธัญบุรี ปทุมธานี 12130",
+        "province": "ปทุมธานี",
+        "postcode": "12130",
+        "phone": "02-992-1234",
+        "email": "rangsit@driedfruits.co.th",
+        "lat": 14.0307,
+        "lng": 100.6078,
+        "manager": "นายพิษณุ อินทิรา",
+        "managerPhone": "089-765-4321",
+        "managerEmail": "pisanu@driedfruits.co.th",
+        "deliveryZone": "ZONE_CENTRAL",
+        "performanceScore": 88,
+        "monthlyRevenue": 650000,
+        "totalOrders": 1890,
+        "createdAt": "2024-02-10T09:00:00Z",
+        "openingDate": "2024-03-01"
+    },
+    {
+        "id": "BR-003",
+        "name": "สาขาเชียงใหม่ นิมมาน",
+        "type": "STANDARD",
+        "status": "ACTIVE",
+        "address": "ถนนนิมมานเหมินท์ ซอย 9 ตำบลสุเทพ อำเภอเมืองเชียงใหม่ เชียงใหม่ 50200",
+        "province": "เชียงใหม่",
+        "postcode": "50200",
+        "phone": "053-219-876",
+        "email": "nimman@driedfruits.co.th",
+        "lat": 18.8000,
+        "lng": 98.9650,
+        "manager": "นางสาวอาภัสรา ใจดี",
+        "managerPhone": "095-123-4567",
+        "managerEmail": "apatsara@driedfruits.co.th",
+        "deliveryZone": "ZONE_NORTH",
+        "performanceScore": 92,
+        "monthlyRevenue": 580000,
+        "totalOrders": 1650,
+        "createdAt": "2024-03-05T09:00:00Z",
+        "openingDate": "2024-04-01"
+    },
+    {
+        "id": "BR-004",
+        "name": "สาขาภูเก็ต ป่าตอง",
+        "type": "EXPRESS",
+        "status": "ACTIVE",
+        "address": "ถนนราษฎร์อุทิศ 200 ปี ตำบลป่าตอง อำเภอกะทู้ ภูเก็ต 83150",
+        "province": "ภูเก็ต",
+        "postcode": "83150",
+        "phone": "076-340-555",
+        "email": "patong@driedfruits.co.th",
+        "lat": 7.8964,
+        "lng": 98.2964,
+        "manager": "นายสมชาย ทะเลใส",
+        "managerPhone": "087-456-7890",
+        "managerEmail": "somchai@driedfruits.co.th",
+        "deliveryZone": "ZONE_SOUTH",
+        "performanceScore": 78,
+        "monthlyRevenue": 420000,
+        "totalOrders": 980,
+        "createdAt": "2024-04-12T09:00:00Z",
+        "openingDate": "2024-05-15"
+    },
+    {
+        "id": "BR-005",
+        "name": "สาขาขอนแก่น เซ็นทรัลพลาซ่า",
+        "type": "STANDARD",
+        "status": "PENDING",
+        "address": "เซ็นทรัลพลาซ่าขอนแก่น ชั้น 1 เลขที่ 1/1 ถนนศรีจันทร์ ตำบลในเมือง อำเภอเมืองขอนแก่น ขอนแก่น 40000",
+        "province": "ขอนแก่น",
+        "postcode": "40000",
+        "phone": "043-123-456",
+        "email": "khonkaen@driedfruits.co.th",
+        "lat": 16.4322,
+        "lng": 102.8236,
+        "manager": "นางวิไลวรรณ สุขใส",
+        "managerPhone": "081-999-8888",
+        "managerEmail": "wilaiwan@driedfruits.co.th",
+        "deliveryZone": "ZONE_NORTHEAST",
+        "performanceScore": 0,
+        "monthlyRevenue": 0,
+        "totalOrders": 0,
+        "createdAt": "2024-07-10T09:00:00Z",
+        "openingDate": None
+    },
+    {
+        "id": "BR-006",
+        "name": "สาขาสงขลา หาดใหญ่",
+        "type": "STANDARD",
+        "status": "PENDING",
+        "address": "ถนนนิพัทธ์อุทิศ 3 ตำบลหาดใหญ่ อำเภอหาดใหญ่ สงขลา 90110",
+        "province": "สงขลา",
+        "postcode": "90110",
+        "phone": "074-567-890",
+        "email": "hatyai@driedfruits.co.th",
+        "lat": 7.0187,
+        "lng": 100.4685,
+        "manager": "นายประเสริฐ รักดี",
+        "managerPhone": "086-777-6666",
+        "managerEmail": "prasert@driedfruits.co.th",
+        "deliveryZone": "ZONE_SOUTH",
+        "performanceScore": 0,
+        "monthlyRevenue": 0,
+        "totalOrders": 0,
+        "createdAt": "2024-07-15T09:00:00Z",
+        "openingDate": None
+    },
+    {
+        "id": "BR-007",
+        "name": "สาขาอุดรธานี เซ็นทรัลพลาซ่า",
+        "type": "STANDARD",
+        "status": "INACTIVE",
+        "address": "เซ็นทรัลพลาซ่าอุดรธานี ชั้น 2 เลขที่ 777 ถนนโพศรี ตำบลหมากแข้ง อำเภอเมืองอุดรธานี อุดรธานี 41000",
+        "province": "อุดรธานี",
+        "postcode": "41000",
+        "phone": "042-888-999",
+        "email": "udon@driedfruits.co.th",
+        "lat": 17.4139,
+        "lng": 102.7864,
+        "manager": "นายชัยวัฒน์ มีสุข",
+        "managerPhone": "089-333-2222",
+        "managerEmail": "chaiwat@driedfruits.co.th",
+        "deliveryZone": "ZONE_NORTHEAST",
+        "performanceScore": 65,
+        "monthlyRevenue": 0,
+        "totalOrders": 850,
+        "createdAt": "2024-01-20T09:00:00Z",
+        "openingDate": "2024-02-15"
+    }
+]
+
+@router.get("/api/branches")
 async def get_branches():
     return {
         "success": True,
-        "data": [
-            {
-                "id": "BR-001",
-                "name": "สาขาเซ็นทรัลปิ่นเกล้า",
-                "type": "FLAGSHIP",
-                "status": "ACTIVE",
-                "address": "เซ็นทรัลปิ่นเกล้า ชั้น 2 เลขที่ 7/222 ถนนบรมราชชนนี แขวงบางบำหรุ เขตบางพลัด กรุงเทพมหานคร 10700",
-                "province": "กรุงเทพมหานคร",
-                "postcode": "10700",
-                "phone": "02-884-8888",
-                "email": "pinklao@driedfruits.co.th",
-                "lat": 13.7878,
-                "lng": 100.4832,
-                "manager": "นางสาวกรรณิกา สมใส",
-                "managerPhone": "081-234-5678",
-                "managerEmail": "kannika@driedfruits.co.th",
-                "deliveryZone": "ZONE_CENTRAL",
-                "performanceScore": 95,
-                "monthlyRevenue": 850000,
-                "totalOrders": 2450,
-                "createdAt": "2024-01-15T09:00:00Z",
-                "openingDate": "2024-02-01"
-            },
-            {
-                "id": "BR-002",
-                "name": "สาขาเซียร์รังสิต",
-                "type": "STANDARD",
-                "status": "ACTIVE",
-                "address": "ห้างสรรพสินค้าเซียร์รังสิต ชั้น 1 เลขที่ 99/19 ถนนพหลโยธิน ตำบลประชาธิปัตย์ อำเภอธัญบุรี ปทุมธานี 12130",
-                "province": "ปทุมธานี",
-                "postcode": "12130",
-                "phone": "02-992-1234",
-                "email": "rangsit@driedfruits.co.th",
-                "lat": 14.0307,
-                "lng": 100.6078,
-                "manager": "นายพิษณุ อินทิรา",
-                "managerPhone": "089-765-4321",
-                "managerEmail": "pisanu@driedfruits.co.th",
-                "deliveryZone": "ZONE_CENTRAL",
-                "performanceScore": 88,
-                "monthlyRevenue": 650000,
-                "totalOrders": 1890,
-                "createdAt": "2024-02-10T09:00:00Z",
-                "openingDate": "2024-03-01"
-            },
-            {
-                "id": "BR-003",
-                "name": "สาขาเชียงใหม่ นิมมาน",
-                "type": "STANDARD",
-                "status": "ACTIVE",
-                "address": "ถนนนิมมานเหมินท์ ซอย 9 ตำบลสุเทพ อำเภอเมืองเชียงใหม่ เชียงใหม่ 50200",
-                "province": "เชียงใหม่",
-                "postcode": "50200",
-                "phone": "053-219-876",
-                "email": "nimman@driedfruits.co.th",
-                "lat": 18.8000,
-                "lng": 98.9650,
-                "manager": "นางสาวอาภัสรา ใจดี",
-                "managerPhone": "095-123-4567",
-                "managerEmail": "apatsara@driedfruits.co.th",
-                "deliveryZone": "ZONE_NORTH",
-                "performanceScore": 92,
-                "monthlyRevenue": 580000,
-                "totalOrders": 1650,
-                "createdAt": "2024-03-05T09:00:00Z",
-                "openingDate": "2024-04-01"
-            },
-            {
-                "id": "BR-004",
-                "name": "สาขาภูเก็ต ป่าตอง",
-                "type": "EXPRESS",
-                "status": "ACTIVE",
-                "address": "ถนนราษฎร์อุทิศ 200 ปี ตำบลป่าตอง อำเภอกะทู้ ภูเก็ต 83150",
-                "province": "ภูเก็ต",
-                "postcode": "83150",
-                "phone": "076-340-555",
-                "email": "patong@driedfruits.co.th",
-                "lat": 7.8964,
-                "lng": 98.2964,
-                "manager": "นายสมชาย ทะเลใส",
-                "managerPhone": "087-456-7890",
-                "managerEmail": "somchai@driedfruits.co.th",
-                "deliveryZone": "ZONE_SOUTH",
-                "performanceScore": 78,
-                "monthlyRevenue": 420000,
-                "totalOrders": 980,
-                "createdAt": "2024-04-12T09:00:00Z",
-                "openingDate": "2024-05-15"
-            },
-            {
-                "id": "BR-005",
-                "name": "สาขาขอนแก่น เซ็นทรัลพลาซ่า",
-                "type": "STANDARD",
-                "status": "PENDING",
-                "address": "เซ็นทรัลพลาซ่าขอนแก่น ชั้น 1 เลขที่ 1/1 ถนนศรีจันทร์ ตำบลในเมือง อำเภอเมืองขอนแก่น ขอนแก่น 40000",
-                "province": "ขอนแก่น",
-                "postcode": "40000",
-                "phone": "043-123-456",
-                "email": "khonkaen@driedfruits.co.th",
-                "lat": 16.4322,
-                "lng": 102.8236,
-                "manager": "นางวิไลวรรณ สุขใส",
-                "managerPhone": "081-999-8888",
-                "managerEmail": "wilaiwan@driedfruits.co.th",
-                "deliveryZone": "ZONE_NORTHEAST",
-                "performanceScore": 0,
-                "monthlyRevenue": 0,
-                "totalOrders": 0,
-                "createdAt": "2024-07-10T09:00:00Z",
-                "openingDate": null
-            },
-            {
-                "id": "BR-006",
-                "name": "สาขาสงขลา หาดใหญ่",
-                "type": "STANDARD",
-                "status": "PENDING",
-                "address": "ถนนนิพัทธ์อุทิศ 3 ตำบลหาดใหญ่ อำเภอหาดใหญ่ สงขลา 90110",
-                "province": "สงขลา",
-                "postcode": "90110",
-                "phone": "074-567-890",
-                "email": "hatyai@driedfruits.co.th",
-                "lat": 7.0187,
-                "lng": 100.4685,
-                "manager": "นายประเสริฐ รักดี",
-                "managerPhone": "086-777-6666",
-                "managerEmail": "prasert@driedfruits.co.th",
-                "deliveryZone": "ZONE_SOUTH",
-                "performanceScore": 0,
-                "monthlyRevenue": 0,
-                "totalOrders": 0,
-                "createdAt": "2024-07-15T09:00:00Z",
-                "openingDate": null
-            },
-            {
-                "id": "BR-007",
-                "name": "สาขาอุดรธานี เซ็นทรัลพลาซ่า",
-                "type": "STANDARD",
-                "status": "INACTIVE",
-                "address": "เซ็นทรัลพลาซ่าอุดรธานี ชั้น 2 เลขที่ 777 ถนนโพศรี ตำบลหมากแข้ง อำเภอเมืองอุดรธานี อุดรธานี 41000",
-                "province": "อุดรธานี",
-                "postcode": "41000",
-                "phone": "042-888-999",
-                "email": "udon@driedfruits.co.th",
-                "lat": 17.4139,
-                "lng": 102.7864,
-                "manager": "นายชัยวัฒน์ มีสุข",
-                "managerPhone": "089-333-2222",
-                "managerEmail": "chaiwat@driedfruits.co.th",
-                "deliveryZone": "ZONE_NORTHEAST",
-                "performanceScore": 65,
-                "monthlyRevenue": 0,
-                "totalOrders": 850,
-                "createdAt": "2024-01-20T09:00:00Z",
-                "openingDate": "2024-02-15"
-            }
-        ]
+        "data": BRANCHES
     }
 
-@app.get("/api/branches/generate-id")
+@router.get("/api/branches/generate-id")
 async def generate_branch_id():
-    # In real implementation, get the next available ID from database
-    import random
-    next_id = f"BR-{random.randint(100, 999):03d}"
+    # Time-ordered and unique across workers, unlike the old random 3-digit ID
+    next_id = new_id("BR-")
     return {"branchId": next_id}
 
-@app.post("/api/branches")
+@router.post("/api/branches")
 async def create_branch(request: Request):
     try:
         data = await request.json()
         
         # Generate branch ID if not provided
-        branch_id = data.get('branchId', f"BR-{len(await get_branches()) + 1:03d}")
+        branch_id = data.get('branchId') or new_id("BR-")
         
         # Create branch data
         new_branch = {
@@ -2310,7 +1897,7 @@ async def create_branch(request: Request):
             "message": f"เกิดข้อผิดพลาด: {str(e)}"
         }
 
-@app.get("/api/branches/zones")
+@router.get("/api/branches/zones")
 async def get_delivery_zones():
     return {
         "success": True,
@@ -2360,7 +1947,7 @@ async def get_delivery_zones():
         ]
     }
 
-@app.put("/api/branches/{branch_id}")
+@router.put("/api/branches/{branch_id}")
 async def update_branch(branch_id: str, request: Request):
     try:
         data = await request.json()
@@ -2377,7 +1964,7 @@ async def update_branch(branch_id: str, request: Request):
             "message": f"เกิดข้อผิดพลาด: {str(e)}"
         }
 
-@app.delete("/api/branches/{branch_id}")
+@router.delete("/api/branches/{branch_id}")
 async def delete_branch(branch_id: str):
     try:
         # In real implementation, soft delete or deactivate branch
@@ -2392,7 +1979,7 @@ async def delete_branch(branch_id: str):
             "message": f"เกิดข้อผิดพลาด: {str(e)}"
         }
 
-@app.post("/api/branches/{branch_id}/activate")
+@router.post("/api/branches/{branch_id}/activate")
 async def activate_branch(branch_id: str):
     try:
         # In real implementation:
@@ -2412,7 +1999,7 @@ async def activate_branch(branch_id: str):
         }
 
 # Branch Approval Workflow API endpoints
-@app.post("/api/branches/{branch_id}/approve")
+@router.post("/api/branches/{branch_id}/approve")
 async def approve_branch(branch_id: str, request: Request):
     try:
         data = await request.json() if request.headers.get('content-type') == 'application/json' else {}
@@ -2446,7 +2033,7 @@ async def approve_branch(branch_id: str, request: Request):
             "message": f"เกิดข้อผิดพลาด: {str(e)}"
         }
 
-@app.post("/api/branches/{branch_id}/reject")
+@router.post("/api/branches/{branch_id}/reject")
 async def reject_branch(branch_id: str, request: Request):
     try:
         data = await request.json()
@@ -2480,7 +2067,7 @@ async def reject_branch(branch_id: str, request: Request):
             "message": f"เกิดข้อผิดพลาด: {str(e)}"
         }
 
-@app.get("/api/branches/pending")
+@router.get("/api/branches/pending")
 async def get_pending_branches():
     return {
         "success": True,
@@ -2536,7 +2123,7 @@ async def get_pending_branches():
         ]
     }
 
-@app.post("/api/branches/bulk-approve")
+@router.post("/api/branches/bulk-approve")
 async def bulk_approve_branches(request: Request):
     try:
         data = await request.json()
@@ -2560,7 +2147,7 @@ async def bulk_approve_branches(request: Request):
             "message": f"เกิดข้อผิดพลาด: {str(e)}"
         }
 
-@app.post("/api/branches/bulk-reject")
+@router.post("/api/branches/bulk-reject")
 async def bulk_reject_branches(request: Request):
     try:
         data = await request.json()
@@ -2586,7 +2173,7 @@ async def bulk_reject_branches(request: Request):
             "message": f"เกิดข้อผิดพลาด: {str(e)}"
         }
 
-@app.get("/api/approval/statistics")
+@router.get("/api/approval/statistics")
 async def get_approval_statistics():
     return {
         "success": True,
@@ -2602,110 +2189,129 @@ async def get_approval_statistics():
     }
 
 # Delivery Routes API endpoints
-@app.get("/api/delivery/routes")
+# Trucks load at the central warehouse; route legs and totals are measured
+# from here, so the distances in DELIVERY_ROUTES are only initial values
+WAREHOUSE = {"id": "WH-BKK", "name": "คลังสินค้ากลาง กรุงเทพฯ", "lat": 13.7563, "lng": 100.5018}
+
+DELIVERY_ROUTES = [
+    {
+        "id": "route-central-a",
+        "name": "เส้นทางภาคกลาง A",
+        "zone": "ZONE_CENTRAL",
+        "status": "active",
+        "vehicle": "รถบรรทุก 6 ล้อ (BKK-001)",
+        "driver": "สมชาย ใจดี",
+        "branches": [
+            {"id": "BR-001", "name": "เซ็นทรัลปิ่นเกล้า", "lat": 13.7878, "lng": 100.4832, "order": 1, "distance": 15.2},
+            {"id": "BR-002", "name": "เซียร์รังสิต", "lat": 14.0307, "lng": 100.6078, "order": 2, "distance": 28.5},
+            {"id": "BR-008", "name": "เมกาบางนา", "lat": 13.6676, "lng": 100.6155, "order": 3, "distance": 22.8}
+        ],
+        "totalDistance": 66.5,
+        "estimatedTime": 4.5,
+        "optimizationScore": 94,
+        "lastOptimized": "2024-07-18T05:30:00Z"
+    },
+    {
+        "id": "route-north-a",
+        "name": "เส้นทางภาคเหนือ",
+        "zone": "ZONE_NORTH",
+        "status": "planned",
+        "vehicle": "รถบรรทุก 10 ล้อ (CNX-001)",
+        "driver": "อานนท์ ภูเขียว",
+        "branches": [
+            {"id": "BR-003", "name": "เชียงใหม่ นิมมาน", "lat": 18.8000, "lng": 98.9650, "order": 1, "distance": 695.2},
+            {"id": "BR-009", "name": "ลำปาง กาดกองต้า", "lat": 18.2888, "lng": 99.4919, "order": 2, "distance": 102.4},
+            {"id": "BR-010", "name": "แพร่ วิน", "lat": 18.1459, "lng": 100.1201, "order": 3, "distance": 78.9}
+        ],
+        "totalDistance": 876.5,
+        "estimatedTime": 12.5,
+        "optimizationScore": 89,
+        "lastOptimized": "2024-07-18T05:30:00Z"
+    },
+    {
+        "id": "route-south-a",
+        "name": "เส้นทางภาคใต้ A",
+        "zone": "ZONE_SOUTH",
+        "status": "active",
+        "vehicle": "รถบรรทุก 6 ล้อ (PKT-001)",
+        "driver": "ประเสริฐ ทะเลใส",
+        "branches": [
+            {"id": "BR-004", "name": "ภูเก็ต ป่าตอง", "lat": 7.8964, "lng": 98.2964, "order": 1, "distance": 862.1},
+            {"id": "BR-011", "name": "กระบี่ อ่าวนาง", "lat": 8.0348, "lng": 98.9067, "order": 2, "distance": 165.3},
+            {"id": "BR-012", "name": "ตรัง เซ็นทรัล", "lat": 7.5563, "lng": 99.6114, "order": 3, "distance": 145.8}
+        ],
+        "totalDistance": 1173.2,
+        "estimatedTime": 16.5,
+        "optimizationScore": 87,
+        "lastOptimized": "2024-07-18T05:30:00Z"
+    },
+    {
+        "id": "route-northeast-a",
+        "name": "เส้นทางภาคอีสาน",
+        "zone": "ZONE_NORTHEAST",
+        "status": "delayed",
+        "vehicle": "รถบรรทุก 10 ล้อ (KKC-001)",
+        "driver": "วิไลวรรณ สุขใส",
+        "branches": [
+            {"id": "BR-005", "name": "ขอนแก่น เซ็นทรัล", "lat": 16.4322, "lng": 102.8236, "order": 1, "distance": 449.2},
+            {"id": "BR-013", "name": "อุดรธานี เซ็นทรัล", "lat": 17.4139, "lng": 102.7864, "order": 2, "distance": 112.4},
+            {"id": "BR-014", "name": "หนองคาย วิลล่า", "lat": 17.8782, "lng": 102.7412, "order": 3, "distance": 67.8}
+        ],
+        "totalDistance": 629.4,
+        "estimatedTime": 9.2,
+        "optimizationScore": 78,
+        "lastOptimized": "2024-07-17T05:30:00Z"
+    }
+]
+
+# Distance matrix over the warehouse and every stop; optimize-all solves
+# each delivery zone on its own worker process
+route_planner = RoutePlanner(WAREHOUSE, DELIVERY_ROUTES, BRANCHES)
+
+@router.get("/api/delivery/routes")
 async def get_delivery_routes():
     return {
         "success": True,
-        "data": [
-            {
-                "id": "route-central-a",
-                "name": "เส้นทางภาคกลาง A",
-                "zone": "ZONE_CENTRAL",
-                "status": "active",
-                "vehicle": "รถบรรทุก 6 ล้อ (BKK-001)",
-                "driver": "สมชาย ใจดี",
-                "branches": [
-                    {"id": "BR-001", "name": "เซ็นทรัลปิ่นเกล้า", "lat": 13.7878, "lng": 100.4832, "order": 1, "distance": 15.2},
-                    {"id": "BR-002", "name": "เซียร์รังสิต", "lat": 14.0307, "lng": 100.6078, "order": 2, "distance": 28.5},
-                    {"id": "BR-008", "name": "เมกาบางนา", "lat": 13.6676, "lng": 100.6155, "order": 3, "distance": 22.8}
-                ],
-                "totalDistance": 66.5,
-                "estimatedTime": 4.5,
-                "optimizationScore": 94,
-                "lastOptimized": "2024-07-18T05:30:00Z"
-            },
-            {
-                "id": "route-north-a",
-                "name": "เส้นทางภาคเหนือ",
-                "zone": "ZONE_NORTH",
-                "status": "planned",
-                "vehicle": "รถบรรทุก 10 ล้อ (CNX-001)",
-                "driver": "อานนท์ ภูเขียว",
-                "branches": [
-                    {"id": "BR-003", "name": "เชียงใหม่ นิมมาน", "lat": 18.8000, "lng": 98.9650, "order": 1, "distance": 695.2},
-                    {"id": "BR-009", "name": "ลำปาง กาดกองต้า", "lat": 18.2888, "lng": 99.4919, "order": 2, "distance": 102.4},
-                    {"id": "BR-010", "name": "แพร่ วิน", "lat": 18.1459, "lng": 100.1201, "order": 3, "distance": 78.9}
-                ],
-                "totalDistance": 876.5,
-                "estimatedTime": 12.5,
-                "optimizationScore": 89,
-                "lastOptimized": "2024-07-18T05:30:00Z"
-            },
-            {
-                "id": "route-south-a",
-                "name": "เส้นทางภาคใต้ A",
-                "zone": "ZONE_SOUTH",
-                "status": "active",
-                "vehicle": "รถบรรทุก 6 ล้อ (PKT-001)",
-                "driver": "ประเสริฐ ทะเลใส",
-                "branches": [
-                    {"id": "BR-004", "name": "ภูเก็ต ป่าตอง", "lat": 7.8964, "lng": 98.2964, "order": 1, "distance": 862.1},
-                    {"id": "BR-011", "name": "กระบี่ อ่าวนาง", "lat": 8.0348, "lng": 98.9067, "order": 2, "distance": 165.3},
-                    {"id": "BR-012", "name": "ตรัง เซ็นทรัล", "lat": 7.5563, "lng": 99.6114, "order": 3, "distance": 145.8}
-                ],
-                "totalDistance": 1173.2,
-                "estimatedTime": 16.5,
-                "optimizationScore": 87,
-                "lastOptimized": "2024-07-18T05:30:00Z"
-            },
-            {
-                "id": "route-northeast-a",
-                "name": "เส้นทางภาคอีสาน",
-                "zone": "ZONE_NORTHEAST",
-                "status": "delayed",
-                "vehicle": "รถบรรทุก 10 ล้อ (KKC-001)",
-                "driver": "วิไลวรรณ สุขใส",
-                "branches": [
-                    {"id": "BR-005", "name": "ขอนแก่น เซ็นทรัล", "lat": 16.4322, "lng": 102.8236, "order": 1, "distance": 449.2},
-                    {"id": "BR-013", "name": "อุดรธานี เซ็นทรัล", "lat": 17.4139, "lng": 102.7864, "order": 2, "distance": 112.4},
-                    {"id": "BR-014", "name": "หนองคาย วิลล่า", "lat": 17.8782, "lng": 102.7412, "order": 3, "distance": 67.8}
-                ],
-                "totalDistance": 629.4,
-                "estimatedTime": 9.2,
-                "optimizationScore": 78,
-                "lastOptimized": "2024-07-17T05:30:00Z"
-            }
-        ]
+        "data": route_planner.routes()
     }
 
-@app.post("/api/delivery/routes/{route_id}/optimize")
+@router.post("/api/delivery/routes/{route_id}/optimize")
 async def optimize_route(route_id: str):
-    return {
-        "success": True,
-        "data": {
-            "routeId": route_id,
-            "optimizationScore": 95,
-            "distanceSaved": 12.5,
-            "timeSaved": 0.8,
-            "fuelSaved": 2.1
-        },
-        "message": f"ปรับปรุงเส้นทาง {route_id} เรียบร้อยแล้ว"
-    }
+    try:
+        result, = await route_planner.optimize([route_id])
+        return {
+            "success": True,
+            "data": result,
+            "message": f"ปรับปรุงเส้นทาง {route_id} เรียบร้อยแล้ว"
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "message": f"เกิดข้อผิดพลาด: {str(e)}"
+        }
 
-@app.post("/api/delivery/routes/optimize-all")
+@router.post("/api/delivery/routes/optimize-all")
 async def optimize_all_routes():
-    return {
-        "success": True,
-        "data": {
-            "optimizedRoutes": 6,
-            "totalDistanceSaved": 85.4,
-            "totalTimeSaved": 5.2,
-            "totalFuelSaved": 14.8
-        },
-        "message": "ปรับปรุงเส้นทางทั้งหมดเรียบร้อยแล้ว"
-    }
+    try:
+        results = await route_planner.optimize()
+        return {
+            "success": True,
+            "data": {
+                "optimizedRoutes": len(results),
+                "totalDistanceSaved": round(sum(r["distanceSaved"] for r in results), 1),
+                "totalTimeSaved": round(sum(r["timeSaved"] for r in results), 2),
+                "totalFuelSaved": round(sum(r["fuelSaved"] for r in results), 1),
+                "routes": results
+            },
+            "message": "ปรับปรุงเส้นทางทั้งหมดเรียบร้อยแล้ว"
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "message": f"เกิดข้อผิดพลาด: {str(e)}"
+        }
 
-@app.get("/api/delivery/statistics")
+@router.get("/api/delivery/statistics")
 async def get_delivery_statistics():
     return {
         "success": True,
@@ -2720,7 +2326,7 @@ async def get_delivery_statistics():
         }
     }
 
-@app.get("/api/delivery/schedule")
+@router.get("/api/delivery/schedule")
 async def get_delivery_schedule():
     return {
         "success": True,
@@ -2757,22 +2363,11 @@ async def get_delivery_schedule():
     }
 
 # API Routes for Bulk Branch Operations
-@app.get("/api/bulk-operations/branches")
+@router.get("/api/bulk-operations/branches")
 async def get_bulk_operation_branches(region: str = "all", size: str = "all", status: str = "all"):
+    """Branches from the branches table, filtered for the bulk-operation picker"""
     try:
-        # Sample branch data
-        branches = [
-            { "id": "BR001", "name": "สาขาเซ็นทรัลเวิลด์", "region": "central", "size": "large", "status": "active", "revenue": 3200000, "performance": 95.2 },
-            { "id": "BR002", "name": "สาขาเชียงใหม่นิมมาน", "region": "north", "size": "medium", "status": "active", "revenue": 2800000, "performance": 92.8 },
-            { "id": "BR003", "name": "สาขาภูเก็ตบิ๊กซี", "region": "south", "size": "large", "status": "active", "revenue": 2900000, "performance": 90.1 },
-            { "id": "BR004", "name": "สาขาขอนแก่นเซ็นทรัล", "region": "northeast", "size": "medium", "status": "active", "revenue": 2400000, "performance": 88.7 },
-            { "id": "BR005", "name": "สาขาหาดใหญ่ลี การ์เดน", "region": "south", "size": "medium", "status": "active", "revenue": 2200000, "performance": 86.3 },
-            { "id": "BR006", "name": "สาขาอุดรธานีซีคอน", "region": "northeast", "size": "small", "status": "active", "revenue": 2100000, "performance": 84.9 },
-            { "id": "BR007", "name": "สาขาสมุทรปราการเมกา", "region": "central", "size": "medium", "status": "inactive", "revenue": 2000000, "performance": 83.5 },
-            { "id": "BR008", "name": "สาขานครราชสีมาเดอะมอลล์", "region": "northeast", "size": "large", "status": "active", "revenue": 1900000, "performance": 82.1 },
-            { "id": "BR009", "name": "สาขาสุราษฎร์ธานีเซ็นทรัล", "region": "south", "size": "small", "status": "active", "revenue": 1800000, "performance": 80.7 },
-            { "id": "BR010", "name": "สาขาลพบุรีโรบินสัน", "region": "central", "size": "small", "status": "active", "revenue": 1700000, "performance": 79.3 }
-        ]
+        branches = await async_db.read(list_branches)
         
         # Apply filters
         filtered_branches = branches
@@ -2796,8 +2391,29 @@ async def get_bulk_operation_branches(region: str = "all", size: str = "all", st
             "message": f"เกิดข้อผิดพลาด: {str(e)}"
         }
 
-@app.post("/api/bulk-operations/execute")
+# Bulk operations run in the background with BULK_OPERATION_CONCURRENCY
+# branches in flight; their writes still take turns on the single DB writer.
+# Transient failures are retried BULK_OPERATION_ATTEMPTS times
+BULK_OPERATION_CONCURRENCY = 8
+BULK_OPERATION_ATTEMPTS = 3
+bulk_operations = BulkOperationEngine(
+    async_db, concurrency=BULK_OPERATION_CONCURRENCY, max_attempts=BULK_OPERATION_ATTEMPTS
+)
+
+# Scheduled and recurring bulk operations; every worker runs the loop but
+# only the lease holder fires due jobs, checking at least every SCHEDULER_TICK
+SCHEDULER_TICK = 5.0  # seconds
+SCHEDULER_LEASE_TTL = 30.0  # seconds
+# The leader resumes bulk operations with no progress for this long
+BULK_OPERATION_STALE_AFTER = 60.0  # seconds
+bulk_scheduler = BulkOperationScheduler(
+    async_db, bulk_operations, tick=SCHEDULER_TICK, lease_ttl=SCHEDULER_LEASE_TTL,
+    stale_after=BULK_OPERATION_STALE_AFTER
+)
+
+@router.post("/api/bulk-operations/execute")
 async def execute_bulk_operation(request: Request):
+    """Start a bulk operation; poll or stream its progress by operationId"""
     try:
         data = await request.json()
         operation_type = data.get("operationType")
@@ -2805,35 +2421,86 @@ async def execute_bulk_operation(request: Request):
         operation_data = data.get("operationData", {})
         schedule_type = data.get("scheduleType", "immediate")
         
-        # Simulate bulk operation execution
-        results = []
-        for branch_id in branch_ids:
-            # Simulate processing with 90% success rate
-            success = __import__('random').random() > 0.1
-            
-            results.append({
-                "branchId": branch_id,
-                "success": success,
-                "message": "สำเร็จ" if success else "ล้มเหลว: ข้อผิดพลาดเชื่อมต่อ",
-                "timestamp": int(time.time())
-            })
+        if schedule_type in ("scheduled", "recurring"):
+            job = await bulk_scheduler.schedule(
+                operation_type, branch_ids, operation_data,
+                run_at=data.get("scheduledDateTime"),
+                cadence=data.get("recurringFreq", "daily") if schedule_type == "recurring" else None
+            )
+            return {
+                "success": True,
+                "data": job,
+                "message": f"กำหนดเวลาดำเนินการแล้ว: {job['nextRunAt']}"
+            }
+        if schedule_type != "immediate":
+            raise ValueError(f"ยังไม่รองรับการกำหนดเวลาแบบ {schedule_type}")
         
-        successful = len([r for r in results if r["success"]])
-        failed = len([r for r in results if not r["success"]])
+        progress = await bulk_operations.submit(operation_type, branch_ids, operation_data)
+        operation_id = progress["operationId"]
         
         return {
             "success": True,
-            "data": {
-                "operationId": f"OP{int(time.time())}",
-                "operationType": operation_type,
-                "totalBranches": len(branch_ids),
-                "successful": successful,
-                "failed": failed,
-                "results": results,
-                "scheduleType": schedule_type,
-                "executedAt": int(time.time())
-            },
-            "message": f"ดำเนินการแล้วเสร็จ: {successful}/{len(branch_ids)} สาขา"
+            "data": dict(
+                progress,
+                scheduleType=schedule_type,
+                statusUrl=f"/api/bulk-operations/{operation_id}",
+                streamUrl=f"/api/bulk-operations/{operation_id}/stream"
+            ),
+            "message": f"เริ่มดำเนินการกับ {progress['totalBranches']} สาขาแล้ว"
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "message": f"เกิดข้อผิดพลาด: {str(e)}"
+        }
+
+@router.get("/api/bulk-operations/schedules")
+async def get_bulk_operation_schedules(include_finished: bool = False):
+    """Scheduled and recurring bulk operations, soonest first"""
+    try:
+        return {
+            "success": True,
+            "data": await bulk_scheduler.jobs(include_finished)
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "message": f"เกิดข้อผิดพลาด: {str(e)}"
+        }
+
+@router.delete("/api/bulk-operations/schedules/{job_id}")
+async def cancel_bulk_operation_schedule(job_id: str):
+    try:
+        if not await bulk_scheduler.cancel(job_id):
+            return {
+                "success": False,
+                "message": f"ไม่พบกำหนดการ {job_id} ที่ยังใช้งานอยู่"
+            }
+        
+        return {
+            "success": True,
+            "message": f"ยกเลิกกำหนดการ {job_id} แล้ว"
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "message": f"เกิดข้อผิดพลาด: {str(e)}"
+        }
+
+@router.get("/api/bulk-operations/{operation_id}")
+async def get_bulk_operation(operation_id: str, results: bool = True):
+    """Progress of a bulk operation and each branch's result"""
+    try:
+        progress = await bulk_operations.progress(operation_id, results)
+        if progress is None:
+            return {
+                "success": False,
+                "message": f"ไม่พบการดำเนินการ {operation_id}"
+            }
+        
+        return {
+            "success": True,
+            "data": progress
         }
     except Exception as e:
         return {
@@ -2841,9 +2508,19 @@ async def execute_bulk_operation(request: Request):
             "message": f"เกิดข้อผิดพลาด: {str(e)}"
         }
 
+@router.get("/api/bulk-operations/{operation_id}/stream")
+async def stream_bulk_operation(request: Request, operation_id: str):
+    """Server-Sent Events: progress as branches finish, then the results"""
+    return StreamingResponse(
+        bulk_operations.stream(operation_id, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # API Routes for Sales Recording System
-@app.post("/api/sales")
+@router.post("/api/sales")
 async def record_sale(request: Request):
+    log = require_sale_log()
     try:
         data = await request.json()
         
@@ -2869,11 +2546,10 @@ async def record_sale(request: Request):
             "createdAt": int(time.time())
         }
         
-        # Store in global variable for demo (in real app, save to database)
-        global recorded_sales
-        if 'recorded_sales' not in globals():
-            recorded_sales = []
-        recorded_sales.append(sale_record)
+        # Append to the durable sale log; returns once the record is fsynced
+        sale_record["saleId"] = sale_record["id"]
+        sale_record["logOffset"] = await log.append_durable(sale_record)
+        live_feed.publish(sale_record)
         
         return {
             "success": True,
@@ -2886,56 +2562,39 @@ async def record_sale(request: Request):
             "message": f"เกิดข้อผิดพลาด: {str(e)}"
         }
 
-@app.get("/api/sales/live")
-async def get_live_sales():
+@router.get("/api/sales/live")
+async def get_live_sales(cursor: Optional[int] = None, branch: Optional[str] = None, limit: int = 50):
+    """Latest sales newest first; with ``cursor``, those after it oldest first (repeat while ``hasMore``)"""
     try:
-        # Return sample sales data for demo
-        sample_sales = [
-            {
-                "saleId": "SALE202501171430001",
-                "employeeName": "นายสมชาย ใจดี",
-                "branchName": "เซ็นทรัล เวสต์เกต",
-                "items": [
-                    {"name": "มะม่วงอบแห้ง", "quantity": 250, "unit": "กรัม", "total": 62.5}
-                ],
-                "totalAmount": 62.5,
-                "timestamp": "2025-01-17T14:30:00Z"
-            },
-            {
-                "saleId": "SALE202501171425002",
-                "employeeName": "นางสาวมาลี รักงาน",
-                "branchName": "สยาม พารากอน",
-                "items": [
-                    {"name": "กล้วยอบแห้ง", "quantity": 300, "unit": "กรัม", "total": 54.0},
-                    {"name": "ถั่วผสม", "quantity": 150, "unit": "กรัม", "total": 45.0}
-                ],
-                "totalAmount": 99.0,
-                "timestamp": "2025-01-17T14:25:00Z"
-            },
-            {
-                "saleId": "SALE202501171420003",
-                "employeeName": "นายวิชัย ขยัน",
-                "branchName": "เอ็มควอเทียร์",
-                "items": [
-                    {"name": "สับปะรดอบแห้ง", "quantity": 200, "unit": "กรัม", "total": 40.0}
-                ],
-                "totalAmount": 40.0,
-                "timestamp": "2025-01-17T14:20:00Z"
-            }
-        ]
+        events, next_cursor, reset = live_feed.since(
+            cursor, branches=[branch] if branch else None, limit=min(limit, 200)
+        )
         
-        # Include recorded sales from global variable
-        if 'recorded_sales' in globals():
-            all_sales = recorded_sales + sample_sales
-        else:
-            all_sales = sample_sales
-            
-        # Sort by timestamp (newest first)
-        all_sales.sort(key=lambda x: x['timestamp'], reverse=True)
+        return {
+            "success": True,
+            "data": [event.data for event in events],
+            "cursor": next_cursor,
+            "hasMore": next_cursor < live_feed.cursor,
+            "reset": reset
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "message": f"เกิดข้อผิดพลาด: {str(e)}"
+        }
+
+@router.get("/api/sales/log")
+async def read_sale_log(after: int = -1, limit: int = 100):
+    """Sales recorded via POST /api/sales (all workers), oldest first after ``after``"""
+    log = require_sale_log()
+    try:
+        # Segment reads are file I/O: keep them off the event loop
+        records = await asyncio.to_thread(log.read, after=after, limit=min(limit, 1000))
         
         return {
             "success": True,
-            "data": all_sales[:50]  # Return latest 50 sales
+            "data": [dict(record, logOffset=offset) for offset, record in records],
+            "nextAfter": records[-1][0] if records else after
         }
     except Exception as e:
         return {
@@ -2943,6 +2602,115 @@ async def get_live_sales():
             "message": f"เกิดข้อผิดพลาด: {str(e)}"
         }
 
+@router.get("/api/sales/live/stream")
+async def stream_live_sales(request: Request, branch: Optional[str] = None, cursor: Optional[int] = None):
+    """Server-Sent Events feed of committed sales (optionally one branch)"""
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        cursor = int(last_event_id)
+    subscription = live_feed.subscribe(branches=[branch] if branch else None, cursor=cursor)
+    
+    return SSEResponse(live_feed, subscription, request.is_disconnected, LIVE_FEED_HEARTBEAT)
+
+@router.websocket("/api/sales/live/ws")
+async def live_sales_websocket(websocket: WebSocket, branch: Optional[str] = None, cursor: Optional[int] = None):
+    """WebSocket feed of committed sales; same events as the SSE stream"""
+    await websocket.accept()
+    subscription = live_feed.subscribe(branches=[branch] if branch else None, cursor=cursor)
+    try:
+        while True:
+            events, dropped = await subscription.next_batch(timeout=LIVE_FEED_HEARTBEAT)
+            if dropped:
+                await websocket.send_text(json.dumps({"type": "gap", "dropped": dropped}))
+            if events:
+                await websocket.send_text(
+                    '{"type":"sales","data":[' + ",".join(event.json for event in events) + "]}"
+                )
+            else:
+                await websocket.send_text('{"type":"ping"}')
+    except WebSocketDisconnect:
+        pass
+    finally:
+        live_feed.unsubscribe(subscription)
+
+@router.get("/product-management", response_class=HTMLResponse)
+async def product_management(request: Request):
+    return page_cache.file(request, "product-management.html", fallback="<h1>Product Management - กำลังพัฒนา</h1>")
+
+@router.get("/employee-management", response_class=HTMLResponse)
+async def employee_management(request: Request):
+    return page_cache.file(request, "employee-management.html", fallback="<h1>Employee Management - กำลังพัฒนา</h1>")
+
+@router.get("/mall-comparison", response_class=HTMLResponse)
+async def mall_comparison(request: Request):
+    return page_cache.file(request, "mall-comparison.html", fallback="<h1>Mall Comparison - กำลังพัฒนา</h1>")
+
+@router.get("/sales-reports", response_class=HTMLResponse)
+async def sales_reports(request: Request):
+    return page_cache.file(request, "sales-reports.html", fallback="<h1>Sales Reports - กำลังพัฒนา</h1>")
+
+# =========================================
+# APPLICATION
+# =========================================
+
+def startup():
+    """Open the DB pool and worker threads, branch_system.db (migrate, seed)
+    and the sale log; idempotent, and reopens everything ``shutdown`` closed"""
+    db_pool.open()
+    async_db.start()
+    password_hasher.start()
+    if "version" not in schema_status:
+        init_database()
+    open_sale_log()
+
+async def shutdown():
+    """Stop background work and close what ``startup`` opened"""
+    # The sale log first, so its last batch is fsynced whatever fails below
+    close_sale_log()
+    await bulk_scheduler.stop()
+    await bulk_operations.shutdown()
+    route_planner.shutdown()
+    password_hasher.shutdown()
+    async_db.shutdown()
+    db_pool.close()
+    schema_status.clear()
+
+@asynccontextmanager
+async def lifespan(application: FastAPI):
+    startup()
+    bulk_scheduler.start()
+    try:
+        yield
+    finally:
+        await shutdown()
+
+def create_app() -> FastAPI:
+    """Build the ASGI application (``uvicorn main:create_app --factory``)"""
+    application = FastAPI(title="ระบบจัดการสต๊อคผลไม้อบแห้ง", version="1.0.0", lifespan=lifespan)
+
+    # CORS middleware
+    application.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Mount static files
+    if os.path.exists("web"):
+        application.mount("/static", StaticFiles(directory="web"), name="static")
+
+    application.include_router(router)
+    return application
+
+def __getattr__(name):
+    # ``main:app`` (uvicorn, gunicorn) builds the application on first access
+    if name == "app":
+        globals()["app"] = application = create_app()
+        return application
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 if __name__ == "__main__":
     print("🥭 เริ่มต้นระบบจัดการสต๊อคผลไม้อบแห้ง...")
     print("📱 เข้าถึงระบบได้ที่: http://localhost:8001")
@@ -2982,40 +2750,6 @@ if __name__ == "__main__":
     print("")
     print("⏹️  กด Ctrl+C เพื่อหยุดระบบ")
     print("=" * 70)
-    
-    uvicorn.run("main:app", host="0.0.0.0", port=8001, reload=True)
-
-@app.get("/product-management", response_class=HTMLResponse)
-async def product_management():
-    try:
-        with open("web/product-management.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
-        return HTMLResponse(content="<h1>Product Management - กำลังพัฒนา</h1>")
-
-@app.get("/employee-management", response_class=HTMLResponse)
-async def employee_management():
-    try:
-        with open("web/employee-management.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
-        return HTMLResponse(content="<h1>Employee Management - กำลังพัฒนา</h1>")
-
-@app.get("/mall-comparison", response_class=HTMLResponse)
-async def mall_comparison():
-    try:
-        with open("web/mall-comparison.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
-        return HTMLResponse(content="<h1>Mall Comparison - กำลังพัฒนา</h1>")
-
-
-
-@app.get("/sales-reports", response_class=HTMLResponse)
-async def sales_reports():
-    try:
-        with open("web/sales-reports.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
-        return HTMLResponse(content="<h1>Sales Reports - กำลังพัฒนา</h1>")
 
+    import uvicorn
+    uvicorn.run("main:create_app", factory=True, host="0.0.0.0", port=8001, reload=True)
@@ -0,0 +1,11 @@
+"""
+API v1 router configuration
+"""
+from fastapi import APIRouter
+
+from app.api.v1.endpoints import cache
+
+api_router = APIRouter()
+
+# Include cache statistics routes
+api_router.include_router(cache.router, prefix="/cache", tags=["cache"])
@@ -0,0 +1,44 @@
+"""
+Cache statistics endpoints
+"""
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+from redis.exceptions import RedisError
+
+from app.api.dependencies import get_current_admin_user
+from app.core.database import tiered_cache
+from app.models.user import User
+
+router = APIRouter()
+
+
+@router.get("/stats")
+async def get_cache_stats(current_user: User = Depends(get_current_admin_user)) -> Dict[str, Any]:
+    """
+    Per-namespace hits, misses, sets, evictions, payload bytes and latency
+    for this worker, with Redis-wide INFO fields when Redis answers
+    """
+    stats = tiered_cache.get_stats()
+    try:
+        stats["redis"] = await tiered_cache.redis.get_stats()
+        del stats["redis"]["namespaces"]  # already in stats["namespaces"]
+    except RedisError as e:
+        stats["redis"] = {"error": str(e)}
+    return stats
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_cache_metrics() -> PlainTextResponse:
+    """
+    Prometheus text exposition of this worker's cache metrics
+
+    Unauthenticated so Prometheus can scrape it; serve it on the internal
+    network only.  Counters are per process: aggregate over workers with
+    sum by (namespace).
+    """
+    return PlainTextResponse(
+        tiered_cache.metrics.prometheus(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
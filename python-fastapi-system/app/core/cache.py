@@ -0,0 +1,215 @@
+"""
+Redis cache management
+
+CacheManager talks to Redis through ``redis.asyncio`` on a shared connection
+pool, so a cache call awaits its network round trip instead of blocking the
+event loop.  ``get_many`` and ``set_many`` move any number of keys in one
+round trip (MGET, and a non-transactional pipeline of SETEX).
+
+Entries can carry tags such as ``branch:BR-001``, ``product:42`` or
+``category:nuts``.  Each tag is a Redis set of the keys cached under it, so
+``invalidate_tags`` finds the entries to drop without looking at the rest of
+the keyspace and removes them with batched UNLINKs (freed off Redis's main
+thread).  ``clear_pattern`` remains for callers that cache without tags; it
+walks the keyspace with incremental SCAN instead of KEYS.
+
+Every operation is counted per key namespace in ``metrics`` (see
+app.core.cache_metrics).
+"""
+import time
+import uuid
+from typing import Dict, Iterable, List, Mapping, Optional
+
+import redis.asyncio as aioredis
+from redis.exceptions import ResponseError
+
+from app.core.cache_metrics import CacheMetrics, namespace_of
+
+# Keys removed per UNLINK (and popped per SPOP / scanned per SCAN step)
+INVALIDATE_BATCH = 500
+
+# Add ARGV[2..] to every tag set in KEYS and make each set live at least
+# ARGV[1] seconds, so a tag never expires before an entry registered in it
+_REGISTER_TAGS = """
+local ttl = tonumber(ARGV[1])
+for _, tag in ipairs(KEYS) do
+    redis.call('SADD', tag, unpack(ARGV, 2))
+    if redis.call('TTL', tag) < ttl then
+        redis.call('EXPIRE', tag, ttl)
+    end
+end
+"""
+
+
+def create_redis(
+    url: str,
+    max_connections: int = 50,
+    socket_timeout: Optional[float] = 1.0,
+    socket_connect_timeout: Optional[float] = 1.0,
+    pool_timeout: Optional[float] = 1.0,
+    health_check_interval: int = 30,
+) -> aioredis.Redis:
+    """
+    Async Redis client on its own bounded connection pool
+
+    When all ``max_connections`` are busy a command waits up to
+    ``pool_timeout`` seconds for one; a command that gets no reply within
+    ``socket_timeout`` seconds raises ``redis.exceptions.TimeoutError``
+    instead of hanging the request.
+    """
+    pool = aioredis.BlockingConnectionPool.from_url(
+        url,
+        decode_responses=True,
+        max_connections=max_connections,
+        timeout=pool_timeout,
+        socket_timeout=socket_timeout,
+        socket_connect_timeout=socket_connect_timeout,
+        health_check_interval=health_check_interval,
+    )
+    return aioredis.Redis(connection_pool=pool)
+
+
+class CacheManager:
+    """Redis cache management utilities"""
+
+    def __init__(self, redis_client: aioredis.Redis, prefix: str = "dried_fruits", ttl: int = 3600):
+        self.redis = redis_client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.metrics = CacheMetrics(prefix)
+        self._register_tags = redis_client.register_script(_REGISTER_TAGS)
+
+    def make_key(self, key: str) -> str:
+        """Generate cache key with prefix"""
+        return f"{self.prefix}:{key}"
+
+    def make_tag_key(self, tag: str) -> str:
+        """Key of the set holding the cache keys registered under ``tag``"""
+        return f"{self.prefix}:tag:{tag}"
+
+    def _unprefix(self, cache_key: str) -> str:
+        return cache_key[len(self.prefix) + 1 :]
+
+    def _record_get(self, key: str, value: Optional[str], started: float):
+        namespace = namespace_of(key)
+        self.metrics.observe("get", namespace, time.perf_counter() - started)
+        self.metrics.count_read(namespace, value)
+
+    async def get(self, key: str) -> Optional[str]:
+        """Get value from cache"""
+        started = time.perf_counter()
+        value = await self.redis.get(self.make_key(key))
+        self._record_get(key, value, started)
+        return value
+
+    async def set(self, key: str, value: str, ttl: int = None, tags: Iterable[str] = ()):
+        """Set value in cache, registered under ``tags``"""
+        return (await self.set_many({key: value}, ttl, tags))[0]
+
+    async def delete(self, key: str):
+        """Delete value from cache"""
+        removed = await self.redis.delete(self.make_key(key))
+        self.metrics.count("evictions", namespace_of(key), removed)
+        return removed
+
+    async def exists(self, key: str) -> bool:
+        """Check if key exists in cache"""
+        return bool(await self.redis.exists(self.make_key(key)))
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Get several values in one round trip; missing keys map to None"""
+        keys = list(keys)
+        if not keys:
+            return {}
+        started = time.perf_counter()
+        values = await self.redis.mget([self.make_key(key) for key in keys])
+        seconds = time.perf_counter() - started
+        namespaces = [namespace_of(key) for key in keys]
+        for namespace in set(namespaces):
+            self.metrics.observe("get", namespace, seconds)
+        for namespace, value in zip(namespaces, values):
+            self.metrics.count_read(namespace, value)
+        return dict(zip(keys, values))
+
+    async def set_many(
+        self, items: Mapping[str, str], ttl: int = None, tags: Iterable[str] = ()
+    ) -> List[bool]:
+        """Set several values, each with ``ttl`` and ``tags``, in one round trip"""
+        if not items:
+            return []
+        ttl = ttl or self.ttl
+        started = time.perf_counter()
+        tag_keys = [self.make_tag_key(tag) for tag in tags]
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, value in items.items():
+                pipe.setex(self.make_key(key), ttl, value)
+            if tag_keys:
+                cache_keys = [self.make_key(key) for key in items]
+                # Chunked: Lua's unpack() takes at most a few thousand values
+                for start in range(0, len(cache_keys), INVALIDATE_BATCH):
+                    chunk = cache_keys[start : start + INVALIDATE_BATCH]
+                    await self._register_tags(keys=tag_keys, args=[ttl, *chunk], client=pipe)
+            results = await pipe.execute()
+        seconds = time.perf_counter() - started
+        metrics = self.metrics
+        for namespace in {namespace_of(key) for key in items}:
+            metrics.observe("set", namespace, seconds)
+        for key, value in items.items():
+            namespace = namespace_of(key)
+            metrics.count("sets", namespace)
+            metrics.count("bytes_written", namespace, len(value.encode()))
+        return results[: len(items)]
+
+    async def invalidate_tags(self, *tags: str) -> int:
+        """Delete every entry registered under any of ``tags``; returns keys unlinked"""
+        removed = 0
+        for tag in tags:
+            # Detach the set first: entries cached from now on register in a
+            # fresh set and survive, and nothing is left half-invalidated
+            detached = f"{self.make_tag_key(tag)}:invalidating:{uuid.uuid4().hex}"
+            try:
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    pipe.rename(self.make_tag_key(tag), detached)
+                    pipe.expire(detached, self.ttl)
+                    await pipe.execute()
+            except ResponseError:
+                continue  # nothing cached under this tag
+            while True:
+                keys = await self.redis.spop(detached, INVALIDATE_BATCH)
+                if not keys:
+                    break
+                removed += await self.redis.unlink(*keys)
+                self.metrics.count_keys("evictions", [self._unprefix(key) for key in keys])
+        return removed
+
+    async def clear_pattern(self, pattern: str) -> int:
+        """Clear all keys matching pattern (incremental SCAN; prefer tags)"""
+        removed = 0
+        batch = []
+        async for key in self.redis.scan_iter(match=self.make_key(pattern), count=INVALIDATE_BATCH):
+            batch.append(key)
+            if len(batch) == INVALIDATE_BATCH:
+                removed += await self.redis.unlink(*batch)
+                self.metrics.count_keys("evictions", [self._unprefix(key) for key in batch])
+                batch = []
+        if batch:
+            removed += await self.redis.unlink(*batch)
+            self.metrics.count_keys("evictions", [self._unprefix(key) for key in batch])
+        return removed
+
+    async def get_stats(self) -> dict:
+        """Get cache statistics: Redis-wide INFO fields and this process's namespaces"""
+        info = await self.redis.info()
+        return {
+            "used_memory": info.get("used_memory_human"),
+            "connected_clients": info.get("connected_clients"),
+            "total_commands_processed": info.get("total_commands_processed"),
+            "keyspace_hits": info.get("keyspace_hits"),
+            "keyspace_misses": info.get("keyspace_misses"),
+            "evicted_keys": info.get("evicted_keys"),
+            "namespaces": self.metrics.snapshot(),
+        }
+
+    async def close(self):
+        """Close the client and disconnect its pool"""
+        await self.redis.aclose()
@@ -0,0 +1,198 @@
+"""
+Cache instrumentation per key namespace
+
+A key's namespace is its first segment after the cache prefix:
+``analytics`` for ``dried_fruits:analytics:daily:BR-001``.  CacheMetrics
+counts hits, misses, sets, evictions and payload bytes per namespace, and
+keeps a latency histogram of Redis gets and sets.  TieredCache adds its
+local tier's hits and LRU evictions, coalesced waits and early refreshes
+to the same object.
+
+Evictions here are entries this process dropped (delete, tag
+invalidation, clear_pattern, local LRU).  Redis's own maxmemory evictions
+are not attributed to namespaces; see ``evicted_keys`` in INFO.  Bytes are
+UTF-8 payload sizes, not Redis's memory usage.
+
+Counting takes a dict update and two ``perf_counter`` calls per operation,
+which is small beside the round trip it measures.
+"""
+import bisect
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets; +Inf is implied
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+COUNTERS = (
+    "hits",
+    "local_hits",
+    "misses",
+    "sets",
+    "evictions",
+    "local_evictions",
+    "bytes_read",
+    "bytes_written",
+    "coalesced",
+    "early_refreshes",
+)
+
+# Prometheus family, help text and label for each counter
+_FAMILIES = (
+    ("hits_total", "Cache hits", "tier", (("hits", "redis"), ("local_hits", "local"))),
+    ("misses_total", "Cache misses in Redis", None, (("misses", None),)),
+    ("sets_total", "Entries written to Redis", None, (("sets", None),)),
+    (
+        "evictions_total",
+        "Entries dropped by invalidation, delete or LRU",
+        "tier",
+        (("evictions", "redis"), ("local_evictions", "local")),
+    ),
+    (
+        "payload_bytes_total",
+        "Payload bytes moved to and from Redis",
+        "direction",
+        (("bytes_read", "read"), ("bytes_written", "write")),
+    ),
+    (
+        "coalesced_total",
+        "Misses that waited for another request's load",
+        None,
+        (("coalesced", None),),
+    ),
+    (
+        "early_refreshes_total",
+        "XFetch refreshes started before expiry",
+        None,
+        (("early_refreshes", None),),
+    ),
+)
+
+
+def namespace_of(key: str) -> str:
+    """First segment of an unprefixed cache key"""
+    return key.split(":", 1)[0]
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class LatencyHistogram:
+    """Fixed-bucket histogram of durations in seconds"""
+
+    __slots__ = ("counts", "count", "total")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate (linear within a bucket); the +Inf bucket reports 1 s"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, bucket in enumerate(self.counts):
+            if seen + bucket >= rank and bucket:
+                lower = LATENCY_BUCKETS[i - 1] if i else 0.0
+                upper = LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else LATENCY_BUCKETS[-1]
+                return lower + (upper - lower) * (rank - seen) / bucket
+            seen += bucket
+        return LATENCY_BUCKETS[-1]
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else None,
+            "p50_ms": round(self.quantile(0.5) * 1000, 3) if self.count else None,
+            "p99_ms": round(self.quantile(0.99) * 1000, 3) if self.count else None,
+        }
+
+
+class CacheMetrics:
+    """Per-namespace cache counters and latency histograms"""
+
+    def __init__(self, prefix: str = "dried_fruits"):
+        self.metric_prefix = re.sub(r"[^a-zA-Z0-9_]", "_", prefix) + "_cache"
+        self.counters: Dict[str, Counter] = defaultdict(Counter)
+        self.latency: Dict[Tuple[str, str], LatencyHistogram] = defaultdict(LatencyHistogram)
+
+    def count(self, metric: str, namespace: str, amount: int = 1):
+        self.counters[namespace][metric] += amount
+
+    def observe(self, operation: str, namespace: str, seconds: float):
+        self.latency[(operation, namespace)].observe(seconds)
+
+    def count_read(self, namespace: str, value: Optional[str]):
+        """Count one looked-up value as a hit (with its size) or a miss"""
+        counts = self.counters[namespace]
+        if value is None:
+            counts["misses"] += 1
+        else:
+            counts["hits"] += 1
+            counts["bytes_read"] += len(value.encode())
+
+    def count_keys(self, metric: str, keys: List[str]):
+        """Count unprefixed ``keys`` under their namespaces"""
+        for namespace, amount in Counter(namespace_of(key) for key in keys).items():
+            self.counters[namespace][metric] += amount
+
+    def reset(self):
+        self.counters.clear()
+        self.latency.clear()
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Counters, hit ratios and latency summaries keyed by namespace"""
+        namespaces = sorted(set(self.counters) | {namespace for _, namespace in self.latency})
+        result = {}
+        for namespace in namespaces:
+            counts = self.counters.get(namespace, Counter())
+            hits = counts["hits"] + counts["local_hits"]
+            lookups = hits + counts["misses"]
+            result[namespace] = {
+                **{metric: counts[metric] for metric in COUNTERS},
+                "hit_ratio": round(hits / lookups, 4) if lookups else None,
+                "local_hit_ratio": round(counts["local_hits"] / lookups, 4) if lookups else None,
+                "avg_bytes_written": round(counts["bytes_written"] / counts["sets"])
+                if counts["sets"]
+                else None,
+                "latency": {
+                    operation: self.latency[(operation, namespace)].summary()
+                    for operation in ("get", "set")
+                    if (operation, namespace) in self.latency
+                },
+            }
+        return result
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition (format 0.0.4) of every metric"""
+        lines = []
+        for family, help_text, label, sources in _FAMILIES:
+            name = f"{self.metric_prefix}_{family}"
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for namespace, counts in sorted(self.counters.items()):
+                for metric, value in sources:
+                    if metric in counts:
+                        extra = f',{label}="{value}"' if label else ""
+                        lines.append(
+                            f'{name}{{namespace="{_label(namespace)}"{extra}}} {counts[metric]}'
+                        )
+
+        name = f"{self.metric_prefix}_operation_duration_seconds"
+        lines += [f"# HELP {name} Redis get/set latency", f"# TYPE {name} histogram"]
+        for (operation, namespace), histogram in sorted(self.latency.items()):
+            labels = f'namespace="{_label(namespace)}",operation="{operation}"'
+            cumulative = 0
+            for bound, bucket in zip((*LATENCY_BUCKETS, "+Inf"), histogram.counts):
+                cumulative += bucket
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {histogram.total:.6f}")
+            lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
@@ -9,18 +9,18 @@ from pydantic import AnyHttpUrl, BaseSettings, EmailStr, Field, validator
 
 class Settings(BaseSettings):
     """Application settings"""
-    
+
     # API Configuration
     API_V1_STR: str = "/api/v1"
     PROJECT_NAME: str = "Dried Fruits Inventory System"
     PROJECT_VERSION: str = "1.0.0"
     DESCRIPTION: str = "ระบบจัดการสต๊อคผลไม้อบแห้งแบบครบวงจร"
-    
+
     # Environment
     ENVIRONMENT: str = "development"
     DEBUG: bool = True
     TESTING: bool = False
-    
+
     # Security
     SECRET_KEY: str = secrets.token_urlsafe(32)
     ALGORITHM: str = "HS256"
@@ -29,20 +29,24 @@ class Settings(BaseSettings):
     PASSWORD_MIN_LENGTH: int = 8
     MAX_LOGIN_ATTEMPTS: int = 5
     ACCOUNT_LOCKOUT_DURATION: int = 300  # 5 minutes
-    
+
     # Database
     DATABASE_URL: str = Field(..., env="DATABASE_URL")
     DATABASE_TEST_URL: Optional[str] = None
-    
+
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
     REDIS_TEST_URL: str = "redis://localhost:6379/1"
-    
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_SOCKET_TIMEOUT: float = 1.0  # seconds
+    REDIS_SOCKET_CONNECT_TIMEOUT: float = 1.0  # seconds
+    REDIS_POOL_TIMEOUT: float = 1.0  # seconds to wait for a free connection
+
     # CORS
     BACKEND_CORS_ORIGINS: List[AnyHttpUrl] = [
         "http://localhost:3000",
-        "http://localhost:8080", 
-        "http://localhost:5173"
+        "http://localhost:8080",
+        "http://localhost:5173",
     ]
 
     @validator("BACKEND_CORS_ORIGINS", pre=True)
@@ -57,11 +61,11 @@ class Settings(BaseSettings):
     UPLOAD_DIR: str = "uploads"
     MAX_FILE_SIZE: int = 10485760  # 10MB
     ALLOWED_EXTENSIONS: List[str] = ["jpg", "jpeg", "png", "pdf", "xlsx", "csv"]
-    
+
     # Barcode & QR Code
     BARCODE_DIR: str = "static/barcodes"
     QR_CODE_DIR: str = "static/qrcodes"
-    
+
     # Email (Optional)
     SMTP_TLS: bool = True
     SMTP_PORT: Optional[int] = None
@@ -80,34 +84,37 @@ class Settings(BaseSettings):
     # Celery
     CELERY_BROKER_URL: str = "redis://localhost:6379/2"
     CELERY_RESULT_BACKEND: str = "redis://localhost:6379/3"
-    
+
     # Monitoring
     LOG_LEVEL: str = "INFO"
     LOG_FORMAT: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-    
+
     # Business Configuration
     DEFAULT_CURRENCY: str = "THB"
     DEFAULT_TIMEZONE: str = "Asia/Bangkok"
     DEFAULT_LANGUAGE: str = "th"
     TAX_RATE: float = 0.07  # 7% VAT
-    
+
     # Notifications
     ENABLE_NOTIFICATIONS: bool = True
     ENABLE_EMAIL_NOTIFICATIONS: bool = True
     ENABLE_SMS_NOTIFICATIONS: bool = False
-    
+
     # Cache
     CACHE_TTL: int = 3600  # 1 hour
     CACHE_PREFIX: str = "dried_fruits"
-    
+    CACHE_LOCAL_MAX_ENTRIES: int = 10000  # per-process LRU in front of Redis
+    CACHE_LOCAL_TTL: float = 5.0  # seconds; bounds staleness across workers
+    CACHE_XFETCH_BETA: float = 1.0  # >1 refreshes earlier, 0 disables early refresh
+
     # Rate Limiting
     RATE_LIMIT_PER_MINUTE: int = 60
     RATE_LIMIT_BURST: int = 10
-    
+
     # First Superuser
     FIRST_SUPERUSER_EMAIL: EmailStr = "admin@fareedadriedfruits.com"
     FIRST_SUPERUSER_PASSWORD: str = "admin123"
-    
+
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -125,9 +132,9 @@ def get_database_url() -> str:
     return settings.DATABASE_URL
 
 
-# Redis URL for different environments  
+# Redis URL for different environments
 def get_redis_url() -> str:
     """Get Redis URL based on environment"""
     if settings.TESTING:
         return settings.REDIS_TEST_URL
-    return settings.REDIS_URL
\ No newline at end of file
+    return settings.REDIS_URL
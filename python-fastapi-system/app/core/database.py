@@ -5,9 +5,10 @@ from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
-import redis
 
+from app.core.cache import CacheManager, create_redis
 from app.core.config import get_database_url, get_redis_url, settings
+from app.core.tiered_cache import TieredCache
 
 # Database Engine
 engine = create_engine(
@@ -25,8 +26,14 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Base class for all models
 Base = declarative_base()
 
-# Redis Connection
-redis_client = redis.from_url(get_redis_url(), decode_responses=True)
+# Redis Connection (asyncio client on a bounded connection pool)
+redis_client = create_redis(
+    get_redis_url(),
+    max_connections=settings.REDIS_MAX_CONNECTIONS,
+    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+    pool_timeout=settings.REDIS_POOL_TIMEOUT,
+)
 
 
 def get_db():
@@ -53,20 +60,20 @@ async def init_db():
     """
     # Import all models to ensure they are registered with SQLAlchemy
     from app.models import (
-        user,
+        alert,
+        analytics,
+        barcode,
         branch,
-        product,
         inventory,
-        sales,
-        barcode,
+        procurement,
+        product,
         repack,
-        shipping,
-        alert,
+        sales,
         sampling,
-        procurement,
-        analytics
+        shipping,
+        user,
     )
-    
+
     # Create all tables
     Base.metadata.create_all(bind=engine)
 
@@ -76,23 +83,23 @@ async def close_db():
     Close database connections
     """
     engine.dispose()
-    redis_client.close()
+    await redis_client.aclose()
 
 
 # Database utilities
 class DatabaseManager:
     """Database management utilities"""
-    
+
     @staticmethod
     def create_tables():
         """Create all database tables"""
         Base.metadata.create_all(bind=engine)
-    
+
     @staticmethod
     def drop_tables():
         """Drop all database tables"""
         Base.metadata.drop_all(bind=engine)
-    
+
     @staticmethod
     def reset_database():
         """Reset database - drop and recreate all tables"""
@@ -100,59 +107,14 @@ class DatabaseManager:
         DatabaseManager.create_tables()
 
 
-# Redis utilities
-class CacheManager:
-    """Redis cache management utilities"""
-    
-    def __init__(self, redis_client: redis.Redis = None):
-        self.redis = redis_client or get_redis()
-        self.prefix = settings.CACHE_PREFIX
-        self.ttl = settings.CACHE_TTL
-    
-    def make_key(self, key: str) -> str:
-        """Generate cache key with prefix"""
-        return f"{self.prefix}:{key}"
-    
-    async def get(self, key: str):
-        """Get value from cache"""
-        cache_key = self.make_key(key)
-        return self.redis.get(cache_key)
-    
-    async def set(self, key: str, value: str, ttl: int = None):
-        """Set value in cache"""
-        cache_key = self.make_key(key)
-        ttl = ttl or self.ttl
-        return self.redis.setex(cache_key, ttl, value)
-    
-    async def delete(self, key: str):
-        """Delete value from cache"""
-        cache_key = self.make_key(key)
-        return self.redis.delete(cache_key)
-    
-    async def exists(self, key: str) -> bool:
-        """Check if key exists in cache"""
-        cache_key = self.make_key(key)
-        return bool(self.redis.exists(cache_key))
-    
-    async def clear_pattern(self, pattern: str):
-        """Clear all keys matching pattern"""
-        pattern_key = self.make_key(pattern)
-        keys = self.redis.keys(pattern_key)
-        if keys:
-            return self.redis.delete(*keys)
-        return 0
-    
-    async def get_stats(self) -> dict:
-        """Get cache statistics"""
-        info = self.redis.info()
-        return {
-            "used_memory": info.get("used_memory_human"),
-            "connected_clients": info.get("connected_clients"),
-            "total_commands_processed": info.get("total_commands_processed"),
-            "keyspace_hits": info.get("keyspace_hits"),
-            "keyspace_misses": info.get("keyspace_misses"),
-        }
-
-
 # Global cache manager instance
-cache_manager = CacheManager()
\ No newline at end of file
+cache_manager = CacheManager(redis_client, prefix=settings.CACHE_PREFIX, ttl=settings.CACHE_TTL)
+
+# Per-process LRU in front of cache_manager; use tiered_cache.cached(...) on
+# CRUD and analytics functions
+tiered_cache = TieredCache(
+    cache_manager,
+    max_entries=settings.CACHE_LOCAL_MAX_ENTRIES,
+    local_ttl=settings.CACHE_LOCAL_TTL,
+    beta=settings.CACHE_XFETCH_BETA,
+)
@@ -0,0 +1,35 @@
+"""
+Response classes
+
+ORJSONModelResponse renders straight to bytes with orjson.  Models in the
+content are serialized through their compiled ModelSerializer, so a list
+endpoint can return ``ORJSONModelResponse(rows)`` without building
+``to_dict()`` copies and running them through jsonable_encoder.  orjson
+encodes UUID, datetime and Enum values itself; Decimals become numbers as
+jsonable_encoder would make them.
+"""
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+from app.models.base import decimal_value
+
+
+def _default(obj: Any) -> Any:
+    serializer = getattr(type(obj), "__serializer__", None)  # BaseModel subclasses
+    if serializer is not None:
+        return serializer.to_orjson_dict(obj)
+    if isinstance(obj, Decimal):
+        return decimal_value(obj)
+    if hasattr(obj, "model_dump"):  # pydantic schemas
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class ORJSONModelResponse(JSONResponse):
+    """JSON response rendered by orjson, with SQLAlchemy models and Decimals"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
@@ -0,0 +1,303 @@
+"""
+Two-tier cache: a per-process LRU in front of Redis
+
+A hit in the local tier costs no network round trip.  A miss falls through
+to Redis (through CacheManager), and only then to the loader.  Three
+guards keep an expiring hot key from being recomputed by every request at
+once:
+
+- single flight: concurrent misses for a key in one process share one
+  load;
+- XFetch probabilistic early refresh: each read may start a background
+  refresh of an entry shortly before it expires, with a probability that
+  grows as expiry nears and with how long the value took to compute, so
+  the entry is usually replaced before any reader sees it expire;
+- local entries live at most ``local_ttl`` seconds.  Invalidation clears
+  the local tier of the process that runs it, and other workers catch up
+  within that bound.
+
+Values go to Redis as JSON, so the loaded value is returned in its decoded
+form: every caller sees the same types whichever tier served it.
+"""
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import math
+import random
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Awaitable, Callable, Dict, Iterable, NamedTuple, Optional, Set, Tuple
+
+from app.core.cache import CacheManager
+from app.core.cache_metrics import namespace_of
+
+logger = logging.getLogger(__name__)
+
+# Arguments left out of a decorated function's default cache key
+UNKEYED_ARGUMENTS = frozenset({"self", "cls", "db"})
+
+
+class CachedValue(NamedTuple):
+    """A cached value with what XFetch needs to decide on early refresh"""
+
+    value: Any
+    delta: float  # seconds the loader took
+    expiry: float  # unix time the Redis entry expires
+    tags: Tuple[str, ...]
+
+
+def encode(entry: CachedValue) -> str:
+    return json.dumps(
+        {"v": entry.value, "d": round(entry.delta, 6), "e": entry.expiry, "t": entry.tags},
+        default=str,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+
+
+def decode(payload: Optional[str]) -> Optional[CachedValue]:
+    if payload is None:
+        return None
+    try:
+        data = json.loads(payload)
+        return CachedValue(data["v"], float(data["d"]), float(data["e"]), tuple(data["t"]))
+    except (ValueError, KeyError, TypeError):
+        return None  # written by something else; treat as a miss
+
+
+class LocalCache:
+    """Size-bounded in-process LRU with per-entry expiry and a tag index"""
+
+    def __init__(self, max_entries: int = 10000, on_evict: Callable[[str], None] = None):
+        self.max_entries = max_entries
+        self.on_evict = on_evict
+        self._entries: "OrderedDict[str, Tuple[CachedValue, float]]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str, now: float) -> Optional[CachedValue]:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        if item[1] <= now:
+            self.delete(key)
+            return None
+        self._entries.move_to_end(key)
+        return item[0]
+
+    def set(self, key: str, entry: CachedValue, expires_at: float):
+        self.delete(key)
+        self._entries[key] = (entry, expires_at)
+        for tag in entry.tags:
+            self._tags[tag].add(key)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self.delete(oldest)
+            if self.on_evict is not None:
+                self.on_evict(oldest)
+
+    def delete(self, key: str) -> bool:
+        item = self._entries.pop(key, None)
+        if item is None:
+            return False
+        for tag in item[0].tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+        return True
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        return sum(self.delete(key) for tag in tags for key in list(self._tags.get(tag, ())))
+
+    def clear(self):
+        self._entries.clear()
+        self._tags.clear()
+
+
+class TieredCache:
+    """Local LRU + Redis cache with single-flight loads and XFetch refresh"""
+
+    def __init__(
+        self,
+        redis_cache: CacheManager,
+        max_entries: int = 10000,
+        local_ttl: float = 5.0,
+        beta: float = 1.0,
+    ):
+        self.redis = redis_cache
+        self.metrics = redis_cache.metrics
+        self.local = LocalCache(max_entries, self._evicted)
+        self.local_ttl = local_ttl
+        self.beta = beta
+        self._flights: Dict[str, asyncio.Future] = {}
+        self._generation = 0
+
+    def _evicted(self, key: str):
+        self.metrics.count("local_evictions", namespace_of(key))
+
+    def _refresh_early(self, entry: CachedValue, now: float) -> bool:
+        # XFetch: now - delta * beta * ln(rand) >= expiry, rand in (0, 1]
+        return now - entry.delta * self.beta * math.log(1.0 - random.random()) >= entry.expiry
+
+    def _keep_locally(self, key: str, entry: CachedValue, now: float):
+        self.local.set(key, entry, min(entry.expiry, now + self.local_ttl))
+
+    async def _read_redis(self, key: str) -> Optional[CachedValue]:
+        entry = decode(await self.redis.get(key))
+        if entry is not None and entry.expiry > time.time():
+            self._keep_locally(key, entry, time.time())
+            return entry
+        return None
+
+    async def get(self, key: str) -> Any:
+        """Cached value for ``key`` from either tier, or None"""
+        entry = self.local.get(key, time.time())
+        if entry is not None:
+            self.metrics.count("local_hits", namespace_of(key))
+            return entry.value
+        entry = await self._read_redis(key)
+        return entry.value if entry is not None else None
+
+    async def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: int = None,
+        tags: Iterable[str] = (),
+    ) -> Any:
+        """Cached value for ``key``, calling ``loader`` at most once per process on a miss"""
+        namespace = namespace_of(key)
+        now = time.time()
+        entry = self.local.get(key, now)
+        if entry is not None:
+            self.metrics.count("local_hits", namespace)
+        else:
+            entry = await self._read_redis(key)  # CacheManager counts the Redis hit or miss
+        if entry is not None and not self._refresh_early(entry, now):
+            return entry.value
+
+        flight = self._flights.get(key)
+        if flight is None:
+            if entry is not None:
+                self.metrics.count("early_refreshes", namespace)
+            flight = asyncio.ensure_future(self._load(key, loader, ttl, tuple(tags), entry))
+            self._flights[key] = flight
+            flight.add_done_callback(functools.partial(self._land, key, entry is not None))
+        elif entry is None:
+            self.metrics.count("coalesced", namespace)
+        if entry is not None:
+            return entry.value  # still valid: refresh in the background, serve this
+        # Shielded: a cancelled caller must not cancel the load others wait on
+        return await asyncio.shield(flight)
+
+    def _land(self, key: str, refresh: bool, flight: asyncio.Future):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if flight.cancelled():
+            return
+        error = flight.exception()  # retrieved here even if every waiter was cancelled
+        if error is not None and refresh:
+            logger.warning("Early refresh of cache key %s failed: %r", key, error)
+
+    async def _load(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[int],
+        tags: Tuple[str, ...],
+        stale: Optional[CachedValue],
+    ) -> Any:
+        if stale is not None:
+            # Another worker may have refreshed it already
+            fresher = await self._read_redis(key)
+            if fresher is not None and fresher.expiry > stale.expiry:
+                return fresher.value
+        generation = self._generation
+        started = time.monotonic()
+        value = await loader()
+        delta = time.monotonic() - started
+        ttl = ttl or self.redis.ttl
+        payload = encode(CachedValue(value, delta, time.time() + ttl, tags))
+        entry = decode(payload)
+        # An invalidation while loading may have made this value stale
+        if generation == self._generation:
+            await self.redis.set(key, payload, ttl, tags)
+            self._keep_locally(key, entry, time.time())
+        return entry.value
+
+    async def delete(self, key: str):
+        """Drop ``key`` from both tiers"""
+        self._generation += 1
+        self.local.delete(key)
+        return await self.redis.delete(key)
+
+    async def invalidate_tags(self, *tags: str) -> int:
+        """Drop every entry registered under any of ``tags`` from both tiers"""
+        self._generation += 1
+        self.local.invalidate_tags(tags)
+        return await self.redis.invalidate_tags(*tags)
+
+    def cached(
+        self, namespace: str, ttl: int = None, key: str = None, tags: Iterable[str] = ()
+    ) -> Callable:
+        """
+        Decorator caching a function's result under ``namespace``
+
+        ``key`` and each of ``tags`` are format strings over the function's
+        arguments, e.g. ``key="{branch_id}:{day}"`` and
+        ``tags=["branch:{branch_id}"]``.  Without ``key`` every argument
+        except ``self``, ``cls`` and ``db`` is part of the key.  Sync
+        functions (CRUD helpers taking a Session) run in a worker thread;
+        the decorated function is always a coroutine function.  Results
+        must be JSON-serialisable; other values are stored via ``str()``.
+        """
+        tags = tuple(tags)
+
+        def decorate(func: Callable) -> Callable:
+            signature = inspect.signature(func)
+            is_async = inspect.iscoroutinefunction(func)
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                arguments = bound.arguments
+                if key is None:
+                    suffix = ":".join(
+                        f"{name}={value}"
+                        for name, value in arguments.items()
+                        if name not in UNKEYED_ARGUMENTS
+                    )
+                else:
+                    suffix = key.format(**arguments)
+                cache_key = f"{namespace}:{suffix}" if suffix else namespace
+
+                async def load():
+                    if is_async:
+                        return await func(*args, **kwargs)
+                    return await asyncio.to_thread(func, *args, **kwargs)
+
+                return await self.get_or_load(
+                    cache_key, load, ttl, [tag.format(**arguments) for tag in tags]
+                )
+
+            return wrapper
+
+        return decorate
+
+    def get_stats(self) -> dict:
+        """Local tier size and per-namespace counters, hit ratios and latency"""
+        return {
+            "local": {
+                "entries": len(self.local),
+                "max_entries": self.local.max_entries,
+                "ttl": self.local_ttl,
+            },
+            "namespaces": self.metrics.snapshot(),
+        }
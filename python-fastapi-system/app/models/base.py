@@ -1,102 +1,164 @@
 """
 Base model with common fields and utilities
+
+Every BaseModel subclass gets a ModelSerializer when its mapper is
+constructed: the column names, the attribute keys to read them from, and a
+converter for each column whose Python values are not JSON types.
+``to_dict`` then reads all columns with one ``itemgetter`` call on the
+instance ``__dict__`` instead of a descriptor lookup per column.
 """
+import enum
+import operator
 import uuid
-from datetime import datetime
-from typing import Any
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Callable, ClassVar, List, Optional, Tuple, Union
 
-from sqlalchemy import Column, DateTime, String, Boolean
+from sqlalchemy import Boolean, Column, Date, DateTime, Enum, Numeric, String, Time, Uuid, event
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.ext.declarative import as_declarative, declared_attr
+from sqlalchemy.orm import Mapper
 from sqlalchemy.sql import func
 
 
 @as_declarative()
 class Base:
     """Base class for all database models"""
-    
+
     id: Any
     __name__: str
-    
+
     # Generate __tablename__ automatically
     @declared_attr
     def __tablename__(cls) -> str:
         return cls.__name__.lower()
 
 
+def decimal_value(value: Decimal) -> Union[int, float]:
+    """JSON number for a Decimal, as FastAPI's jsonable_encoder gives it"""
+    return int(value) if value.as_tuple().exponent >= 0 else float(value)
+
+
+def _json_converter(column_type) -> Optional[Tuple[Any, Callable[[Any], Any]]]:
+    """(value types, converter) for a column whose values are not JSON types"""
+    if isinstance(column_type, Numeric) and column_type.asdecimal:
+        return Decimal, decimal_value
+    if isinstance(column_type, (DateTime, Date, Time)):
+        return (datetime, date, time), operator.methodcaller("isoformat")
+    if isinstance(column_type, Uuid):
+        return uuid.UUID, str
+    if isinstance(column_type, Enum):
+        return enum.Enum, operator.attrgetter("value")
+    return None
+
+
+class ModelSerializer:
+    """Column accessors and JSON converters of one model, compiled once"""
+
+    __slots__ = ("names", "keys", "_get", "_json", "_decimals")
+
+    def __init__(self, mapper: Mapper):
+        columns = list(mapper.class_.__table__.columns)
+        self.names = tuple(column.name for column in columns)
+        # Attribute keys can differ from column names (e.g. metadata_ -> "metadata")
+        self.keys = tuple(mapper.get_property_by_column(column).key for column in columns)
+        getter = operator.itemgetter(*self.keys)
+        self._get = getter if len(self.keys) > 1 else (lambda state: (getter(state),))
+        self._json = tuple(
+            (i, *converter)
+            for i, converter in enumerate(_json_converter(column.type) for column in columns)
+            if converter
+        )
+        # orjson encodes UUID, datetime and Enum natively; only Decimal needs help
+        self._decimals = tuple(entry for entry in self._json if entry[1] is Decimal)
+
+    def values(self, obj) -> List[Any]:
+        try:
+            return list(self._get(obj.__dict__))
+        except KeyError:
+            # Expired, deferred or never-set attribute: go through the descriptors
+            return [getattr(obj, key) for key in self.keys]
+
+    @staticmethod
+    def _convert(values: List[Any], converters) -> List[Any]:
+        for i, types, convert in converters:
+            value = values[i]
+            if isinstance(value, types):
+                values[i] = convert(value)
+        return values
+
+    def to_dict(self, obj) -> dict:
+        return dict(zip(self.names, self.values(obj)))
+
+    def to_json_dict(self, obj) -> dict:
+        return dict(zip(self.names, self._convert(self.values(obj), self._json)))
+
+    def to_orjson_dict(self, obj) -> dict:
+        return dict(zip(self.names, self._convert(self.values(obj), self._decimals)))
+
+
 class BaseModel(Base):
     """
     Base model with common fields
     """
+
     __abstract__ = True
-    
-    id = Column(
-        UUID(as_uuid=True), 
-        primary_key=True, 
-        default=uuid.uuid4,
-        index=True
-    )
-    created_at = Column(
-        DateTime(timezone=True), 
-        server_default=func.now(),
-        nullable=False
-    )
+    __serializer__: ClassVar[ModelSerializer]
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(
-        DateTime(timezone=True), 
-        server_default=func.now(),
-        onupdate=func.now(),
-        nullable=False
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
     )
     is_active = Column(Boolean, default=True, nullable=False)
-    
+
     def __repr__(self):
         return f"<{self.__class__.__name__}(id={self.id})>"
-    
+
     def to_dict(self) -> dict:
         """Convert model to dictionary"""
-        return {
-            column.name: getattr(self, column.name)
-            for column in self.__table__.columns
-        }
-    
+        return self.__serializer__.to_dict(self)
+
+    def to_json_dict(self) -> dict:
+        """Convert model to a dictionary of JSON types (what jsonable_encoder makes of to_dict)"""
+        return self.__serializer__.to_json_dict(self)
+
     @classmethod
     def get_searchable_fields(cls) -> list:
         """Get fields that can be searched"""
         return []
-    
+
     @classmethod
     def get_filterable_fields(cls) -> list:
         """Get fields that can be filtered"""
         return ["is_active", "created_at", "updated_at"]
 
 
+@event.listens_for(BaseModel, "after_mapper_constructed", propagate=True)
+def _compile_serializer(mapper: Mapper, cls: type):
+    cls.__serializer__ = ModelSerializer(mapper)
+
+
 class TimestampMixin:
     """Mixin for timestamp fields"""
-    
-    created_at = Column(
-        DateTime(timezone=True), 
-        server_default=func.now(),
-        nullable=False
-    )
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(
-        DateTime(timezone=True), 
-        server_default=func.now(),
-        onupdate=func.now(),
-        nullable=False
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
     )
 
 
 class SoftDeleteMixin:
     """Mixin for soft delete functionality"""
-    
+
     is_deleted = Column(Boolean, default=False, nullable=False)
     deleted_at = Column(DateTime(timezone=True), nullable=True)
-    
+
     def soft_delete(self):
         """Mark record as deleted"""
         self.is_deleted = True
         self.deleted_at = datetime.utcnow()
-    
+
     def restore(self):
         """Restore deleted record"""
         self.is_deleted = False
@@ -105,14 +167,14 @@ class SoftDeleteMixin:
 
 class AuditMixin:
     """Mixin for audit trail"""
-    
+
     created_by = Column(UUID(as_uuid=True), nullable=True)
     updated_by = Column(UUID(as_uuid=True), nullable=True)
-    
+
     def set_created_by(self, user_id: uuid.UUID):
         """Set created by user"""
         self.created_by = user_id
-    
+
     def set_updated_by(self, user_id: uuid.UUID):
         """Set updated by user"""
-        self.updated_by = user_id
\ No newline at end of file
+        self.updated_by = user_id
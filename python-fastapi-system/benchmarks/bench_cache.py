@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Benchmark: event-loop lag of CacheManager calls under concurrent requests
+
+Starts a fakeredis TCP server in a child process, behind a proxy that adds
+--rtt ms per round trip (like Redis on another host).  Then --requests concurrent
+requests each look up --keys cached products three ways: a synchronous
+client called from ``async def`` (how CacheManager worked before), one
+awaited ``get`` per key, and one ``get_many`` per request.  A ticker that
+wakes every millisecond measures how late the event loop lets it run.
+
+The sync client stalls the loop for whole round trips, so the ticker
+barely runs and its p99 says little; compare the worst lag.  Fails unless
+the async client's worst lag is --lag-ratio times below the sync client's
+and ``get_many`` finishes faster than per-key gets.
+
+Usage:
+python benchmarks/bench_cache.py [--requests 200] [--keys 10] [--rtt 1.0]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+import redis
+from fakeredis import TcpFakeServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.core.cache import CacheManager, create_redis  # noqa: E402
+
+
+def _serve(rtt_ms, conn):
+    server = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    upstream = server.server_address
+    delay = rtt_ms / 2000
+
+    async def pipe(reader, writer):
+        # Deliver each chunk half a round trip after it arrived
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        async def deliver():
+            while True:
+                due, data = await queue.get()
+                if data is None:
+                    writer.close()
+                    return
+                await asyncio.sleep(due - loop.time())
+                writer.write(data)
+
+        deliverer = asyncio.ensure_future(deliver())
+        try:
+            while True:
+                data = await reader.read(65536)
+                queue.put_nowait((loop.time() + delay, data or None))
+                if not data:
+                    break
+        finally:
+            queue.put_nowait((loop.time(), None))
+            await deliverer
+
+    async def handle(client_reader, client_writer):
+        server_reader, server_writer = await asyncio.open_connection(*upstream)
+        await asyncio.gather(
+            pipe(client_reader, server_writer),
+            pipe(server_reader, client_writer),
+            return_exceptions=True,
+        )
+
+    async def proxy():
+        listener = await asyncio.start_server(handle, "127.0.0.1", 0)
+        conn.send(listener.sockets[0].getsockname()[1])
+        await listener.serve_forever()
+
+    asyncio.run(proxy())
+
+
+def start_redis(rtt_ms):
+    """URL of a fakeredis server reached through a proxy adding ``rtt_ms``
+
+    Server and proxy run in a child process, so their CPU time does not
+    show up as event-loop lag here.
+    """
+    parent, child = multiprocessing.Pipe()
+    multiprocessing.Process(target=_serve, args=(rtt_ms, child), daemon=True).start()
+    return f"redis://127.0.0.1:{parent.recv()}/0"
+
+
+class BlockingCacheManager(CacheManager):
+    """The previous CacheManager: a synchronous client inside ``async def``"""
+
+    async def get(self, key):
+        return self.redis.get(self.make_key(key))
+
+
+async def measure_lag(stop, lag):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lag.append((time.perf_counter() - started) * 1000 - 1.0)
+
+
+async def scenario(lookup, requests):
+    stop, lag = asyncio.Event(), []
+    ticker = asyncio.create_task(measure_lag(stop, lag))
+    await asyncio.sleep(0.01)
+    started = time.perf_counter()
+    await asyncio.gather(*(lookup(i) for i in range(requests)))
+    elapsed = (time.perf_counter() - started) * 1000
+    stop.set()
+    await ticker
+    lag.sort()
+    return elapsed, lag[int(0.99 * (len(lag) - 1))], lag[-1]
+
+
+async def run(url, args):
+    keys = [
+        [f"product:{(i * args.keys + k) % 1000}" for k in range(args.keys)]
+        for i in range(args.requests)
+    ]
+    cache = CacheManager(create_redis(url, max_connections=args.connections, pool_timeout=10))
+    await cache.set_many({f"product:{n}": f'{{"id": {n}, "price": 240}}' for n in range(1000)})
+    legacy = BlockingCacheManager(redis.Redis.from_url(url, decode_responses=True))
+
+    async def blocking(i):
+        for key in keys[i]:
+            await legacy.get(key)
+
+    async def per_key(i):
+        for key in keys[i]:
+            await cache.get(key)
+
+    async def batched(i):
+        await cache.get_many(keys[i])
+
+    results = {}
+    for name, lookup in (
+        ("sync client", blocking),
+        ("async get", per_key),
+        ("async get_many", batched),
+    ):
+        await scenario(lookup, args.requests)  # warm-up: open pool connections
+        results[name] = await scenario(lookup, args.requests)
+    legacy.redis.close()
+    await cache.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--keys", type=int, default=10, help="cache lookups per request")
+    parser.add_argument("--rtt", type=float, default=1.0, help="added round-trip time in ms")
+    parser.add_argument("--connections", type=int, default=50, help="async pool size")
+    parser.add_argument(
+        "--lag-ratio", type=float, default=10.0, help="required worst-lag improvement"
+    )
+    args = parser.parse_args()
+
+    url = start_redis(args.rtt)
+    results = asyncio.run(run(url, args))
+
+    print(
+        f"{args.requests} concurrent requests x {args.keys} lookups, {args.rtt:.1f} ms round trip"
+    )
+    print(f"{'client':<16}{'total ms':>10}{'lag p99 ms':>12}{'lag max ms':>12}")
+    for name, (elapsed, p99, worst) in results.items():
+        print(f"{name:<16}{elapsed:>10.1f}{p99:>12.1f}{worst:>12.1f}")
+    improvement = results["sync client"][2] / max(
+        results["async get"][2], results["async get_many"][2]
+    )
+    ok = improvement >= args.lag_ratio and results["async get_many"][0] < results["async get"][0]
+    print(
+        f"{'✅' if ok else '❌'} worst loop lag {improvement:.0f}x lower than the sync client, get_many "
+        f"{results['async get'][0] / results['async get_many'][0]:.1f}x faster than per-key gets"
+    )
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cost and accuracy of per-namespace cache metrics
+
+Runs a known workload against the fakeredis server from bench_cache
+(child process, --rtt ms per round trip): --ops reads spread over three
+namespaces that hit the cache 90%, 50% and 0% of the time, plus writes and
+a tag invalidation.  The counters in CacheManager.metrics must match the
+workload exactly, and every line of the Prometheus exposition must parse.
+
+It also times the bookkeeping CacheManager.get adds to a read (counting
+plus the histogram).  fakeredis makes a GET far slower than Redis, so the
+bookkeeping is compared with the --rtt round trip alone: fails if it costs
+more than --overhead percent of it.
+
+Usage:
+python benchmarks/bench_cache_metrics.py [--ops 20000] [--rtt 0.2] [--overhead 2]
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import sys
+import time
+
+from bench_cache import start_redis
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.core.cache import CacheManager, create_redis  # noqa: E402
+
+# namespace -> share of reads that find a cached entry
+HIT_RATES = {"product": 0.9, "analytics": 0.5, "report": 0.0}
+SAMPLE = re.compile(r'^[a-z_]+(\{([a-z_]+="[^"]*",?)+\})? [0-9.e+-]+$')
+
+
+async def workload(cache, ops):
+    expected = {}
+    for namespace, rate in HIT_RATES.items():
+        cached = {f"{namespace}:{n}": '{"price": 240}' for n in range(int(100 * rate))}
+        await cache.set_many(cached, tags=[f"ns:{namespace}"])
+        reads = ops // len(HIT_RATES)
+        keys = [f"{namespace}:{n % 100}" for n in range(reads)]
+        for start in range(0, reads, 50):
+            await asyncio.gather(*(cache.get(key) for key in keys[start : start + 50]))
+        hits = sum(1 for key in keys if key in cached)
+        expected[namespace] = {
+            "hits": hits,
+            "misses": reads - hits,
+            "sets": len(cached),
+            "bytes_written": sum(len(v) for v in cached.values()),
+        }
+    expected["product"]["evictions"] = await cache.invalidate_tags("ns:product")
+    return expected
+
+
+def bookkeeping_us(cache, rounds=20000):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        cache._record_get("product:1", '{"price": 240}', time.perf_counter())
+    return (time.perf_counter() - started) / rounds * 1e6
+
+
+async def get_us(cache, rounds=2000):
+    latencies = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        await cache.get("product:1")
+        latencies.append((time.perf_counter() - started) * 1e6)
+    return statistics.median(latencies)
+
+
+async def run(url, args):
+    cache = CacheManager(create_redis(url, socket_timeout=10, pool_timeout=10), prefix="bench")
+    expected = await workload(cache, args.ops)
+    snapshot = cache.metrics.snapshot()
+    exposition = cache.metrics.prometheus()
+    per_get = await get_us(cache)
+    per_count = bookkeeping_us(cache)
+    await cache.close()
+    return expected, snapshot, exposition, per_get, per_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ops", type=int, default=20000)
+    parser.add_argument("--rtt", type=float, default=0.2, help="added round-trip time in ms")
+    parser.add_argument(
+        "--overhead", type=float, default=2.0, help="allowed bookkeeping, % of --rtt"
+    )
+    args = parser.parse_args()
+
+    expected, snapshot, exposition, per_get, per_count = asyncio.run(
+        run(start_redis(args.rtt), args)
+    )
+
+    print(f"{args.ops} reads over {len(HIT_RATES)} namespaces, {args.rtt:.1f} ms round trip")
+    print(
+        f"{'namespace':<12}{'hits':>8}{'misses':>8}{'ratio':>8}{'sets':>6}{'evicted':>9}"
+        f"{'get p50 ms':>12}{'get p99 ms':>12}"
+    )
+    accurate = True
+    for namespace, want in expected.items():
+        got = snapshot[namespace]
+        accurate &= all(got[metric] == value for metric, value in want.items())
+        latency = got["latency"]["get"]
+        print(
+            f"{namespace:<12}{got['hits']:>8}{got['misses']:>8}{got['hit_ratio']:>8.2f}{got['sets']:>6}"
+            f"{got['evictions']:>9}{latency['p50_ms']:>12.3f}{latency['p99_ms']:>12.3f}"
+        )
+
+    lines = [line for line in exposition.splitlines() if line and not line.startswith("#")]
+    malformed = [line for line in lines if not SAMPLE.match(line)]
+    print(f"prometheus exposition: {len(lines)} samples, {len(malformed)} malformed")
+    overhead = per_count / (args.rtt * 1000) * 100
+    print(
+        f"bookkeeping {per_count:.1f} us per read ({overhead:.2f}% of the round trip), "
+        f"fakeredis GET {per_get:.0f} us"
+    )
+
+    ok = accurate and lines and not malformed and overhead <= args.overhead
+    print(
+        f"{'✅' if ok else '❌'} counters match the workload, exposition parses, "
+        f"bookkeeping {overhead:.2f}% of a round trip (allowed {args.overhead:.0f}%)"
+    )
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Benchmark: invalidating a large cache namespace while other clients read
+
+Caches --keys product entries under the tag ``category:nuts`` next to as
+many unrelated entries, then drops the products three ways while a probe
+client in its own process keeps reading an unrelated key: KEYS + DEL (what clear_pattern did
+before), clear_pattern's incremental SCAN + UNLINK, and invalidate_tags.
+Reports how long each invalidation took and the probe's read latency while
+it ran.  fakeredis's SCAN costs O(keyspace) per call where Redis's costs
+O(COUNT), so the SCAN row's duration is far worse here than on Redis.
+
+Fails unless the probe's worst read during invalidate_tags is --spike-ratio
+times below its worst read during KEYS + DEL, and every product entry (and
+no unrelated one) is gone.
+
+Usage:
+python benchmarks/bench_invalidation.py [--keys 100000] [--rtt 0.2]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+
+import redis
+from bench_cache import start_redis
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.core.cache import CacheManager, create_redis  # noqa: E402
+
+SEED_BATCH = 5000
+
+
+async def seed(cache, keys):
+    for start in range(0, keys, SEED_BATCH):
+        await cache.set_many(
+            {f"product:{n}": "x" * 64 for n in range(start, min(start + SEED_BATCH, keys))},
+            tags=["category:nuts"],
+        )
+        await cache.set_many(
+            {f"branch:{n}": "y" * 64 for n in range(start, min(start + SEED_BATCH, keys))}
+        )
+
+
+async def keys_and_del(cache):
+    keys = await cache.redis.keys(cache.make_key("product:*"))
+    return await cache.redis.delete(*keys) if keys else 0
+
+
+def _probe(url, running, conn):
+    """Time GETs of one unrelated key from its own process until told to stop"""
+    client = redis.Redis.from_url(url, socket_timeout=60)
+    latencies = []
+    while running.is_set():
+        started = time.perf_counter()
+        client.get("bench:branch:0")
+        latencies.append((time.perf_counter() - started) * 1000)
+    conn.send(latencies)
+
+
+async def probe_while(url, invalidate):
+    """Probe read latencies (ms) while ``invalidate`` runs, and its duration"""
+    running = multiprocessing.Event()
+    running.set()
+    parent, child = multiprocessing.Pipe()
+    probe = multiprocessing.Process(target=_probe, args=(url, running, child))
+    probe.start()
+    await asyncio.sleep(0.2)
+    started = time.perf_counter()
+    removed = await invalidate()
+    elapsed = (time.perf_counter() - started) * 1000
+    running.clear()
+    latencies = parent.recv()
+    probe.join()
+    return removed, elapsed, latencies
+
+
+async def run(url, args):
+    # Long socket timeout: KEYS over this keyspace outlasts the default 1 s
+    cache = CacheManager(create_redis(url, socket_timeout=60), prefix="bench")
+    idle = sorted((await probe_while(url, lambda: asyncio.sleep(0.5)))[2])
+    baseline = idle[int(0.99 * (len(idle) - 1))]
+
+    results = {}
+    for name, invalidate in (
+        ("KEYS + DEL", lambda: keys_and_del(cache)),
+        ("SCAN + UNLINK", lambda: cache.clear_pattern("product:*")),
+        ("invalidate_tags", lambda: cache.invalidate_tags("category:nuts")),
+    ):
+        await cache.redis.flushdb()
+        await seed(cache, args.keys)
+        removed, elapsed, latencies = await probe_while(url, invalidate)
+        remaining = await cache.get_many([f"product:{n}" for n in range(0, args.keys, 97)])
+        survivors = await cache.get_many([f"branch:{n}" for n in range(0, args.keys, 97)])
+        clean = (not any(remaining.values())) and all(survivors.values())
+        latencies.sort()
+        results[name] = (
+            removed,
+            elapsed,
+            latencies[int(0.99 * (len(latencies) - 1))],
+            latencies[-1],
+            clean,
+        )
+    await cache.close()
+    return baseline, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--keys", type=int, default=100000)
+    parser.add_argument("--rtt", type=float, default=0.2, help="added round-trip time in ms")
+    parser.add_argument(
+        "--spike-ratio",
+        type=float,
+        default=5.0,
+        help="required worst-read improvement over KEYS + DEL",
+    )
+    args = parser.parse_args()
+
+    baseline, results = asyncio.run(run(start_redis(args.rtt), args))
+
+    print(f"{args.keys} tagged entries + {args.keys} unrelated, probe idle p99 {baseline:.2f} ms")
+    print(f"{'method':<17}{'removed':>9}{'took ms':>10}{'probe p99 ms':>14}{'probe max ms':>14}")
+    for name, (removed, elapsed, p99, worst, _) in results.items():
+        print(f"{name:<17}{removed:>9}{elapsed:>10.0f}{p99:>14.2f}{worst:>14.2f}")
+    improvement = results["KEYS + DEL"][3] / results["invalidate_tags"][3]
+    ok = all(result[4] for result in results.values()) and improvement >= args.spike_ratio
+    print(
+        f"{'✅' if ok else '❌'} worst probe read during invalidate_tags {improvement:.1f}x lower than "
+        f"during KEYS + DEL; only the tagged entries were removed"
+    )
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
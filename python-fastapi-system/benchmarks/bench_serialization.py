@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Benchmark: serializing InventoryMovement rows for a list endpoint
+
+Builds --rows InventoryMovement rows the way a query loads them (committed
+column values, nothing pending), then renders the list two ways:
+
+- before: the old ``to_dict`` (``getattr`` per column) per row, then
+  ``jsonable_encoder`` and ``json.dumps``, as JSONResponse does;
+- after: ORJSONModelResponse, which reads each row through the model's
+  compiled serializer and lets orjson write the bytes.
+
+It also times ``to_dict`` alone, old against compiled.  The rows map
+InventoryMovement's own table in a registry of their own: the app's model
+registry does not configure as a whole in this tree, and rows of an
+unconfigured mapper cannot be built.
+
+Fails unless both paths decode to the same JSON and the response renders
+--speedup times faster.
+
+Usage:
+python benchmarks/bench_serialization.py [--rows 10000] [--rounds 5] [--speedup 3]
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import registry
+from sqlalchemy.orm.attributes import set_committed_value
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.core.responses import ORJSONModelResponse  # noqa: E402
+from app.models.base import BaseModel, ModelSerializer  # noqa: E402
+from app.models.inventory import InventoryMovement, MovementType  # noqa: E402
+
+
+class Movement:
+    """InventoryMovement's table and serialization, without its relationships"""
+
+    to_dict = BaseModel.to_dict
+
+
+bench_registry = registry()
+Movement.__serializer__ = ModelSerializer(
+    bench_registry.map_imperatively(Movement, InventoryMovement.__table__)
+)
+bench_registry.configure()
+
+
+def legacy_to_dict(row):
+    return {column.name: getattr(row, column.name) for column in row.__table__.columns}
+
+
+def make_rows(count):
+    started = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    branches = [uuid.uuid4() for _ in range(20)]
+    products = [uuid.uuid4() for _ in range(200)]
+    rows = []
+    for n in range(count):
+        quantity = Decimal(random.randrange(-5000, 5000)) / 1000
+        unit_cost = Decimal(random.randrange(1000, 90000)) / 100
+        values = {
+            "id": uuid.uuid4(),
+            "created_at": started + timedelta(minutes=n),
+            "updated_at": started + timedelta(minutes=n),
+            "is_active": True,
+            "created_by": uuid.uuid4(),
+            "updated_by": None,
+            "branch_id": random.choice(branches),
+            "product_id": random.choice(products),
+            "stock_id": None,
+            "movement_type": random.choice(list(MovementType)),
+            "quantity": quantity,
+            "unit_cost": unit_cost,
+            "total_cost": (quantity * unit_cost).quantize(Decimal("0.01")),
+            "balance_after": Decimal(random.randrange(0, 100000)) / 1000,
+            "reference_type": "sale",
+            "reference_id": uuid.uuid4(),
+            "reference_number": f"SO-{n:06d}",
+            "movement_date": started + timedelta(minutes=n),
+            "batch_number": None,
+            "lot_number": None,
+            "expiry_date": None,
+            "notes": None,
+            "reason": None,
+            "requires_approval": False,
+            "approved_by": None,
+            "approved_at": None,
+            "approval_notes": None,
+        }
+        row = Movement.__mapper__.class_manager.new_instance()
+        for key in Movement.__serializer__.keys:
+            set_committed_value(row, key, values[key])
+        rows.append(row)
+    return rows
+
+
+def best_ms(func, rounds):
+    times = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        result = func()
+        times.append((time.perf_counter() - started) * 1000)
+    return min(times), statistics.median(times), result
+
+
+def before(rows):
+    content = jsonable_encoder([legacy_to_dict(row) for row in rows])
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument(
+        "--speedup", type=float, default=3.0, help="required response render speedup"
+    )
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    results = {
+        "to_dict (getattr per column)": best_ms(
+            lambda: [legacy_to_dict(row) for row in rows], args.rounds
+        ),
+        "to_dict (compiled)": best_ms(lambda: [row.to_dict() for row in rows], args.rounds),
+        "jsonable_encoder + json.dumps": best_ms(lambda: before(rows), args.rounds),
+        "ORJSONModelResponse": best_ms(lambda: ORJSONModelResponse(rows).body, args.rounds),
+    }
+
+    print(
+        f"{args.rows} InventoryMovement rows, {len(Movement.__serializer__.keys)} columns, "
+        f"best of {args.rounds}"
+    )
+    print(f"{'path':<32}{'best ms':>10}{'p50 ms':>10}{'rows/s':>12}")
+    for name, (best, median, _) in results.items():
+        print(f"{name:<32}{best:>10.1f}{median:>10.1f}{args.rows / best * 1000:>12,.0f}")
+
+    old_body = results["jsonable_encoder + json.dumps"][2]
+    new_body = results["ORJSONModelResponse"][2]
+    same = json.loads(old_body) == json.loads(new_body)
+    same &= results["to_dict (getattr per column)"][2] == results["to_dict (compiled)"][2]
+    to_dict_speedup = results["to_dict (getattr per column)"][0] / results["to_dict (compiled)"][0]
+    speedup = results["jsonable_encoder + json.dumps"][0] / results["ORJSONModelResponse"][0]
+    print(
+        f"body {len(old_body) / 2 ** 20:.1f} MB before, {len(new_body) / 2 ** 20:.1f} MB after; "
+        f"identical JSON: {'yes' if same else 'NO'}"
+    )
+
+    ok = same and speedup >= args.speedup
+    print(
+        f"{'✅' if ok else '❌'} response renders {speedup:.1f}x faster (required {args.speedup:.0f}x), "
+        f"to_dict {to_dict_speedup:.1f}x faster, same JSON"
+    )
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
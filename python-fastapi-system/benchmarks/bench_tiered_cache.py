@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Benchmark: TieredCache against CacheManager alone
+
+Runs against the fakeredis server from bench_cache (child process, --rtt ms
+per round trip) and measures three things:
+
+1. hot reads: --readers concurrent requests reading 100 cached keys, through
+   CacheManager.get and through TieredCache (served by the local LRU);
+2. stampede: the same requests miss one key whose loader takes --load ms,
+   with get-then-set on CacheManager and with TieredCache's single flight;
+3. expiry: --workers TieredCache instances (one per simulated worker, each
+   with its own LRU and pool) poll a key with a --ttl s TTL for
+   --duration s, without early refresh (beta=0) and with XFetch (beta=1).
+   It counts loader calls and requests that had to wait for one.
+
+Fails unless local hits are --speedup times faster than Redis reads, the
+stampede runs the loader once, and XFetch at least halves the requests
+that wait for a load at expiry.
+
+Usage:
+python benchmarks/bench_tiered_cache.py [--readers 20] [--requests 200] [--workers 8] [--duration 10]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+from bench_cache import start_redis
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.core.cache import CacheManager, create_redis  # noqa: E402
+from app.core.tiered_cache import TieredCache  # noqa: E402
+
+
+def new_cache(url):
+    return CacheManager(create_redis(url, socket_timeout=10, pool_timeout=10), prefix="bench")
+
+
+async def timed(call):
+    started = time.perf_counter()
+    await call()
+    return (time.perf_counter() - started) * 1000
+
+
+async def hot_reads(url, args):
+    cache = new_cache(url)
+    tiered = TieredCache(cache, local_ttl=60)
+    keys = [f"product:{n}" for n in range(100)]
+    for key in keys:
+        await tiered.get_or_load(key, lambda: asyncio.sleep(0, {"id": 1, "price": 240}))
+
+    async def redis_reads():
+        for key in keys:
+            await cache.get(key)
+
+    async def local_reads():
+        for key in keys:
+            await tiered.get_or_load(key, None)
+
+    results = {}
+    for name, reads in (("CacheManager.get", redis_reads), ("TieredCache", local_reads)):
+        await asyncio.gather(
+            *(reads() for _ in range(args.readers))
+        )  # warm-up: open pool connections
+        latencies = await asyncio.gather(*(timed(reads) for _ in range(args.readers)))
+        results[name] = statistics.median(latencies) / len(keys)
+    await cache.close()
+    return results
+
+
+async def stampede(url, args):
+    cache = new_cache(url)
+    tiered = TieredCache(cache)
+    calls = {"CacheManager": 0, "TieredCache": 0}
+
+    def loader(name):
+        async def load():
+            calls[name] += 1
+            await asyncio.sleep(args.load / 1000)
+            return {"id": 7, "price": 240}
+
+        return load
+
+    async def get_then_set():
+        if await cache.get("report:cold") is None:
+            await cache.set("report:cold", str(await loader("CacheManager")()))
+
+    await asyncio.gather(*(get_then_set() for _ in range(args.requests)))
+    await asyncio.gather(
+        *(
+            tiered.get_or_load("report:coalesced", loader("TieredCache"))
+            for _ in range(args.requests)
+        )
+    )
+    await cache.close()
+    return calls
+
+
+async def expiry(url, args, beta):
+    caches = [new_cache(url) for _ in range(args.workers)]
+    workers = [TieredCache(cache, beta=beta) for cache in caches]
+    key = f"analytics:daily:beta={beta}"
+    loads, waits, requests = 0, 0, 0
+
+    async def load():
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(args.load / 1000)
+        return {"revenue": 12345}
+
+    async def poll(worker):
+        nonlocal waits, requests
+        deadline = time.monotonic() + args.duration
+        while time.monotonic() < deadline:
+            if await timed(lambda: worker.get_or_load(key, load, args.ttl)) > args.load / 2:
+                waits += 1
+            requests += 1
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(poll(worker) for worker in workers))
+    for cache in caches:
+        await cache.close()
+    return loads, waits, requests
+
+
+async def run(url, args):
+    reads = await hot_reads(url, args)
+    calls = await stampede(url, args)
+    plain = await expiry(url, args, 0.0)
+    xfetch = await expiry(url, args, 1.0)
+    return reads, calls, plain, xfetch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--readers", type=int, default=20, help="concurrent hot-read requests")
+    parser.add_argument("--rtt", type=float, default=0.2, help="added round-trip time in ms")
+    parser.add_argument("--load", type=float, default=100.0, help="loader duration in ms")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--ttl", type=int, default=2, help="expiry scenario TTL in seconds")
+    parser.add_argument("--duration", type=float, default=10.0, help="expiry scenario seconds")
+    parser.add_argument(
+        "--speedup", type=float, default=5.0, help="required local vs Redis read speedup"
+    )
+    args = parser.parse_args()
+
+    reads, calls, plain, xfetch = asyncio.run(run(start_redis(args.rtt), args))
+
+    print(f"hot reads, {args.readers} concurrent requests x 100 keys, {args.rtt:.1f} ms round trip")
+    for name, per_read in reads.items():
+        print(f"  {name:<18}{per_read * 1000:>10.1f} us per read (p50)")
+    print(f"stampede, {args.requests} concurrent misses, {args.load:.0f} ms loader")
+    for name, count in calls.items():
+        print(f"  {name:<18}{count:>10} loader calls")
+    print(f"expiry, {args.workers} workers, {args.ttl} s TTL, {args.duration:.0f} s")
+    print(f"  {'':<18}{'loads':>10}{'waited':>10}{'requests':>10}")
+    for name, (loads, waits, requests) in (("no early refresh", plain), ("XFetch", xfetch)):
+        print(f"  {name:<18}{loads:>10}{waits:>10}{requests:>10}")
+
+    speedup = reads["CacheManager.get"] / reads["TieredCache"]
+    ok = speedup >= args.speedup and calls["TieredCache"] == 1 and xfetch[1] * 2 <= plain[1]
+    print(
+        f"{'✅' if ok else '❌'} local hits {speedup:.0f}x faster than Redis reads, "
+        f"{calls['TieredCache']} load for {args.requests} concurrent misses, "
+        f"{plain[1]} -> {xfetch[1]} requests waiting on a load at expiry"
+    )
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()